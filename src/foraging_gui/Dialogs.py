@@ -51,6 +51,7 @@ from PyQt5.QtWidgets import (
 )
 
 from foraging_gui.MyFunctions import Worker,WorkerTagging
+from foraging_gui.laser_waveforms import laser_waveform
 from foraging_gui.Visualization import PlotWaterCalibration
 
 codebase_curriculum_schema_version = DynamicForagingCurriculum.model_fields[
@@ -1740,6 +1741,9 @@ class CameraDialog(QDialog):
             self.MainWindow.Channel.CameraControl(int(1))
             time.sleep(5)
             self.camera_start_time = str(datetime.now())
+            self.MainWindow._start_drop_frame_monitor(
+                int(self.FrameRate.text())
+            )
             logging.info(
                 "Camera is on!",
                 extra={"tags": [self.MainWindow.warning_log_tag]},
@@ -1753,6 +1757,7 @@ class CameraDialog(QDialog):
             )
             self.info_label.setText("Camera is turning off")
             QApplication.processEvents()
+            self.MainWindow._stop_drop_frame_monitor()
             self.MainWindow.Channel.CameraControl(int(2))
             self.camera_stop_time = str(datetime.now())
             time.sleep(5)
@@ -1968,139 +1973,29 @@ class LaserCalibrationDialog(QDialog):
 
     def _ProduceWaveForm(self, Amplitude):
         """generate the waveform based on Duration and Protocol, Laser Power, Frequency, RampingDown, PulseDur and the sample frequency"""
-        if self.CLP_Protocol == "Sine":
-            resolution = (
-                self.CLP_SampleFrequency * self.CLP_CurrentDuration
-            )  # how many datapoints to generate
-            cycles = (
-                self.CLP_CurrentDuration * self.CLP_Frequency
-            )  # how many sine cycles
-            length = np.pi * 2 * cycles
-            self.my_wave = (
-                Amplitude
-                * (
-                    1
-                    + np.sin(
-                        np.arange(
-                            0 + 1.5 * math.pi,
-                            length + 1.5 * math.pi,
-                            length / resolution,
-                        )
-                    )
-                )
-                / 2
-            )
-            # add ramping down
-            if self.CLP_RampingDown > 0:
-                if self.CLP_RampingDown > self.CLP_CurrentDuration:
-                    logging.warning(
-                        "Ramping down is longer than the laser duration!",
-                        extra={"tags": [self.MainWindow.warning_log_tag]},
-                    )
-                else:
-                    Constant = np.ones(
-                        int(
-                            (self.CLP_CurrentDuration - self.CLP_RampingDown)
-                            * self.CLP_SampleFrequency
-                        )
-                    )
-                    RD = np.arange(
-                        1,
-                        0,
-                        -1
-                        / (np.shape(self.my_wave)[0] - np.shape(Constant)[0]),
-                    )
-                    RampingDown = np.concatenate((Constant, RD), axis=0)
-                    self.my_wave = self.my_wave * RampingDown
-            self.my_wave = np.append(self.my_wave, [0, 0])
-        elif self.CLP_Protocol == "Pulse":
+        if self.CLP_Protocol == "Pulse":
             if self.CLP_PulseDur == "NA":
                 logging.warning(
                     "Pulse duration is NA!",
                     extra={"tags": [self.MainWindow.warning_log_tag]},
                 )
-            else:
-                self.CLP_PulseDur = float(self.CLP_PulseDur)
-                PointsEachPulse = int(
-                    self.CLP_SampleFrequency * self.CLP_PulseDur
-                )
-                PulseIntervalPoints = int(
-                    1 / self.CLP_Frequency * self.CLP_SampleFrequency
-                    - PointsEachPulse
-                )
-                if PulseIntervalPoints < 0:
-                    logging.warning(
-                        "Pulse frequency and pulse duration are not compatible!",
-                        extra={"tags": [self.MainWindow.warning_log_tag]},
-                    )
-                TotalPoints = int(
-                    self.CLP_SampleFrequency * self.CLP_CurrentDuration
-                )
-                PulseNumber = np.floor(
-                    self.CLP_CurrentDuration * self.CLP_Frequency
-                )
-                EachPulse = Amplitude * np.ones(PointsEachPulse)
-                PulseInterval = np.zeros(PulseIntervalPoints)
-                WaveFormEachCycle = np.concatenate(
-                    (EachPulse, PulseInterval), axis=0
-                )
-                self.my_wave = np.empty(0)
-                # pulse number should be greater than 0
-                if PulseNumber > 1:
-                    for i in range(int(PulseNumber - 1)):
-                        self.my_wave = np.concatenate(
-                            (self.my_wave, WaveFormEachCycle), axis=0
-                        )
-                else:
-                    logging.warning(
-                        "Pulse number is less than 1!",
-                        extra={"tags": [self.MainWindow.warning_log_tag]},
-                    )
-                    return
-                self.my_wave = np.concatenate(
-                    (self.my_wave, EachPulse), axis=0
-                )
-                self.my_wave = np.concatenate(
-                    (
-                        self.my_wave,
-                        np.zeros(TotalPoints - np.shape(self.my_wave)[0]),
-                    ),
-                    axis=0,
-                )
-                self.my_wave = np.append(self.my_wave, [0, 0])
-        elif self.CLP_Protocol == "Constant":
-            resolution = (
-                self.CLP_SampleFrequency * self.CLP_CurrentDuration
-            )  # how many datapoints to generate
-            self.my_wave = Amplitude * np.ones(int(resolution))
-            if self.CLP_RampingDown > 0:
-                # add ramping down
-                if self.CLP_RampingDown > self.CLP_CurrentDuration:
-                    logging.warning(
-                        "Ramping down is longer than the laser duration!",
-                        extra={"tags": [self.MainWindow.warning_log_tag]},
-                    )
-                else:
-                    Constant = np.ones(
-                        int(
-                            (self.CLP_CurrentDuration - self.CLP_RampingDown)
-                            * self.CLP_SampleFrequency
-                        )
-                    )
-                    RD = np.arange(
-                        1,
-                        0,
-                        -1
-                        / (np.shape(self.my_wave)[0] - np.shape(Constant)[0]),
-                    )
-                    RampingDown = np.concatenate((Constant, RD), axis=0)
-                    self.my_wave = self.my_wave * RampingDown
-            self.my_wave = np.append(self.my_wave, [0, 0])
-        else:
+                return
+            self.CLP_PulseDur = float(self.CLP_PulseDur)
+        waveform = laser_waveform(
+            self.CLP_Protocol,
+            self.CLP_CurrentDuration,
+            Amplitude,
+            self.CLP_SampleFrequency,
+            frequency=self.CLP_Frequency,
+            pulse_duration=self.CLP_PulseDur,
+            ramping_down=self.CLP_RampingDown,
+        )
+        for warning in waveform.warnings:
             logging.warning(
-                "Unidentified optogenetics protocol!",
-                extra={"tags": [self.MainWindow.warning_log_tag]},
+                warning, extra={"tags": [self.MainWindow.warning_log_tag]}
             )
+        if waveform.wave is not None:
+            self.my_wave = waveform.wave
 
     def _GetLaserAmplitude(self):
         """the voltage amplitude dependens on Protocol, Laser Power, Laser color, and the stimulation locations<>"""
@@ -4334,8 +4229,8 @@ class OpticalTaggingDialog(QDialog):
                 # receiving the timestamps of laser start and saving them. The laser waveforms should be sent to the NI-daq as a backup.
                 Rec=self.MainWindow.Channel.receive()
 
-                if Rec[0].address=='/ITIStartTimeHarp':
-                    laser_start_timestamp=Rec[1][1][0]
+                if Rec.address=='/ITIStartTimeHarp':
+                    laser_start_timestamp=Rec.value
                     # change the success_tag to 1
                     success_tag=1
                 else:
@@ -4552,28 +4447,23 @@ class OpticalTaggingDialog(QDialog):
             logger.warning(f"Unknown protocol: {protocol}")
             return
         sample_frequency=5000 # should be replaced
-        PointsEachPulse=int(sample_frequency*pulse_duration/1000)
-        PulseIntervalPoints=int(1/frequency*sample_frequency-PointsEachPulse)
-        if PulseIntervalPoints<0:
-            logging.warning('Pulse frequency and pulse duration are not compatible!',
-                            extra={'tags': [self.MainWindow.warning_log_tag]})
-        TotalPoints=int(sample_frequency*duration_each_cycle)
-        PulseNumber=np.floor(duration_each_cycle*frequency)
-        EachPulse=input_voltage*np.ones(PointsEachPulse)
-        PulseInterval=np.zeros(PulseIntervalPoints)
-        WaveFormEachCycle=np.concatenate((EachPulse, PulseInterval), axis=0)
-        my_wave=np.empty(0)
-        # pulse number should be greater than 0
-        if PulseNumber>1:
-            for i in range(int(PulseNumber-1)):
-                my_wave=np.concatenate((my_wave, WaveFormEachCycle), axis=0)
-        else:
-            logging.warning('Pulse number is less than 1!', extra={'tags': [self.MainWindow.warning_log_tag]})
+        # pulse_duration is in ms
+        waveform = laser_waveform(
+            protocol,
+            duration_each_cycle,
+            input_voltage,
+            sample_frequency,
+            frequency=frequency,
+            pulse_duration=pulse_duration,
+            pulse_unit=1000,
+        )
+        for warning in waveform.warnings:
+            logging.warning(
+                warning, extra={"tags": [self.MainWindow.warning_log_tag]}
+            )
+        if waveform.wave.size == 0:
             return
-        my_wave=np.concatenate((my_wave, EachPulse), axis=0)
-        my_wave=np.concatenate((my_wave, np.zeros(TotalPoints-np.shape(my_wave)[0])), axis=0)
-        my_wave=np.append(my_wave,[0,0])
-        return my_wave
+        return waveform.wave
 
     def _get_laser_amplitude(self,target_power:float,laser_color:str,protocol:str,laser_name:str)->float:
         '''Get the amplitude of the laser based on the calibraion results
@@ -4903,8 +4793,8 @@ class RandomRewardDialog(QDialog):
         Return = False # no licks received
         while not self.MainWindow.Channel2.msgs.empty():
             Rec = self.MainWindow.Channel2.receive()
-            address = Rec[0].address
-            lick_time = Rec[1][1][0]
+            address = Rec.address
+            lick_time = Rec.value
 
             if address == '/LeftLickTime':
                 self.random_reward_par['left_lick_time'].append(lick_time)
@@ -4935,10 +4825,10 @@ class RandomRewardDialog(QDialog):
 
             while random_left_water_start_time is None or random_left_reward_delivery_time_harp is None:
                 Rec = self.MainWindow.Channel2.receive()
-                if Rec[0].address == '/RandomLeftWaterStartTime':
-                    random_left_water_start_time = Rec[1][1][0]
-                elif Rec[0].address == '/LeftRewardDeliveryTimeHarp':
-                    random_left_reward_delivery_time_harp = Rec[1][1][0]
+                if Rec.address == '/RandomLeftWaterStartTime':
+                    random_left_water_start_time = Rec.value
+                elif Rec.address == '/LeftRewardDeliveryTimeHarp':
+                    random_left_reward_delivery_time_harp = Rec.value
 
             return random_left_water_start_time, random_left_reward_delivery_time_harp
 
@@ -4948,10 +4838,10 @@ class RandomRewardDialog(QDialog):
 
             while random_right_water_start_time is None or random_right_reward_delivery_time_harp is None:
                 Rec = self.MainWindow.Channel2.receive()
-                if Rec[0].address == '/RandomRightWaterStartTime':
-                    random_right_water_start_time = Rec[1][1][0]
-                elif Rec[0].address == '/RightRewardDeliveryTimeHarp':
-                    random_right_reward_delivery_time_harp = Rec[1][1][0]
+                if Rec.address == '/RandomRightWaterStartTime':
+                    random_right_water_start_time = Rec.value
+                elif Rec.address == '/RightRewardDeliveryTimeHarp':
+                    random_right_reward_delivery_time_harp = Rec.value
 
             return random_right_water_start_time, random_right_reward_delivery_time_harp
 
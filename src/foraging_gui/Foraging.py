@@ -1,3 +1,4 @@
+import copy
 import csv
 import json
 import logging
@@ -21,7 +22,6 @@ import ms_active_directory
 import concurrent.futures
 import getpass
 
-import harp
 import logging_loki
 import numpy as np
 import pandas as pd
@@ -71,7 +71,16 @@ from foraging_gui.Dialogs import (
     RandomRewardDialog,
     get_curriculum_string
 )
+from foraging_gui.drop_frames import (
+    CAMERA_TRIGGER_FILE,
+    DropFrameMonitor,
+    count_frames,
+    find_camera_files,
+    harp_message_count,
+    wait_for_stable_size,
+)
 from foraging_gui.GenerateMetadata import generate_metadata
+from foraging_gui.json_fields import read_fields
 from foraging_gui.MyFunctions import (
     EphysRecording,
     GenerateTrials,
@@ -79,16 +88,48 @@ from foraging_gui.MyFunctions import (
     TimerWorker,
     Worker,
 )
+from foraging_gui.parameter_log import (
+    PARAMETER_LOG_KEY,
+    ParameterLog,
+    parameter_history,
+)
 from foraging_gui.RigJsonBuilder import build_rig_json
+from foraging_gui.session_columns import (
+    ColumnarSession,
+    columns_path,
+    load_session,
+    write_columns,
+)
+from foraging_gui.session_index import SessionIndex, session_summary
+from foraging_gui.session_journal import (
+    JOURNAL_SUFFIX,
+    NumpyEncoder,
+    SessionJournal,
+    TrialFields,
+    compact,
+    journal_path,
+)
 from foraging_gui.settings_model import BonsaiSettingsModel, DFTSettingsModel
 from foraging_gui.sound_button import SoundButton
 from foraging_gui.stage import Stage
+from foraging_gui.trial_engine import REWARD_FAMILIES
+from foraging_gui.trial_store import BufferedHistory, GrowableArray
+from foraging_gui.trial_updates import (
+    TrialGapMonitor,
+    TrialSnapshot,
+    TrialUpdates,
+)
 from foraging_gui.Visualization import (
     PlotLickDistribution,
     PlotTimeDistribution,
     PlotV,
 )
 from foraging_gui.warning_widget import WarningWidget
+from foraging_gui.widget_registry import (
+    TEXT_WIDGETS,
+    WINDOW_PARAMETER_CONTAINERS,
+    WidgetRegistry,
+)
 import csv
 
 
@@ -97,17 +138,6 @@ logger.root.handlers.clear()  # clear handlers so console output can be configur
 logging.raiseExceptions = os.getenv("FORAGING_DEV_MODE", False)
 logging.basicConfig(level=logging.INFO)
 
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()  # Convert NumPy array to a list
-        if isinstance(obj, np.integer):
-            return int(obj)  # Convert np.int32 to a regular int
-        if isinstance(obj, np.float64) and np.isnan(obj):
-            return "NaN"  # Represent NaN as a string
-        return super(NumpyEncoder, self).default(obj)
-
-
 class Window(QMainWindow):
     Time = QtCore.pyqtSignal(int)  # Photometry timer signal
 
@@ -166,6 +196,14 @@ class Window(QMainWindow):
 
         # Load User interface
         self._LoadUI()
+        # parameter widgets, dialogs are registered when they are created
+        self.widget_registry = WidgetRegistry()
+        self.widget_registry.register(
+            "TrainingParameters", self.TrainingParameters
+        )
+        self.widget_registry.register("centralwidget", self.centralwidget)
+        # widgets whose text differs from the current parameters, see _CheckTextChange
+        self.changed_widgets = set()
 
         # create AINDBehaviorSession model to be used and referenced for session info
         self.behavior_session_model = AindBehaviorSessionModel(
@@ -209,8 +247,13 @@ class Window(QMainWindow):
         # -1, logging is not started; 0, formal logging; 1, temporary logging
         self.logging_type = -1
         self.previous_backup_completed = 1  # permission to save backup data; 0, the previous saving has not finished, and it will not trigger the next saving; 1, it is allowed to save backup data
+        self.session_journal = None  # per-trial backup of the running session
+        self.journal_fields = None  # snapshots of the journaled GeneratedTrials values
+        # index of the saved sessions, see _GetSessionIndex
+        self.session_index = None
         self.unsaved_data = False  # Setting unsaved data to False
         self.to_check_drop_frames = 1  # 1, to check drop frames during saving data; 0, not to check drop frames
+        self.drop_frame_monitor = None  # compares camera triggers and frames while recording
         self.session_run = (
             False  # flag to indicate if session has been run or not
         )
@@ -266,7 +309,20 @@ class Window(QMainWindow):
         self.bias_indicator.setSizePolicy(
             QSizePolicy.Maximum, QSizePolicy.Maximum
         )
-        self.bias_thread = threading.Thread()  # dummy thread
+        self.last_bias_trial = 0  # trial number of the last bias fit
+
+        # per-trial snapshots are handed from the trial loop to the plot, information and
+        # bias consumers, so that slow updates never delay the next trial
+        self.trial_updates = TrialUpdates()
+        self.trial_updates.add_consumer("bias", self._update_bias)
+        # the figures and the information panel are widgets, updated on the GUI thread
+        self.trial_updates.add_consumer("plot")
+        self.trial_updates.add_consumer("information")
+        self.trial_updates_timer = QtCore.QTimer(
+            timeout=self._poll_trial_updates, interval=200
+        )
+        self.trial_updates_timer.start()
+        self.trial_gap = TrialGapMonitor()
 
         # create sound button
         self.sound_button = SoundButton(
@@ -317,19 +373,7 @@ class Window(QMainWindow):
         self._RandomReward()
         self._InitializeMotorStage()
         self._Metadata()
-        self.RewardFamilies = [
-            [[8, 1], [6, 1], [3, 1], [1, 1]],
-            [[8, 1], [1, 1]],
-            [
-                [1, 0],
-                [0.9, 0.1],
-                [0.8, 0.2],
-                [0.7, 0.3],
-                [0.6, 0.4],
-                [0.5, 0.5],
-            ],
-            [[6, 1], [3, 1], [1, 1]],
-        ]
+        self.RewardFamilies = REWARD_FAMILIES
         self.WaterPerRewardedTrial = 0.005
         self._ShowRewardPairs()  # show reward pairs
         self._GetTrainingParameters()  # get initial training parameters
@@ -349,7 +393,7 @@ class Window(QMainWindow):
 
         # load the rig metadata
         self._load_rig_metadata()
-        
+
         # setup life-cycle logger
         self.lifecycle_logger = self.setup_lifecycle_logger()
 
@@ -375,7 +419,7 @@ class Window(QMainWindow):
         logging.info("Start up complete")
 
     def setup_lifecycle_logger(self) -> logging.Logger:
-        
+
         """
         Creates logger for start, stop, and failure events with formatter adhering to aind log standards.
         """
@@ -940,7 +984,24 @@ class Window(QMainWindow):
         )
         session_full_path_list = []
         session_path_list = []
-        for session_folder in os.listdir(animal_folder):
+        index = self._GetSessionIndex()
+        box_folder = os.path.dirname(animal_folder)
+        box = os.path.basename(box_folder)
+        if (
+            index is not None
+            and os.path.normcase(os.path.abspath(os.path.dirname(box_folder)))
+            == os.path.normcase(os.path.abspath(self.default_saveFolder))
+            and index.is_scanned(box)
+        ):
+            # from the session index instead of listing the session folders
+            for entry in index.sessions(box, os.path.basename(animal_folder)):
+                session_full_path_list.append(entry.path)
+                session_path_list.append(entry.session)
+        # list the session folders of mice the index does not know
+        session_folders = (
+            os.listdir(animal_folder) if not session_full_path_list else []
+        )
+        for session_folder in session_folders:
             training_folder_old = os.path.join(
                 animal_folder, session_folder, "TrainingFolder"
             )
@@ -1061,38 +1122,31 @@ class Window(QMainWindow):
                         )
 
                 camera_trigger_file = os.path.join(
-                    HarpFolder, "BehaviorEvents", "Event_94.bin"
+                    HarpFolder, CAMERA_TRIGGER_FILE
                 )
 
-                # Determine trigger length
-                if os.path.exists(camera_trigger_file):
-                    # Wait for video saving to complete
-                    time.sleep(5)
-                    triggers = harp.read(camera_trigger_file)
-                    self.trigger_length = len(triggers)
-                elif len(os.listdir(video_folder)) == 0:
-                    # No video data saved
-                    self.trigger_length = 0
-                    self.to_check_drop_frames = 0
-                    return
-                elif ("HighSpeedCamera" in self.SettingsBox) and (
-                    self.SettingsBox["HighSpeedCamera"] == 1
-                ):
-                    self.trigger_length = 0
-                    logging.error(
-                        "Saved video data, but no camera trigger file found"
-                    )
-                    logging.info(
-                        "No camera trigger file found!",
-                        extra={"tags": [self.warning_log_tag]},
-                    )
-                    return
-                else:
-                    logging.info(
-                        "Saved video data, but not using high speed camera - skipping drop frame check"
-                    )
-                    self.trigger_length = 0
-                    self.to_check_drop_frames = 0
+                if not os.path.exists(camera_trigger_file):
+                    if len(os.listdir(video_folder)) == 0:
+                        # No video data saved
+                        self.trigger_length = 0
+                        self.to_check_drop_frames = 0
+                    elif ("HighSpeedCamera" in self.SettingsBox) and (
+                        self.SettingsBox["HighSpeedCamera"] == 1
+                    ):
+                        self.trigger_length = 0
+                        logging.error(
+                            "Saved video data, but no camera trigger file found"
+                        )
+                        logging.info(
+                            "No camera trigger file found!",
+                            extra={"tags": [self.warning_log_tag]},
+                        )
+                    else:
+                        logging.info(
+                            "Saved video data, but not using high speed camera - skipping drop frame check"
+                        )
+                        self.trigger_length = 0
+                        self.to_check_drop_frames = 0
                     return
 
                 if not os.path.isdir(video_folder):
@@ -1102,97 +1156,22 @@ class Window(QMainWindow):
                     return
 
                 # Inspect contents of video_folder to determine structure
-                entries = os.listdir(video_folder)
-                csv_files = [f for f in entries if f.endswith(".csv")]
-                avi_files = [f for f in entries if f.endswith(".avi")]
-                subfolders = [
-                    d for d in entries
-                    if os.path.isdir(os.path.join(video_folder, d))
-                ]
+                cameras = find_camera_files(video_folder)
 
-                # ---------------------------------------------------------
-                # Case 1: flat structure with .avi + .csv in video_folder
-                # ---------------------------------------------------------
-                if avi_files:
-                    for avi_file in avi_files:
-                        csv_file = avi_file.replace(".avi", ".csv")
-                        camera_name = avi_file.replace(".avi", "")
-                        if csv_file not in csv_files:
-                            this_text = f"No csv file found for {avi_file}"
-                            self.drop_frames_warning_text += this_text
-                        else:
-                            current_frames = pd.read_csv(
-                                os.path.join(video_folder, csv_file),
-                                header=None,
-                            )
-                            num_frames = len(current_frames)
-                            if num_frames != self.trigger_length:
-                                this_text = (
-                                    f"Error: {avi_file} has {num_frames} frames, "
-                                    f"but {self.trigger_length} triggers. "
-                                )
-                                self.drop_frames_warning_text += this_text
-                                logging.error(
-                                    this_text,
-                                    extra={"tags": [self.warning_log_tag]},
-                                )
-                                self.drop_frames_tag = 1
-                            else:
-                                this_text = (
-                                    f"Correct: {avi_file} has {num_frames} frames "
-                                    f"and {self.trigger_length} triggers. "
-                                )
-                                self.drop_frames_warning_text += this_text
-                                logging.info(
-                                    this_text,
-                                    extra={"tags": [self.warning_log_tag]},
-                                )
-                            self.frame_num[camera_name] = num_frames
-
-                # ---------------------------------------------------------
-                # Case 2: nested structure with camera subfolders
-                #         Each subfolder contains video.mp4 + metadata.csv
-                # ---------------------------------------------------------
-                if subfolders:
-                    for camera_name in subfolders:
-                        cam_dir = os.path.join(video_folder, camera_name)
-                        if not os.path.isdir(cam_dir):
-                            continue
-
-                        # Expect metadata.csv inside the subfolder
-                        metadata_path = os.path.join(cam_dir, "metadata.csv")
-                        if not os.path.exists(metadata_path):
-                            this_text = (
-                                f"No metadata.csv file found for camera {camera_name}"
-                            )
-                            self.drop_frames_warning_text += this_text
-                            logging.error(
-                                this_text,
-                                extra={"tags": [self.warning_log_tag]},
-                            )
-                            self.drop_frames_tag = 1
-                            continue
-
-                        # Count frames from metadata.csv
-                        current_frames = pd.read_csv(metadata_path)
-                        num_frames = len(current_frames)
-
-                        # Try to identify the mp4 file for logging purposes
-                        mp4_files = [
-                            f for f in os.listdir(cam_dir)
-                            if f.lower().endswith(".mp4")
-                        ]
-                        if mp4_files:
-                            video_file = mp4_files[0]
-                        else:
-                            # Fall back to a generic name if no mp4 is found
-                            video_file = "video.mp4"
+                # Wait for the trigger file and the camera csvs to be flushed
+                if not wait_for_stable_size(
+                    [camera_trigger_file]
+                    + [c.csv_path for c in cameras if c.csv_path is not None]
+                ):
+                    logging.warning(
+                        "Camera files were still growing when checking dropped frames"
+                    )
+                self.trigger_length = harp_message_count(camera_trigger_file)
 
-                        if num_frames != self.trigger_length:
-                            this_text = (
-                                f"Error: {camera_name}/{video_file} has "
-                                f"{num_frames} frames, but {self.trigger_length} triggers. "
-                            )
+                for camera, num_frames in count_frames(cameras):
+                    if num_frames is None:
+                        if camera.nested:
+                            this_text = f"No metadata.csv file found for camera {camera.camera_name}"
                             self.drop_frames_warning_text += this_text
                             logging.error(
                                 this_text,
@@ -1201,21 +1180,57 @@ class Window(QMainWindow):
                             self.drop_frames_tag = 1
                         else:
                             this_text = (
-                                f"Correct: {camera_name}/{video_file} has "
-                                f"{num_frames} frames and {self.trigger_length} triggers. "
+                                f"No csv file found for {camera.video_label}"
                             )
                             self.drop_frames_warning_text += this_text
-                            logging.info(
-                                this_text,
-                                extra={"tags": [self.warning_log_tag]},
-                            )
+                        continue
 
-                        self.frame_num[camera_name] = num_frames
+                    if num_frames != self.trigger_length:
+                        this_text = (
+                            f"Error: {camera.video_label} has {num_frames} frames, "
+                            f"but {self.trigger_length} triggers. "
+                        )
+                        self.drop_frames_warning_text += this_text
+                        logging.error(
+                            this_text,
+                            extra={"tags": [self.warning_log_tag]},
+                        )
+                        self.drop_frames_tag = 1
+                    else:
+                        this_text = (
+                            f"Correct: {camera.video_label} has {num_frames} frames "
+                            f"and {self.trigger_length} triggers. "
+                        )
+                        self.drop_frames_warning_text += this_text
+                        logging.info(
+                            this_text,
+                            extra={"tags": [self.warning_log_tag]},
+                        )
+                    self.frame_num[camera.camera_name] = num_frames
 
             # Only check drop frames once each session
             self.to_check_drop_frames = 0
 
 
+    def _start_drop_frame_monitor(self, frame_rate: int):
+        """Compare camera triggers and frames while recording the current session"""
+        self._stop_drop_frame_monitor()
+        if not hasattr(self, "HarpFolder"):
+            return
+        self.drop_frame_monitor = DropFrameMonitor(
+            self.HarpFolder,
+            self.VideoFolder,
+            # one second of frames
+            tolerance=max(frame_rate, 1),
+            warning_log_tag=self.warning_log_tag,
+        )
+        self.drop_frame_monitor.start()
+
+    def _stop_drop_frame_monitor(self):
+        if self.drop_frame_monitor is not None:
+            self.drop_frame_monitor.stop()
+            self.drop_frame_monitor = None
+
     def _warmup(self):
         """warm up the session before starting.
         Use warm up with caution. Usually, it is only used for the first time training.
@@ -1649,7 +1664,7 @@ class Window(QMainWindow):
         self._stop_logging()
         self.Channel.StartLogging(log_folder)
         Rec = self.Channel.receive()
-        if Rec[0].address == "/loggerstarted":
+        if Rec.address == "/loggerstarted":
             pass
 
         self.logging_type = (
@@ -1991,6 +2006,7 @@ class Window(QMainWindow):
             ),
             "create_rig_metadata": True,
             "save_each_trial": True,
+            "save_columnar_session": True,
             "AutomaticUpload": True,
             "manifest_flag_dir": os.path.join(
                 os.path.expanduser("~"),
@@ -2107,6 +2123,7 @@ class Window(QMainWindow):
         ]
         self.name_mapper_file = self.Settings["name_mapper_file"]
         self.save_each_trial = self.Settings["save_each_trial"]
+        self.save_columnar_session = self.Settings["save_columnar_session"]
         self.auto_engage = self.Settings["auto_engage"]
         self.clear_figure_after_save = self.Settings["clear_figure_after_save"]
         self.add_default_project_name = self.Settings[
@@ -2838,171 +2855,152 @@ class Window(QMainWindow):
             event.accept()
             self.UpdateParameters = 1  # Changes are allowed
             # change color to black
-            for container in [
-                self.TrainingParameters,
-                self.centralwidget,
-                self.Opto_dialog,
-                self.Metadata_dialog,
-            ]:
-                # Iterate over each child of the container that is a QLineEdit or QDoubleSpinBox
-                for child in container.findChildren(
-                    (
-                        QtWidgets.QLineEdit,
-                        QtWidgets.QDoubleSpinBox,
-                        QtWidgets.QSpinBox,
-                    )
+            # Iterate over each QLineEdit, QDoubleSpinBox and QSpinBox
+            for child in self.widget_registry.widgets(
+                WINDOW_PARAMETER_CONTAINERS, TEXT_WIDGETS
+            ):
+                if not (
+                    hasattr(self, "AutoTrain_dialog")
+                    and self.AutoTrain_dialog.auto_train_engaged
                 ):
-                    if child.objectName() == "qt_spinbox_lineedit":
+                    # Only run _Task again if AutoTrain is NOT engaged
+                    # To avoid the _Task() function overwriting the AutoTrain UI locks
+                    # resolves https://github.com/AllenNeuralDynamics/dynamic-foraging-task/issues/239
+                    child.setStyleSheet("color: black;")
+                    child.setStyleSheet("background-color: white;")
+                    self._Task()
+
+                if child.objectName() in {
+                    "WeightAfter",
+                    "LickSpoutDistance",
+                    "ModuleAngle",
+                    "ArcAngle",
+                    "ProtocolID",
+                    "Stick_RotationAngle",
+                    "LickSpoutReferenceX",
+                    "LickSpoutReferenceY",
+                    "LickSpoutReferenceZ",
+                    "LickSpoutReferenceArea",
+                    "Stick_ArcAngle",
+                    "Stick_ModuleAngle",
+                    "RotationAngle",
+                    "ManipulatorX",
+                    "ManipulatorY",
+                    "ManipulatorZ",
+                    "ProbeTarget",
+                    "RigMetadataFile",
+                    "IACUCProtocol",
+                    "Experimenter",
+                    "TotalWater",
+                    "ExtraWater",
+                    "laser_1_target",
+                    "laser_2_target",
+                    "laser_1_calibration_power",
+                    "laser_2_calibration_power",
+                    "laser_1_calibration_voltage",
+                    "laser_2_calibration_voltage",
+                    "hab_time_box",
+                }:
+                    continue
+                if child.objectName() == "UncoupledReward":
+                    Correct = self._CheckFormat(child)
+                    if Correct == 0:  # incorrect format; don't change
+                        child.setText(
+                            getattr(Parameters, "TP_" + child.objectName())
+                        )
+                    continue
+                if (
+                    child.objectName()
+                    in [
+                        "PositionX",
+                        "PositionY",
+                        "PositionZ",
+                        "SuggestedWater",
+                        "BaseWeight",
+                        "TargetWeight",
+                        "",
+                        "ConditionP_5",
+                        "ConditionP_6",
+                        "Duration_5",
+                        "Duration_6",
+                        "OffsetEnd_5",
+                        "OffsetEnd_6",
+                        "OffsetStart_5",
+                        "OffsetStart_6",
+                        "Probability_5",
+                        "Probability_6",
+                        "PulseDur_5",
+                        "PulseDur_6",
+                        "RD_5",
+                        "RD_6",
+                    ]
+                ) and (child.text() == ""):
+                    # These attributes can have the empty string, but we can't set the value as the empty string, unless we allow resets
+                    if allow_reset:
                         continue
-
-                    if not (
-                        hasattr(self, "AutoTrain_dialog")
-                        and self.AutoTrain_dialog.auto_train_engaged
+                    if (
+                        hasattr(Parameters, "TP_" + child.objectName())
+                        and child.objectName() != ""
                     ):
-                        # Only run _Task again if AutoTrain is NOT engaged
-                        # To avoid the _Task() function overwriting the AutoTrain UI locks
-                        # resolves https://github.com/AllenNeuralDynamics/dynamic-foraging-task/issues/239
-                        child.setStyleSheet("color: black;")
-                        child.setStyleSheet("background-color: white;")
-                        self._Task()
+                        child.setText(
+                            getattr(Parameters, "TP_" + child.objectName())
+                        )
+                    continue
+                if child.objectName() in [
+                    "LatestCalibrationDate",
+                    "SessionlistSpin",
+                ]:
+                    continue
 
-                    if child.objectName() in {
-                        "WeightAfter",
-                        "LickSpoutDistance",
-                        "ModuleAngle",
-                        "ArcAngle",
-                        "ProtocolID",
-                        "Stick_RotationAngle",
-                        "LickSpoutReferenceX",
-                        "LickSpoutReferenceY",
-                        "LickSpoutReferenceZ",
-                        "LickSpoutReferenceArea",
-                        "Stick_ArcAngle",
-                        "Stick_ModuleAngle",
-                        "RotationAngle",
-                        "ManipulatorX",
-                        "ManipulatorY",
-                        "ManipulatorZ",
-                        "ProbeTarget",
-                        "RigMetadataFile",
-                        "IACUCProtocol",
-                        "Experimenter",
-                        "TotalWater",
-                        "ExtraWater",
-                        "laser_1_target",
-                        "laser_2_target",
-                        "laser_1_calibration_power",
-                        "laser_2_calibration_power",
-                        "laser_1_calibration_voltage",
-                        "laser_2_calibration_voltage",
-                        "hab_time_box"
-                    }:
-                        continue
-                    if child.objectName() == "UncoupledReward":
-                        Correct = self._CheckFormat(child)
-                        if Correct == 0:  # incorrect format; don't change
-                            child.setText(
+                # check for empty string condition
+                try:
+                    float(child.text())
+                except Exception:
+                    # Invalid float. Do not change the parameter, reset back to previous value
+                    logging.warning(
+                        "Cannot convert input to float: {}, '{}'".format(
+                            child.objectName(), child.text()
+                        )
+                    )
+                    if isinstance(child, QtWidgets.QDoubleSpinBox):
+                        child.setValue(
+                            float(
                                 getattr(Parameters, "TP_" + child.objectName())
                             )
-                        continue
-                    if (
-                        child.objectName()
-                        in [
-                            "PositionX",
-                            "PositionY",
-                            "PositionZ",
-                            "SuggestedWater",
-                            "BaseWeight",
-                            "TargetWeight",
-                            "",
-                            "ConditionP_5",
-                            "ConditionP_6",
-                            "Duration_5",
-                            "Duration_6",
-                            "OffsetEnd_5",
-                            "OffsetEnd_6",
-                            "OffsetStart_5",
-                            "OffsetStart_6",
-                            "Probability_5",
-                            "Probability_6",
-                            "PulseDur_5",
-                            "PulseDur_6",
-                            "RD_5",
-                            "RD_6",
-                        ]
-                    ) and (child.text() == ""):
-                        # These attributes can have the empty string, but we can't set the value as the empty string, unless we allow resets
-                        if allow_reset:
-                            continue
-                        if (
-                            hasattr(Parameters, "TP_" + child.objectName())
-                            and child.objectName() != ""
-                        ):
-                            child.setText(
+                        )
+                    elif isinstance(child, QtWidgets.QSpinBox):
+                        child.setValue(
+                            int(
                                 getattr(Parameters, "TP_" + child.objectName())
                             )
-                        continue
-                    if child.objectName() in [
-                        "LatestCalibrationDate",
-                        "SessionlistSpin",
-                    ]:
-                        continue
-
-                    # check for empty string condition
-                    try:
-                        float(child.text())
-                    except Exception:
-                        # Invalid float. Do not change the parameter, reset back to previous value
-                        logging.warning(
-                            "Cannot convert input to float: {}, '{}'".format(
-                                child.objectName(), child.text()
-                            )
                         )
-                        if isinstance(child, QtWidgets.QDoubleSpinBox):
-                            child.setValue(
-                                float(
-                                    getattr(
-                                        Parameters, "TP_" + child.objectName()
-                                    )
-                                )
-                            )
-                        elif isinstance(child, QtWidgets.QSpinBox):
-                            child.setValue(
-                                int(
-                                    getattr(
-                                        Parameters, "TP_" + child.objectName()
-                                    )
-                                )
-                            )
-                        else:
-                            if (
-                                hasattr(Parameters, "TP_" + child.objectName())
-                                and child.objectName() != ""
-                            ):
-                                child.setText(
-                                    getattr(
-                                        Parameters, "TP_" + child.objectName()
-                                    )
-                                )
                     else:
                         if (
                             hasattr(Parameters, "TP_" + child.objectName())
                             and child.objectName() != ""
                         ):
-                            # If this parameter changed, add the change to the log
-                            old = getattr(
-                                Parameters, "TP_" + child.objectName()
+                            child.setText(
+                                getattr(Parameters, "TP_" + child.objectName())
                             )
-                            if old != "":
-                                old = float(old)
-                            new = float(child.text())
-                            if new != old:
-                                logging.info(
-                                    "Changing parameter: {}, {} -> {}".format(
-                                        child.objectName(), old, new
-                                    )
+                else:
+                    if (
+                        hasattr(Parameters, "TP_" + child.objectName())
+                        and child.objectName() != ""
+                    ):
+                        # If this parameter changed, add the change to the log
+                        old = getattr(Parameters, "TP_" + child.objectName())
+                        if old != "":
+                            old = float(old)
+                        new = float(child.text())
+                        if new != old:
+                            logging.info(
+                                "Changing parameter: {}, {} -> {}".format(
+                                    child.objectName(), old, new
                                 )
+                            )
 
+            # read all widgets again, in case one changed without signaling it
+            self.widget_registry.invalidate()
             # update the current training parameters
             self._GetTrainingParameters()
 
@@ -3013,145 +3011,142 @@ class Window(QMainWindow):
             Parameters = self.GeneratedTrials
         else:
             Parameters = self
-        for container in [
-            self.TrainingParameters,
-            self.centralwidget,
-            self.Opto_dialog,
-            self.Metadata_dialog,
-        ]:
-            # Iterate over each child of the container that is a QLineEdit or QDoubleSpinBox
-            for child in container.findChildren(
-                (
-                    QtWidgets.QLineEdit,
-                    QtWidgets.QDoubleSpinBox,
-                    QtWidgets.QSpinBox,
-                )
-            ):
-                if (
-                    child.objectName() in ["qt_spinbox_lineedit", None, ""]
-                    or child.isEnabled() == False
-                ):  # I don't understand where the qt_spinbox_lineedit comes from.
-                    continue
-                if (
-                    child.objectName() == "RewardFamily"
-                    or child.objectName() == "RewardPairsN"
-                    or child.objectName() == "BaseRewardSum"
-                ) and (child.text() != ""):
-                    Correct = self._CheckFormat(child)
-                    if Correct == 0:  # incorrect format; don't change
-                        child.setText(
-                            getattr(Parameters, "TP_" + child.objectName())
-                        )
-                    self._ShowRewardPairs()
-                try:
-                    if (
+        # only check the widget that changed and the ones still differing from the
+        # current parameters, all widgets when not called by a widget signal
+        sender = self.sender()
+        children = self.widget_registry.widgets(
+            WINDOW_PARAMETER_CONTAINERS, TEXT_WIDGETS
+        )
+        if sender in children:
+            children = [
+                child
+                for child in children
+                if child is sender or child in self.changed_widgets
+            ]
+        for child in children:
+            if (
+                child.objectName() in ["qt_spinbox_lineedit", None, ""]
+                or child.isEnabled() == False
+            ):  # I don't understand where the qt_spinbox_lineedit comes from.
+                continue
+            if (
+                child.objectName() == "RewardFamily"
+                or child.objectName() == "RewardPairsN"
+                or child.objectName() == "BaseRewardSum"
+            ) and (child.text() != ""):
+                Correct = self._CheckFormat(child)
+                if Correct == 0:  # incorrect format; don't change
+                    child.setText(
                         getattr(Parameters, "TP_" + child.objectName())
-                        != child.text()
+                    )
+                self._ShowRewardPairs()
+            try:
+                if (
+                    getattr(Parameters, "TP_" + child.objectName())
+                    != child.text()
+                ):
+                    self.changed_widgets.add(child)
+                    # Changes are not allowed until press is typed except for PositionX, PositionY and PositionZ
+                    if child.objectName() not in (
+                        "PositionX",
+                        "PositionY",
+                        "PositionZ",
                     ):
-                        # Changes are not allowed until press is typed except for PositionX, PositionY and PositionZ
-                        if child.objectName() not in (
-                            "PositionX",
-                            "PositionY",
-                            "PositionZ",
-                        ):
-                            self.UpdateParameters = 0
-
-                        self.Continue = 0
-                        if child.objectName() in {
-                            "LickSpoutReferenceArea",
-                            "ProbeTarget",
-                            "RigMetadataFile",
-                            "Experimenter",
-                            "UncoupledReward",
-                            "ExtraWater",
-                            "laser_1_target",
-                            "laser_2_target",
-                            "laser_1_calibration_power",
-                            "laser_2_calibration_power",
-                            "laser_1_calibration_voltage",
-                            "laser_2_calibration_voltage",
-                        }:
-                            child.setStyleSheet(
-                                f"color: {self.default_text_color};"
-                            )
-                            self.Continue = 1
-                        if (
-                            child.text() == ""
-                        ):  # If empty, change background color and wait for confirmation
-                            self.UpdateParameters = 0
-                            child.setStyleSheet(
-                                f"background-color: {self.default_text_background_color};"
-                            )
-                            self.Continue = 1
-                        if child.objectName() in {
-                            "RunLength",
-                            "WindowSize",
-                            "StepSize",
-                        }:
-                            if child.text() == "":
-                                child.setValue(
-                                    int(
-                                        getattr(
-                                            Parameters,
-                                            "TP_" + child.objectName(),
-                                        )
-                                    )
-                                )
-                                child.setStyleSheet("color: black;")
-                                child.setStyleSheet("background-color: white;")
-                        if self.Continue == 1:
-                            continue
+                        self.UpdateParameters = 0
+
+                    self.Continue = 0
+                    if child.objectName() in {
+                        "LickSpoutReferenceArea",
+                        "ProbeTarget",
+                        "RigMetadataFile",
+                        "Experimenter",
+                        "UncoupledReward",
+                        "ExtraWater",
+                        "laser_1_target",
+                        "laser_2_target",
+                        "laser_1_calibration_power",
+                        "laser_2_calibration_power",
+                        "laser_1_calibration_voltage",
+                        "laser_2_calibration_voltage",
+                    }:
                         child.setStyleSheet(
                             f"color: {self.default_text_color};"
                         )
-                        try:
-                            # it's valid float
-                            float(child.text())
-                        except Exception:
-                            # logging.error(traceback.format_exc())
-                            # Invalid float. Do not change the parameter
-                            if child.objectName() in [
-                                "BaseWeight",
-                                "WeightAfter",
-                            ]:
-                                # Strip the last character which triggered the invalid float
-                                child.setText(child.text()[:-1])
-                                continue
-                            elif isinstance(child, QtWidgets.QDoubleSpinBox):
-                                child.setValue(
-                                    float(
-                                        getattr(
-                                            Parameters,
-                                            "TP_" + child.objectName(),
-                                        )
+                        self.Continue = 1
+                    if (
+                        child.text() == ""
+                    ):  # If empty, change background color and wait for confirmation
+                        self.UpdateParameters = 0
+                        child.setStyleSheet(
+                            f"background-color: {self.default_text_background_color};"
+                        )
+                        self.Continue = 1
+                    if child.objectName() in {
+                        "RunLength",
+                        "WindowSize",
+                        "StepSize",
+                    }:
+                        if child.text() == "":
+                            child.setValue(
+                                int(
+                                    getattr(
+                                        Parameters,
+                                        "TP_" + child.objectName(),
                                     )
                                 )
-                            elif isinstance(child, QtWidgets.QSpinBox):
-                                child.setValue(
-                                    int(
-                                        getattr(
-                                            Parameters,
-                                            "TP_" + child.objectName(),
-                                        )
+                            )
+                            child.setStyleSheet("color: black;")
+                            child.setStyleSheet("background-color: white;")
+                    if self.Continue == 1:
+                        continue
+                    child.setStyleSheet(f"color: {self.default_text_color};")
+                    try:
+                        # it's valid float
+                        float(child.text())
+                    except Exception:
+                        # logging.error(traceback.format_exc())
+                        # Invalid float. Do not change the parameter
+                        if child.objectName() in [
+                            "BaseWeight",
+                            "WeightAfter",
+                        ]:
+                            # Strip the last character which triggered the invalid float
+                            child.setText(child.text()[:-1])
+                            continue
+                        elif isinstance(child, QtWidgets.QDoubleSpinBox):
+                            child.setValue(
+                                float(
+                                    getattr(
+                                        Parameters,
+                                        "TP_" + child.objectName(),
                                     )
                                 )
-                            else:
-                                child.setText(
+                            )
+                        elif isinstance(child, QtWidgets.QSpinBox):
+                            child.setValue(
+                                int(
                                     getattr(
-                                        Parameters, "TP_" + child.objectName()
+                                        Parameters,
+                                        "TP_" + child.objectName(),
                                     )
                                 )
+                            )
+                        else:
                             child.setText(
                                 getattr(Parameters, "TP_" + child.objectName())
                             )
-                            child.setStyleSheet("color: black;")
-                            self.UpdateParameters = 0
-                    else:
+                        child.setText(
+                            getattr(Parameters, "TP_" + child.objectName())
+                        )
                         child.setStyleSheet("color: black;")
-                        child.setStyleSheet("background-color: white;")
-                except Exception:
-                    # logging.error(traceback.format_exc())
-                    pass
+                        self.UpdateParameters = 0
+                else:
+                    self.changed_widgets.discard(child)
+                    child.setStyleSheet("color: black;")
+                    child.setStyleSheet("background-color: white;")
+            except Exception:
+                # logging.error(traceback.format_exc())
+                pass
 
     def _CheckFormat(self, child):
         """Check if the input format is correct"""
@@ -3220,36 +3215,12 @@ class Window(QMainWindow):
 
     def _GetTrainingParameters(self, prefix="TP_"):
         """Get training parameters"""
-        # Iterate over each container to find child widgets and store their values in self
-        for container in [
-            self.TrainingParameters,
-            self.centralwidget,
-            self.Opto_dialog,
-            self.Metadata_dialog,
-        ]:
-            # Iterate over each child of the container that is a QLineEdit or QDoubleSpinBox
-            for child in container.findChildren(
-                (
-                    QtWidgets.QLineEdit,
-                    QtWidgets.QDoubleSpinBox,
-                    QtWidgets.QSpinBox,
-                )
-            ):
-                if child.objectName() == "qt_spinbox_lineedit":
-                    continue
-                # Set an attribute in self with the name 'TP_' followed by the child's object name
-                # and store the child's text value
-                setattr(self, prefix + child.objectName(), child.text())
-            # Iterate over each child of the container that is a QComboBox
-            for child in container.findChildren(QtWidgets.QComboBox):
-                # Set an attribute in self with the name 'TP_' followed by the child's object name
-                # and store the child's current text value
-                setattr(self, prefix + child.objectName(), child.currentText())
-            # Iterate over each child of the container that is a QPushButton
-            for child in container.findChildren(QtWidgets.QPushButton):
-                # Set an attribute in self with the name 'TP_' followed by the child's object name
-                # and store whether the child is checked or not
-                setattr(self, prefix + child.objectName(), child.isChecked())
+        # Store the text, current text or checked state of each parameter widget in self
+        # with the name prefix followed by the widget's object name
+        for name, value in self.widget_registry.read(
+            WINDOW_PARAMETER_CONTAINERS
+        ).items():
+            setattr(self, prefix + name, value)
 
     def _Task(self):
         """hide and show some fields based on the task type"""
@@ -3590,6 +3561,7 @@ class Window(QMainWindow):
         """will be triggered when the optogenetics icon is pressed"""
         if self.OpenOptogenetics == 0:
             self.Opto_dialog = OptogeneticsDialog(MainWindow=self)
+            self.widget_registry.register("Opto_dialog", self.Opto_dialog)
             self.OpenOptogenetics = 1
         if self.action_Optogenetics.isChecked() == True:
             self.Opto_dialog.show()
@@ -3600,6 +3572,7 @@ class Window(QMainWindow):
         """Open the camera. It's not available now"""
         if self.OpenCamera == 0:
             self.Camera_dialog = CameraDialog(MainWindow=self)
+            self.widget_registry.register("Camera_dialog", self.Camera_dialog)
             self.OpenCamera = 1
         if self.action_Camera.isChecked() == True:
             self.Camera_dialog.show()
@@ -3668,6 +3641,9 @@ class Window(QMainWindow):
         """Open the metadata dialog"""
         if self.OpenMetadata == 0:
             self.Metadata_dialog = MetadataDialog(MainWindow=self)
+            self.widget_registry.register(
+                "Metadata_dialog", self.Metadata_dialog
+            )
             self.OpenMetadata = 1
         if self.actionMeta_Data.isChecked() == True:
             self.Metadata_dialog.show()
@@ -3816,6 +3792,8 @@ class Window(QMainWindow):
             behavior_data_field = "GeneratedTrials"
 
         logging.info("Saving current session, ForceSave={}".format(ForceSave))
+        # _NewSession below lets go of the journal of the session being saved
+        session_journal = self.session_journal
         if ForceSave == 0:
             self._StopCurrentSession()  # stop the current session first
         if (
@@ -3901,7 +3879,7 @@ class Window(QMainWindow):
         if self.CreateNewFolder == 1:
             self._GetSaveFolder()
             self.CreateNewFolder = 0
-            
+
         if not os.path.exists(os.path.dirname(self.SaveFileJson)):
             os.makedirs(os.path.dirname(self.SaveFileJson))
             logging.info(
@@ -3939,55 +3917,17 @@ class Window(QMainWindow):
             Obj = {}
 
         if self.load_tag == 0:
-            widget_dict = {
-                w.objectName(): w
-                for w in self.centralwidget.findChildren(
-                    (
-                        QtWidgets.QPushButton,
-                        QtWidgets.QLineEdit,
-                        QtWidgets.QTextEdit,
-                        QtWidgets.QComboBox,
-                        QtWidgets.QDoubleSpinBox,
-                        QtWidgets.QSpinBox,
-                    )
-                )
-            }
-            widget_dict.update(
-                {
-                    w.objectName(): w
-                    for w in self.TrainingParameters.findChildren(
-                        QtWidgets.QDoubleSpinBox
-                    )
-                }
-            )
-            self._Concat(widget_dict, Obj, "None")
-            dialogs = [
-                "LaserCalibration_dialog",
-                "Opto_dialog",
-                "Camera_dialog",
-                "Metadata_dialog",
-                'OpticalTagging_dialog',
-                'RandomReward_dialog'
-            ]
-            for dialog_name in dialogs:
-                if hasattr(self, dialog_name):
-                    widget_dict = {
-                        w.objectName(): w
-                        for w in getattr(self, dialog_name).findChildren(
-                            (
-                                QtWidgets.QPushButton,
-                                QtWidgets.QLineEdit,
-                                QtWidgets.QTextEdit,
-                                QtWidgets.QComboBox,
-                                QtWidgets.QDoubleSpinBox,
-                                QtWidgets.QSpinBox,
-                            )
-                        )
-                    }
-                    self._Concat(widget_dict, Obj, dialog_name)
+            self._GetWidgetParameters(Obj)
             Obj2 = Obj.copy()
             # save behavor events
             if hasattr(self, behavior_data_field):
+                # recompute the running foraging efficiency from the whole history
+                try:
+                    getattr(
+                        self, behavior_data_field
+                    )._update_foraging_efficiency(force=True)
+                except Exception:
+                    logging.error(traceback.format_exc())
                 # Do something if self has the GeneratedTrials attribute
                 # Iterate over all attributes of the GeneratedTrials object
                 for attr_name in dir(getattr(self, behavior_data_field)):
@@ -4189,7 +4129,7 @@ class Window(QMainWindow):
                 elif session is None:
                     logging.warning(f"Waterlog for mouse {self.behavior_session_model.subject} cannot be added to database"
                                   f" due do metadata generation failure.")
-                
+
         except Exception as e:
             logging.warning(
                 "Meta data is not saved!",
@@ -4223,6 +4163,23 @@ class Window(QMainWindow):
                     if os.path.isfile(self.SaveFile):
                         os.remove(self.SaveFile)
                     os.rename(tmp_file_name,self.SaveFile)
+                    if BackupSave == 0 and self.save_columnar_session:
+                        # for fast loading when the session is reviewed
+                        try:
+                            write_columns(columns_path(self.SaveFile), Obj)
+                        except Exception:
+                            logging.error(traceback.format_exc())
+                    if BackupSave == 0:
+                        self._IndexSession(self.SaveFile, Obj)
+                if (
+                    BackupSave == 0
+                    and session_journal is not None
+                    and not self.SaveFile.endswith("par.json")
+                ):
+                    # the session is saved, the journal is not needed anymore
+                    session_journal.close(remove=True)
+                    if self.session_journal is session_journal:
+                        self.session_journal = None
 
         # Toggle unsaved data to False
         if BackupSave == 0:
@@ -4397,6 +4354,56 @@ class Window(QMainWindow):
         self.PhotometryFolder = os.path.join(self.SessionFolder, "fib")
         self.MetadataFolder = os.path.join(self.SessionFolder, "metadata-dir")
 
+    def _GetWidgetParameters(self, Obj):
+        """Add the values of the main window and dialog widgets to Obj"""
+        widget_dict = {
+            w.objectName(): w
+            for w in self.centralwidget.findChildren(
+                (
+                    QtWidgets.QPushButton,
+                    QtWidgets.QLineEdit,
+                    QtWidgets.QTextEdit,
+                    QtWidgets.QComboBox,
+                    QtWidgets.QDoubleSpinBox,
+                    QtWidgets.QSpinBox,
+                )
+            )
+        }
+        widget_dict.update(
+            {
+                w.objectName(): w
+                for w in self.TrainingParameters.findChildren(
+                    QtWidgets.QDoubleSpinBox
+                )
+            }
+        )
+        self._Concat(widget_dict, Obj, "None")
+        dialogs = [
+            "LaserCalibration_dialog",
+            "Opto_dialog",
+            "Camera_dialog",
+            "Metadata_dialog",
+            "OpticalTagging_dialog",
+            "RandomReward_dialog",
+        ]
+        for dialog_name in dialogs:
+            if hasattr(self, dialog_name):
+                widget_dict = {
+                    w.objectName(): w
+                    for w in getattr(self, dialog_name).findChildren(
+                        (
+                            QtWidgets.QPushButton,
+                            QtWidgets.QLineEdit,
+                            QtWidgets.QTextEdit,
+                            QtWidgets.QComboBox,
+                            QtWidgets.QDoubleSpinBox,
+                            QtWidgets.QSpinBox,
+                        )
+                    )
+                }
+                self._Concat(widget_dict, Obj, dialog_name)
+        return Obj
+
     def _Concat(self, widget_dict, Obj, keyname):
         """Help manage save different dialogs"""
         if keyname == "None":
@@ -4606,6 +4613,24 @@ class Window(QMainWindow):
         filepath = os.path.join(self.default_saveFolder, self.current_box)
         now = datetime.now()
 
+        index = self._GetSessionIndex()
+        if index is not None and index.is_scanned(self.current_box):
+            # from the session index instead of reading the session files
+            entries = index.mice(self.current_box)
+            # If check_schedule, only show schedule mice as options
+            if self.Settings["check_schedule"] and (
+                self.schedule_mice is not None
+            ):
+                entries = [e for e in entries if e.mouse in self.schedule_mice]
+            mice = [entry.mouse for entry in entries]
+            experimenters = [entry.experimenter for entry in entries]
+            two_week = [
+                entry.mouse
+                for entry in entries
+                if (now - entry.modified).days <= 14
+            ]
+            return mice, experimenters, two_week
+
         mouse_dirs = os.listdir(filepath)
         mouse_dirs.sort(
             reverse=True,
@@ -4638,8 +4663,10 @@ class Window(QMainWindow):
                     )
                     if os.path.isfile(json_file):
                         try:
-                            with open(json_file, "r") as file:
-                                name = json.load(file)["Experimenter"]
+                            # only parse the file up to the experimenter
+                            name = read_fields(json_file, ["Experimenter"])[
+                                "Experimenter"
+                            ]
                             mice.append(m)
                             experimenters.append(name)
                             break
@@ -4723,7 +4750,9 @@ class Window(QMainWindow):
                     self,
                     "Open file",
                     self.default_openFolder + "\\" + self.current_box,
-                    "Behavior JSON files (*.json);;Behavior MAT files (*.mat);;JSON parameters (*_par.json)",
+                    "Behavior JSON files (*.json);;Behavior MAT files (*.mat);;JSON parameters (*_par.json);;Session journals (*{})".format(
+                        JOURNAL_SUFFIX
+                    ),
                 )
                 logging.info("User selected: {}".format(fname))
                 if fname != "":
@@ -4745,12 +4774,19 @@ class Window(QMainWindow):
             if not new_session:
                 return
 
+            if fname.endswith(JOURNAL_SUFFIX):
+                # recover a session that was not saved, e.g. after a crash
+                fname = compact(fname)
+                self.fname = fname
+                logging.warning(
+                    "Recovered session from journal: {}".format(fname),
+                    extra={"tags": [self.warning_log_tag]},
+                )
             if fname.endswith(".mat"):
                 Obj = loadmat(fname)
             elif fname.endswith(".json"):
-                f = open(fname, "r")
-                Obj = json.loads(f.read())
-                f.close()
+                # from the columnar file written next to the json if there is one
+                Obj = load_session(fname)
             self.Obj = Obj
 
             widget_dict = {}
@@ -4791,6 +4827,7 @@ class Window(QMainWindow):
                     or key.startswith("Frequency_")
                 ):
                     widget_keys.append(key)
+            parameter_log = ParameterLog.from_session(Obj)
             try:
                 for key in widget_keys:
                     try:
@@ -4842,12 +4879,11 @@ class Window(QMainWindow):
 
                         # loading_parameters_type=0, get the last value of saved training parameters for each trial;
                         # loading_parameters_type=1, get the current value for single value data directly from the window.
-                        if ("TP_{}".format(key) in CurrentObj) and (
-                            len(CurrentObj["TP_{}".format(key)]) > 1
-                        ):
-                            value = np.array(
-                                [CurrentObj["TP_{}".format(key)][-2]]
-                            )
+                        tp_history = parameter_history(
+                            CurrentObj, "TP_{}".format(key), parameter_log
+                        )
+                        if tp_history is not None and len(tp_history) > 1:
+                            value = np.array([tp_history[-2]])
                             loading_parameters_type = 0
                         else:
                             value = CurrentObj[key]
@@ -5097,19 +5133,43 @@ class Window(QMainWindow):
         self.ToInitializeVisual = 1
         Obj = self.Obj
         self.GeneratedTrials = GenerateTrials(self)
+        parameter_log = ParameterLog.from_session(Obj)
+        if parameter_log is not None:
+            # continue the change log of the loaded session
+            parameter_log = ParameterLog(copy.deepcopy(parameter_log.data))
+            self.GeneratedTrials.parameter_log = parameter_log
+            self.GeneratedTrials.Obj[PARAMETER_LOG_KEY] = parameter_log.data
         # Iterate over all attributes of the GeneratedTrials object
         for attr_name in dir(self.GeneratedTrials):
-            if attr_name in Obj.keys():
+            if (
+                attr_name.startswith("TP_")
+                and parameter_log is not None
+                and attr_name in parameter_log
+                and parameter_log.n_trials > 0
+            ):
+                setattr(
+                    self.GeneratedTrials,
+                    attr_name,
+                    parameter_log.value(attr_name, -1),
+                )
+            elif attr_name in Obj.keys():
                 try:
                     # Get the value of the attribute from Obj
                     if attr_name.startswith("TP_"):
                         value = Obj[attr_name][-1]
+                        if isinstance(value, np.generic):
+                            value = value.item()
+                    elif (
+                        isinstance(Obj, ColumnarSession)
+                        and attr_name in Obj.columns
+                    ):
+                        value = self._LoadColumn(Obj, attr_name)
                     else:
                         value = Obj[attr_name]
                     # transfer list to numpy array
                     if isinstance(
                         getattr(self.GeneratedTrials, attr_name), np.ndarray
-                    ):
+                    ) and not isinstance(value, GrowableArray):
                         value = np.array(value)
                     # Set the attribute in the GeneratedTrials object
                     setattr(self.GeneratedTrials, attr_name, value)
@@ -5164,6 +5224,25 @@ class Window(QMainWindow):
         self.PlotM._Update(GeneratedTrials=self.GeneratedTrials)
         self.PlotLick._Update(GeneratedTrials=self.GeneratedTrials)
 
+    def _LoadColumn(self, Obj, attr_name):
+        """
+        Value of a GeneratedTrials history from a columnar session. Buffered histories
+        keep using the memory-mapped file until they grow, so only the pages the views
+        read are loaded
+        """
+        value = Obj.column(attr_name)
+        current = getattr(self.GeneratedTrials, attr_name)
+        descriptor = getattr(type(self.GeneratedTrials), attr_name, None)
+        if (
+            isinstance(descriptor, BufferedHistory)
+            and descriptor.per_trial_rows is None
+        ):
+            return GrowableArray.wrap(value)
+        if isinstance(current, list):
+            # as loaded from the json
+            return value.tolist()
+        return value
+
     def _Clear(self):
         # Stop current session first
         self._StopCurrentSession()
@@ -5652,10 +5731,15 @@ class Window(QMainWindow):
 
         self.unsaved_data = False
         self.ManualWaterVolume = [0, 0]
+        if self.session_journal is not None:
+            # keep the journal of an unsaved session for recovery
+            self.session_journal.close()
+            self.session_journal = None
         self.baseline_min_elapsed = 0   # variable to track baseline time elapsed before session for start/stop
 
         # Clear Plots
         if hasattr(self, "PlotM") and self.clear_figure_after_save:
+            self.trial_updates.clear()
             self.bias_indicator.clear()
             self.PlotM._Update(GeneratedTrials=None, Channel=None)
 
@@ -5741,6 +5825,7 @@ class Window(QMainWindow):
         if self.NewTrialRewardOrder == 0:
             self.GeneratedTrials._GenerateATrial(self.Channel4)
         self.ANewTrial = 1
+        self.trial_gap.trial_ready()
 
     def _thread_complete2(self):
         """complete of receive licks"""
@@ -6535,9 +6620,11 @@ class Window(QMainWindow):
         stall_duration = 5 * 60
 
         logging.info(f"Starting session.")
+        self.trial_gap.reset()
 
         while self.Start.isChecked():
-            QApplication.processEvents()
+            with self.trial_gap.gui_work():
+                QApplication.processEvents()
             if (
                 self.ANewTrial == 1
                 and self.Start.isChecked()
@@ -6573,6 +6660,7 @@ class Window(QMainWindow):
                     self.NewTrialRewardOrder = 1
 
                 # initiate the generated trial
+                self.trial_gap.trial_started()
                 try:
                     GeneratedTrials._InitiateATrial(
                         self.Channel, self.Channel4
@@ -6619,76 +6707,26 @@ class Window(QMainWindow):
                                                                       "acquisition_name": self.behavior_session_model.session_name,
                                                                       "event_type": "stage_failure"})
                         break
-                # receive licks and update figures
-                if self.actionDrawing_after_stopping.isChecked() == False:
-                    self.PlotM._Update(
-                        GeneratedTrials=GeneratedTrials, Channel=self.Channel2
+                # receive licks and hand the trial over to the plot, information and bias
+                # consumers, which run at their own rate
+                with self.trial_gap.gui_work():
+                    GeneratedTrials._get_irregular_timestamp(
+                        self.Channel2, self.data_lock
                     )
-                # update licks statistics
-                if self.actionLicks_sta.isChecked():
-                    self.PlotLick._Update(GeneratedTrials=GeneratedTrials)
+                    self.trial_updates.publish(TrialSnapshot(GeneratedTrials))
 
                 # Generate upload manifest when we generate the second trial
                 # counter starts at 0
                 if GeneratedTrials.B_CurrentTrialN == 1:
                     self._generate_upload_manifest()
 
-                # calculate bias every 10 trials
-                if (
-                    GeneratedTrials.B_CurrentTrialN + 1
-                ) % 10 == 0 and GeneratedTrials.B_CurrentTrialN + 1 > 20:
-                    # correctly format data for bias indicator
-
-                    formatted_history = [
-                        np.nan if x == 2 else int(x)
-                        for x in self.GeneratedTrials.B_AnimalResponseHistory
-                    ]
-                    formatted_reward = [
-                        any(x)
-                        for x in np.column_stack(
-                            self.GeneratedTrials.B_RewardedHistory
-                        )
-                    ]
-
-                    # only take last 200 trials if enough trials have happened
-                    choice_history = (
-                        formatted_history[-200:]
-                        if len(formatted_history) > 200
-                        else formatted_history
-                    )
-                    any_reward = (
-                        formatted_reward[-200:]
-                        if len(formatted_reward) > 200
-                        else formatted_reward
-                    )
-
-                    # add data to bias_indicator
-                    if not self.bias_thread.is_alive():
-                        logger.debug("Starting bias thread.")
-                        self.bias_thread = threading.Thread(
-                            target=self.bias_indicator.calculate_bias,
-                            kwargs={
-                                "trial_num": len(formatted_history),
-                                "choice_history": choice_history,
-                                "reward_history": np.array(any_reward).astype(
-                                    int
-                                ),
-                                "n_trial_back": 5,
-                                "cv": 1,
-                            },
-                        )
-                        self.bias_thread.start()
-                    else:
-                        logger.debug(
-                            "Skipping bias calculation as previous is still in progress. "
-                        )
-
                 # save the data everytrial
                 if GeneratedTrials.CurrentSimulation == True:
                     GeneratedTrials._GetAnimalResponse(
                         self.Channel, self.Channel3, self.data_lock
                     )
                     self.ANewTrial = 1
+                    self.trial_gap.trial_ready()
                     self.NewTrialRewardOrder = 1
                 else:
                     # get the response of the animal using a different thread
@@ -6708,7 +6746,8 @@ class Window(QMainWindow):
                     self.threadpool6.start(worker_save)
 
                 # show disk space
-                self._show_disk_space()
+                with self.trial_gap.gui_work():
+                    self._show_disk_space()
 
             elif (
                 (time.time() - last_trial_start)
@@ -6780,13 +6819,172 @@ class Window(QMainWindow):
                     )
                     stall_iteration += 1
 
+        # inter-trial gaps of the session
+        self.trial_gap.log_summary()
+
     def _perform_backup(self, BackupSave):
-        # Backup save logic
+        # Backup save logic: append the trial to the session journal, whose cost does not
+        # grow with the session, and fall back to saving the whole session
+        try:
+            self._JournalTrial()
+            return
+        except Exception:
+            logging.error(traceback.format_exc())
         try:
             self._Save(BackupSave=BackupSave)
         except Exception as e:
             logging.error("backup save failed: {}".format(e))
 
+    def _GetSessionIndex(self) -> Optional[SessionIndex]:
+        """
+        Index of the sessions saved in default_saveFolder, opened on first use. The
+        sessions of the current box are scanned in the background the first time, and
+        listed from the folders until the scan is done
+        :return: the index, None if it cannot be opened
+        """
+        if self.session_index is None:
+            try:
+                self.session_index = SessionIndex(self.default_saveFolder)
+            except Exception:
+                logging.error(traceback.format_exc())
+                return None
+        index = self.session_index
+        box_folder = os.path.join(self.default_saveFolder, self.current_box)
+        if not index.is_scanned(self.current_box) and os.path.isdir(
+            box_folder
+        ):
+            if getattr(self, "session_index_scan", None) is None:
+                self.session_index_scan = threading.Thread(
+                    target=self._ScanSessionIndex,
+                    args=(index, self.current_box),
+                    daemon=True,
+                )
+                self.session_index_scan.start()
+        return index
+
+    def _ScanSessionIndex(self, index: SessionIndex, box: str):
+        """Index the sessions of a box, run in a background thread"""
+        try:
+            start_time = time.time()
+            n_read = index.scan(boxes=[box])
+            logging.info(
+                f"Indexed {n_read} sessions of box {box} in "
+                f"{time.time() - start_time:.1f} s"
+            )
+        except Exception:
+            logging.error(traceback.format_exc())
+        finally:
+            self.session_index_scan = None
+
+    def _IndexSession(self, session_file: str, Obj: dict):
+        """Add a saved session to the session index"""
+        index = self._GetSessionIndex()
+        if index is None:
+            return
+        try:
+            index.add(session_file, **session_summary(Obj))
+        except Exception:
+            logging.error(traceback.format_exc())
+
+    def _JournalTrial(self):
+        """Append the finished trials to the session journal, starting it if needed"""
+        path = journal_path(self.SaveFileJson)
+        if self.session_journal is None or self.session_journal.path != path:
+            if self.session_journal is not None:
+                self.session_journal.close()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.session_journal = SessionJournal(path)
+            self.session_journal.open(self._JournalHeader())
+            logging.info(f"Started session journal {path}")
+        if (
+            self.journal_fields is None
+            or self.journal_fields.generated_trials is not self.GeneratedTrials
+        ):
+            self.journal_fields = TrialFields(self.GeneratedTrials)
+        # only the snapshot holds the lock of the trial loop, not the journal writes
+        with self.data_lock:
+            trial_number = self.GeneratedTrials.B_CurrentTrialN
+            fields = self.journal_fields.snapshot()
+        self.session_journal.record_trial(trial_number, fields)
+
+    def _JournalHeader(self) -> dict:
+        """Session parameters written at the top of the session journal"""
+        header = self._GetWidgetParameters({})
+        for attr_name in dir(self):
+            if attr_name.startswith(("Other_", "info_", "Ot_")):
+                header[attr_name] = getattr(self, attr_name)
+        header.update(
+            {
+                "box": self.current_box,
+                "settings": self.Settings,
+                "settings_box": self.SettingsBox,
+                "commit_ID": self.behavior_session_model.commit_hash,
+                "repo_url": self.repo_url,
+                "current_branch": self.current_branch,
+                "version": self.behavior_session_model.experiment_version,
+                "SessionFolder": self.SessionFolder,
+                "TrainingFolder": self.behavior_session_model.root_path,
+                "HarpFolder": self.HarpFolder,
+                "VideoFolder": self.VideoFolder,
+                "PhotometryFolder": self.PhotometryFolder,
+                "MetadataFolder": self.MetadataFolder,
+                "SaveFile": self.SaveFileJson,
+            }
+        )
+        return header
+
+    def _poll_trial_updates(self):
+        """Pass the latest snapshots to the consumers polled on the GUI thread"""
+        self._update_figures()
+        self._update_information()
+
+    def _update_figures(self):
+        """Plot consumer: update the choice and lick figures with the latest trial"""
+        snapshot = self.trial_updates.poll("plot")
+        if snapshot is None or snapshot.source is not self.GeneratedTrials:
+            return
+        if self.actionDrawing_after_stopping.isChecked():
+            return
+        self.PlotM._Update(GeneratedTrials=snapshot)
+        # update licks statistics
+        if self.actionLicks_sta.isChecked():
+            self.PlotLick._Update(GeneratedTrials=snapshot)
+
+    def _update_information(self):
+        """Information consumer: show session information of the latest trial"""
+        snapshot = self.trial_updates.poll("information")
+        if snapshot is None or snapshot.source is not self.GeneratedTrials:
+            return
+        if self.Start.isChecked():
+            self.GeneratedTrials._ShowInformation()
+
+    def _update_bias(self, snapshot: TrialSnapshot):
+        """Bias consumer: fit the bias every 10 trials from trial 30"""
+        trial_number = snapshot.B_CurrentTrialN + 1
+        if trial_number < self.last_bias_trial:
+            # a new session started
+            self.last_bias_trial = 0
+        # snapshots may be skipped while a fit runs, so fit on the first trial of each 10
+        if (
+            trial_number < 30
+            or trial_number // 10 <= self.last_bias_trial // 10
+        ):
+            return
+        self.last_bias_trial = trial_number
+        # correctly format data for bias indicator
+        response = snapshot.B_AnimalResponseHistory
+        formatted_history = np.where(response == 2, np.nan, response)
+        formatted_reward = np.any(snapshot.B_RewardedHistory, axis=0)
+        # only take last 200 trials if enough trials have happened
+        logger.debug("Calculating bias.")
+        self.bias_indicator.calculate_bias(
+            trial_num=len(formatted_history),
+            choice_history=formatted_history[-200:],
+            reward_history=formatted_reward[-200:].astype(int),
+            n_trial_back=5,
+            cv=1,
+        )
+
     def bias_calculated(
         self,
         bias: float,
@@ -46,6 +46,7 @@ from aind_data_schema_models.units import (
 )
 
 import foraging_gui
+from foraging_gui.parameter_log import ParameterLog, parameter_history
 from foraging_gui.TransferToNWB import _get_field
 from foraging_gui.Visualization import PlotWaterCalibration
 
@@ -1287,17 +1288,23 @@ class generate_metadata:
         self.light_names_used_in_session = []
         light_sources = []
         index = np.where(np.array(self.Obj["B_SelectedCondition"]) == 1)[0]
+        parameter_log = ParameterLog.from_session(self.Obj)
         for i in index:
             current_condition = self.Obj["B_SelectedCondition"][i]
-            if f"TP_LaserColor_{current_condition}" not in self.Obj:
+            laser_color = parameter_history(
+                self.Obj, f"TP_LaserColor_{current_condition}", parameter_log
+            )
+            if laser_color is None:
                 # old format
-                current_color = self.Obj[f"TP_Laser_{current_condition}"][i]
+                current_color = parameter_history(
+                    self.Obj, f"TP_Laser_{current_condition}", parameter_log
+                )[i]
             else:
                 # new format
-                current_color = self.Obj[f"TP_LaserColor_{current_condition}"][
-                    i
-                ]
-            current_location = self.Obj[f"TP_Location_{current_condition}"][i]
+                current_color = laser_color[i]
+            current_location = parameter_history(
+                self.Obj, f"TP_Location_{current_condition}", parameter_log
+            )[i]
             if current_location == "Both":
                 light_sources.append({"color": current_color, "laser_tag": 1})
                 light_sources.append({"color": current_color, "laser_tag": 2})
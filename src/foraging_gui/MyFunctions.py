@@ -1,10 +1,10 @@
 import logging
-import math
 import random
 import sys
 import threading
 import time
 import traceback
+from collections import defaultdict
 from datetime import datetime
 from itertools import accumulate
 from sys import platform as PLATFORM
@@ -15,7 +15,14 @@ from PyQt5 import QtCore, QtWidgets
 from serial import Serial
 from serial.tools.list_ports import comports as list_comports
 
+from foraging_gui.foraging_efficiency import ForagingEfficiency
+from foraging_gui.laser_waveforms import laser_waveform
+from foraging_gui.lick_statistics import InterLickIntervals, SortedLicks
+from foraging_gui.parameter_log import PARAMETER_LOG_KEY, ParameterLog
 from foraging_gui.reward_schedules.uncoupled_block import UncoupledBlocks
+from foraging_gui.session_statistics import SessionStatistics
+from foraging_gui.trial_store import BufferedHistory, HistoryMixin
+from foraging_gui.widget_registry import TRIAL_PARAMETER_CONTAINERS
 from aind_dynamic_foraging_basic_analysis import compute_foraging_efficiency
 
 if PLATFORM == "win32":
@@ -23,8 +30,70 @@ if PLATFORM == "win32":
 VID_NEWSCALE = 0x10C4
 PID_NEWSCALE = 0xEA61
 
+# OSC address of irregular events -> history the timestamps are appended to
+IRREGULAR_EVENT_HISTORIES = {
+    "/LeftLickTime": "B_LeftLickTime",
+    "/RightLickTime": "B_RightLickTime",
+    "/LeftRewardDeliveryTime": "B_LeftRewardDeliveryTime",
+    "/RightRewardDeliveryTime": "B_RightRewardDeliveryTime",
+    "/LeftRewardDeliveryTimeHarp": "B_LeftRewardDeliveryTimeHarp",
+    "/RightRewardDeliveryTimeHarp": "B_RightRewardDeliveryTimeHarp",
+    "/PhotometryRising": "B_PhotometryRisingTimeHarp",
+    "/PhotometryFalling": "B_PhotometryFallingTimeHarp",
+    "/OptogeneticsTimeHarp": "B_OptogeneticsTimeHarp",
+    "/ManualLeftWaterStartTime": "B_ManualLeftWaterStartTime",
+    "/ManualRightWaterStartTime": "B_ManualRightWaterStartTime",
+    "/EarnedLeftWaterStartTime": "B_EarnedLeftWaterStartTime",
+    "/EarnedRightWaterStartTime": "B_EarnedRightWaterStartTime",
+    "/AutoLeftWaterStartTime": "B_AutoLeftWaterStartTime",
+    "/AutoRightWaterStartTime": "B_AutoRightWaterStartTime",
+}
+# OSC address of environment sensor readings -> (list attribute, rounding digits)
+ENVIRONMENT_SENSOR_HISTORIES = {
+    "/EnvironmentSensorTemperature": ("B_EnvironmentSensorTemperature", 1),
+    "/EnvironmentSensorHumidity": ("B_EnvironmentSensorHumidity", 1),
+    "/EnvironmentSensorPressure": ("B_EnvironmentSensorPressure", None),
+    "/EnvironmentSensorTimestamp": ("B_EnvironmentSensorTimestamp", None),
+}
+
+
+class GenerateTrials(HistoryMixin):
+    # per-trial and per-event histories live in growable buffers (see trial_store.py);
+    # reading them returns read-only numpy views, appending goes through append_history
+    B_RewardProHistory = BufferedHistory()
+    B_BaitHistory = BufferedHistory()
+    B_AnimalResponseHistory = BufferedHistory()
+    B_RewardedHistory = BufferedHistory()
+    B_AutoWaterTrial = BufferedHistory()
+    B_LeftLickTime = BufferedHistory()
+    B_RightLickTime = BufferedHistory()
+    B_TrialStartTime = BufferedHistory()
+    B_DelayStartTime = BufferedHistory()
+    B_TrialEndTime = BufferedHistory()
+    B_GoCueTime = BufferedHistory()
+    B_TrialStartTimeHarp = BufferedHistory()
+    B_DelayStartTimeHarp = BufferedHistory()
+    B_TrialEndTimeHarp = BufferedHistory()
+    B_GoCueTimeBehaviorBoard = BufferedHistory()
+    B_GoCueTimeSoundCard = BufferedHistory()
+    B_DOPort2Output = BufferedHistory()
+    B_LeftRewardDeliveryTime = BufferedHistory()
+    B_RightRewardDeliveryTime = BufferedHistory()
+    B_LeftRewardDeliveryTimeHarp = BufferedHistory()
+    B_RightRewardDeliveryTimeHarp = BufferedHistory()
+    B_PhotometryRisingTimeHarp = BufferedHistory()
+    B_PhotometryFallingTimeHarp = BufferedHistory()
+    B_OptogeneticsTimeHarp = BufferedHistory()
+    B_ManualLeftWaterStartTime = BufferedHistory()
+    B_ManualRightWaterStartTime = BufferedHistory()
+    B_EarnedLeftWaterStartTime = BufferedHistory()
+    B_EarnedRightWaterStartTime = BufferedHistory()
+    B_AutoLeftWaterStartTime = BufferedHistory()
+    B_AutoRightWaterStartTime = BufferedHistory()
+    B_RewardOutcomeTime = BufferedHistory()
+    # left/right random numbers baiting each trial, read as one pair per trial
+    B_CurrentRewardProbRandomNumber = BufferedHistory(per_trial_rows=2)
 
-class GenerateTrials:
     def __init__(self, win):
         self.win = win
         self.B_EnvironmentSensorTemperature = []
@@ -50,7 +119,7 @@ class GenerateTrials:
         )  # trial number starts from 0; Update when trial starts
         self.B_LickPortN = 2
         self.B_ANewBlock = np.array([1, 1]).astype(int)
-        self.B_RewardProHistory = np.array([[], []]).astype(int)
+        self.B_RewardProHistory = np.array([[], []]).astype(float)
         self.BlockLenHistory = [[], []]
         self.B_BaitHistory = np.array([[], []]).astype(bool)
         self.B_CurrentRewardProbRandomNumber = []
@@ -71,12 +140,14 @@ class GenerateTrials:
         self.B_LeftLickTime = np.array([]).astype(float)
         self.B_RightLickTime = np.array([]).astype(float)
         self.B_TrialStartTime = np.array([]).astype(float)
-        self.B_DelayStartTime = np.array([]).astype(float)
+        self.B_DelayStartTime = np.array(
+            [], dtype=object
+        )  # None for trials without delay
         self.B_DelayStartTimeComplete = []
         self.B_TrialEndTime = np.array([]).astype(float)
         self.B_GoCueTime = np.array([]).astype(float)
         self.B_TrialStartTimeHarp = np.array([]).astype(float)
-        self.B_DelayStartTimeHarp = np.array([]).astype(float)
+        self.B_DelayStartTimeHarp = np.array([], dtype=object)
         self.B_DelayStartTimeHarpComplete = []
         self.B_TrialEndTimeHarp = np.array([]).astype(float)
         self.B_GoCueTimeBehaviorBoard = np.array([]).astype(
@@ -106,7 +177,7 @@ class GenerateTrials:
         self.B_LaserDuration = []
         self.B_SelectedCondition = []
         self.B_AutoWaterTrial = np.array([[], []]).astype(
-            bool
+            int
         )  # to indicate if it is a trial with outo water.
         self.B_StagePositions = []
         self.B_session_control_state = []
@@ -130,12 +201,23 @@ class GenerateTrials:
         self.Delay_GoCue_DD = []
         self.GoCue_GoCue1_DD = []
         self.GoCue_NextStart_DD = []
+        self.sorted_licks = SortedLicks()  # merged licks used by _LickSta
+        # running inter-lick interval counts and whether the warnings are shown
+        self.lick_intervals = InterLickIntervals(threshold=0.1)
+        self.lick_interval_exceeded = {"same side": False, "cross side": False}
         self.B_StartType = (
             []
         )  # 1: normal trials with delay; 3: optogenetics trials without delay
         self.GeneFinish = 1
         self.GetResponseFinish = 1
         self.Obj = {}
+        # TP_ parameters of each trial, saved as a change log
+        self.parameter_log = ParameterLog()
+        self.Obj[PARAMETER_LOG_KEY] = self.parameter_log.data
+        # running session statistics updated by _GetBasic
+        self.session_stats = SessionStatistics()
+        # running foraging efficiency updated by _GetBasic
+        self.foraging_efficiency = ForagingEfficiency()
         # get all of the training parameters of the current trial
         self._GetTrainingParameters(self.win)
 
@@ -153,7 +235,9 @@ class GenerateTrials:
         self._SaveParameters()
         # get licks information. Starting from the second trial, and counting licks of the last completed trial
         if self.B_CurrentTrialN >= 1:
-            self._LickSta([self.B_CurrentTrialN - 1])
+            self._LickSta()
+            # refresh the lick interval warnings with the licks of the last trial
+            self.calculate_inter_lick_intervals(log=False)
         # to decide if it's an auto water trial. will give water in _GetAnimalResponse
         self._CheckAutoWater()
 
@@ -221,10 +305,9 @@ class GenerateTrials:
             )
 
         # Append the (updated) current reward probability to the history
-        self.B_RewardProHistory = np.append(
-            self.B_RewardProHistory,
+        self.append_history(
+            "B_RewardProHistory",
             self.B_CurrentRewardProb.reshape(self.B_LickPortN, 1),
-            axis=1,
         )
 
         # --- Generate other parameters such as ITI, delay, and response time ---
@@ -236,9 +319,8 @@ class GenerateTrials:
         # get basic information
         if self.B_CurrentTrialN >= 0:
             self._GetBasic()
-        # Show session/trial related information
-        if self.win.Start.isChecked():
-            self._ShowInformation()
+        # session/trial related information is shown by the information consumer of the
+        # trial updates (see Window._update_information)
         # to decide if we should stop the session
         self._CheckStop()
         # optogenetics section
@@ -845,79 +927,37 @@ class GenerateTrials:
             )  # time interval between the recent trial end and first trial start
         else:
             self.BS_CurrentRunningTime = 0
-        self.BS_AllTrialN = np.shape(self.B_AnimalResponseHistory)[0]
-        self.BS_FinisheTrialN = np.sum(self.B_AnimalResponseHistory != 2)
-        if self.BS_AllTrialN == 0:
-            self.BS_RespondedRate = np.nan
-        else:
-            self.BS_RespondedRate = self.BS_FinisheTrialN / self.BS_AllTrialN
-        self.BS_RewardTrialN = np.sum(self.B_RewardedHistory == True)
-        B_RewardedHistory = self.B_RewardedHistory.copy()
-        # auto reward is considered as reward
-        Ind = range(len(self.B_RewardedHistory[0]))
-        for i in range(len(self.B_RewardedHistory)):
-            B_RewardedHistory[i] = np.logical_or(
-                self.B_RewardedHistory[i], self.B_AutoWaterTrial[i][Ind]
-            )
-        self.BS_RewardN = np.sum(B_RewardedHistory[0] == True) + np.sum(
-            B_RewardedHistory[1] == True
-        )
-
-        (
-            BS_auto_water_left,
-            BS_earned_reward_left,
-            BS_AutoWater_N_left,
-            BS_EarnedReward_N_left,
-        ) = self._process_values(
-            self.Obj["TP_LeftValue_volume"],
-            self.B_AutoWaterTrial[0],
-            self.Obj["TP_Multiplier"],
-            B_RewardedHistory[0],
-        )
-        (
-            BS_auto_water_right,
-            BS_earned_reward_right,
-            BS_AutoWater_N_right,
-            BS_EarnedReward_N_right,
-        ) = self._process_values(
-            self.Obj["TP_RightValue_volume"],
-            self.B_AutoWaterTrial[1],
-            self.Obj["TP_Multiplier"],
-            B_RewardedHistory[1],
+        # fold the newly completed trials into the running statistics
+        stats = self.session_stats
+        stats.update(
+            self.B_AnimalResponseHistory,
+            self.B_RewardedHistory,
+            self.B_AutoWaterTrial,
+            (
+                self.parameter_log.history("TP_LeftValue_volume"),
+                self.parameter_log.history("TP_RightValue_volume"),
+            ),
+            self.parameter_log.history("TP_Multiplier"),
         )
-        self.BS_auto_water = [BS_auto_water_left, BS_auto_water_right]
-        self.BS_earned_reward = [BS_earned_reward_left, BS_earned_reward_right]
-        self.BS_AutoWater_N = [BS_AutoWater_N_left, BS_AutoWater_N_right]
-        self.BS_EarnedReward_N = [
-            BS_EarnedReward_N_left,
-            BS_EarnedReward_N_right,
-        ]
-
-        self.BS_TotalReward = (
-            BS_earned_reward_left
-            + BS_earned_reward_right
-            + BS_auto_water_left
-            + BS_auto_water_right
+        self.BS_AllTrialN = stats.trial_n
+        self.BS_FinisheTrialN = stats.finished_trial_n
+        self.BS_RespondedRate = stats.responded_rate
+        self.BS_RewardTrialN = sum(stats.reward_trial_n)
+        self.BS_RewardN = stats.reward_n
+        self.BS_auto_water = list(stats.auto_water)
+        self.BS_earned_reward = list(stats.earned_reward)
+        self.BS_AutoWater_N = list(stats.auto_water_n)
+        self.BS_EarnedReward_N = list(stats.earned_reward_n)
+        self.BS_TotalReward = stats.total_reward
+        self.BS_LeftRewardTrialN, self.BS_RightRewardTrialN = (
+            stats.reward_trial_n
         )
-        self.BS_LeftRewardTrialN = np.sum(self.B_RewardedHistory[0] == True)
-        self.BS_RightRewardTrialN = np.sum(self.B_RewardedHistory[1] == True)
-        self.BS_LeftChoiceN = np.sum(self.B_AnimalResponseHistory == 0)
-        self.BS_RightChoiceN = np.sum(self.B_AnimalResponseHistory == 1)
+        self.BS_LeftChoiceN, self.BS_RightChoiceN = stats.choice_n
         self.BS_OverallRewardRate = self.BS_RewardTrialN / (
             self.B_CurrentTrialN + 1
         )
-        if self.BS_LeftChoiceN == 0:
-            self.BS_LeftChoiceRewardRate = np.nan
-        else:
-            self.BS_LeftChoiceRewardRate = (
-                self.BS_LeftRewardTrialN / self.BS_LeftChoiceN
-            )
-        if self.BS_RightChoiceN == 0:
-            self.BS_RightChoiceRewardRate = np.nan
-        else:
-            self.BS_RightChoiceRewardRate = (
-                self.BS_RightRewardTrialN / self.BS_RightChoiceN
-            )
+        self.BS_LeftChoiceRewardRate = stats.choice_reward_rate(0)
+        self.BS_RightChoiceRewardRate = stats.choice_reward_rate(1)
         # current trial numbers in the current block; BS_CurrentBlockTrialN
         if self.win.NewTrialRewardOrder == 1:
             # show current finished trial
@@ -927,29 +967,31 @@ class GenerateTrials:
             self._get_current_block_reward(0)
         # update suggested reward
         self.win._UpdateSuggestedWater()
-        # foraging efficiency
-        Len = np.shape(self.B_RewardedHistory)[1]
-        if Len > 0:
-            self.B_for_eff_optimal, self.B_for_eff_optimal_random_seed = self.foraging_eff()
+        self._update_foraging_efficiency()
 
-    def _process_values(
-        self, values, auto_water_trial, multiplier_values, rewarded_history
-    ):
-        BS_AutoWater = 0
-        BS_EarnedReward = 0
-        BS_AutoWater_N = 0
-        BS_EarnedReward_N = 0
-        for i, s in enumerate(values[: len(rewarded_history)]):
-            try:
-                if auto_water_trial[i] == 1 and rewarded_history[i] == 1:
-                    BS_AutoWater += float(s) * float(multiplier_values[i])
-                    BS_AutoWater_N += 1
-                elif auto_water_trial[i] == 0 and rewarded_history[i] == 1:
-                    BS_EarnedReward += float(s)
-                    BS_EarnedReward_N += 1
-            except ValueError as e:
-                logging.error(str(e))
-        return BS_AutoWater, BS_EarnedReward, BS_AutoWater_N, BS_EarnedReward_N
+    def _update_foraging_efficiency(self, force=False):
+        """
+        Update the running foraging efficiency with the new trials, or recompute it from the
+        whole history if force (e.g. before saving)
+        """
+        Len = np.shape(self.B_RewardedHistory)[1]
+        if Len == 0:
+            return
+        if force:
+            self.B_for_eff_optimal, self.B_for_eff_optimal_random_seed = (
+                self.foraging_eff()
+            )
+            return
+        self.B_for_eff_optimal, self.B_for_eff_optimal_random_seed = (
+            self.foraging_efficiency.update(
+                self.TP_Task in ["Coupled Baiting", "Uncoupled Baiting"],
+                self.B_AnimalResponseHistory,
+                self.B_RewardedHistory,
+                self.B_RewardProHistory,
+                self.B_CurrentRewardProbRandomNumber.T,
+                self.B_AutoWaterTrial,
+            )
+        )
 
     def foraging_eff(self):
         """Calculating the foraging efficiency"""
@@ -958,151 +1000,76 @@ class GenerateTrials:
             choice_history=np.where(self.B_AnimalResponseHistory == 2, np.nan, self.B_AnimalResponseHistory),
             reward_history=self.B_RewardedHistory[0] | self.B_RewardedHistory[1],
             p_reward=self.B_RewardProHistory[:, :-1],
-            random_number=[[arr[0] for arr in self.B_CurrentRewardProbRandomNumber],
-                           [arr[1] for arr in self.B_CurrentRewardProbRandomNumber]],
+            random_number=self.B_CurrentRewardProbRandomNumber.T,
             autowater_offered=(self.B_AutoWaterTrial[0, :] == 1) | (self.B_AutoWaterTrial[1, :] == 1),
         )
 
     def _LickSta(self, Trials=None):
-        """Perform lick stats for the input trials"""
+        """Perform lick stats for the input trials, by default the trials not processed yet"""
         if Trials is None:  # could receive multiple trials
-            Trials = self.B_CurrentTrialN - 1
-        # combine all of the left and right licks
-        self.AllLicksInd = np.concatenate(
-            (
-                np.zeros(len(self.B_LeftLickTime)),
-                np.ones(len(self.B_RightLickTime)),
+            Trials = range(
+                len(self.Start_GoCue_LeftLicks), self.B_CurrentTrialN
             )
-        )
-        self.AllLicksTime = np.concatenate(
-            (self.B_LeftLickTime, self.B_RightLickTime)
-        )
-        # get the sort index
-        sort_index = np.argsort(self.AllLicksTime)
-        # sort the lick times
-        self.AllLicksTimeSorted = np.sort(self.AllLicksTime)
-        self.AllLicksIndSorted = self.AllLicksInd[sort_index]
-        LeftLicksInd = self.AllLicksIndSorted == 0
-        RightLicksInd = self.AllLicksIndSorted == 1
-        for i in Trials:
-            # this only works when the current trial exceeds 2; the length of GoCue_NextStart_LeftLicks is one less than that of trial length
-            if self.B_CurrentTrialN >= 2:
-                CurrentGoCue_NextStart = (
-                    self.B_GoCueTime[i - 1],
-                    self.B_TrialStartTime[i],
-                )
-                Ind_GoCue_NextStart = (
-                    self.AllLicksTimeSorted >= CurrentGoCue_NextStart[0]
-                ) & (self.AllLicksTimeSorted < CurrentGoCue_NextStart[1])
-                Ind_GoCue_NextStart_Left = Ind_GoCue_NextStart & LeftLicksInd
-                Ind_GoCue_NextStart_Right = Ind_GoCue_NextStart & RightLicksInd
-                self.GoCue_NextStart_LeftLicks.append(
-                    sum(Ind_GoCue_NextStart_Left)
-                )
-                self.GoCue_NextStart_RightLicks.append(
-                    sum(Ind_GoCue_NextStart_Right)
-                )
-                # double dipping
-                GoCue_NextStart_DD = self._GetDoubleDipping(
-                    self.AllLicksIndSorted[Ind_GoCue_NextStart]
-                )
-                self.GoCue_NextStart_DD.append(GoCue_NextStart_DD)
-                self.DD_TrialsN_GoCue_NextStart = sum(
-                    np.array(self.GoCue_NextStart_DD) != 0
-                )
-                self.DDRate_GoCue_NextStart = (
-                    self.DD_TrialsN_GoCue_NextStart
-                    / len(self.GoCue_NextStart_DD)
+        Trials = np.asarray(Trials, dtype=int)
+        if Trials.size == 0:
+            return
+        # merge the licks received since the last call into the sorted licks
+        self.sorted_licks.update(self.B_LeftLickTime, self.B_RightLickTime)
+        TrialStartTime = self.B_TrialStartTime.astype(float)
+        GoCueTime = self.B_GoCueTime.astype(float)
+        DelayStartTime = self.B_DelayStartTime
+        # this only works when the current trial exceeds 2; the length of GoCue_NextStart_LeftLicks is one less than that of trial length
+        if self.B_CurrentTrialN >= 2:
+            left, right, dd = self.sorted_licks.window_stats(
+                GoCueTime[Trials - 1], TrialStartTime[Trials]
+            )
+            self.GoCue_NextStart_LeftLicks.extend(left.tolist())
+            self.GoCue_NextStart_RightLicks.extend(right.tolist())
+            # double dipping
+            self.GoCue_NextStart_DD.extend(dd.tolist())
+            self.DD_TrialsN_GoCue_NextStart = sum(
+                np.array(self.GoCue_NextStart_DD) != 0
+            )
+            self.DDRate_GoCue_NextStart = (
+                self.DD_TrialsN_GoCue_NextStart / len(self.GoCue_NextStart_DD)
+            )
+            # double dipping per finish trial
+            Len = len(self.GoCue_NextStart_DD)
+            RespondedTrial = np.where(self.B_AnimalResponseHistory[:Len] != 2)[
+                0
+            ]
+            if RespondedTrial.size > 0:
+                self.DD_PerTrial_GoCue_NextStart = np.round(
+                    sum(np.array(self.GoCue_NextStart_DD)[RespondedTrial])
+                    / len(np.array(self.GoCue_NextStart_DD)[RespondedTrial]),
+                    2,
                 )
-                # double dipping per finish trial
-                Len = len(self.GoCue_NextStart_DD)
-                RespondedTrial = np.where(
-                    self.B_AnimalResponseHistory[:Len] != 2
-                )[0]
-                if RespondedTrial.size > 0:
-                    self.DD_PerTrial_GoCue_NextStart = np.round(
-                        sum(np.array(self.GoCue_NextStart_DD)[RespondedTrial])
-                        / len(
-                            np.array(self.GoCue_NextStart_DD)[RespondedTrial]
-                        ),
-                        2,
-                    )
-                else:
-                    self.DD_PerTrial_GoCue_NextStart = "nan"
-            CurrentStart_GoCue = (
-                self.B_TrialStartTime[i],
-                self.B_GoCueTime[i],
-            )
-            if self.B_DelayStartTime[i] in [None, -999]:
-                CurrentStart_Delay = (
-                    self.B_TrialStartTime[i],
-                    self.B_GoCueTime[i],
-                )  # using the first delay start time
-                CurrentDelay_GoCue = (self.B_GoCueTime[i], self.B_GoCueTime[i])
             else:
-                CurrentStart_Delay = (
-                    self.B_TrialStartTime[i],
-                    self.B_DelayStartTime[i],
-                )  # using the first delay start time
-                CurrentDelay_GoCue = (
-                    self.B_DelayStartTime[i],
-                    self.B_GoCueTime[i],
-                )
-            CurrentGoCue_GoCue1 = (
-                self.B_GoCueTime[i],
-                self.B_GoCueTime[i] + 1,
-            )
-            # licks in different intervals
-            Ind_Start_GoCue = (
-                self.AllLicksTimeSorted >= CurrentStart_GoCue[0]
-            ) & (self.AllLicksTimeSorted < CurrentStart_GoCue[1])
-            Ind_Start_Delay = (
-                self.AllLicksTimeSorted >= CurrentStart_Delay[0]
-            ) & (self.AllLicksTimeSorted < CurrentStart_Delay[1])
-            Ind_Delay_GoCue = (
-                self.AllLicksTimeSorted >= CurrentDelay_GoCue[0]
-            ) & (self.AllLicksTimeSorted < CurrentDelay_GoCue[1])
-            Ind_GoCue_GoCue1 = (
-                self.AllLicksTimeSorted >= CurrentGoCue_GoCue1[0]
-            ) & (self.AllLicksTimeSorted < CurrentGoCue_GoCue1[1])
-            Ind_Start_GoCue_Left = Ind_Start_GoCue & LeftLicksInd
-            Ind_Start_GoCue_Right = Ind_Start_GoCue & RightLicksInd
-            Ind_Start_Delay_Left = (
-                Ind_Start_Delay & LeftLicksInd
-            )  # left lick in this interval
-            Ind_Start_Delay_Right = (
-                Ind_Start_Delay & RightLicksInd
-            )  # right lick in this interval
-            Ind_Delay_GoCue_Left = Ind_Delay_GoCue & LeftLicksInd
-            Ind_Delay_GoCue_Right = Ind_Delay_GoCue & RightLicksInd
-            Ind_GoCue_GoCue1_Left = Ind_GoCue_GoCue1 & LeftLicksInd
-            Ind_GoCue_GoCue1_Right = Ind_GoCue_GoCue1 & RightLicksInd
-            # licks in different intervals
-            self.Start_GoCue_LeftLicks.append(sum(Ind_Start_GoCue_Left))
-            self.Start_GoCue_RightLicks.append(sum(Ind_Start_GoCue_Right))
-            self.Start_Delay_LeftLicks.append(sum(Ind_Start_Delay_Left))
-            self.Start_Delay_RightLicks.append(sum(Ind_Start_Delay_Right))
-            self.Delay_GoCue_LeftLicks.append(sum(Ind_Delay_GoCue_Left))
-            self.Delay_GoCue_RightLicks.append(sum(Ind_Delay_GoCue_Right))
-            self.GoCue_GoCue1_LeftLicks.append(sum(Ind_GoCue_GoCue1_Left))
-            self.GoCue_GoCue1_RightLicks.append(sum(Ind_GoCue_GoCue1_Right))
-            # double dipping in different intervals
-            Start_GoCue_DD = self._GetDoubleDipping(
-                self.AllLicksIndSorted[Ind_Start_GoCue]
-            )  # double dipping numbers
-            Start_Delay_DD = self._GetDoubleDipping(
-                self.AllLicksIndSorted[Ind_Start_Delay]
-            )
-            Delay_GoCue_DD = self._GetDoubleDipping(
-                self.AllLicksIndSorted[Ind_Delay_GoCue]
-            )
-            GoCue_GoCue1_DD = self._GetDoubleDipping(
-                self.AllLicksIndSorted[Ind_GoCue_GoCue1]
-            )
-            self.Start_GoCue_DD.append(Start_GoCue_DD)
-            self.Start_Delay_DD.append(Start_Delay_DD)
-            self.Delay_GoCue_DD.append(Delay_GoCue_DD)
-            self.GoCue_GoCue1_DD.append(GoCue_GoCue1_DD)
+                self.DD_PerTrial_GoCue_NextStart = "nan"
+        # trials without delay use the go cue as the end of the delay
+        NoDelay = np.array(
+            [DelayStartTime[i] in [None, -999] for i in Trials], dtype=bool
+        )
+        DelayStart = np.where(
+            NoDelay,
+            GoCueTime[Trials],
+            np.array(
+                [np.nan if d is None else d for d in DelayStartTime[Trials]],
+                dtype=float,
+            ),
+        )
+        windows = {
+            "Start_GoCue": (TrialStartTime[Trials], GoCueTime[Trials]),
+            "Start_Delay": (TrialStartTime[Trials], DelayStart),
+            "Delay_GoCue": (DelayStart, GoCueTime[Trials]),
+            "GoCue_GoCue1": (GoCueTime[Trials], GoCueTime[Trials] + 1),
+        }
+        # licks and double dipping in different intervals
+        for name, (start, stop) in windows.items():
+            left, right, dd = self.sorted_licks.window_stats(start, stop)
+            getattr(self, name + "_LeftLicks").extend(left.tolist())
+            getattr(self, name + "_RightLicks").extend(right.tolist())
+            getattr(self, name + "_DD").extend(dd.tolist())
         # fraction of early licking trials in different time interval
         self.EarlyLickingTrialsN_Start_Delay = sum(
             np.logical_or(
@@ -1178,102 +1145,71 @@ class GenerateTrials:
                 sum(self.Start_GoCue_LeftLicks)
             ) / np.array(sum(self.Start_GoCue_RightLicks))
 
-    def calculate_inter_lick_intervals(self):
+    def calculate_inter_lick_intervals(self, log=True):
         """
         Calculate and categorize lick intervals
-        """
 
-        right = self.B_RightLickTime
-        left = self.B_LeftLickTime
+        parameters:
+            log (bool): log the percentages, the 10 minute timer logs them while the per-trial update only refreshes the warning labels
+        """
         threshold = 0.1
+        # only the licks received since the last call are counted
+        self.sorted_licks.update(self.B_LeftLickTime, self.B_RightLickTime)
+        self.lick_intervals.update(self.sorted_licks)
+        intervals = self.lick_intervals
+
+        for side, name in enumerate(["left", "right"]):
+            if intervals.same_side_total[side] == 0:
+                continue
+            side_frac = round(intervals.same_side_fraction(side), 4)
+            if log:
+                logging.info(
+                    f"Percentage of {name} lick intervals under 100 ms is {side_frac * 100:.2f}%."
+                )
+            if side == 0:
+                self.B_LeftLickIntervalPercent = side_frac * 100
+            else:
+                self.B_RightLickIntervalPercent = side_frac * 100
 
-        same_side_l = np.diff(left)
-        same_side_r = np.diff(right)
-        if len(right) > 0:
-            # calculate left interval and fraction
-            same_side_l_frac = round(np.mean(same_side_l <= threshold), 4)
-            logging.info(
-                f"Percentage of left lick intervals under 100 ms is {same_side_l_frac * 100:.2f}%."
-            )
-            self.B_LeftLickIntervalPercent = same_side_l_frac * 100
-
-        if len(left) > 0:
-            # calculate right interval and fraction
-            same_side_r_frac = round(np.mean(same_side_r <= threshold), 4)
-            logging.info(
-                f"Percentage of right lick intervals under 100 ms is {same_side_r_frac * 100:.2f}%."
-            )
-            self.B_RightLickIntervalPercent = same_side_r_frac * 100
-
-        if len(right) > 0 and len(left) > 0:
+        if all(intervals.n_seen):
             # calculate same side lick interval and fraction for both right and left
-            same_side_combined = np.concatenate([same_side_l, same_side_r])
-            same_side_frac = round(np.mean(same_side_combined <= threshold), 4)
-            logging.info(
-                f"Percentage of right and left lick intervals under 100 ms is {same_side_frac * 100:.2f}%."
-            )
-            if same_side_frac >= threshold:
-                self.win.same_side_lick_interval.setText(
-                    f"Percentage of same side lick intervals under 100 ms is "
-                    f"over 10%: {same_side_frac * 100:.2f}%."
-                )
-                logging.warning(
-                    f"Percentage of same side lick intervals under 100 ms in Box {self.win.box_number}"
-                    f"{self.win.box_letter} mouse {self.win.behavior_session_model.subject} exceeded 10%"
+            same_side_frac = round(intervals.same_side_fraction(), 4)
+            if log:
+                logging.info(
+                    f"Percentage of right and left lick intervals under 100 ms is {same_side_frac * 100:.2f}%."
                 )
-            else:
-                self.win.same_side_lick_interval.setText("")
+            self._show_lick_interval_warning(
+                "same side", same_side_frac, threshold, log
+            )
 
             # calculate cross side interval and frac
-            right_dummy = np.ones(
-                right.shape
-            )  # array used to assign lick direction
-            left_dummy = np.negative(np.ones(left.shape))
-
-            # 2d arrays pairing each time with a 1 (right) or -1 (left)
-            stacked_right = np.column_stack((right_dummy, right))
-            stacked_left = np.column_stack((left_dummy, left))
-            # concatenate stacked_right and stacked_left then sort based on time element
-            # e.g. [[-1, 10], [1, 15], [-1, 20], [1, 25]...]. Ones added to assign lick side to times
-            merged_sorted = np.array(
-                sorted(
-                    np.concatenate((stacked_right, stacked_left)),
-                    key=lambda x: x[1],
+            cross_side_frac = round(intervals.cross_side_fraction(), 4)
+            if log:
+                logging.info(
+                    f"Percentage of cross side lick intervals under 100 ms is {cross_side_frac * 100:.2f}%."
                 )
+            self.B_CrossSideIntervalPercent = cross_side_frac * 100
+            self._show_lick_interval_warning(
+                "cross side", cross_side_frac, threshold, log
             )
 
-            diffs = np.diff(
-                merged_sorted[:, 0]
-            )  # take difference of 1 (right) or -1 (left)
-            # take difference of next index with previous at indices where directions are opposite
-            cross_sides = np.array(
-                [
-                    merged_sorted[i + 1, 1] - merged_sorted[i, 1]
-                    for i in np.where(diffs != 0)
-                ]
-            )[0]
-            cross_side_frac = round(np.mean(cross_sides <= threshold), 4)
-            logging.info(
-                f"Percentage of cross side lick intervals under 100 ms is {cross_side_frac * 100:.2f}%."
+    def _show_lick_interval_warning(self, kind, frac, threshold, log):
+        """Show or clear the lick interval label; warn when it is (newly) exceeded"""
+        label = getattr(self.win, kind.replace(" ", "_") + "_lick_interval")
+        exceeded = frac >= threshold
+        if exceeded:
+            label.setText(
+                f"Percentage of {kind} lick intervals under 100 ms is "
+                f"over 10%: {frac * 100:.2f}%."
             )
-            self.B_CrossSideIntervalPercent = cross_side_frac * 100
-
-            if cross_side_frac >= threshold:
-                self.win.cross_side_lick_interval.setText(
-                    f"Percentage of cross side lick intervals under 100 ms is "
-                    f"over 10%: {cross_side_frac * 100:.2f}%."
-                )
-                logging.warning(
-                    f"Percentage of cross side lick intervals under 100 ms in Box {self.win.box_number}"
-                    f"{self.win.box_letter} mouse {self.win.behavior_session_model.subject} exceeded 10%"
-                )
-            else:
-                self.win.cross_side_lick_interval.setText("")
-
-    def _GetDoubleDipping(self, LicksIndex):
-        """get the number of double dipping. e.g. 0 1 0 will result in 2 double dipping"""
-        DoubleDipping = np.sum(np.diff(LicksIndex) != 0)
-        return DoubleDipping
+        else:
+            label.setText("")
+        if exceeded and (log or not self.lick_interval_exceeded[kind]):
+            logging.warning(
+                f"Percentage of {kind} lick intervals under 100 ms in Box {self.win.box_number}"
+                f"{self.win.box_letter} mouse {self.win.behavior_session_model.subject} exceeded 10%"
+            )
+        self.lick_interval_exceeded[kind] = exceeded
 
     def _ForagingEfficiency(self):
         pass
@@ -2115,35 +2051,7 @@ class GenerateTrials:
 
     def _ProduceWaveForm(self, Amplitude):
         """generate the waveform based on Duration and Protocol, Laser Power, Frequency, RampingDown, PulseDur and the sample frequency"""
-        if self.CLP_Protocol == "Sine":
-            resolution = (
-                self.CLP_SampleFrequency * self.CLP_CurrentDuration
-            )  # how many datapoints to generate
-            cycles = (
-                self.CLP_CurrentDuration * self.CLP_Frequency
-            )  # how many sine cycles
-            length = np.pi * 2 * cycles
-            self.my_wave = (
-                Amplitude
-                * (
-                    1
-                    + np.sin(
-                        np.arange(
-                            0 + 1.5 * math.pi,
-                            length + 1.5 * math.pi,
-                            length / resolution,
-                        )
-                    )
-                )
-                / 2
-            )
-            # add ramping down
-            self._get_ramping_down()
-            # add offset
-            self._add_offset()
-            self.my_wave = np.append(self.my_wave, [0, 0])
-
-        elif self.CLP_Protocol == "Pulse":
+        if self.CLP_Protocol == "Pulse":
             if self.CLP_PulseDur == "NA":
                 logging.warning(
                     "Pulse duration is NA!",
@@ -2152,6 +2060,7 @@ class GenerateTrials:
                 self.CLP_PulseDur = 0
                 self.my_wave = np.empty(0)
                 self.opto_error_tag = 1
+                return
             elif self.CLP_Frequency == "":
                 logging.warning(
                     "Pulse frequency is NA!",
@@ -2160,109 +2069,27 @@ class GenerateTrials:
                 self.CLP_Frequency = 0
                 self.my_wave = np.empty(0)
                 self.opto_error_tag = 1
-            else:
-                self.CLP_PulseDur = float(self.CLP_PulseDur)
-                PointsEachPulse = int(
-                    self.CLP_SampleFrequency * self.CLP_PulseDur
-                )
-                PulseIntervalPoints = int(
-                    1 / self.CLP_Frequency * self.CLP_SampleFrequency
-                    - PointsEachPulse
-                )
-                if PulseIntervalPoints < 0:
-                    logging.warning(
-                        "Pulse frequency and pulse duration are not compatible!",
-                        extra={"tags": [self.win.warning_log_tag]},
-                    )
-                TotalPoints = int(
-                    self.CLP_SampleFrequency * self.CLP_CurrentDuration
-                )
-                PulseNumber = np.floor(
-                    self.CLP_CurrentDuration * self.CLP_Frequency
-                )
-                EachPulse = Amplitude * np.ones(PointsEachPulse)
-                PulseInterval = np.zeros(PulseIntervalPoints)
-                WaveFormEachCycle = np.concatenate(
-                    (EachPulse, PulseInterval), axis=0
-                )
-                self.my_wave = np.empty(0)
-                # pulse number should be greater than 0
-                if PulseNumber > 1:
-                    for i in range(int(PulseNumber - 1)):
-                        self.my_wave = np.concatenate(
-                            (self.my_wave, WaveFormEachCycle), axis=0
-                        )
-                else:
-                    logging.warning(
-                        "Pulse number is less than 1!",
-                        extra={"tags": [self.win.warning_log_tag]},
-                    )
-                    return
-                self.my_wave = np.concatenate(
-                    (self.my_wave, EachPulse), axis=0
-                )
-                self.my_wave = np.concatenate(
-                    (
-                        self.my_wave,
-                        np.zeros(TotalPoints - np.shape(self.my_wave)[0]),
-                    ),
-                    axis=0,
-                )
-                # add offset
-                self._add_offset()
-                self.my_wave = np.append(self.my_wave, [0, 0])
-        elif self.CLP_Protocol == "Constant":
-            resolution = (
-                self.CLP_SampleFrequency * self.CLP_CurrentDuration
-            )  # how many datapoints to generate
-            self.my_wave = Amplitude * np.ones(int(resolution))
-            # add ramping down
-            self._get_ramping_down()
-            # add offset
-            self._add_offset()
-            self.my_wave = np.append(self.my_wave, [0, 0])
-        else:
+                return
+            self.CLP_PulseDur = float(self.CLP_PulseDur)
+        # waveforms are cached, most opto trials reuse the waveform of an earlier trial
+        waveform = laser_waveform(
+            self.CLP_Protocol,
+            self.CLP_CurrentDuration,
+            Amplitude,
+            self.CLP_SampleFrequency,
+            frequency=(
+                None if self.CLP_Protocol == "Constant" else self.CLP_Frequency
+            ),
+            pulse_duration=self.CLP_PulseDur,
+            ramping_down=self.CLP_RampingDown,
+            offset=self.CLP_OffsetStart,
+        )
+        for warning in waveform.warnings:
             logging.warning(
-                "Unidentified optogenetics protocol!",
-                extra={"tags": [self.win.warning_log_tag]},
+                warning, extra={"tags": [self.win.warning_log_tag]}
             )
-
-        """
-        # test
-        import matplotlib.pyplot as plt
-        plt.plot(np.arange(0, length, length / resolution), self.my_wave)
-        plt.show()
-        """
-
-    def _get_ramping_down(self):
-        """Add ramping down to the waveform"""
-        if self.CLP_RampingDown > 0:
-            if self.CLP_RampingDown > self.CLP_CurrentDuration:
-                logging.warning(
-                    "Ramping down is longer than the laser duration!",
-                    extra={"tags": [self.win.warning_log_tag]},
-                )
-            else:
-                Constant = np.ones(
-                    int(
-                        (self.CLP_CurrentDuration - self.CLP_RampingDown)
-                        * self.CLP_SampleFrequency
-                    )
-                )
-                RD = np.arange(
-                    1,
-                    0,
-                    -1 / (np.shape(self.my_wave)[0] - np.shape(Constant)[0]),
-                )
-                RampingDown = np.concatenate((Constant, RD), axis=0)
-                self.my_wave = self.my_wave * RampingDown
-
-    def _add_offset(self):
-        """Add offset to the waveform"""
-        if self.CLP_OffsetStart > 0:
-            OffsetPoints = int(self.CLP_SampleFrequency * self.CLP_OffsetStart)
-            Offset = np.zeros(OffsetPoints)
-            self.my_wave = np.concatenate((Offset, self.my_wave), axis=0)
+        if waveform.wave is not None:
+            self.my_wave = waveform.wave
 
     def _GetLaserAmplitude(self):
         """the voltage amplitude dependens on Protocol, Laser Power, Laser color, and the stimulation locations<>"""
@@ -2362,7 +2189,7 @@ class GenerateTrials:
 
         # Determine if the current lick port should be baited. self.B_Baited can only be updated after receiving response of the animal, so this part cannot appear in the _GenerateATrial section
         RandomNumber = np.random.random(2)
-        self.B_CurrentRewardProbRandomNumber.append(RandomNumber)
+        self.append_history("B_CurrentRewardProbRandomNumber", RandomNumber)
         self.CurrentBait = self.B_CurrentRewardProb > RandomNumber
         if self.TP_Task in ["Coupled Baiting", "Uncoupled Baiting"]:
             self.CurrentBait = self.CurrentBait | self.B_Baited
@@ -2372,9 +2199,7 @@ class GenerateTrials:
             max_index = np.argmax(self.B_CurrentRewardProb)
             self.CurrentBait[max_index] = False
         self.B_Baited = self.CurrentBait.copy()
-        self.B_BaitHistory = np.append(
-            self.B_BaitHistory, self.CurrentBait.reshape(2, 1), axis=1
-        )
+        self.append_history("B_BaitHistory", self.CurrentBait.reshape(2, 1))
         # determine auto water
         if self.CurrentAutoReward == 1:
             self.CurrentAutoRewardTrial = [0, 0]
@@ -2398,10 +2223,9 @@ class GenerateTrials:
                     self.B_Baited[i] = False
         else:
             self.CurrentAutoRewardTrial = [0, 0]
-        self.B_AutoWaterTrial = np.append(
-            self.B_AutoWaterTrial,
+        self.append_history(
+            "B_AutoWaterTrial",
             np.array(self.CurrentAutoRewardTrial).reshape(2, 1),
-            axis=1,
         )
 
         self._CheckSimulationSession()
@@ -2538,12 +2362,10 @@ class GenerateTrials:
             self.B_CurrentRewarded[0] = False
             self.B_CurrentRewarded[1] = False
 
-        self.B_AnimalResponseHistory = np.append(
-            self.B_AnimalResponseHistory, self.B_AnimalCurrentResponse
-        )
-        self.B_RewardedHistory = np.append(
-            self.B_RewardedHistory, self.B_CurrentRewarded, axis=1
+        self.append_history(
+            "B_AnimalResponseHistory", self.B_AnimalCurrentResponse
         )
+        self.append_history("B_RewardedHistory", self.B_CurrentRewarded)
 
         TN = np.shape(self.B_TrialStartTimeHarp)[0]
         if TN == 0:
@@ -2554,7 +2376,9 @@ class GenerateTrials:
                 + self.B_ITIHistory[TN - 1]
                 + self.B_DelayHistory[TN - 1]
                 + self.B_ResponseTimeHistory[TN - 1]
-                + float(self.Obj["TP_RewardConsumeTime"][TN - 1])
+                + float(
+                    self.parameter_log.value("TP_RewardConsumeTime", TN - 1)
+                )
             )
 
         DelayStartTimeHarp = TrialStartTimeHarp + self.B_ITIHistory[TN]
@@ -2562,7 +2386,7 @@ class GenerateTrials:
         TrialEndTimeHarp = (
             GoCueTimeBehaviorBoard
             + self.B_ResponseTimeHistory[TN]
-            + float(self.Obj["TP_RewardConsumeTime"][TN])
+            + float(self.parameter_log.value("TP_RewardConsumeTime", TN))
         )
         B_DOPort2Output = GoCueTimeBehaviorBoard
         TrialStartTime = TrialStartTimeHarp
@@ -2571,36 +2395,20 @@ class GenerateTrials:
         GoCueTime = GoCueTimeBehaviorBoard
         RewardOutcomeTime = TrialEndTimeHarp
         # get the event harp time
-        self.B_TrialStartTimeHarp = np.append(
-            self.B_TrialStartTimeHarp, TrialStartTimeHarp
-        )
-        self.B_DelayStartTimeHarp = np.append(
-            self.B_DelayStartTimeHarp, DelayStartTimeHarp
-        )
+        self.append_history("B_TrialStartTimeHarp", TrialStartTimeHarp)
+        self.append_history("B_DelayStartTimeHarp", DelayStartTimeHarp)
         self.B_DelayStartTimeHarpComplete.append(DelayStartTimeHarp)
-        self.B_TrialEndTimeHarp = np.append(
-            self.B_TrialEndTimeHarp, TrialEndTimeHarp
-        )
-        self.B_GoCueTimeBehaviorBoard = np.append(
-            self.B_GoCueTimeBehaviorBoard, GoCueTimeBehaviorBoard
-        )
-        self.B_GoCueTimeSoundCard = np.append(
-            self.B_GoCueTimeBehaviorBoard, GoCueTimeBehaviorBoard
-        )
-        self.B_DOPort2Output = np.append(self.B_DOPort2Output, B_DOPort2Output)
+        self.append_history("B_TrialEndTimeHarp", TrialEndTimeHarp)
+        self.append_history("B_GoCueTimeBehaviorBoard", GoCueTimeBehaviorBoard)
+        self.append_history("B_GoCueTimeSoundCard", GoCueTimeBehaviorBoard)
+        self.append_history("B_DOPort2Output", B_DOPort2Output)
         # get the event time
-        self.B_TrialStartTime = np.append(
-            self.B_TrialStartTime, TrialStartTime
-        )
-        self.B_DelayStartTime = np.append(
-            self.B_DelayStartTime, DelayStartTime
-        )
+        self.append_history("B_TrialStartTime", TrialStartTime)
+        self.append_history("B_DelayStartTime", DelayStartTime)
         self.B_DelayStartTimeComplete.append(DelayStartTime)
-        self.B_TrialEndTime = np.append(self.B_TrialEndTime, TrialEndTime)
-        self.B_GoCueTime = np.append(self.B_GoCueTime, GoCueTime)
-        self.B_RewardOutcomeTime = np.append(
-            self.B_RewardOutcomeTime, RewardOutcomeTime
-        )
+        self.append_history("B_TrialEndTime", TrialEndTime)
+        self.append_history("B_GoCueTime", GoCueTime)
+        self.append_history("B_RewardOutcomeTime", RewardOutcomeTime)
         self.GetResponseFinish = 1
 
     def _add_one_trial(self):
@@ -2659,23 +2467,23 @@ class GenerateTrials:
         first_delay_start = 0
         while 1:
             Rec = Channel1.receive()
-            if Rec[0].address not in ["/BehaviorEvent", "/DelayStartTime"]:
+            if Rec.address not in ["/BehaviorEvent", "/DelayStartTime"]:
                 current_receiveN += 1
-            if Rec[0].address == "/TrialStartTime":
-                TrialStartTime = Rec[1][1][0]
+            if Rec.address == "/TrialStartTime":
+                TrialStartTime = Rec.value
                 in_delay = 1  # the next /BehaviorEvent is the delay
-            elif Rec[0].address == "/DelayStartTime":
-                DelayStartTime.append(Rec[1][1][0])
+            elif Rec.address == "/DelayStartTime":
+                DelayStartTime.append(Rec.value)
                 if first_delay_start == 0:
                     first_delay_start = 1
                     current_receiveN += 1
-            elif Rec[0].address == "/GoCueTime":
-                GoCueTime = Rec[1][1][0]
+            elif Rec.address == "/GoCueTime":
+                GoCueTime = Rec.value
                 in_delay = 0
-            elif Rec[0].address == "/RewardOutcomeTime":
-                RewardOutcomeTime = Rec[1][1][0]
-            elif Rec[0].address == "/RewardOutcome":
-                TrialOutcome = Rec[1][1][0]
+            elif Rec.address == "/RewardOutcomeTime":
+                RewardOutcomeTime = Rec.value
+            elif Rec.address == "/RewardOutcome":
+                TrialOutcome = Rec.value
                 if TrialOutcome == "NoResponse":
                     with data_lock:
                         self.B_AnimalCurrentResponse = 2
@@ -2708,9 +2516,9 @@ class GenerateTrials:
                         self.B_CurrentRewarded[1] = False
                 B_CurrentRewarded = self.B_CurrentRewarded
                 B_AnimalCurrentResponse = self.B_AnimalCurrentResponse
-            elif Rec[0].address == "/TrialEndTime":
-                TrialEndTime = Rec[1][1][0]
-            elif Rec[0].address == "/GoCueTimeSoundCard":
+            elif Rec.address == "/TrialEndTime":
+                TrialEndTime = Rec.value
+            elif Rec.address == "/GoCueTimeSoundCard":
                 # give auto water after Co cue
                 # Randomlizing the order to avoid potential bias.
                 if np.random.random(1) < 0.5:
@@ -2743,70 +2551,52 @@ class GenerateTrials:
                 else:
                     self.win._give_reserved_water(valve="right")
                     self.win._give_reserved_water(valve="left")
-                GoCueTimeSoundCard = Rec[1][1][0]
+                GoCueTimeSoundCard = Rec.value
                 in_delay = 0
             elif (
-                Rec[0].address == "/DOPort2Output"
+                Rec.address == "/DOPort2Output"
             ):  # this port is used to trigger optogenetics aligned to Go cue
-                B_DOPort2Output = Rec[1][1][0]
+                B_DOPort2Output = Rec.value
                 with data_lock:
-                    self.B_DOPort2Output = np.append(
-                        self.B_DOPort2Output, B_DOPort2Output
-                    )
-            elif Rec[0].address == "/ITIStartTimeHarp":
-                TrialStartTimeHarp = Rec[1][1][0]
-            elif Rec[0].address == "/BehaviorEvent":
+                    self.append_history("B_DOPort2Output", B_DOPort2Output)
+            elif Rec.address == "/ITIStartTimeHarp":
+                TrialStartTimeHarp = Rec.value
+            elif Rec.address == "/BehaviorEvent":
                 if in_delay == 1:
-                    DelayStartTimeHarp.append(Rec[1][1][0])
+                    DelayStartTimeHarp.append(Rec.value)
                     if first_behavior_event == 0:
                         first_behavior_event = 1
                         current_receiveN += 1  # only count once
                 else:
                     if behavior_eventN == 0:
-                        GoCueTimeBehaviorBoard = Rec[1][1][0]
+                        GoCueTimeBehaviorBoard = Rec.value
                     elif behavior_eventN == 1:
-                        TrialEndTimeHarp = Rec[1][1][0]
+                        TrialEndTimeHarp = Rec.value
                     behavior_eventN += 1
                     current_receiveN += 1
             if current_receiveN == ReceiveN:
                 break
         with data_lock:
-            self.B_RewardedHistory = np.append(
-                self.B_RewardedHistory, B_CurrentRewarded, axis=1
-            )
-            self.B_AnimalResponseHistory = np.append(
-                self.B_AnimalResponseHistory, B_AnimalCurrentResponse
+            self.append_history("B_RewardedHistory", B_CurrentRewarded)
+            self.append_history(
+                "B_AnimalResponseHistory", B_AnimalCurrentResponse
             )
             # get the event harp time
-            self.B_TrialStartTimeHarp = np.append(
-                self.B_TrialStartTimeHarp, TrialStartTimeHarp
-            )
-            self.B_DelayStartTimeHarp = np.append(
-                self.B_DelayStartTimeHarp, DelayStartTimeHarp[0]
-            )
+            self.append_history("B_TrialStartTimeHarp", TrialStartTimeHarp)
+            self.append_history("B_DelayStartTimeHarp", DelayStartTimeHarp[0])
             self.B_DelayStartTimeHarpComplete.append(DelayStartTimeHarp)
-            self.B_TrialEndTimeHarp = np.append(
-                self.B_TrialEndTimeHarp, TrialEndTimeHarp
-            )
-            self.B_GoCueTimeBehaviorBoard = np.append(
-                self.B_GoCueTimeBehaviorBoard, GoCueTimeBehaviorBoard
-            )
-            self.B_GoCueTimeSoundCard = np.append(
-                self.B_GoCueTimeSoundCard, GoCueTimeSoundCard
+            self.append_history("B_TrialEndTimeHarp", TrialEndTimeHarp)
+            self.append_history(
+                "B_GoCueTimeBehaviorBoard", GoCueTimeBehaviorBoard
             )
+            self.append_history("B_GoCueTimeSoundCard", GoCueTimeSoundCard)
             # get the event time
-            self.B_TrialStartTime = np.append(
-                self.B_TrialStartTime, TrialStartTime
-            )
-            self.B_DelayStartTime = np.append(
-                self.B_DelayStartTime, DelayStartTime[0]
-            )
+            self.append_history("B_TrialStartTime", TrialStartTime)
+            self.append_history("B_DelayStartTime", DelayStartTime[0])
             self.B_DelayStartTimeComplete.append(DelayStartTime)
-            self.B_TrialEndTime = np.append(self.B_TrialEndTime, TrialEndTime)
-            self.B_GoCueTime = np.append(self.B_GoCueTime, GoCueTime)
-            self.B_RewardOutcomeTime = np.append(
-                self.B_RewardOutcomeTime, RewardOutcomeTime
-            )
+            self.append_history("B_TrialEndTime", TrialEndTime)
+            self.append_history("B_GoCueTime", GoCueTime)
+            self.append_history("B_RewardOutcomeTime", RewardOutcomeTime)
             self.GetResponseFinish = 1
 
     def _set_valve_time_left(self, channel3, LeftValue=0.01, Multiplier=1):
@@ -2841,100 +2631,27 @@ class GenerateTrials:
 
     def _get_irregular_timestamp(self, Channel2, data_lock: threading.Lock):
         """Get timestamps occurred irregularly (e.g. licks and reward delivery time)"""
-        while not Channel2.msgs.empty():
-            Rec = Channel2.receive()
-            if Rec[0].address == "/LeftLickTime":
-                with data_lock:
-                    self.B_LeftLickTime = np.append(
-                        self.B_LeftLickTime, Rec[1][1][0]
+        # drain everything received so far and group the values by address
+        grouped = defaultdict(list)
+        for Rec in Channel2.receive_all():
+            grouped[Rec.address].append(Rec.value)
+        if not grouped:
+            return
+        # append each group with a single lock acquisition
+        with data_lock:
+            for address, values in grouped.items():
+                if address in IRREGULAR_EVENT_HISTORIES:
+                    self.extend_history(
+                        IRREGULAR_EVENT_HISTORIES[address], values
                     )
-            elif Rec[0].address == "/RightLickTime":
-                with data_lock:
-                    self.B_RightLickTime = np.append(
-                    self.B_RightLickTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/LeftRewardDeliveryTime":
-                with data_lock:
-                    self.B_LeftRewardDeliveryTime = np.append(
-                    self.B_LeftRewardDeliveryTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/RightRewardDeliveryTime":
-                with data_lock:
-                    self.B_RightRewardDeliveryTime = np.append(
-                    self.B_RightRewardDeliveryTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/LeftRewardDeliveryTimeHarp":
-                with data_lock:
-                    self.B_LeftRewardDeliveryTimeHarp = np.append(
-                    self.B_LeftRewardDeliveryTimeHarp, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/RightRewardDeliveryTimeHarp":
-                with data_lock:
-                    self.B_RightRewardDeliveryTimeHarp = np.append(
-                    self.B_RightRewardDeliveryTimeHarp, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/PhotometryRising":
-                with data_lock:
-                    self.B_PhotometryRisingTimeHarp = np.append(
-                    self.B_PhotometryRisingTimeHarp, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/PhotometryFalling":
-                with data_lock:
-                    self.B_PhotometryFallingTimeHarp = np.append(
-                    self.B_PhotometryFallingTimeHarp, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/OptogeneticsTimeHarp":
-                with data_lock:
-                    self.B_OptogeneticsTimeHarp = np.append(
-                    self.B_OptogeneticsTimeHarp, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/ManualLeftWaterStartTime":
-                with data_lock:
-                    self.B_ManualLeftWaterStartTime = np.append(
-                    self.B_ManualLeftWaterStartTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/ManualRightWaterStartTime":
-                with data_lock:
-                    self.B_ManualRightWaterStartTime = np.append(
-                    self.B_ManualRightWaterStartTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/EarnedLeftWaterStartTime":
-                with data_lock:
-                    self.B_EarnedLeftWaterStartTime = np.append(
-                    self.B_EarnedLeftWaterStartTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/EarnedRightWaterStartTime":
-                with data_lock:
-                    self.B_EarnedRightWaterStartTime = np.append(
-                    self.B_EarnedRightWaterStartTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/AutoLeftWaterStartTime":
-                with data_lock:
-                    self.B_AutoLeftWaterStartTime = np.append(
-                    self.B_AutoLeftWaterStartTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/AutoRightWaterStartTime":
-                with data_lock:
-                    self.B_AutoRightWaterStartTime = np.append(
-                    self.B_AutoRightWaterStartTime, Rec[1][1][0]
-                )
-            elif Rec[0].address == "/EnvironmentSensorTemperature":
-                with data_lock:
-                    value = Rec[1][1][0] if type(Rec[1][1][0]) != float else round(Rec[1][1][0], 1)
-                    self.B_EnvironmentSensorTemperature.append(value)
-
-            elif Rec[0].address == "/EnvironmentSensorHumidity":
-                with data_lock:
-                    value = Rec[1][1][0] if type(Rec[1][1][0]) != float else round(Rec[1][1][0], 1)
-                    self.B_EnvironmentSensorHumidity.append(value)
-
-            elif Rec[0].address == "/EnvironmentSensorPressure":
-                with data_lock:
-                    self.B_EnvironmentSensorPressure.append(Rec[1][1][0])
-
-            elif Rec[0].address == "/EnvironmentSensorTimestamp":
-                with data_lock:
-                    self.B_EnvironmentSensorTimestamp.append(Rec[1][1][0])
+                elif address in ENVIRONMENT_SENSOR_HISTORIES:
+                    attr_name, digits = ENVIRONMENT_SENSOR_HISTORIES[address]
+                    if digits is not None:
+                        values = [
+                            round(v, digits) if type(v) == float else v
+                            for v in values
+                        ]
+                    getattr(self, attr_name).extend(values)
 
     def _DeletePreviousLicks(self, Channel2):
         """Delete licks from the previous session"""
@@ -2944,40 +2661,16 @@ class GenerateTrials:
     # get training parameters
     def _GetTrainingParameters(self, win):
         """Get training parameters"""
-        # Iterate over each container to find child widgets and store their values in self
-        for container in [
-            win.TrainingParameters,
-            win.centralwidget,
-            win.Opto_dialog,
-            win.Camera_dialog,
-            win.Metadata_dialog,
-        ]:
-            # Iterate over each child of the container that is a QLineEdit or QDoubleSpinBox
-            for child in container.findChildren(
-                (
-                    QtWidgets.QLineEdit,
-                    QtWidgets.QDoubleSpinBox,
-                    QtWidgets.QSpinBox,
-                )
-            ):
-                if (
-                    child.objectName() == "qt_spinbox_lineedit"
-                    or child.objectName() == ""
-                ):
-                    continue
-                # Set an attribute in self with the name 'TP_' followed by the child's object name
-                # and store the child's text value
-                setattr(self, "TP_" + child.objectName(), child.text())
-            # Iterate over each child of the container that is a QComboBox
-            for child in container.findChildren(QtWidgets.QComboBox):
-                # Set an attribute in self with the name 'TP_' followed by the child's object name
-                # and store the child's current text value
-                setattr(self, "TP_" + child.objectName(), child.currentText())
-            # Iterate over each child of the container that is a QPushButton
-            for child in container.findChildren(QtWidgets.QPushButton):
-                # Set an attribute in self with the name 'TP_' followed by the child's object name
-                # and store whether the child is checked or not
-                setattr(self, "TP_" + child.objectName(), child.isChecked())
+        # Store the text, current text or checked state of each parameter widget in self
+        # with the name 'TP_' followed by the widget's object name
+        start = time.perf_counter()
+        names = []  # names of the parameters logged by _SaveParameters
+        for name, value in win.widget_registry.read(
+            TRIAL_PARAMETER_CONTAINERS
+        ).items():
+            setattr(self, "TP_" + name, value)
+            names.append("TP_" + name)
+        self.parameter_capture_time = time.perf_counter() - start
 
         # Manually attach auto training parameters
         if (
@@ -3002,25 +2695,26 @@ class GenerateTrials:
             self.TP_auto_train_curriculum_schema_version = None
             self.TP_auto_train_stage = None
             self.TP_auto_train_stage_overridden = None
+        names.extend(
+            [
+                "TP_auto_train_engaged",
+                "TP_auto_train_curriculum_name",
+                "TP_auto_train_curriculum_version",
+                "TP_auto_train_curriculum_schema_version",
+                "TP_auto_train_stage",
+                "TP_auto_train_stage_overridden",
+            ]
+        )
+        self.training_parameter_names = list(dict.fromkeys(names))
 
     def _SaveParameters(self):
-        for attr_name in dir(self):
-            if attr_name.startswith("TP_"):
-                # Add the field to the dictionary with the 'TP_' prefix removed
-                # Check if the attribute exists in self.Obj
-                if attr_name in self.Obj:
-                    # Check if the attribute value is already a list
-                    if isinstance(self.Obj[attr_name], list):
-                        self.Obj[attr_name].append(getattr(self, attr_name))
-                    else:
-                        # If the attribute value is not a list, create a new list and append to it
-                        self.Obj[attr_name] = [
-                            self.Obj[attr_name],
-                            getattr(self, attr_name),
-                        ]
-                else:
-                    # If the attribute does not exist in self.Obj, create a new list and append to it
-                    self.Obj[attr_name] = [getattr(self, attr_name)]
+        # only the parameters that changed since the previous trial are stored
+        self.parameter_log.record(
+            {
+                name: getattr(self, name)
+                for name in self.training_parameter_names
+            }
+        )
         # get the newscale positions
         if (
             hasattr(self.win, "current_stage")
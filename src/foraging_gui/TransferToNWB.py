@@ -11,12 +11,30 @@ from uuid import uuid4
 import numpy as np
 import pandas as pd
 from dateutil.tz import tzlocal
-from pynwb import NWBHDF5IO, NWBFile, TimeSeries
+from pynwb import H5DataIO, NWBHDF5IO, NWBFile, TimeSeries
 from pynwb.file import Subject
 from scipy.io import loadmat
 
+from foraging_gui.parameter_log import ParameterLog
+from foraging_gui.session_columns import ColumnarSession, load_session
+
 save_folder = R"F:\Data_for_ingestion\Foraging_behavior\Bonsai\nwb"
 
+# event series written as chunked, compressed datasets: elements per chunk
+EVENT_CHUNK_SIZE = 16384
+# event histories kept as arrays when the session is read from its columnar file,
+# they are written from the memory-mapped file without being converted to lists
+STREAMED_EVENT_FIELDS = (
+    "B_LeftRewardDeliveryTime",
+    "B_LeftRewardDeliveryTimeHarp",
+    "B_RightRewardDeliveryTime",
+    "B_RightRewardDeliveryTimeHarp",
+    "B_LeftLickTime",
+    "B_RightLickTime",
+    "B_PhotometryFallingTimeHarp",
+    "B_PhotometryRisingTimeHarp",
+)
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,13 +76,7 @@ def _get_field(
                 has_field = 1
         if has_field == 0:
             continue
-        reject = (
-            not isinstance(value, np.generic)
-            and value in reject_list
-            or isinstance(value, np.generic)
-            and value.size == 0
-        )
-        if reject:
+        if _is_rejected(value, reject_list):
             continue
         if index is None:
             return value
@@ -83,8 +95,355 @@ def _get_field(
         return default
 
 
+def _is_rejected(value, reject_list):
+    """whether a field value found by _get_field is rejected"""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.size == 0
+    return value in reject_list
+
+
+def _get_column(
+    obj,
+    field_list,
+    n_trials,
+    reject_list=[None, np.nan, "", []],
+    default=np.nan,
+):
+    """get a per-trial column from obj, the same values as
+    [_get_field(obj, field_list, reject_list, index=i, default) for i in range(n_trials)]
+    but each field is looked up and checked once for the whole column
+
+    Parameters
+    ----------
+    obj : the object to get the field from
+    field_list : str or list
+            if is a list, a trial whose value is missing or rejected in a field takes
+            its value from the next field
+    n_trials : int, length of the column
+    default : value of the trials not found in any field
+    """
+    if type(field_list) is not list:
+        field_list = [field_list]
+
+    column = [default] * n_trials
+    pending = range(n_trials)
+    for f in field_list:
+        if not pending:
+            break
+        if type(obj) is type and hasattr(obj, f):
+            value = getattr(obj, f)
+        elif type(obj) is dict and f in obj:
+            value = obj[f]
+        else:
+            continue
+        if _is_rejected(value, reject_list):
+            continue
+        rejected = []
+        for i in pending:
+            try:
+                item = value[i]
+                if item in reject_list:
+                    rejected.append(i)
+                    continue
+            except:
+                # not iterable or too short: default, as _get_field
+                continue
+            column[i] = item
+        pending = rejected
+    return column
+
+
+# wavelength (nm) of the laser colors
+LASER_WAVELENGTHS = {"Blue": 473.0, "Red": 647.0, "Green": 547.0}
+# optogenetics trial columns read from the TP_<field>_<condition> of the laser
+# condition of each trial: column -> (field, type)
+LASER_CONDITION_FIELDS = {
+    "laser_location": ("Location", str),
+    "laser_on_probability": ("Probability", float),
+    "laser_duration": ("Duration", float),
+    "laser_condition": ("Condition", str),
+    "laser_condition_probability": ("ConditionP", float),
+    "laser_start": ("LaserStart", str),
+    "laser_start_offset": ("OffsetStart", float),
+    "laser_end": ("LaserEnd", str),
+    "laser_end_offset": ("OffsetEnd", float),
+    "laser_protocol": ("Protocol", str),
+    "laser_frequency": ("Frequency", float),
+    "laser_rampingdown": ("RD", float),
+    "laser_pulse_duration": ("PulseDur", float),
+}
+
+
+def _laser_power(power_strings):
+    """second element of each "[x, y]" power string, each distinct string parsed once"""
+    parsed = {}
+    powers = np.empty(len(power_strings))
+    for i, power in enumerate(power_strings):
+        if power not in parsed:
+            parsed[power] = float(eval(power)[1])
+        powers[i] = parsed[power]
+    return powers
+
+
+def _laser_columns(obj, n_trials):
+    """optogenetics trial columns, NaN or "None" for the trials without laser"""
+    conditions = np.asarray(obj.B_SelectedCondition[:n_trials])
+    columns = {
+        "laser_wavelength": np.full(n_trials, np.nan),
+        "laser_1_power": np.full(n_trials, np.nan),
+        "laser_2_power": np.full(n_trials, np.nan),
+    }
+    for name, (_, kind) in LASER_CONDITION_FIELDS.items():
+        if kind is str:
+            columns[name] = np.full(n_trials, "None", dtype=object)
+        else:
+            columns[name] = np.full(n_trials, np.nan)
+    for Sc in np.unique(conditions[conditions != 0]).tolist():
+        trials = np.flatnonzero(conditions == Sc)
+        laser_color = _get_column(
+            obj, [f"TP_Laser_{Sc}", f"TP_LaserColor_{Sc}"], n_trials
+        )
+        columns["laser_wavelength"][trials] = [
+            LASER_WAVELENGTHS.get(laser_color[i], np.nan) for i in trials
+        ]
+        for laser, sides in (
+            ("laser_1_power", ["Laser1_power", "LaserPowerLeft"]),
+            ("laser_2_power", ["Laser2_power", "LaserPowerRight"]),
+        ):
+            power = _get_column(
+                obj,
+                [f"TP_{side}_{Sc}" for side in sides],
+                n_trials,
+                default="[np.nan,np.nan]",
+            )
+            columns[laser][trials] = _laser_power([power[i] for i in trials])
+        for name, (field, kind) in LASER_CONDITION_FIELDS.items():
+            values = np.asarray(getattr(obj, f"TP_{field}_{Sc}"), dtype=object)
+            if kind is str:
+                columns[name][trials] = [str(v) for v in values[trials]]
+            else:
+                columns[name][trials] = values[trials].astype(float)
+    return {name: column.tolist() for name, column in columns.items()}
+
+
+def _lickspout_columns(obj, n_trials, aind_stage):
+    """lickspout position columns, NaN for the trials without a stage position"""
+    stage_positions = getattr(obj, "B_StagePositions", [])[:n_trials]
+    axes = ["x", "y1", "y2", "z"] if aind_stage else ["x", "y", "z"]
+    missing = [np.nan] * (n_trials - len(stage_positions))
+    return {
+        f"lickspout_position_{axis}": [
+            position.get(axis, np.nan) for position in stage_positions
+        ]
+        + missing
+        for axis in axes
+    }
+
+
+def _trial_columns(obj, n_trials, Harp, aind_stage):
+    """values of the trial table, column name -> list of the values of all trials"""
+
+    def floats(values):
+        return np.asarray(values[:n_trials], dtype=float).tolist()
+
+    if Harp == "":
+        goCue_start_time = obj.B_GoCueTime  # Use CPU time
+    elif hasattr(obj, "B_GoCueTimeHarp"):
+        goCue_start_time = obj.B_GoCueTimeHarp  # Use Harp time, old format
+    else:
+        goCue_start_time = (
+            obj.B_GoCueTimeSoundCard
+        )  # Use Harp time, new format
+    if type(obj.B_AutoWaterTrial[0]) is list:
+        auto_waterL, auto_waterR = obj.B_AutoWaterTrial[:2]
+    else:
+        # Back-compatible with old autowater format
+        auto_waterL = auto_waterR = obj.B_AutoWaterTrial
+    reward_random_number = _get_column(
+        obj,
+        "B_CurrentRewardProbRandomNumber",
+        n_trials,
+        default=[np.nan] * 2,
+    )
+
+    columns = {
+        "start_time": getattr(obj, f"B_TrialStartTime{Harp}")[:n_trials],
+        "stop_time": getattr(obj, f"B_TrialEndTime{Harp}")[:n_trials],
+        "animal_response": obj.B_AnimalResponseHistory[:n_trials],
+        "rewarded_historyL": obj.B_RewardedHistory[0][:n_trials],
+        "rewarded_historyR": obj.B_RewardedHistory[1][:n_trials],
+        "reward_outcome_time": obj.B_RewardOutcomeTime[:n_trials],
+        "delay_start_time": _get_column(
+            obj, f"B_DelayStartTime{Harp}", n_trials, default=np.nan
+        ),
+        "goCue_start_time": goCue_start_time[:n_trials],
+        "bait_left": obj.B_BaitHistory[0][:n_trials],
+        "bait_right": obj.B_BaitHistory[1][:n_trials],
+        "base_reward_probability_sum": floats(obj.TP_BaseRewardSum),
+        "reward_probabilityL": floats(obj.B_RewardProHistory[0]),
+        "reward_probabilityR": floats(obj.B_RewardProHistory[1]),
+        "reward_random_number_left": [r[0] for r in reward_random_number],
+        "reward_random_number_right": [r[1] for r in reward_random_number],
+        "left_valve_open_time": floats(obj.TP_LeftValue),
+        "right_valve_open_time": floats(obj.TP_RightValue),
+        "block_beta": floats(obj.TP_BlockBeta),
+        "block_min": floats(obj.TP_BlockMin),
+        "block_max": floats(obj.TP_BlockMax),
+        "min_reward_each_block": floats(obj.TP_BlockMinReward),
+        "delay_beta": floats(obj.TP_DelayBeta),
+        "delay_min": floats(obj.TP_DelayMin),
+        "delay_max": floats(obj.TP_DelayMax),
+        "delay_duration": obj.B_DelayHistory[:n_trials],
+        "ITI_beta": floats(obj.TP_ITIBeta),
+        "ITI_min": floats(obj.TP_ITIMin),
+        "ITI_max": floats(obj.TP_ITIMax),
+        "ITI_duration": obj.B_ITIHistory[:n_trials],
+        "response_duration": floats(obj.TP_ResponseTime),
+        "reward_consumption_duration": floats(obj.TP_RewardConsumeTime),
+        "reward_delay": floats(
+            _get_column(obj, "TP_RewardDelay", n_trials, default=0)
+        ),
+        "auto_waterL": auto_waterL[:n_trials],
+        "auto_waterR": auto_waterR[:n_trials],
+        # optogenetics
+        "laser_on_trial": obj.B_LaserOnTrial[:n_trials],
+        **_laser_columns(obj, n_trials),
+        "session_wide_control": _get_column(
+            obj, "TP_SessionWideControl", n_trials, default="None"
+        ),
+        "fraction_of_session": floats(
+            _get_column(obj, "TP_FractionOfSession", n_trials, default=np.nan)
+        ),
+        "session_start_with": _get_column(
+            obj, "TP_SessionStartWith", n_trials, default="None"
+        ),
+        "session_alternation": _get_column(
+            obj, "TP_SessionAlternating", n_trials, default="None"
+        ),
+        "minimum_opto_interval": floats(
+            _get_column(obj, "TP_MinOptoInterval", n_trials, default=0)
+        ),
+        # reward size
+        "reward_size_left": floats(
+            _get_column(obj, "TP_LeftValue_volume", n_trials)
+        ),
+        "reward_size_right": floats(
+            _get_column(obj, "TP_RightValue_volume", n_trials)
+        ),
+        **_lickspout_columns(obj, n_trials, aind_stage),
+    }
+    # add all auto training parameters (eventually should be in session.json)
+    for name in [
+        "auto_train_engaged",
+        "auto_train_curriculum_name",
+        "auto_train_curriculum_version",
+        "auto_train_curriculum_schema_version",
+        "auto_train_stage",
+    ]:
+        columns[name] = _get_column(
+            obj, f"TP_{name}", n_trials, default="None"
+        )
+    columns["auto_train_stage_overridden"] = _get_column(
+        obj, "TP_auto_train_stage_overridden", n_trials, default=np.nan
+    )
+    return columns
+
+
+def _add_trials(nwbfile, columns):
+    """add the trials to the trial table at once, column by column, instead of
+    calling add_trial for each trial. The columns must have been added with
+    add_trial_column
+    """
+    trials = nwbfile.trials
+    if set(columns) != set(trials.colnames):
+        raise ValueError(
+            f"Trial columns {sorted(set(columns) ^ set(trials.colnames))} "
+            "are not both declared and filled"
+        )
+    n_trials = len(columns["start_time"])
+    for name, values in columns.items():
+        if len(values) != n_trials:
+            raise ValueError(
+                f"Trial column {name} has {len(values)} values "
+                f"for {n_trials} trials"
+            )
+    for name, values in columns.items():
+        trials[name].extend(values)
+    trials.id.extend(range(len(trials.id), len(trials.id) + n_trials))
+
+
+def _read_columns(fname):
+    """session dict read from the up-to-date columnar file of a session json, with
+    STREAMED_EVENT_FIELDS as memory-mapped arrays and the other histories as lists,
+    None if there is no such file
+    """
+    session = load_session(fname)
+    if not isinstance(session, ColumnarSession):
+        return None
+    Obj = {}
+    for key in session:
+        if key in session.columns and key not in STREAMED_EVENT_FIELDS:
+            Obj[key] = session[key].tolist()
+        else:
+            Obj[key] = session[key]
+    return Obj
+
+
+def _event_series(
+    name,
+    timestamps,
+    description,
+    chunk_size=EVENT_CHUNK_SIZE,
+    compression="gzip",
+):
+    """TimeSeries of events (data of ones), as chunked and compressed datasets
+
+    Parameters
+    ----------
+    timestamps : list or array of the event times
+    chunk_size : int, elements per chunk
+    compression : str, h5py compression filter, or None to write plain datasets
+    """
+    n_events = len(timestamps)
+    data = np.ones(n_events)
+    if compression is not None:
+        chunks = (max(min(chunk_size, n_events), 1),)
+        timestamps = H5DataIO(
+            np.asarray(timestamps, dtype=float),
+            compression=compression,
+            chunks=chunks,
+        )
+        data = H5DataIO(data, compression=compression, chunks=chunks)
+    else:
+        data = data.tolist()
+    return TimeSeries(
+        name=name,
+        unit="second",
+        timestamps=timestamps,
+        data=data,
+        description=description,
+    )
+
+
 ######## load the Json/Mat file #######
-def bonsai_to_nwb(fname, save_folder=save_folder):
+def bonsai_to_nwb(
+    fname,
+    save_folder=save_folder,
+    chunk_size=EVENT_CHUNK_SIZE,
+    compression="gzip",
+    from_columns=True,
+):
+    """convert a session json or mat file to NWB
+
+    Parameters
+    ----------
+    chunk_size : int, elements per chunk of the event series datasets
+    compression : str, h5py compression filter of the event series, None to write
+            plain datasets
+    from_columns : bool, read a session json from its columnar file when it is up to
+            date, so long event series are written from the memory-mapped file
+    """
+    Obj = None
     if fname.endswith(".mat"):
         Obj = loadmat(fname)
         for key in Obj.keys():
@@ -103,7 +462,9 @@ def bonsai_to_nwb(fname, save_folder=save_folder):
                     Obj[key] = Value.tolist()[0]
                 else:
                     Obj[key] = Value.tolist()
-    elif fname.endswith(".json"):
+    elif fname.endswith(".json") and from_columns:
+        Obj = _read_columns(fname)
+    if Obj is None and fname.endswith(".json"):
         f = open(fname, "r")
         Obj = json.loads(f.read())
         f.close()
@@ -115,6 +476,12 @@ def bonsai_to_nwb(fname, save_folder=save_folder):
     for attr_name in Obj.keys():
         setattr(obj, attr_name, Obj[attr_name])
 
+    # sessions saved with a parameter change log: rebuild the per-trial TP_ lists
+    parameter_log = ParameterLog.from_session(Obj)
+    if parameter_log is not None:
+        for attr_name, values in parameter_log.histories().items():
+            setattr(obj, attr_name, values)
+
     # Early return if missing some key fields
     if any(
         [
@@ -486,12 +853,10 @@ def bonsai_to_nwb(fname, save_folder=save_folder):
         name="lickspout_position_z",
         description="z position (um) of the lickspout position (up-down)",
     )
-    if len(stage_positions) > 0 and list(stage_positions[0].keys()) == [
-        "x",
-        "y1",
-        "y2",
-        "z",
-    ]:  # aind stage
+    aind_stage = len(stage_positions) > 0 and list(
+        stage_positions[0].keys()
+    ) == ["x", "y1", "y2", "z"]
+    if aind_stage:
         nwbfile.add_trial_column(
             name="lickspout_position_y1",
             description="y position (um) of the left lickspout position (forward-backward)",
@@ -523,251 +888,13 @@ def bonsai_to_nwb(fname, save_folder=save_folder):
         Harp = ""
     else:
         Harp = "Harp"
-    for i in range(len(obj.B_TrialEndTime)):
-        Sc = obj.B_SelectedCondition[i]  # the optogenetics conditions
-        if Sc == 0:
-            LaserWavelengthC = np.nan
-            LaserLocationC = "None"
-            Laser1Power = np.nan
-            Laser2Power = np.nan
-            LaserOnProbablityC = np.nan
-            LaserDurationC = np.nan
-            LaserConditionC = "None"
-            LaserConditionProC = np.nan
-            LaserStartC = "None"
-            LaserStartOffsetC = np.nan
-            LaserEndC = "None"
-            LaserEndOffsetC = np.nan
-            LaserProtocolC = "None"
-            LaserFrequencyC = np.nan
-            LaserRampingDownC = np.nan
-            LaserPulseDurC = np.nan
-
-        else:
-            laser_color = _get_field(
-                obj,
-                field_list=[f"TP_Laser_{Sc}", f"TP_LaserColor_{Sc}"],
-                index=i,
-            )
-            if laser_color == "Blue":
-                LaserWavelengthC = float(473)
-            elif laser_color == "Red":
-                LaserWavelengthC = float(647)
-            elif laser_color == "Green":
-                LaserWavelengthC = float(547)
-            LaserLocationC = str(getattr(obj, f"TP_Location_{Sc}")[i])
-            Laser1Power = float(
-                eval(
-                    _get_field(
-                        obj,
-                        field_list=[
-                            f"TP_Laser1_power_{Sc}",
-                            f"TP_LaserPowerLeft_{Sc}",
-                        ],
-                        index=i,
-                        default="[np.nan,np.nan]",
-                    )
-                )[1]
-            )
-            Laser2Power = float(
-                eval(
-                    _get_field(
-                        obj,
-                        field_list=[
-                            f"TP_Laser2_power_{Sc}",
-                            f"TP_LaserPowerRight_{Sc}",
-                        ],
-                        index=i,
-                        default="[np.nan,np.nan]",
-                    )
-                )[1]
-            )
-            LaserOnProbablityC = float(getattr(obj, f"TP_Probability_{Sc}")[i])
-            LaserDurationC = float(getattr(obj, f"TP_Duration_{Sc}")[i])
-            LaserConditionC = str(getattr(obj, f"TP_Condition_{Sc}")[i])
-            LaserConditionProC = float(getattr(obj, f"TP_ConditionP_{Sc}")[i])
-            LaserStartC = str(getattr(obj, f"TP_LaserStart_{Sc}")[i])
-            LaserStartOffsetC = float(getattr(obj, f"TP_OffsetStart_{Sc}")[i])
-            LaserEndC = str(getattr(obj, f"TP_LaserEnd_{Sc}")[i])
-            LaserEndOffsetC = float(getattr(obj, f"TP_OffsetEnd_{Sc}")[i])
-            LaserProtocolC = str(getattr(obj, f"TP_Protocol_{Sc}")[i])
-            LaserFrequencyC = float(getattr(obj, f"TP_Frequency_{Sc}")[i])
-            LaserRampingDownC = float(getattr(obj, f"TP_RD_{Sc}")[i])
-            LaserPulseDurC = float(getattr(obj, f"TP_PulseDur_{Sc}")[i])
-
-        if Harp == "":
-            goCue_start_time_t = getattr(obj, "B_GoCueTime")[i]  # Use CPU time
-        else:
-            if hasattr(obj, "B_GoCueTimeHarp"):
-                goCue_start_time_t = getattr(obj, "B_GoCueTimeHarp")[
-                    i
-                ]  # Use Harp time, old format
-            else:
-                goCue_start_time_t = getattr(obj, "B_GoCueTimeSoundCard")[
-                    i
-                ]  # Use Harp time, new format
-
-        trial_kwargs = {
-            "start_time": getattr(obj, f"B_TrialStartTime{Harp}")[i],
-            "stop_time": getattr(obj, f"B_TrialEndTime{Harp}")[i],
-            "animal_response": obj.B_AnimalResponseHistory[i],
-            "rewarded_historyL": obj.B_RewardedHistory[0][i],
-            "rewarded_historyR": obj.B_RewardedHistory[1][i],
-            "reward_outcome_time": obj.B_RewardOutcomeTime[i],
-            "delay_start_time": _get_field(
-                obj, f"B_DelayStartTime{Harp}", index=i, default=np.nan
-            ),
-            "goCue_start_time": goCue_start_time_t,
-            "bait_left": obj.B_BaitHistory[0][i],
-            "bait_right": obj.B_BaitHistory[1][i],
-            "base_reward_probability_sum": float(obj.TP_BaseRewardSum[i]),
-            "reward_probabilityL": float(obj.B_RewardProHistory[0][i]),
-            "reward_probabilityR": float(obj.B_RewardProHistory[1][i]),
-            "reward_random_number_left": _get_field(
-                obj,
-                "B_CurrentRewardProbRandomNumber",
-                index=i,
-                default=[np.nan] * 2,
-            )[0],
-            "reward_random_number_right": _get_field(
-                obj,
-                "B_CurrentRewardProbRandomNumber",
-                index=i,
-                default=[np.nan] * 2,
-            )[1],
-            "left_valve_open_time": float(obj.TP_LeftValue[i]),
-            "right_valve_open_time": float(obj.TP_RightValue[i]),
-            "block_beta": float(obj.TP_BlockBeta[i]),
-            "block_min": float(obj.TP_BlockMin[i]),
-            "block_max": float(obj.TP_BlockMax[i]),
-            "min_reward_each_block": float(obj.TP_BlockMinReward[i]),
-            "delay_beta": float(obj.TP_DelayBeta[i]),
-            "delay_min": float(obj.TP_DelayMin[i]),
-            "delay_max": float(obj.TP_DelayMax[i]),
-            "delay_duration": obj.B_DelayHistory[i],
-            "ITI_beta": float(obj.TP_ITIBeta[i]),
-            "ITI_min": float(obj.TP_ITIMin[i]),
-            "ITI_max": float(obj.TP_ITIMax[i]),
-            "ITI_duration": obj.B_ITIHistory[i],
-            "response_duration": float(obj.TP_ResponseTime[i]),
-            "reward_consumption_duration": float(obj.TP_RewardConsumeTime[i]),
-            "reward_delay": float(
-                _get_field(obj, "TP_RewardDelay", index=i, default=0)
-            ),
-            "auto_waterL": (
-                obj.B_AutoWaterTrial[0][i]
-                if type(obj.B_AutoWaterTrial[0]) is list
-                else obj.B_AutoWaterTrial[i]
-            ),  # Back-compatible with old autowater format
-            "auto_waterR": (
-                obj.B_AutoWaterTrial[1][i]
-                if type(obj.B_AutoWaterTrial[0]) is list
-                else obj.B_AutoWaterTrial[i]
-            ),
-            # optogenetics
-            "laser_on_trial": obj.B_LaserOnTrial[i],
-            "laser_wavelength": LaserWavelengthC,
-            "laser_location": LaserLocationC,
-            "laser_1_power": Laser1Power,
-            "laser_2_power": Laser2Power,
-            "laser_on_probability": LaserOnProbablityC,
-            "laser_duration": LaserDurationC,
-            "laser_condition": LaserConditionC,
-            "laser_condition_probability": LaserConditionProC,
-            "laser_start": LaserStartC,
-            "laser_start_offset": LaserStartOffsetC,
-            "laser_end": LaserEndC,
-            "laser_end_offset": LaserEndOffsetC,
-            "laser_protocol": LaserProtocolC,
-            "laser_frequency": LaserFrequencyC,
-            "laser_rampingdown": LaserRampingDownC,
-            "laser_pulse_duration": LaserPulseDurC,
-            "session_wide_control": _get_field(
-                obj, "TP_SessionWideControl", index=i, default="None"
-            ),
-            "fraction_of_session": float(
-                _get_field(
-                    obj, "TP_FractionOfSession", index=i, default=np.nan
-                )
-            ),
-            "session_start_with": _get_field(
-                obj, "TP_SessionStartWith", index=i, default="None"
-            ),
-            "session_alternation": _get_field(
-                obj, "TP_SessionAlternating", index=i, default="None"
-            ),
-            "minimum_opto_interval": float(
-                _get_field(obj, "TP_MinOptoInterval", index=i, default=0)
-            ),
-            # add all auto training parameters (eventually should be in session.json)
-            "auto_train_engaged": _get_field(
-                obj, "TP_auto_train_engaged", index=i, default="None"
-            ),
-            "auto_train_curriculum_name": _get_field(
-                obj, "TP_auto_train_curriculum_name", index=i, default="None"
-            ),
-            "auto_train_curriculum_version": _get_field(
-                obj,
-                "TP_auto_train_curriculum_version",
-                index=i,
-                default="None",
-            ),
-            "auto_train_curriculum_schema_version": _get_field(
-                obj,
-                "TP_auto_train_curriculum_schema_version",
-                index=i,
-                default="None",
-            ),
-            "auto_train_stage": _get_field(
-                obj, "TP_auto_train_stage", index=i, default="None"
-            ),
-            "auto_train_stage_overridden": _get_field(
-                obj, "TP_auto_train_stage_overridden", index=i, default=np.nan
-            ),
-            # reward size
-            "reward_size_left": float(
-                _get_field(obj, "TP_LeftValue_volume", index=i)
-            ),
-            "reward_size_right": float(
-                _get_field(obj, "TP_RightValue_volume", index=i)
-            ),
-        }
-
-        # populate lick spouts with correct format depending if using newscale or aind stage
-        stage_positions = getattr(
-            obj, "B_StagePositions", []
-        )  # If obj doesn't have attr, skip if since i !< len([])
-        if i < len(
-            stage_positions
-        ):  # index is valid for stage position lengths
-            trial_kwargs["lickspout_position_x"] = stage_positions[i].get(
-                "x", np.nan
-            )  # nan default if keys are wrong
-            trial_kwargs["lickspout_position_z"] = stage_positions[i].get(
-                "z", np.nan
-            )  # nan default if keys are wrong
-            if list(stage_positions[i].keys()) == [
-                "x",
-                "y1",
-                "y2",
-                "z",
-            ]:  # aind stage
-                trial_kwargs["lickspout_position_y1"] = stage_positions[i][
-                    "y1"
-                ]
-                trial_kwargs["lickspout_position_y2"] = stage_positions[i][
-                    "y2"
-                ]
-            else:  # newscale stage
-                trial_kwargs["lickspout_position_y"] = stage_positions[i].get(
-                    "y", np.nan
-                )  # nan default if keys are wrong
-        else:  # if i not valid index, populate values with nan for x, y, z
-            trial_kwargs["lickspout_position_x"] = np.nan
-            trial_kwargs["lickspout_position_y"] = np.nan
-            trial_kwargs["lickspout_position_z"] = np.nan
-
-        nwbfile.add_trial(**trial_kwargs)
+    # the table is filled column by column: per-trial add_trial calls dominate the
+    # conversion time of long sessions
+    n_trials = len(obj.B_TrialEndTime)
+    trial_columns = {}
+    if n_trials > 0:
+        trial_columns = _trial_columns(obj, n_trials, Harp, aind_stage)
+        _add_trials(nwbfile, trial_columns)
 
     #######  Other time series  #######
     # left/right lick time; give left/right reward time
@@ -786,60 +913,36 @@ def bonsai_to_nwb(fname, save_folder=save_folder):
         obj, "B_PhotometryRisingTimeHarp", default=[np.nan]
     )
 
-    LeftRewardDeliveryTime = TimeSeries(
-        name="left_reward_delivery_time",
-        unit="second",
-        timestamps=B_LeftRewardDeliveryTime,
-        data=np.ones(len(B_LeftRewardDeliveryTime)).tolist(),
-        description="The reward delivery time of the left lick port",
-    )
-    nwbfile.add_acquisition(LeftRewardDeliveryTime)
-
-    RightRewardDeliveryTime = TimeSeries(
-        name="right_reward_delivery_time",
-        unit="second",
-        timestamps=B_RightRewardDeliveryTime,
-        data=np.ones(len(B_RightRewardDeliveryTime)).tolist(),
-        description="The reward delivery time of the right lick port",
-    )
-    nwbfile.add_acquisition(RightRewardDeliveryTime)
-
-    LeftLickTime = TimeSeries(
-        name="left_lick_time",
-        unit="second",
-        timestamps=B_LeftLickTime,
-        data=np.ones(len(B_LeftLickTime)).tolist(),
-        description="The time of left licks",
-    )
-    nwbfile.add_acquisition(LeftLickTime)
-
-    RightLickTime = TimeSeries(
-        name="right_lick_time",
-        unit="second",
-        timestamps=B_RightLickTime,
-        data=np.ones(len(B_RightLickTime)).tolist(),
-        description="The time of left licks",
-    )
-    nwbfile.add_acquisition(RightLickTime)
-
-    # Add photometry time stamps
-    PhotometryFallingTimeHarp = TimeSeries(
-        name="FIP_falling_time",
-        unit="second",
-        timestamps=B_PhotometryFallingTimeHarp,
-        data=np.ones(len(B_PhotometryFallingTimeHarp)).tolist(),
-        description="The time of photometry falling edge (from Harp)",
-    )
-    nwbfile.add_acquisition(PhotometryFallingTimeHarp)
-
-    PhotometryRisingTimeHarp = TimeSeries(
-        name="FIP_rising_time",
-        unit="second",
-        timestamps=B_PhotometryRisingTimeHarp,
-        data=np.ones(len(B_PhotometryRisingTimeHarp)).tolist(),
-        description="The time of photometry rising edge (from Harp)",
-    )
-    nwbfile.add_acquisition(PhotometryRisingTimeHarp)
+    for name, timestamps, description in [
+        (
+            "left_reward_delivery_time",
+            B_LeftRewardDeliveryTime,
+            "The reward delivery time of the left lick port",
+        ),
+        (
+            "right_reward_delivery_time",
+            B_RightRewardDeliveryTime,
+            "The reward delivery time of the right lick port",
+        ),
+        ("left_lick_time", B_LeftLickTime, "The time of left licks"),
+        ("right_lick_time", B_RightLickTime, "The time of left licks"),
+        # Add photometry time stamps
+        (
+            "FIP_falling_time",
+            B_PhotometryFallingTimeHarp,
+            "The time of photometry falling edge (from Harp)",
+        ),
+        (
+            "FIP_rising_time",
+            B_PhotometryRisingTimeHarp,
+            "The time of photometry rising edge (from Harp)",
+        ),
+    ]:
+        nwbfile.add_acquisition(
+            _event_series(
+                name, timestamps, description, chunk_size, compression
+            )
+        )
 
     # Add optogenetics time stamps
     """
@@ -851,13 +954,7 @@ def bonsai_to_nwb(fname, save_folder=save_folder):
     start_time = np.array(
         _get_field(obj, f"B_TrialStartTime{Harp}", default=[np.nan])
     )
-    LaserStart = []
-    for i in range(len(obj.B_TrialEndTime)):
-        Sc = obj.B_SelectedCondition[i]  # the optogenetics conditions
-        if Sc == 0:
-            LaserStart.append("None")
-            continue
-        LaserStart.append(str(getattr(obj, f"TP_LaserStart_{Sc}")[i]))
+    LaserStart = trial_columns.get("laser_start", [])
     OptogeneticsTimeHarp_ITI_Stimulation = start_time[
         np.array(LaserStart) == "Trial start"
     ].tolist()
@@ -868,12 +965,12 @@ def bonsai_to_nwb(fname, save_folder=save_folder):
         OptogeneticsTimeHarp_ITI_Stimulation + OptogeneticsTimeHarp_other
     )
     B_OptogeneticsTimeHarp.sort()
-    OptogeneticsTimeHarp = TimeSeries(
-        name="optogenetics_time",
-        unit="second",
-        timestamps=B_OptogeneticsTimeHarp,
-        data=np.ones(len(B_OptogeneticsTimeHarp)).tolist(),
-        description="Optogenetics start time (from Harp)",
+    OptogeneticsTimeHarp = _event_series(
+        "optogenetics_time",
+        B_OptogeneticsTimeHarp,
+        "Optogenetics start time (from Harp)",
+        chunk_size,
+        compression,
     )
     nwbfile.add_acquisition(OptogeneticsTimeHarp)
 
@@ -1,4 +1,5 @@
 import logging
+import traceback
 
 import numpy as np
 from matplotlib.backends.backend_qt5agg import (
@@ -6,10 +7,81 @@ from matplotlib.backends.backend_qt5agg import (
 )
 from matplotlib.figure import Figure
 from matplotlib.gridspec import GridSpec
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy import stats
 
+from foraging_gui.trial_store import GrowableArray
+
+
+class _ArtistSeries:
+    """
+    Points of one series of the choice plot. ``line`` holds every point and is drawn on full
+    redraws, ``new_points`` only holds the points added since the figure was last drawn and
+    is drawn on top of the cached background.
+    """
+
+    def __init__(self, ax, y, fmt, style):
+        """
+        :param ax: axes to plot on
+        :param y: constant y position of the markers, None for series with a value per point
+        :param fmt: matplotlib format string
+        :param style: keyword arguments passed to ``ax.plot``
+        """
+        self.ax = ax
+        self.y = y
+        self.x_values = GrowableArray(dtype=float)
+        self.y_values = GrowableArray(dtype=float)
+        self.x_max = -np.inf
+        (self.line,) = ax.plot([], [], fmt, **style)
+        new_style = {k: v for k, v in style.items() if k != "label"}
+        (self.new_points,) = ax.plot([], [], fmt, animated=True, **new_style)
+        self.drawn = 0  # points already on the cached background
+
+    def extend(self, x, y=None):
+        x = np.asarray(x, dtype=float)
+        if x.size == 0:
+            return
+        if y is None:
+            y = np.full(x.shape, self.y, dtype=float)
+        self.x_values.extend(x)
+        self.y_values.extend(y)
+        self.x_max = max(self.x_max, np.nanmax(x, initial=-np.inf))
+        self.line.set_data(self.x_values.view(), self.y_values.view())
+
+    def draw_new(self):
+        """Draw the points added since the last draw"""
+        n = len(self.x_values)
+        if n == self.drawn:
+            return
+        # lines start from the last drawn point so that the segments connect
+        start = self.drawn if self.y is not None else max(self.drawn - 1, 0)
+        self.new_points.set_data(
+            self.x_values.view()[start:], self.y_values.view()[start:]
+        )
+        self.ax.draw_artist(self.new_points)
+        self.drawn = n
+
 
 class PlotV(FigureCanvas):
+    # Colors for different optogenetics conditions
+    color_mapping = {
+        "Condition1": (0, 191 / 255, 255 / 255, 1),  # Deep Sky Blue
+        "Condition2": (255 / 255, 127 / 255, 80 / 255, 1),  # Coral Red
+        "Condition3": (34 / 255, 139 / 255, 34 / 255, 1),  # Forest Green
+        "Condition4": (218 / 255, 165 / 255, 32 / 255, 1),  # Goldenrod
+        "Condition5": (255 / 255, 0 / 255, 0 / 255, 1),  # Red
+        "Condition6": (0 / 255, 0 / 255, 255 / 255, 1),  # Blue
+    }
+    # event histories plotted as markers, relative to the first trial start
+    event_series = {
+        "auto_left": "B_AutoLeftWaterStartTime",
+        "auto_right": "B_AutoRightWaterStartTime",
+        "manual_left": "B_ManualLeftWaterStartTime",
+        "manual_right": "B_ManualRightWaterStartTime",
+        "left_lick": "B_LeftLickTime",
+        "right_lick": "B_RightLickTime",
+    }
+
     def __init__(
         self,
         win,
@@ -39,6 +111,14 @@ class PlotV(FigureCanvas):
         self.StepSize = 5
         self.MarkerSize = 3
         self.main_win = win
+        self.kernel_size = 10
+        # update persistent artists with the new trials only instead of clearing the axes
+        self.persistent_artists = True
+        # the x axis is extended by this factor when the data reach its end
+        self.x_headroom = 1.5
+        self._series = None
+        self._background = None
+        self.mpl_connect("draw_event", self._on_draw)
 
         self.setMinimumWidth(650)
 
@@ -47,12 +127,20 @@ class PlotV(FigureCanvas):
             # If we have no trials, clear the plots
             self.ax1.cla()
             self.ax2.cla()
+            self._series = None
             self.draw()
             return
 
         if Channel is not None:
             GeneratedTrials._get_irregular_timestamp(Channel, self.main_win.data_lock)
 
+        if self.persistent_artists:
+            try:
+                self._UpdateArtists(GeneratedTrials)
+            except Exception:
+                logging.error(traceback.format_exc())
+            return
+
         # Unpack data
         self.B_AnimalResponseHistory = GeneratedTrials.B_AnimalResponseHistory
         self.B_LickPortN = GeneratedTrials.B_LickPortN
@@ -185,16 +273,7 @@ class PlotV(FigureCanvas):
 
     def _PlotChoice(self):
         self.ax1.cla()
-
-        # Colors for different optogenetics conditions
-        color_mapping = {
-            "Condition1": (0, 191 / 255, 255 / 255, 1),  # Deep Sky Blue
-            "Condition2": (255 / 255, 127 / 255, 80 / 255, 1),  # Coral Red
-            "Condition3": (34 / 255, 139 / 255, 34 / 255, 1),  # Forest Green
-            "Condition4": (218 / 255, 165 / 255, 32 / 255, 1),  # Goldenrod
-            "Condition5": (255 / 255, 0 / 255, 0 / 255, 1),  # Red
-            "Condition6": (0 / 255, 0 / 255, 255 / 255, 1),  # Blue
-        }
+        color_mapping = self.color_mapping
 
         # Define trial types
         LeftChoice_Rewarded = np.where(
@@ -223,7 +302,6 @@ class PlotV(FigureCanvas):
         )
 
         # running average of choice
-        self.kernel_size = 10
         ResponseHistoryT = self.B_AnimalResponseHistory.copy()
         ResponseHistoryT[ResponseHistoryT == 2] = np.nan
         ResponseHistoryF = ResponseHistoryT.copy()
@@ -553,7 +631,10 @@ class PlotV(FigureCanvas):
         )
         self.draw()
 
-    def _UpdateAxis(self):
+    def _UpdateAxis(self, legend_handles=(None, None)):
+        """
+        :param legend_handles: artists listed in the ax1 and ax2 legends, None for all labeled
+        """
         self.ax1.set_yticks([0, 1])
         self.ax1.set_yticklabels(["L", "R"])
         self.ax1.set_ylim(-0.6, 1.6)
@@ -564,8 +645,417 @@ class PlotV(FigureCanvas):
         self.ax2.set_ylim(-0.05, 1.05)
         # self.ax2.yaxis.set_inverted(True)
 
-        self.ax1.legend(bbox_to_anchor=(1, 1), loc="upper left", fontsize=6)
-        self.ax2.legend(bbox_to_anchor=(1, 0), loc="lower left", fontsize=6)
+        if legend_handles[0] != []:
+            self.ax1.legend(
+                handles=legend_handles[0],
+                bbox_to_anchor=(1, 1),
+                loc="upper left",
+                fontsize=6,
+            )
+        if legend_handles[1] != []:
+            self.ax2.legend(
+                handles=legend_handles[1],
+                bbox_to_anchor=(1, 0),
+                loc="lower left",
+                fontsize=6,
+            )
+
+    def _series_specs(self):
+        """Axes, constant y (None for a value per point), format and style of each series"""
+        ms = self.MarkerSize
+        green = (0, 1, 0, 1)
+        white = (1, 1, 1, 1)
+        return {
+            # block structure
+            "p_L": ("ax2", None, "r", dict(label="p_L", alpha=1)),
+            "p_R": ("ax2", None, "b", dict(label="p_R", alpha=1)),
+            "p_R_frac": (
+                "ax2",
+                None,
+                "y",
+                dict(linestyle=":", label="p_R_frac", alpha=0.8),
+            ),
+            # water
+            "auto_left": (
+                "ax1",
+                0.4,
+                "bo",
+                dict(markerfacecolor=green, markersize=ms),
+            ),
+            "auto_right": (
+                "ax1",
+                0.6,
+                "bo",
+                dict(markerfacecolor=green, markersize=ms, label="AutoWater"),
+            ),
+            "manual_left": (
+                "ax1",
+                0.3,
+                "bs",
+                dict(markerfacecolor=green, markersize=ms),
+            ),
+            "manual_right": (
+                "ax1",
+                0.7,
+                "bs",
+                dict(
+                    markerfacecolor=green, markersize=ms, label="ManualWater"
+                ),
+            ),
+            # choices
+            "left_bait": ("ax1", -0.2, "kD", dict(markersize=ms, alpha=0.2)),
+            "right_bait": ("ax1", 1.2, "kD", dict(markersize=ms, alpha=0.2)),
+            "left_choice": (
+                "ax1",
+                0,
+                "go",
+                dict(markerfacecolor=white, label="Choice", markersize=ms),
+            ),
+            "left_rewarded": (
+                "ax1",
+                0.2,
+                "go",
+                dict(markerfacecolor=green, label="Rewarded", markersize=ms),
+            ),
+            "right_choice": (
+                "ax1",
+                1,
+                "go",
+                dict(markerfacecolor=white, markersize=ms),
+            ),
+            "right_rewarded": (
+                "ax1",
+                0.8,
+                "go",
+                dict(markerfacecolor=green, markersize=ms),
+            ),
+            "no_response": (
+                "ax1",
+                0.5,
+                "Xk",
+                dict(label="NoResponse", markersize=ms, alpha=0.2),
+            ),
+            # running averages
+            "choice_frac": (
+                "ax2",
+                None,
+                "k",
+                dict(label="Choice_frac", linewidth=2, alpha=0.8),
+            ),
+            "reward_frac": (
+                "ax2",
+                None,
+                "g",
+                dict(label="reward_frac", linewidth=1, alpha=0.8),
+            ),
+            "finish_frac": (
+                "ax2",
+                None,
+                "c",
+                dict(label="finish_frac", alpha=0.2),
+            ),
+            # licks
+            "left_lick": ("ax1", -0.4, "k|", {}),
+            "right_lick": ("ax1", 1.4, "k|", {}),
+        }
+
+    def _reset_artists(self, source):
+        """
+        Clear the axes and create the persistent artists for a session
+        :param source: GenerateTrials object of the session
+        """
+        self.ax1.cla()
+        self.ax2.cla()
+        self._trials_source = source
+        self._series = {}
+        for name, (ax_name, y, fmt, style) in self._series_specs().items():
+            self._series[name] = _ArtistSeries(
+                getattr(self, ax_name), y, fmt, style
+            )
+        # number of trials/events already added to the series
+        self._plotted = {"trials": 0, "bait": 0, "opto": 0}
+        self._plotted.update({name: 0 for name in self.event_series})
+        self._legend_labels = set()
+        self._background = None
+        self._xlim = None
+
+        # markers of the upcoming trial, redrawn on every update
+        ms = self.MarkerSize
+        upcoming = dict(animated=True)
+        self._upcoming = {
+            "trial": self.ax1.plot(
+                [],
+                [],
+                color="k",
+                linewidth=2,
+                alpha=0.3,
+                label="UpcomingTrial",
+                **upcoming,
+            )[0],
+            "trial_ax2": self.ax2.plot(
+                [], [], color="k", linewidth=2, alpha=0.3, **upcoming
+            )[0],
+            "left_bait": self.ax1.plot(
+                [],
+                [],
+                "kD",
+                label="Reward available",
+                markersize=ms,
+                alpha=0.4,
+                **upcoming,
+            )[0],
+            "right_bait": self.ax1.plot(
+                [], [], "kD", markersize=ms, alpha=0.4, **upcoming
+            )[0],
+            "laser": self.ax1.plot(
+                [], [], "o", markersize=ms, alpha=1, **upcoming
+            )[0],
+            "auto_left": self.ax1.plot(
+                [],
+                [],
+                "bo",
+                markerfacecolor=(0, 1, 0, 1),
+                markersize=ms,
+                **upcoming,
+            )[0],
+            "auto_right": self.ax1.plot(
+                [],
+                [],
+                "bo",
+                markerfacecolor=(0, 1, 0, 1),
+                markersize=ms,
+                **upcoming,
+            )[0],
+        }
+        self._upcoming_x = -np.inf
+
+    def _UpdateArtists(self, GeneratedTrials):
+        """
+        Add the trials and events received since the last update to the persistent artists
+        and draw only those on top of the cached background (blitting). The whole figure is
+        redrawn when the x range or the legend changes.
+        """
+        # snapshots of the trial updates refer to the GenerateTrials object they come from
+        source = getattr(GeneratedTrials, "source", GeneratedTrials)
+        if (
+            self._series is None
+            or source is not self._trials_source
+            or len(GeneratedTrials.B_AnimalResponseHistory)
+            < self._plotted["trials"]
+        ):
+            self._reset_artists(source)
+
+        trial_start = GeneratedTrials.B_TrialStartTime
+        if len(trial_start) > 0:
+            t0 = trial_start[0]
+            self._add_trials(GeneratedTrials, t0)
+            for name, attr_name in self.event_series.items():
+                times = getattr(GeneratedTrials, attr_name)
+                if len(times) < self._plotted[name]:
+                    self._plotted[name] = 0
+                self._series[name].extend(times[self._plotted[name] :] - t0)
+                self._plotted[name] = len(times)
+        self._set_upcoming_trial(GeneratedTrials)
+
+        x_max = max(
+            [self._upcoming_x]
+            + [series.x_max for series in self._series.values()]
+        )
+        if (
+            self._background is None
+            or self._update_legend_labels()
+            or self.ax1.get_xlim() != self._xlim
+            or x_max > self._xlim[1]
+        ):
+            self._redraw(x_max)
+            return
+        self.restore_region(self._background)
+        for series in self._series.values():
+            series.draw_new()
+        self._background = self.copy_from_bbox(self.fig.bbox)
+        self._draw_upcoming_trial()
+        # schedule a paint of the updated buffer; blit() repaints synchronously, which is
+        # not allowed from the plotting worker thread
+        self.update()
+
+    def _add_trials(self, GeneratedTrials, t0):
+        """Add the finished trials not plotted yet"""
+        n = min(
+            len(GeneratedTrials.B_AnimalResponseHistory),
+            len(GeneratedTrials.B_RewardOutcomeTime),
+        )
+        start = self._plotted["trials"]
+        if n > start:
+            time = GeneratedTrials.B_RewardOutcomeTime[start:n] - t0
+            response = GeneratedTrials.B_AnimalResponseHistory[start:n]
+            rewarded = GeneratedTrials.B_RewardedHistory[:, start:n] == True
+            series = self._series
+            series["left_choice"].extend(time[response == 0])
+            series["left_rewarded"].extend(time[(response == 0) & rewarded[0]])
+            series["right_choice"].extend(time[response == 1])
+            series["right_rewarded"].extend(
+                time[(response == 1) & rewarded[1]]
+            )
+            series["no_response"].extend(time[response == 2])
+
+            reward_prob = GeneratedTrials.B_RewardProHistory[:, start:n]
+            series["p_L"].extend(time, reward_prob[0])
+            series["p_R"].extend(time, reward_prob[1])
+            series["p_R_frac"].extend(
+                time, reward_prob[1] / reward_prob.sum(axis=0)
+            )
+            self._add_running_averages(GeneratedTrials, t0, n)
+            self._plotted["trials"] = n
+
+        # bait and laser of the finished trials
+        bait = GeneratedTrials.B_BaitHistory
+        stop = min(n, bait.shape[1])
+        start = self._plotted["bait"]
+        if stop > start:
+            time = GeneratedTrials.B_RewardOutcomeTime[start:stop] - t0
+            self._series["left_bait"].extend(time[bait[0, start:stop] == True])
+            self._series["right_bait"].extend(
+                time[bait[1, start:stop] == True]
+            )
+            self._plotted["bait"] = stop
+        stop = min(n, len(GeneratedTrials.B_LaserOnTrial) - 1)
+        start = self._plotted["opto"]
+        if stop > start:
+            time = GeneratedTrials.B_RewardOutcomeTime[start:stop] - t0
+            laser_on = np.asarray(GeneratedTrials.B_LaserOnTrial[start:stop])
+            condition = np.asarray(
+                GeneratedTrials.B_SelectedCondition[start:stop]
+            )
+            for c in np.unique(condition[laser_on == 1]):
+                self._opto_series(c).extend(
+                    time[(laser_on == 1) & (condition == c)]
+                )
+            self._plotted["opto"] = stop
+
+    def _add_running_averages(self, GeneratedTrials, t0, n):
+        """Add the running averages of the windows ending on the new trials"""
+        k = self.kernel_size
+        first = max(self._plotted["trials"], k - 1)
+        if n <= first:
+            return
+        response = GeneratedTrials.B_AnimalResponseHistory[first - k + 1 : n]
+        rewarded = GeneratedTrials.B_RewardedHistory[:, first - k + 1 : n]
+        choice = np.where(response == 2, np.nan, response)
+        reward = response.astype(float)
+        reward[(rewarded[0] == 1) & (rewarded[1] == 0)] = 0
+        reward[(rewarded[1] == 1) & (rewarded[0] == 0)] = 1
+        reward[(rewarded[1] == 0) & (rewarded[0] == 0)] = np.nan
+        finish = np.where(response == 2, 0.0, 1.0)
+        time = GeneratedTrials.B_RewardOutcomeTime[first:n] - t0
+        for name, values in (
+            ("choice_frac", choice),
+            ("reward_frac", reward),
+            ("finish_frac", finish),
+        ):
+            windows = sliding_window_view(values, k)
+            counts = np.sum(~np.isnan(windows), axis=1)
+            with np.errstate(invalid="ignore"):
+                means = np.nansum(windows, axis=1) / counts
+            self._series[name].extend(time, means)
+
+    def _opto_series(self, condition) -> _ArtistSeries:
+        name = f"opto_{condition}"
+        if name not in self._series:
+            color = self.color_mapping["Condition" + str(condition)]
+            self._series[name] = _ArtistSeries(
+                self.ax1,
+                1.5,
+                "o",
+                dict(
+                    markeredgecolor=color,
+                    markerfacecolor=color,
+                    label="Opto condition " + str(condition),
+                    markersize=self.MarkerSize,
+                    alpha=1,
+                ),
+            )
+        return self._series[name]
+
+    def _set_upcoming_trial(self, GeneratedTrials):
+        """Place the markers of the upcoming trial"""
+        for artist in self._upcoming.values():
+            artist.set_data([], [])
+        self._upcoming_x = -np.inf
+        bait = GeneratedTrials.B_BaitHistory
+        if bait.shape[1] <= len(GeneratedTrials.B_AnimalResponseHistory):
+            return
+        trial_end = GeneratedTrials.B_TrialEndTime
+        if trial_end.size != 0:
+            Delta = trial_end[-1] - GeneratedTrials.B_TrialStartTime[0]
+            last_end = Delta + 0.02 * Delta
+        else:
+            last_end = 2
+        if GeneratedTrials.B_CurrentTrialN > 0:
+            NewTrialStart = last_end
+            NewTrialStart2 = last_end + last_end / 40
+        else:
+            NewTrialStart = last_end + 0.1
+            NewTrialStart2 = last_end
+        self._upcoming_x = max(NewTrialStart, NewTrialStart2)
+        upcoming = self._upcoming
+        upcoming["trial"].set_data([NewTrialStart] * 2, [-0.5, 1.5])
+        upcoming["trial_ax2"].set_data([NewTrialStart] * 2, [-0.5, 1.5])
+        if bait[0][-1] == True:
+            upcoming["left_bait"].set_data([NewTrialStart2], [-0.2])
+        if bait[1][-1] == True:
+            upcoming["right_bait"].set_data([NewTrialStart2], [1.2])
+        if GeneratedTrials.B_LaserOnTrial[-1] == 1:
+            color = self.color_mapping[
+                "Condition" + str(GeneratedTrials.B_SelectedCondition[-1])
+            ]
+            upcoming["laser"].set_color(color)
+            upcoming["laser"].set_data([NewTrialStart2], [1.5])
+        if GeneratedTrials.B_AutoWaterTrial[0][-1] == 1:
+            upcoming["auto_left"].set_data([NewTrialStart2], [0.4])
+        if GeneratedTrials.B_AutoWaterTrial[1][-1] == 1:
+            upcoming["auto_right"].set_data([NewTrialStart2], [0.6])
+
+    def _draw_upcoming_trial(self):
+        for artist in self._upcoming.values():
+            artist.axes.draw_artist(artist)
+
+    def _update_legend_labels(self) -> bool:
+        """Add the labels of artists that got data, return True if the legend changed"""
+        artists = [series.line for series in self._series.values()] + list(
+            self._upcoming.values()
+        )
+        n_labels = len(self._legend_labels)
+        for artist in artists:
+            label = artist.get_label()
+            if label.startswith("_") or label in self._legend_labels:
+                continue
+            if len(artist.get_xdata()):
+                self._legend_labels.add(label)
+        return len(self._legend_labels) > n_labels
+
+    def _redraw(self, x_max):
+        """Redraw the whole figure with room for the upcoming trials"""
+        right = max(x_max * self.x_headroom, 60)
+        self.ax1.set_xlim(-0.02 * right, right)
+        self._xlim = self.ax1.get_xlim()
+        handles = ([], [])
+        artists = [series.line for series in self._series.values()] + list(
+            self._upcoming.values()
+        )
+        for artist in artists:
+            if artist.get_label() in self._legend_labels:
+                handles[artist.axes is self.ax2].append(artist)
+        self._UpdateAxis(legend_handles=handles)
+        self.draw()
+
+    def _on_draw(self, event):
+        """Cache the background after a full draw and draw the upcoming trial on top"""
+        if not self.persistent_artists or self._series is None:
+            return
+        self._background = self.copy_from_bbox(self.fig.bbox)
+        for series in self._series.values():
+            series.drawn = len(series.x_values)
+        self._draw_upcoming_trial()
 
 
 class PlotWaterCalibration(FigureCanvas):
@@ -0,0 +1,1303 @@
+"""
+Micro-benchmarks for the hot paths of the GUI that do not need a rig.
+
+Run e.g. ``python -m foraging_gui.benchmarks irregular_timestamps``
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+
+import numpy as np
+
+from foraging_gui.test_session_statistics import (
+    full_session_statistics,
+    session_histories,
+    synthetic_session,
+)
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register a benchmark under its function name"""
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def _time_it(func, repeat=5):
+    """Return the best wall time of func over repeat runs"""
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _synthetic_osc_burst(n_messages, seed=0):
+    """Burst of irregular-event messages dominated by photometry edges"""
+    from foraging_gui.MyFunctions import IRREGULAR_EVENT_HISTORIES
+    from foraging_gui.rigcontrol import RigMessage
+
+    rng = np.random.default_rng(seed)
+    addresses = list(IRREGULAR_EVENT_HISTORIES)
+    # 20 Hz photometry rising/falling edges make up most of the traffic
+    p = np.full(len(addresses), 0.1 / (len(addresses) - 2))
+    p[addresses.index("/PhotometryRising")] = 0.45
+    p[addresses.index("/PhotometryFalling")] = 0.45
+    picks = rng.choice(len(addresses), size=n_messages, p=p / p.sum())
+    times = np.cumsum(rng.exponential(0.025, size=n_messages))
+    return [RigMessage(addresses[i], t, [t]) for i, t in zip(picks, times)]
+
+
+class _BurstChannel:
+    """Stand-in for RigClient holding pre-built messages"""
+
+    def __init__(self, messages):
+        from foraging_gui.rigcontrol import RigClient
+
+        self.msgs = queue.Queue()
+        for msg in messages:
+            self.msgs.put(msg)
+        self.receive = RigClient.receive.__get__(self)
+        self.receive_all = RigClient.receive_all.__get__(self)
+
+
+def _empty_event_store():
+    """Object carrying only the histories _get_irregular_timestamp touches"""
+    from foraging_gui.MyFunctions import (
+        ENVIRONMENT_SENSOR_HISTORIES,
+        IRREGULAR_EVENT_HISTORIES,
+        GenerateTrials,
+    )
+
+    store = GenerateTrials.__new__(GenerateTrials)
+    for attr_name in IRREGULAR_EVENT_HISTORIES.values():
+        setattr(store, attr_name, np.array([]).astype(float))
+    for attr_name, _ in ENVIRONMENT_SENSOR_HISTORIES.values():
+        setattr(store, attr_name, [])
+    return store
+
+
+@benchmark
+def irregular_timestamps(sessions=(), n_messages=20000, repeat=5):
+    """Per-message if/elif + np.append versus batched table dispatch"""
+    from foraging_gui.MyFunctions import IRREGULAR_EVENT_HISTORIES
+
+    messages = _synthetic_osc_burst(n_messages)
+    data_lock = threading.Lock()
+
+    def legacy():
+        # one lock acquisition and one full array copy per message
+        channel = _BurstChannel(messages)
+        histories = {
+            name: np.array([]).astype(float)
+            for name in IRREGULAR_EVENT_HISTORIES.values()
+        }
+        while not channel.msgs.empty():
+            Rec = channel.receive()
+            for address, attr_name in IRREGULAR_EVENT_HISTORIES.items():
+                if Rec.address == address:
+                    with data_lock:
+                        histories[attr_name] = np.append(
+                            histories[attr_name], Rec.value
+                        )
+                    break
+
+    def batched():
+        channel = _BurstChannel(messages)
+        store = _empty_event_store()
+        store._get_irregular_timestamp(channel, data_lock)
+
+    t_legacy = _time_it(legacy, repeat)
+    t_batched = _time_it(batched, repeat)
+    print(
+        f"{n_messages} messages: legacy {t_legacy * 1e3:.1f} ms, "
+        f"batched {t_batched * 1e3:.1f} ms, "
+        f"speedup x{t_legacy / t_batched:.1f}"
+    )
+
+
+def _load_session(path):
+    """Load a recorded session json"""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+@benchmark
+def session_statistics(sessions=()):
+    """Incremental SessionStatistics versus whole-history recomputation"""
+    from foraging_gui.session_statistics import SessionStatistics
+
+    objs = [_load_session(path) for path in sessions] or [synthetic_session()]
+    for obj in objs:
+        response, rewarded, auto_water, volumes, multipliers = (
+            session_histories(obj)
+        )
+        n = len(response)
+        stats = SessionStatistics()
+        t_incremental = t_full = 0
+        for trial in range(1, n + 1):
+            start = time.perf_counter()
+            stats.update(
+                response[:trial],
+                rewarded[:, :trial],
+                auto_water,
+                volumes,
+                multipliers,
+            )
+            t_incremental += time.perf_counter() - start
+            start = time.perf_counter()
+            full = full_session_statistics(
+                response[:trial],
+                rewarded[:, :trial],
+                auto_water[:, :trial],
+                volumes,
+                multipliers,
+            )
+            t_full += time.perf_counter() - start
+        for key, value in full.items():
+            assert np.allclose(getattr(stats, key), value), key
+        print(
+            f"{n} trials match; per trial: incremental "
+            f"{t_incremental / n * 1e6:.1f} us, full {t_full / n * 1e6:.1f} us"
+        )
+
+
+@benchmark
+def foraging_efficiency(sessions=(), n_trials=1000, checkpoint_every=50):
+    """
+    Running ForagingEfficiency updated after every trial versus compute_foraging_efficiency
+    on the whole history, with and without baiting
+    """
+    from aind_dynamic_foraging_basic_analysis import (
+        compute_foraging_efficiency,
+    )
+
+    from foraging_gui.foraging_efficiency import ForagingEfficiency
+
+    rng = np.random.default_rng(0)
+    synthetic = synthetic_session(n_trials)
+    # reward probabilities in blocks of 20 to 40 trials, as the optimal forager expects
+    block_ends = np.cumsum(rng.integers(20, 41, size=n_trials))
+    blocks = rng.choice([0.1, 0.4, 0.7], size=(2, len(block_ends)))
+    in_block = np.searchsorted(
+        block_ends, np.arange(n_trials + 1), side="right"
+    )
+    objs = [_load_session(path) for path in sessions] or [
+        synthetic,
+        dict(synthetic, B_RewardProHistory=blocks[:, in_block].tolist()),
+    ]
+    for obj in objs:
+        response = np.array(obj["B_AnimalResponseHistory"], dtype=float)
+        n = len(response)
+        rewarded = np.array(obj["B_RewardedHistory"], dtype=bool)[:, :n]
+        auto_water = np.array(obj["B_AutoWaterTrial"])[:, :n]
+        reward_prob = np.array(obj["B_RewardProHistory"], dtype=float)[:, :n]
+        random_number = np.array(
+            obj["B_CurrentRewardProbRandomNumber"], dtype=float
+        ).T[:, :n]
+        for baited in (False, True):
+            efficiency = ForagingEfficiency()
+            t_incremental = np.zeros(n)
+            t_full = {}
+            for trial in range(1, n + 1):
+                start = time.perf_counter()
+                running = efficiency.update(
+                    baited,
+                    response[:trial],
+                    rewarded[:, :trial],
+                    reward_prob[:, :trial],
+                    random_number[:, :trial],
+                    auto_water[:, :trial],
+                )
+                t_incremental[trial - 1] = time.perf_counter() - start
+                if trial % checkpoint_every and trial != n:
+                    continue
+                start = time.perf_counter()
+                full = compute_foraging_efficiency(
+                    baited=baited,
+                    choice_history=np.where(
+                        response[:trial] == 2, np.nan, response[:trial]
+                    ),
+                    reward_history=rewarded[0, :trial] | rewarded[1, :trial],
+                    p_reward=reward_prob[:, :trial],
+                    random_number=random_number[:, :trial],
+                    autowater_offered=np.any(
+                        auto_water[:, :trial] == 1, axis=0
+                    ),
+                )
+                t_full[trial] = time.perf_counter() - start
+                assert np.allclose(
+                    running, full, equal_nan=True
+                ), f"trial {trial}, baited {baited}: {running} != {full}"
+            tenth = max(n // 10, 1)
+            print(
+                f"{n} trials, baited {baited}, match at every {checkpoint_every} "
+                f"trials; per trial: incremental "
+                f"{np.mean(t_incremental[:tenth]) * 1e6:.0f} us (first tenth), "
+                f"{np.mean(t_incremental[-tenth:]) * 1e6:.0f} us (last tenth); "
+                f"full {t_full[min(t_full)] * 1e6:.0f} us at trial {min(t_full)}, "
+                f"{t_full[n] * 1e6:.0f} us at trial {n}"
+            )
+
+
+def _synthetic_plot_trials(n_trials, seed=0):
+    """Full histories of a session as plotted by PlotV, one row per upcoming trial too"""
+    rng = np.random.default_rng(seed)
+    session = synthetic_session(n_trials + 1, seed)
+    trial_start = np.cumsum(rng.uniform(3, 8, size=n_trials + 1))
+    left_licks = np.sort(rng.uniform(0, trial_start[-1], size=3 * n_trials))
+    right_licks = np.sort(rng.uniform(0, trial_start[-1], size=3 * n_trials))
+    return {
+        "B_AnimalResponseHistory": np.array(
+            session["B_AnimalResponseHistory"]
+        ),
+        "B_RewardedHistory": np.array(session["B_RewardedHistory"]),
+        "B_AutoWaterTrial": np.array(session["B_AutoWaterTrial"]),
+        "B_RewardProHistory": np.array(session["B_RewardProHistory"]),
+        "B_BaitHistory": rng.random((2, n_trials + 1)) < 0.3,
+        "B_LaserOnTrial": (rng.random(n_trials + 1) < 0.2).astype(int),
+        "B_SelectedCondition": rng.integers(1, 3, size=n_trials + 1),
+        "B_TrialStartTime": trial_start,
+        "B_TrialEndTime": trial_start + 2.5,
+        "B_RewardOutcomeTime": trial_start + 1.5,
+        "B_LeftLickTime": left_licks,
+        "B_RightLickTime": right_licks,
+    }
+
+
+def _set_plot_trials(trials, full, n):
+    """Show the first n finished trials of full plus the upcoming trial"""
+    for name, values in full.items():
+        if name in ("B_LeftLickTime", "B_RightLickTime"):
+            values = values[values < full["B_TrialEndTime"][max(n - 1, 0)]]
+        elif name in (
+            "B_BaitHistory",
+            "B_LaserOnTrial",
+            "B_SelectedCondition",
+            "B_AutoWaterTrial",
+            "B_RewardProHistory",
+        ):
+            values = values[..., : n + 1]
+        else:
+            values = values[..., :n]
+        setattr(trials, name, values)
+    trials.B_CurrentTrialN = n
+    for name in (
+        "B_AutoLeftWaterStartTime",
+        "B_AutoRightWaterStartTime",
+        "B_ManualLeftWaterStartTime",
+        "B_ManualRightWaterStartTime",
+        "B_EarnedLeftWaterStartTime",
+        "B_EarnedRightWaterStartTime",
+    ):
+        setattr(trials, name, np.array([]))
+    for name in (
+        "B_LickPortN",
+        "B_ITIHistory",
+        "B_DelayHistory",
+        "B_CurrentRewardProb",
+        "B_AnimalCurrentResponse",
+    ):
+        setattr(trials, name, None)
+
+
+@benchmark
+def plot_update(
+    sessions=(), n_trials=1500, checkpoints=(10, 100, 500, 1000, 1500)
+):
+    """
+    PlotV._Update redraw time per trial, clearing the axes versus persistent artists.
+    Persistent artist times are the median of the 10 trials up to each checkpoint, as the
+    occasional full redraw when the x axis is extended is amortized over many trials.
+    """
+    import os
+    import types
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    from foraging_gui.Visualization import PlotV
+
+    app = QApplication.instance() or QApplication([])  # noqa: F841
+    full = _synthetic_plot_trials(n_trials)
+    times = {checkpoint: [] for checkpoint in checkpoints}
+    for persistent in (False, True):
+        plot = PlotV(win=None, width=5, height=4)
+        plot.persistent_artists = persistent
+        plot.resize(650, 400)
+        trials = types.SimpleNamespace()
+        for n in range(1, n_trials + 1):
+            if not persistent and n not in checkpoints:
+                # clearing the axes redraws everything, no need to replay all trials
+                continue
+            _set_plot_trials(trials, full, n)
+            start = time.perf_counter()
+            plot._Update(GeneratedTrials=trials)
+            elapsed = time.perf_counter() - start
+            if not persistent:
+                times[n].append(elapsed)
+            else:
+                for checkpoint in checkpoints:
+                    if checkpoint - 10 < n <= checkpoint:
+                        times[checkpoint].append(elapsed)
+    print("trial  clear axes  persistent artists")
+    for n in checkpoints:
+        print(
+            f"{n:5d}  {times[n][0] * 1e3:7.1f} ms  "
+            f"{np.median(times[n][1:]) * 1e3:7.1f} ms"
+        )
+
+
+def _synthetic_biased_choices(n_trials=1000, bias=0.5, seed=0):
+    """Choices of a win-stay agent with a side bias and 10% no-response trials"""
+    rng = np.random.default_rng(seed)
+    response = np.zeros(n_trials)
+    rewarded = np.zeros((2, n_trials), dtype=bool)
+    previous = 0
+    for trial in range(n_trials):
+        logit = bias + (1.0 if previous > 0 else -1.0 if previous < 0 else 0)
+        choice = int(rng.random() < 1 / (1 + np.exp(-logit)))
+        if rng.random() < 0.1:
+            response[trial] = 2
+            previous = 0
+            continue
+        response[trial] = choice
+        rewarded[choice, trial] = rng.random() < 0.4
+        previous = (2 * choice - 1) * rewarded[choice, trial]
+    return {
+        "B_AnimalResponseHistory": response.tolist(),
+        "B_RewardedHistory": rewarded.tolist(),
+    }
+
+
+@benchmark
+def bias_fit(sessions=(), n_trial_back=5, n_full_timed=5):
+    """
+    Warm-started Newton fit with Fisher-information CIs versus fit_logistic_regression, at
+    the trials the GUI fits the bias (every 10 trials after 20, last 200 trials)
+    """
+    from aind_dynamic_foraging_models.logistic_regression import (
+        fit_logistic_regression,
+    )
+
+    from foraging_gui.bias_estimator import IncrementalBiasEstimator
+
+    objs = [_load_session(path) for path in sessions] or [
+        _synthetic_biased_choices()
+    ]
+    for obj in objs:
+        response = np.array(obj["B_AnimalResponseHistory"], dtype=float)
+        choice = np.where(response == 2, np.nan, response)
+        reward = np.any(np.array(obj["B_RewardedHistory"]), axis=0)
+        reward = reward[: len(choice)].astype(int)
+        estimator = IncrementalBiasEstimator()
+        fit_trials = [n for n in range(30, len(choice) + 1, 10) if n > 20]
+        timed = set(fit_trials[:: max(len(fit_trials) // n_full_timed, 1)])
+        t_fast, t_full, t_point, diffs, widths = [], [], [], [], []
+        for n in fit_trials:
+            choice_history, reward_history = (
+                choice[:n][-200:],
+                reward[:n][-200:],
+            )
+            if len(np.unique(choice_history[~np.isnan(choice_history)])) < 2:
+                continue
+            start = time.perf_counter()
+            bias, (lower, upper) = estimator.fit(
+                choice_history, reward_history, n_trial_back
+            )
+            t_fast.append(time.perf_counter() - start)
+            # point estimate of the full path, without bootstrap
+            start = time.perf_counter()
+            lr = fit_logistic_regression(
+                choice_history,
+                reward_history,
+                n_trial_back=n_trial_back,
+                cv=1,
+                n_bootstrap_iters=0,
+                fit_exponential=False,
+            )
+            t_point.append(time.perf_counter() - start)
+            reference = lr["df_beta"].loc["bias"]["cross_validation"].values[0]
+            diffs.append(abs(bias - reference))
+            if n in timed:
+                start = time.perf_counter()
+                lr = fit_logistic_regression(
+                    choice_history,
+                    reward_history,
+                    n_trial_back=n_trial_back,
+                    cv=1,
+                    fit_exponential=False,
+                )
+                t_full.append(time.perf_counter() - start)
+                df_bias = lr["df_beta"].loc["bias"]
+                bootstrap_width = (
+                    df_bias["bootstrap_CI_upper"].values[0]
+                    - df_bias["bootstrap_CI_lower"].values[0]
+                )
+                widths.append((upper - lower) / bootstrap_width)
+        print(
+            f"{len(t_fast)} fits: fast {np.mean(t_fast) * 1e3:.2f} ms, "
+            f"full without bootstrap {np.mean(t_point) * 1e3:.1f} ms, "
+            f"full with bootstrap {np.mean(t_full) * 1e3:.0f} ms; "
+            f"|bias difference| mean {np.mean(diffs):.2e} max {np.max(diffs):.2e}; "
+            f"Fisher / bootstrap CI width {np.mean(widths):.2f}"
+        )
+
+
+def _session_histories_at(full, n, n_trials):
+    """Histories and parameters of a session after n of its n_trials trials"""
+    state = {}
+    for name, values in full.items():
+        length = (
+            values.shape[-1] if isinstance(values, np.ndarray) else len(values)
+        )
+        stop = length * n // n_trials
+        state[name] = (
+            values[..., :stop]
+            if isinstance(values, np.ndarray)
+            else values[:stop]
+        )
+    return state
+
+
+@benchmark
+def journal_backup(
+    sessions=(), n_trials=2000, checkpoints=(10, 100, 500, 1000, 2000)
+):
+    """
+    Backup cost per trial: rewriting the whole session json versus appending a record to
+    the session journal. Journal times are the median of the 10 trials up to each
+    checkpoint, and the journal is checked to replay to the session.
+    """
+    import os
+    import tempfile
+
+    from foraging_gui.session_journal import (
+        NumpyEncoder,
+        SessionJournal,
+        read_journal,
+    )
+
+    fulls = []
+    for path in sessions:
+        obj = _load_session(path)
+        full = {}
+        for name, values in obj.items():
+            if not (name.startswith("B_") or name.startswith("TP_")):
+                continue
+            if not isinstance(values, list):
+                continue
+            try:
+                values = np.array(values, dtype=float)
+            except (TypeError, ValueError):
+                pass
+            full[name] = values
+        fulls.append((full, len(obj["B_AnimalResponseHistory"])))
+    if not fulls:
+        full = _synthetic_plot_trials(n_trials)
+        session = synthetic_session(n_trials)
+        full.update(
+            {name: v for name, v in session.items() if name.startswith("TP_")}
+        )
+        fulls.append((full, n_trials))
+    with tempfile.TemporaryDirectory() as folder:
+        session_file = os.path.join(folder, "session.json")
+        for full, n in fulls:
+            journal = SessionJournal(
+                os.path.join(folder, "session_journal.jsonl")
+            )
+            journal.open({"box": "benchmark"})
+            times = {c: [] for c in checkpoints if c <= n}
+            print("trial  whole json  journal record")
+            for trial in range(1, n + 1):
+                state = _session_histories_at(full, trial, n)
+                start = time.perf_counter()
+                journal.record_trial(trial, state)
+                elapsed = time.perf_counter() - start
+                for checkpoint in times:
+                    if checkpoint - 10 < trial <= checkpoint:
+                        times[checkpoint].append(elapsed)
+                if trial not in times:
+                    continue
+                start = time.perf_counter()
+                tmp_file = session_file.replace(".json", "_tmp.json")
+                with open(tmp_file, "w") as outfile:
+                    json.dump(state, outfile, indent=4, cls=NumpyEncoder)
+                if os.path.isfile(session_file):
+                    os.remove(session_file)
+                os.rename(tmp_file, session_file)
+                t_json = time.perf_counter() - start
+                print(
+                    f"{trial:5d}  {t_json * 1e3:7.1f} ms  "
+                    f"{np.median(times[trial]) * 1e3:7.2f} ms"
+                )
+            journal.close()
+            _, fields = read_journal(journal.path)
+            for name, values in state.items():
+                assert json.dumps(
+                    fields[name], cls=NumpyEncoder
+                ) == json.dumps(values, cls=NumpyEncoder), name
+            print(f"journal of {n} trials replays to the session")
+
+
+@benchmark
+def session_load(sessions=(), n_trials=1000, repeat=3):
+    """
+    Loading a session for review: parsing the json and converting the histories to numpy
+    versus opening the columnar file and reading the histories the plots need
+    """
+    import os
+    import tempfile
+    import tracemalloc
+
+    from foraging_gui.session_columns import (
+        ColumnarSession,
+        columns_path,
+        write_columns,
+    )
+    from foraging_gui.session_journal import NumpyEncoder
+    from foraging_gui.trial_updates import TrialSnapshot
+
+    with tempfile.TemporaryDirectory() as folder:
+        files = list(sessions)
+        if not files:
+            rng = np.random.default_rng(0)
+            obj = _synthetic_plot_trials(n_trials)
+            obj.update(synthetic_session(n_trials))
+            # photometry edges at 20 Hz make up most of a session
+            duration = obj["B_TrialStartTime"][-1]
+            for name in (
+                "B_PhotometryRisingTimeHarp",
+                "B_PhotometryFallingTimeHarp",
+            ):
+                obj[name] = np.sort(
+                    rng.uniform(0, duration, size=int(duration * 20))
+                )
+            files.append(os.path.join(folder, "session.json"))
+            with open(files[0], "w") as f:
+                json.dump(obj, f, indent=4, cls=NumpyEncoder)
+        for path in files:
+            if not os.path.isfile(columns_path(path)):
+                write_columns(columns_path(path), _load_session(path))
+            plotted = [
+                name for name in TrialSnapshot.fields if name.startswith("B_")
+            ]
+
+            def load_json():
+                obj = _load_session(path)
+                return {
+                    name: np.array(value)
+                    for name, value in obj.items()
+                    if name.startswith("B_")
+                }
+
+            def load_columns():
+                session = ColumnarSession(path=columns_path(path))
+                return {
+                    name: np.asarray(session[name]).sum()
+                    for name in plotted
+                    if name in session.columns
+                }
+
+            results = []
+            for load in (load_json, load_columns):
+                elapsed = _time_it(load, repeat)
+                tracemalloc.start()
+                load()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                results.append((elapsed, peak))
+            (t_json, m_json), (t_columns, m_columns) = results
+            print(
+                f"{os.path.basename(path)}: json {t_json * 1e3:.0f} ms, "
+                f"{m_json / 2**20:.1f} MiB; columnar {t_columns * 1e3:.1f} ms, "
+                f"{m_columns / 2**20:.2f} MiB; "
+                f"files {os.path.getsize(path) / 2**20:.1f} MiB json, "
+                f"{os.path.getsize(columns_path(path)) / 2**20:.1f} MiB columnar"
+            )
+
+
+@benchmark
+def parameter_log(sessions=(), n_trials=1000, n_parameters=150, seed=0):
+    """
+    Saving the TP_ parameters of each trial: scanning dir() and appending every parameter
+    to its per-trial list versus recording the changes in a ParameterLog. Also compares
+    the size of the saved parameters and checks the log rebuilds the per-trial lists.
+    """
+    from foraging_gui.parameter_log import ParameterLog, parameter_history
+    from foraging_gui.session_journal import NumpyEncoder
+
+    histories = []
+    for path in sessions:
+        obj = _load_session(path)
+        log = ParameterLog.from_session(obj)
+        names = log.names() if log is not None else []
+        names += [name for name in obj if name.startswith("TP_")]
+        histories.append(
+            {name: list(parameter_history(obj, name, log)) for name in names}
+        )
+    if not histories:
+        # mostly constant parameters, a few changed during the session
+        rng = np.random.default_rng(seed)
+        history = {}
+        for i in range(n_parameters):
+            values = [f"{i}.0"] * n_trials
+            for trial in rng.integers(1, n_trials, size=rng.poisson(1)):
+                values[trial:] = [f"{i}.{trial}"] * (n_trials - trial)
+            history[f"TP_Parameter{i}"] = values
+        histories.append(history)
+    for history in histories:
+        n = min(len(values) for values in history.values())
+
+        class Trials:
+            pass
+
+        trials = Trials()
+        obj = {}
+        log = ParameterLog()
+        t_lists = t_log = 0
+        for trial in range(n):
+            for name, values in history.items():
+                setattr(trials, name, values[trial])
+            start = time.perf_counter()
+            for attr_name in dir(trials):
+                if attr_name.startswith("TP_"):
+                    obj.setdefault(attr_name, []).append(
+                        getattr(trials, attr_name)
+                    )
+            t_lists += time.perf_counter() - start
+            start = time.perf_counter()
+            log.record({name: getattr(trials, name) for name in history})
+            t_log += time.perf_counter() - start
+        assert log.histories() == obj
+        size_lists = len(json.dumps(obj, cls=NumpyEncoder))
+        size_log = len(json.dumps(log.data, cls=NumpyEncoder))
+        print(
+            f"{len(history)} parameters, {n} trials: per trial "
+            f"dir() lists {t_lists / n * 1e6:.0f} us, "
+            f"change log {t_log / n * 1e6:.0f} us; saved "
+            f"{size_lists / 2**10:.0f} KiB lists, {size_log / 2**10:.1f} KiB log "
+            f"({len(log.data['changes'])} changes)"
+        )
+
+
+def _scan_training_parameters(containers):
+    """Reference: the findChildren walk _GetTrainingParameters used to do"""
+    from PyQt5 import QtWidgets
+
+    values = {}
+    for container in containers:
+        for child in container.findChildren(
+            (
+                QtWidgets.QLineEdit,
+                QtWidgets.QDoubleSpinBox,
+                QtWidgets.QSpinBox,
+            )
+        ):
+            if child.objectName() in ("qt_spinbox_lineedit", ""):
+                continue
+            values[child.objectName()] = child.text()
+        for child in container.findChildren(QtWidgets.QComboBox):
+            values[child.objectName()] = child.currentText()
+        for child in container.findChildren(QtWidgets.QPushButton):
+            values[child.objectName()] = child.isChecked()
+    return values
+
+
+@benchmark
+def parameter_capture(sessions=(), n_trials=500, n_changed=2, seed=0):
+    """
+    Per-trial capture of the training parameters from the GUI forms: walking the widget
+    trees with findChildren versus reading the WidgetRegistry, with n_changed widgets
+    edited between trials. Needs PyQt5, and runs offscreen.
+    """
+    import os
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtWidgets, uic
+
+    from foraging_gui.widget_registry import (
+        TEXT_WIDGETS,
+        TRIAL_PARAMETER_CONTAINERS,
+        WidgetRegistry,
+    )
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    folder = os.path.dirname(os.path.abspath(__file__))
+    window = QtWidgets.QMainWindow()
+    uic.loadUi(os.path.join(folder, "ForagingGUI.ui"), window)
+    containers = {
+        "TrainingParameters": window.TrainingParameters,
+        "centralwidget": window.centralwidget,
+    }
+    for name, ui_file in (
+        ("Opto_dialog", "Optogenetics.ui"),
+        ("Camera_dialog", "Camera.ui"),
+        ("Metadata_dialog", "MetaData.ui"),
+    ):
+        containers[name] = QtWidgets.QDialog()
+        uic.loadUi(os.path.join(folder, ui_file), containers[name])
+    registry = WidgetRegistry()
+    for name, container in containers.items():
+        registry.register(name, container)
+    editable = [
+        w
+        for w in registry.widgets(TRIAL_PARAMETER_CONTAINERS, TEXT_WIDGETS)
+        if isinstance(w, QtWidgets.QLineEdit)
+    ]
+    rng = np.random.default_rng(seed)
+    t_scan = t_registry = 0
+    for trial in range(n_trials):
+        for i in rng.choice(len(editable), size=n_changed, replace=False):
+            editable[i].setText(str(trial))
+        start = time.perf_counter()
+        scanned = _scan_training_parameters(
+            [containers[name] for name in TRIAL_PARAMETER_CONTAINERS]
+        )
+        t_scan += time.perf_counter() - start
+        start = time.perf_counter()
+        read = registry.read(TRIAL_PARAMETER_CONTAINERS)
+        t_registry += time.perf_counter() - start
+        assert read == scanned
+    print(
+        f"{len(scanned)} parameters, {n_changed} changed per trial: per trial "
+        f"findChildren {t_scan / n_trials * 1e3:.2f} ms, "
+        f"registry {t_registry / n_trials * 1e3:.3f} ms"
+    )
+    app.processEvents()
+
+
+def _list_mice_from_files(box_folder):
+    """Reference: the folder walk _Open_getListOfMice does without an index"""
+    import os
+
+    mice, experimenters = [], []
+    for m in os.listdir(box_folder):
+        sessions = sorted(
+            os.listdir(os.path.join(box_folder, m)), reverse=True
+        )
+        for s in sessions:
+            json_file = os.path.join(
+                box_folder, m, s, "behavior", s.split("behavior_")[1] + ".json"
+            )
+            if os.path.isfile(json_file):
+                with open(json_file, "r") as file:
+                    experimenters.append(json.load(file)["Experimenter"])
+                mice.append(m)
+                break
+    return mice, experimenters
+
+
+@benchmark
+def session_index(sessions=(), n_mice=50, n_sessions=40, n_trials=500):
+    """
+    Filling the mouse picker: listing the mouse folders and parsing the last session json
+    of each mouse versus querying the session index. Synthetic sessions are written to a
+    temporary data folder with n_trials trials each.
+    """
+    import os
+    import tempfile
+
+    from foraging_gui.session_index import SessionIndex
+
+    session = synthetic_session(n_trials)
+    with tempfile.TemporaryDirectory() as save_folder:
+        box_folder = os.path.join(save_folder, "Box-1")
+        for m in range(n_mice):
+            mouse = str(600000 + m)
+            for day in range(n_sessions):
+                name = f"{mouse}_2024-01-{day % 28 + 1:02d}_10-{day:02d}-00"
+                folder = os.path.join(
+                    box_folder, mouse, f"behavior_{name}", "behavior"
+                )
+                os.makedirs(folder)
+                with open(os.path.join(folder, name + ".json"), "w") as f:
+                    json.dump({"Experimenter": "someone", **session}, f)
+        index = SessionIndex(save_folder)
+        start = time.perf_counter()
+        index.scan()
+        t_scan = time.perf_counter() - start
+        t_files = _time_it(lambda: _list_mice_from_files(box_folder), 3)
+        t_index = _time_it(lambda: index.mice("Box-1"), 3)
+        t_sessions = _time_it(lambda: index.sessions("Box-1", "600000"), 3)
+        assert sorted(e.mouse for e in index.mice("Box-1")) == sorted(
+            _list_mice_from_files(box_folder)[0]
+        )
+        index.close()
+    print(
+        f"{n_mice} mice x {n_sessions} sessions: mouse list from files "
+        f"{t_files * 1e3:.0f} ms, from index {t_index * 1e3:.2f} ms; "
+        f"session list from index {t_sessions * 1e3:.2f} ms; "
+        f"full scan {t_scan:.1f} s"
+    )
+
+
+@benchmark
+def json_fields(
+    sessions=(),
+    keys=("Experimenter", "Other_SessionStartTime", "stage_in_use"),
+    n_trials=2000,
+    repeat=3,
+):
+    """
+    Reading a few top-level fields of a session json: json.load of the whole file versus
+    read_fields, which stops once the fields are found
+    """
+    import os
+    import tempfile
+
+    from foraging_gui.json_fields import read_fields
+    from foraging_gui.session_journal import NumpyEncoder
+
+    with tempfile.TemporaryDirectory() as folder:
+        if not sessions:
+            # laid out like the sessions saved before the parameter change log: TP_
+            # histories, then the widget parameters, then the B_ histories
+            session = synthetic_session(n_trials)
+            Obj = {
+                name: v
+                for name, v in session.items()
+                if name.startswith("TP_")
+            }
+            Obj.update(
+                {
+                    "Experimenter": "someone",
+                    "stage_in_use": "STAGE_3",
+                    "Other_SessionStartTime": "2024-01-31 10:00:00",
+                }
+            )
+            Obj.update(
+                {
+                    name: v.tolist()
+                    for name, v in _synthetic_plot_trials(n_trials).items()
+                }
+            )
+            Obj.update(
+                {
+                    name: v
+                    for name, v in session.items()
+                    if name.startswith("B_")
+                }
+            )
+            path = os.path.join(folder, "session.json")
+            with open(path, "w") as f:
+                json.dump(Obj, f, indent=4, cls=NumpyEncoder)
+            sessions = [path]
+        for path in sessions:
+
+            def load_json():
+                with open(path, "r") as f:
+                    Obj = json.load(f)
+                return {key: Obj[key] for key in keys if key in Obj}
+
+            fields = read_fields(path, keys)
+            assert fields == load_json()
+            t_json = _time_it(load_json, repeat)
+            t_fields = _time_it(lambda: read_fields(path, keys), repeat)
+            print(
+                f"{os.path.basename(path)} ({os.path.getsize(path) / 2**20:.1f} MiB), "
+                f"{len(fields)} of {len(keys)} fields found: json.load "
+                f"{t_json * 1e3:.0f} ms, read_fields {t_fields * 1e3:.1f} ms"
+            )
+
+
+def _add_trials_one_by_one(nwbfile, columns):
+    """Reference: the add_trial call per trial bonsai_to_nwb used to make"""
+    for i in range(len(columns["start_time"])):
+        nwbfile.add_trial(
+            **{name: values[i] for name, values in columns.items()}
+        )
+
+
+@benchmark
+def nwb_trials(sessions=(), n_trials=1500, repeat=3):
+    """
+    Converting a session to NWB: filling the trial table with one add_trial per trial
+    versus column by column, and the whole bonsai_to_nwb conversion. Both fill the table
+    from the same _trial_columns, so the check that the two tables are the same covers
+    the writing only; test_transfer_to_nwb checks the columns against the former
+    per-trial extraction
+    """
+    import os
+    import tempfile
+
+    from pynwb import NWBHDF5IO
+
+    from foraging_gui import TransferToNWB
+    from foraging_gui.session_journal import NumpyEncoder
+    from foraging_gui.test_transfer_to_nwb import synthetic_nwb_session
+
+    with tempfile.TemporaryDirectory() as folder:
+        if not sessions:
+            sessions = [os.path.join(folder, "session.json")]
+            with open(sessions[0], "w") as f:
+                json.dump(synthetic_nwb_session(n_trials), f, cls=NumpyEncoder)
+        for path in sessions:
+            add_trials = TransferToNWB._add_trials
+            nwb_file = os.path.join(
+                folder, os.path.splitext(os.path.basename(path))[0] + ".nwb"
+            )
+            tables = []
+            results = []
+            for fill in (_add_trials_one_by_one, add_trials):
+                fill_times = []
+
+                def fill_trials(nwbfile, columns):
+                    start = time.perf_counter()
+                    fill(nwbfile, columns)
+                    fill_times.append(time.perf_counter() - start)
+
+                TransferToNWB._add_trials = fill_trials
+                try:
+                    t_total = _time_it(
+                        lambda: TransferToNWB.bonsai_to_nwb(path, folder),
+                        repeat,
+                    )
+                finally:
+                    TransferToNWB._add_trials = add_trials
+                with NWBHDF5IO(nwb_file, mode="r") as io:
+                    tables.append(io.read().trials.to_dataframe())
+                results.append((min(fill_times), t_total))
+            (t_rows, t_row_total), (t_columns, t_column_total) = results
+            assert tables[0].equals(tables[1])
+            print(
+                f"{os.path.basename(path)}, {len(tables[1])} trials: trial table "
+                f"add_trial {t_rows * 1e3:.0f} ms, columns {t_columns * 1e3:.1f} ms; "
+                f"bonsai_to_nwb {t_row_total:.2f} s -> {t_column_total:.2f} s"
+            )
+
+
+@benchmark
+def nwb_events(sessions=(), n_trials=1500, hours=2.0, repeat=1):
+    """
+    Converting a long photometry session to NWB: plain datasets from the json versus
+    chunked, compressed event series written from the columnar file. Reports the time,
+    the peak of Python allocations and the NWB size
+    """
+    import os
+    import tempfile
+    import tracemalloc
+
+    from pynwb import NWBHDF5IO
+
+    from foraging_gui.session_columns import columns_path, write_columns
+    from foraging_gui.session_journal import NumpyEncoder
+    from foraging_gui.test_transfer_to_nwb import synthetic_nwb_session
+    from foraging_gui.TransferToNWB import bonsai_to_nwb
+
+    with tempfile.TemporaryDirectory() as folder:
+        if not sessions:
+            rng = np.random.default_rng(0)
+            obj = synthetic_nwb_session(n_trials)
+            # 20 Hz photometry edges and licks over the whole session
+            duration = hours * 3600
+            for name, rate in (
+                ("B_PhotometryRisingTimeHarp", 20),
+                ("B_PhotometryFallingTimeHarp", 20),
+                ("B_LeftLickTime", 2),
+                ("B_RightLickTime", 2),
+            ):
+                obj[name] = np.sort(
+                    rng.uniform(0, duration, size=int(duration * rate))
+                )
+            sessions = [os.path.join(folder, "session.json")]
+            with open(sessions[0], "w") as f:
+                json.dump(obj, f, cls=NumpyEncoder)
+        for path in sessions:
+            if not os.path.isfile(columns_path(path)):
+                write_columns(columns_path(path), _load_session(path))
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            results = []
+            series = []
+            for options in (
+                dict(compression=None, from_columns=False),
+                dict(compression="gzip", from_columns=True),
+            ):
+                out_folder = os.path.join(folder, str(options["compression"]))
+                os.makedirs(out_folder, exist_ok=True)
+                elapsed = _time_it(
+                    lambda: bonsai_to_nwb(path, out_folder, **options),
+                    repeat,
+                )
+                tracemalloc.start()
+                bonsai_to_nwb(path, out_folder, **options)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                nwb_file = os.path.join(out_folder, base_name + ".nwb")
+                with NWBHDF5IO(nwb_file, mode="r") as io:
+                    acquisition = io.read().acquisition
+                    series.append(
+                        {
+                            name: acquisition[name].timestamps[:]
+                            for name in acquisition
+                        }
+                    )
+                results.append((elapsed, peak, os.path.getsize(nwb_file)))
+            assert series[0].keys() == series[1].keys()
+            for name in series[0]:
+                assert np.array_equal(
+                    series[0][name], series[1][name], equal_nan=True
+                )
+            (t_plain, m_plain, s_plain), (t_chunked, m_chunked, s_chunked) = (
+                results
+            )
+            n_events = sum(
+                len(timestamps) for timestamps in series[1].values()
+            )
+            print(
+                f"{base_name}, {n_events} events: plain {t_plain:.2f} s, "
+                f"{m_plain / 2**20:.0f} MiB peak, {s_plain / 2**20:.1f} MiB; "
+                f"chunked from columns {t_chunked:.2f} s, "
+                f"{m_chunked / 2**20:.0f} MiB peak, {s_chunked / 2**20:.1f} MiB"
+            )
+
+
+def _pulse_train_by_concatenation(
+    duration, frequency, pulse_duration, amplitude, sample_frequency
+):
+    """Reference: the pulse train _ProduceWaveForm built one cycle at a time"""
+    points_each_pulse = int(sample_frequency * pulse_duration)
+    interval_points = int(1 / frequency * sample_frequency - points_each_pulse)
+    total_points = int(sample_frequency * duration)
+    pulse = amplitude * np.ones(points_each_pulse)
+    cycle = np.concatenate((pulse, np.zeros(interval_points)))
+    wave = np.empty(0)
+    for _ in range(int(np.floor(duration * frequency) - 1)):
+        wave = np.concatenate((wave, cycle))
+    wave = np.concatenate((wave, pulse))
+    wave = np.concatenate((wave, np.zeros(total_points - wave.shape[0])))
+    return np.append(wave, [0, 0])
+
+
+@benchmark
+def laser_waveform(sessions=(), n_trials=200, seed=0):
+    """
+    Per opto trial waveform of a 40 Hz pulse protocol lasting from trial start to go cue
+    (the ITI, a few durations): concatenating one cycle at a time versus the cached,
+    tiled laser_waveform
+    """
+    from foraging_gui.laser_waveforms import _build_waveform
+    from foraging_gui.laser_waveforms import laser_waveform as build
+
+    rng = np.random.default_rng(seed)
+    durations = rng.choice([5.0, 10.0, 20.0, 30.0], size=n_trials)
+    amplitudes = rng.choice([1.2, 2.5], size=n_trials)
+    parameters = dict(frequency=40.0, pulse_duration=0.005)
+    _build_waveform.cache_clear()
+    t_loop = t_cached = 0
+    for duration, amplitude in zip(durations, amplitudes):
+        start = time.perf_counter()
+        reference = _pulse_train_by_concatenation(
+            duration,
+            parameters["frequency"],
+            parameters["pulse_duration"],
+            amplitude,
+            5000.0,
+        )
+        t_loop += time.perf_counter() - start
+        start = time.perf_counter()
+        wave = build("Pulse", duration, amplitude, 5000.0, **parameters).wave
+        t_cached += time.perf_counter() - start
+        assert np.array_equal(wave, reference)
+    info = _build_waveform.cache_info()
+    print(
+        f"{n_trials} opto trials, {info.misses} distinct waveforms: per trial "
+        f"concatenation {t_loop / n_trials * 1e3:.1f} ms, "
+        f"cached laser_waveform {t_cached / n_trials * 1e3:.3f} ms"
+    )
+
+
+def _write_camera_session(folder, n_cameras, n_frames, seed=0):
+    """Camera trigger file and flat-structure camera csvs of a synthetic session"""
+    import os
+
+    rng = np.random.default_rng(seed)
+    harp_folder = os.path.join(folder, "raw.harp")
+    video_folder = os.path.join(folder, "behavior-videos")
+    os.makedirs(os.path.join(harp_folder, "BehaviorEvents"))
+    os.makedirs(video_folder)
+    # U8 event messages: type, length, address, port, payload type, 6 timestamp bytes,
+    # payload, checksum
+    messages = np.zeros((n_frames, 13), dtype=np.uint8)
+    messages[:, 0] = 3
+    messages[:, 1] = 11
+    messages[:, 2] = 94
+    messages[:, 3] = 255
+    messages[:, 4] = 0x11
+    messages[:, 11] = 1
+    messages.tofile(
+        os.path.join(harp_folder, "BehaviorEvents", "Event_94.bin")
+    )
+    frames = np.arange(n_frames)
+    for camera in range(n_cameras):
+        times = np.cumsum(rng.exponential(0.002, size=n_frames))
+        np.savetxt(
+            os.path.join(video_folder, f"Camera{camera}.csv"),
+            np.column_stack([frames, times * 1e9, times]),
+            fmt=["%d", "%d", "%.6f"],
+            delimiter=",",
+        )
+        open(os.path.join(video_folder, f"Camera{camera}.avi"), "w").close()
+    return harp_folder, video_folder
+
+
+@benchmark
+def drop_frames(sessions=(), n_cameras=4, rate=500.0, minutes=30.0):
+    """
+    Dropped-frame check at the end of a session: decoding the trigger file and reading
+    each camera csv with pandas in turn versus the file size and parallel line counts
+    """
+    import os
+    import tempfile
+
+    import pandas as pd
+
+    from foraging_gui.drop_frames import (
+        CAMERA_TRIGGER_FILE,
+        count_frames,
+        find_camera_files,
+        harp_message_count,
+    )
+
+    n_frames = int(rate * minutes * 60)
+    with tempfile.TemporaryDirectory() as folder:
+        harp_folder, video_folder = _write_camera_session(
+            folder, n_cameras, n_frames
+        )
+        trigger_file = os.path.join(harp_folder, CAMERA_TRIGGER_FILE)
+
+        def serial():
+            try:
+                import harp
+
+                triggers = len(harp.read(trigger_file))
+            except ImportError:
+                # what harp.read does before building its data frame
+                data = np.fromfile(trigger_file, dtype=np.uint8)
+                triggers = len(data.reshape(-1, int(data[1]) + 2))
+            frames = [
+                len(
+                    pd.read_csv(
+                        os.path.join(video_folder, f"Camera{camera}.csv"),
+                        header=None,
+                    )
+                )
+                for camera in range(n_cameras)
+            ]
+            return triggers, frames
+
+        def counted():
+            triggers = harp_message_count(trigger_file)
+            frames = count_frames(find_camera_files(video_folder))
+            return triggers, sorted(frames, key=lambda f: f.camera.camera_name)
+
+        reference = serial()
+        triggers, frames = counted()
+        assert triggers == reference[0] == n_frames
+        assert [f.num_frames for f in frames] == reference[1]
+        t_serial = _time_it(serial, repeat=1)
+        t_counted = _time_it(counted, repeat=3)
+    print(
+        f"{n_cameras} cameras x {n_frames} frames: harp.read + pandas "
+        f"{t_serial:.2f} s, file size + parallel line count {t_counted:.3f} s"
+    )
+
+
+@benchmark
+def trial_engine(sessions=(), n_sessions=200, n_gui_seeds=3):
+    """
+    Simulated sessions through GenerateTrials with a stand-in window versus the headless
+    TrialEngine. test_trial_engine checks that both give the same trials for the same
+    seed
+    """
+    import logging
+    import os
+
+    from PyQt5 import QtWidgets
+
+    from foraging_gui.test_trial_engine import (
+        PARITY_CONFIGURATIONS,
+        gui_simulation,
+    )
+    from foraging_gui.trial_engine import TaskParameters, simulate_session
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # GenerateTrials shows a message box when the session stops
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    logging.disable(logging.WARNING)
+    try:
+        t_gui = 0
+        n_gui = 0
+        for parameters, policy in PARITY_CONFIGURATIONS.values():
+            for seed in range(n_gui_seeds):
+                start = time.perf_counter()
+                gui_simulation(parameters, seed, policy)
+                t_gui += time.perf_counter() - start
+                n_gui += 1
+    finally:
+        logging.disable(logging.NOTSET)
+    del app
+
+    parameters = TaskParameters()
+    start = time.perf_counter()
+    results = [
+        simulate_session(parameters, seed) for seed in range(n_sessions)
+    ]
+    t_engine = time.perf_counter() - start
+    n_trials = np.mean(
+        [len(r.histories["B_AnimalResponseHistory"]) for r in results]
+    )
+    print(
+        f"GenerateTrials: {t_gui / n_gui * 1e3:.0f} ms per session; "
+        f"TrialEngine: {n_sessions / t_engine * 60:.0f} sessions/min in one process "
+        f"({n_trials:.0f} trials per session)"
+    )
+
+
+@benchmark
+def reward_schedule_batch(
+    sessions=(), n_sessions=100000, n_trials=500, seed=0
+):
+    """
+    Throughput of the batch UncoupledBlocks sessions with an ideal observer;
+    reward_schedules/test_batch checks that the batch schedules match the scalar ones
+    in distribution
+    """
+    from foraging_gui.reward_schedules.batch import (
+        block_lengths,
+        greedy,
+        simulate_uncoupled_blocks,
+    )
+
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    batch = simulate_uncoupled_blocks(n_sessions, n_trials, greedy, rng=rng)
+    t_batch = time.perf_counter() - start
+    lengths = block_lengths(batch.reward_prob[..., 0])
+    print(
+        f"{n_sessions} UncoupledBlocks sessions of {n_trials} trials in "
+        f"{t_batch:.1f} s: block length {np.mean(lengths):.1f} "
+        f"+/- {np.std(lengths):.1f}, ideal observer reward rate "
+        f"{batch.rewarded.mean():.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("name", choices=sorted(BENCHMARKS))
+    parser.add_argument(
+        "sessions",
+        nargs="*",
+        help="recorded session json files, synthetic data is used if omitted",
+    )
+    args = parser.parse_args()
+    BENCHMARKS[args.name](sessions=args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.special import expit
+
+
+class BiasFit(NamedTuple):
+    """Result of a bias fit"""
+
+    bias: float
+    lower: float  # 95% confidence interval
+    upper: float
+    coef: np.ndarray  # all coefficients, bias last
+    C: float  # inverse regularization strength used
+
+
+def design_matrix(
+    choice_history: Union[List, np.ndarray],
+    reward_history: Union[List, np.ndarray],
+    n_trial_back: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Design matrix of the Su2022 logistic model (rewarded and unrewarded choices of the
+    previous n_trial_back trials) with a trailing column of ones for the bias, built
+    like aind_dynamic_foraging_models.logistic_regression.prepare_logistic_design_matrix
+    :param choice_history: 0 left, 1 right, nan ignored
+    :param reward_history: 0 unrewarded, 1 rewarded
+    :param n_trial_back: number of trials back into history
+    :return: design matrix and choices (0 left, 1 right) of the fitted trials
+    """
+    choice = np.asarray(choice_history, dtype=float)
+    reward = np.asarray(reward_history, dtype=float)
+    responded = ~np.isnan(choice)
+    choice = 2 * choice[responded] - 1
+    reward = reward[responded]
+    if len(choice) < n_trial_back + 2:
+        raise ValueError(
+            "Number of trials must be greater than n_trial_back + 2."
+        )
+    rewarded_choice = choice * (reward == 1)
+    unrewarded_choice = choice * (reward == 0)
+    X = np.hstack(
+        [
+            sliding_window_view(rewarded_choice[:-1], n_trial_back),
+            sliding_window_view(unrewarded_choice[:-1], n_trial_back),
+            np.ones((len(choice) - n_trial_back, 1)),
+        ]
+    )
+    y = (choice[n_trial_back:] + 1) / 2
+    return X, y
+
+
+class IncrementalBiasEstimator:
+    """
+    L2-regularized logistic regression of choices on choice/reward history, fitted with
+    Newton's method on a sliding window and warm-started from the previous coefficients,
+    so a refit after a few new trials converges in one or two iterations.
+
+    The objective is the one minimized by liblinear in fit_logistic_regression (the bias
+    is penalized like the other coefficients). Confidence intervals come from the Fisher
+    information of the window instead of bootstrapping.
+    """
+
+    def __init__(
+        self,
+        window: int = 200,
+        C: float = 0.1,
+        max_iter: int = 25,
+        tol: float = 1e-6,
+    ):
+        """
+        :param window: number of most recent trials fitted
+        :param C: inverse regularization strength, as in sklearn
+        :param max_iter: maximum number of Newton iterations
+        :param tol: stop when no coefficient changes by more than tol
+        """
+        self.window = window
+        self.C = C
+        self.max_iter = max_iter
+        self.tol = tol
+        self.reset()
+
+    def reset(self):
+        """Forget the previous coefficients, e.g. for a new session"""
+        self.coef = None
+        self.n_iter = 0
+
+    def warm_start(self, coef: np.ndarray, C: float = None):
+        """
+        Start the next fit from coef, e.g. from a full cross-validated fit
+        :param coef: coefficients with the bias last
+        :param C: inverse regularization strength to use from now on
+        """
+        self.coef = np.asarray(coef, dtype=float).copy()
+        if C is not None:
+            self.C = C
+
+    def fit(
+        self,
+        choice_history: Union[List, np.ndarray],
+        reward_history: Union[List, np.ndarray],
+        n_trial_back: int = 5,
+    ) -> Tuple[float, List[float]]:
+        """
+        Fit the last window trials
+        :param choice_history: 0 left, 1 right, nan ignored
+        :param reward_history: 0 unrewarded, 1 rewarded
+        :param n_trial_back: number of trials back into history
+        :return: bias and its 95% confidence interval
+        """
+        X, y = design_matrix(
+            choice_history[-self.window :],
+            reward_history[-self.window :],
+            n_trial_back,
+        )
+        n_coef = X.shape[1]
+        if self.coef is None or len(self.coef) != n_coef:
+            coef = np.zeros(n_coef)
+        else:
+            coef = self.coef.copy()
+        prior = np.eye(n_coef) / self.C
+        for self.n_iter in range(1, self.max_iter + 1):
+            p = expit(X @ coef)
+            gradient = X.T @ (p - y) + prior @ coef
+            hessian = (X.T * (p * (1 - p))) @ X + prior
+            step = np.linalg.solve(hessian, gradient)
+            coef -= step
+            if np.max(np.abs(step)) < self.tol:
+                break
+        p = expit(X @ coef)
+        fisher_information = (X.T * (p * (1 - p))) @ X
+        inverse_hessian = np.linalg.inv(fisher_information + prior)
+        self.coef = coef
+        # sandwich covariance of the penalized estimate, which the bootstrap approximates
+        self.covariance = (
+            inverse_hessian @ fisher_information @ inverse_hessian
+        )
+        bias = coef[-1]
+        half_width = 1.96 * np.sqrt(self.covariance[-1, -1])
+        return bias, [bias - half_width, bias + half_width]
+
+
+def full_fit(
+    choice_history: Union[List, np.ndarray],
+    reward_history: Union[List, np.ndarray],
+    n_trial_back: int = 5,
+    selected_trial_idx: Union[List, np.ndarray] = None,
+    cv: int = 10,
+) -> BiasFit:
+    """Fit with fit_logistic_regression: cross-validation and bootstrap confidence intervals"""
+    from aind_dynamic_foraging_models.logistic_regression import (
+        fit_logistic_regression,
+    )
+
+    lr = fit_logistic_regression(
+        choice_history=choice_history,
+        reward_history=reward_history,
+        n_trial_back=n_trial_back,
+        selected_trial_idx=selected_trial_idx,
+        cv=cv,
+        fit_exponential=False,
+    )
+    df_bias = lr["df_beta"].loc["bias"]
+    return BiasFit(
+        bias=df_bias["cross_validation"].values[0],
+        lower=df_bias["bootstrap_CI_lower"].values[0],
+        upper=df_bias["bootstrap_CI_upper"].values[0],
+        coef=lr["df_beta"]["cross_validation"].to_numpy(),
+        C=lr["C"],
+    )
+
+
+def _fit_in_worker(
+    shm_name: str,
+    n_trials: int,
+    n_trial_back: int,
+    cv: int,
+    full: bool,
+    coef: np.ndarray,
+    C: float,
+) -> BiasFit:
+    """Run in the pool process: read the histories from shared memory and fit"""
+    shm = SharedMemory(name=shm_name)
+    try:
+        choice_history, reward_history = np.ndarray(
+            (2, n_trials), dtype=float, buffer=shm.buf
+        ).copy()
+    finally:
+        shm.close()
+    if full:
+        return full_fit(choice_history, reward_history, n_trial_back, cv=cv)
+    estimator = IncrementalBiasEstimator(C=C)
+    if coef is not None:
+        estimator.warm_start(coef)
+    bias, (lower, upper) = estimator.fit(
+        choice_history, reward_history, n_trial_back
+    )
+    return BiasFit(bias, lower, upper, estimator.coef, C)
+
+
+class BiasFitPool:
+    """
+    Runs bias fits in a dedicated worker process, so they do not compete with the GUI for
+    the GIL. Histories are passed through shared memory. Only the latest fit matters: a
+    fit still queued is cancelled when a newer one is submitted, and the results of
+    superseded fits are dropped.
+    """
+
+    def __init__(self):
+        self.executor = None  # started on the first fit
+        self.generation = 0  # incremented on each submit and cancel
+        self.pending = None
+        self.lock = threading.Lock()
+
+    def submit(
+        self,
+        choice_history: np.ndarray,
+        reward_history: Union[List, np.ndarray],
+        callback: Callable[[BiasFit], None],
+        n_trial_back: int = 5,
+        cv: int = 10,
+        full: bool = False,
+        coef: np.ndarray = None,
+        C: float = 0.1,
+    ):
+        """
+        Queue a fit
+        :param callback: called with the BiasFit from a pool thread, unless superseded
+        :param full: fit with cross-validation and bootstrap instead of the fast estimator
+        :param coef: coefficients to warm start the fast estimator from
+        :param C: inverse regularization strength of the fast estimator
+        """
+        histories = np.vstack(
+            [
+                np.asarray(choice_history, dtype=float),
+                np.asarray(reward_history, dtype=float),
+            ]
+        )
+        shm = SharedMemory(create=True, size=max(histories.nbytes, 1))
+        np.ndarray(histories.shape, dtype=float, buffer=shm.buf)[:] = histories
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=1, mp_context=get_context("spawn")
+                )
+            if self.pending is not None:
+                self.pending.cancel()  # no effect if the fit already started
+            self.generation += 1
+            generation = self.generation
+            self.pending = self.executor.submit(
+                _fit_in_worker,
+                shm.name,
+                histories.shape[1],
+                n_trial_back,
+                cv,
+                full,
+                coef,
+                C,
+            )
+
+        def done(future):
+            shm.close()
+            shm.unlink()
+            if future.cancelled() or generation != self.generation:
+                return
+            try:
+                result = future.result()
+            except Exception:
+                logging.error(traceback.format_exc())
+                return
+            callback(result)
+
+        self.pending.add_done_callback(done)
+
+    def cancel(self):
+        """Drop the queued and running fits, e.g. when the session is cleared"""
+        with self.lock:
+            self.generation += 1
+            if self.pending is not None:
+                self.pending.cancel()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -3,9 +3,6 @@ from threading import Lock
 from typing import List, Union
 
 import numpy as np
-from aind_dynamic_foraging_models.logistic_regression import (
-    fit_logistic_regression,
-)
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtGui import QColor, QPen
 from PyQt5.QtWidgets import QMainWindow
@@ -19,6 +16,13 @@ from pyqtgraph import (
     setConfigOption,
 )
 
+from foraging_gui.bias_estimator import (
+    BiasFit,
+    BiasFitPool,
+    IncrementalBiasEstimator,
+    full_fit,
+)
+
 setConfigOption("background", "w")
 setConfigOption("foreground", "k")
 
@@ -31,12 +35,17 @@ class BiasIndicator(QMainWindow):
     biasValue = pyqtSignal(
         float, list, int
     )  # emit bias, confidence intervals, and trial number it occurred
+    # fit finished in the process pool: fit, whether it was a full fit, trial number and count
+    _fitFinished = pyqtSignal(object, bool, int, int)
 
     def __init__(
         self,
         bias_threshold: float = 0.7,
         x_range: int = 15,
         data_lock: Lock = Lock(),
+        fast_fit: bool = True,
+        full_fit_every: int = 10,
+        use_process_pool: bool = True,
         *args,
         **kwargs,
     ):
@@ -44,12 +53,24 @@ class BiasIndicator(QMainWindow):
         :param bias_limit: decimal to alert user if bias is above between 0 and 1
         :param x_range: total number of values displayed on the x axis as graph is scrolling
         :param data_lock: optional data lock to use when manipulating data
+        :param fast_fit: fit with the warm-started IncrementalBiasEstimator instead of
+            cross-validation and bootstrap
+        :param full_fit_every: in fast fit mode, refresh with a full cross-validation and
+            bootstrap fit after this many fast fits. 0 never refreshes
+        :param use_process_pool: fit in a worker process, results are shown when they arrive
         """
 
         super().__init__(*args, **kwargs)
         self.log = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.bias_threshold = bias_threshold
         self.lock = data_lock
+        self.fast_fit = fast_fit
+        self.full_fit_every = full_fit_every
+        self.estimator = IncrementalBiasEstimator()
+        self._fast_fits = 0  # fast fits since the last full fit
+        self.fit_pool = BiasFitPool() if use_process_pool else None
+        # queued connection: results are shown on the GUI thread
+        self._fitFinished.connect(self._fit_finished)
 
         # initialize biases as empy list and x_range
         self._biases = []
@@ -202,26 +223,51 @@ class BiasIndicator(QMainWindow):
             # Determine if we have valid data to fit model
             unique = np.unique(choice_history[~np.isnan(choice_history)])
             if len(unique) == 2:
-                with self.lock:
-                    lr = fit_logistic_regression(
-                        choice_history=choice_history,
-                        reward_history=reward_history,
+                full = (
+                    not self.fast_fit
+                    or selected_trial_idx is not None
+                    or (
+                        self.full_fit_every
+                        and self._fast_fits >= self.full_fit_every
+                    )
+                )
+                if full:
+                    self._fast_fits = 0
+                else:
+                    self._fast_fits += 1
+                if self.fit_pool is not None and selected_trial_idx is None:
+                    # results come back through _fitFinished
+                    self.fit_pool.submit(
+                        choice_history,
+                        reward_history,
+                        lambda fit: self._fitFinished.emit(
+                            fit, full, trial_num, trial_count
+                        ),
                         n_trial_back=n_trial_back,
-                        selected_trial_idx=selected_trial_idx,
                         cv=cv,
-                        fit_exponential=False,
+                        full=full,
+                        coef=self.estimator.coef,
+                        C=self.estimator.C,
+                    )
+                    return
+                if full:
+                    with self.lock:
+                        fit = full_fit(
+                            choice_history,
+                            reward_history,
+                            n_trial_back,
+                            selected_trial_idx,
+                            cv,
+                        )
+                    self.estimator.warm_start(fit.coef, C=fit.C)
+                    bias, lower, upper = fit.bias, fit.lower, fit.upper
+                else:
+                    # the histories are copies, no need to hold the data lock
+                    bias, (lower, upper) = self.estimator.fit(
+                        choice_history, reward_history, n_trial_back
                     )
-                bias = lr["df_beta"].loc["bias"]["cross_validation"].values[0]
                 self.log.info(f"Bias: {bias} Trial Number: {trial_num}")
                 self._biases.append(bias)
-
-                # add confidence intervals
-                upper = (
-                    lr["df_beta"].loc["bias"]["bootstrap_CI_upper"].values[0]
-                )
-                lower = (
-                    lr["df_beta"].loc["bias"]["bootstrap_CI_lower"].values[0]
-                )
             elif len(unique) == 0:
                 # no choices, report bias confidence as (-inf, +inf)
                 bias = 0
@@ -242,61 +288,84 @@ class BiasIndicator(QMainWindow):
             else:  # skip bias calculation if no conditions are met
                 return
 
-            self.biasValue.emit(bias, [lower, upper], trial_num)
+            self._show_bias(bias, lower, upper, trial_num, trial_count)
 
-            # update
-            self._upper_scatter_item.setData(
-                x=np.append(self._upper_scatter_item.xData, trial_num),
-                y=np.append(self._upper_scatter_item.yData, upper),
-            )
-            self._lower_scatter_item.setData(
-                x=np.append(self._lower_scatter_item.xData, trial_num),
-                y=np.append(self._lower_scatter_item.yData, lower),
-            )
+    def _fit_finished(
+        self, fit: BiasFit, full: bool, trial_num: int, trial_count: int
+    ):
+        """Show a fit done in the process pool"""
+        if full:
+            self.estimator.warm_start(fit.coef, C=fit.C)
+        else:
+            self.estimator.warm_start(fit.coef)
+        self.log.info(f"Bias: {fit.bias} Trial Number: {trial_num}")
+        self._biases.append(fit.bias)
+        self._show_bias(fit.bias, fit.lower, fit.upper, trial_num, trial_count)
 
-            # add to plot
-            if len(self._biases) >= 2:
-                # append data with latest
-                x = np.append(self._biases_scatter_item.xData, trial_num)
-                y = np.append(self._biases_scatter_item.yData, bias)
-
-                self._biases_scatter_item.setData(x=x, y=y)
-
-                # auto scroll graph
-                if trial_num >= self.bias_plot.getAxis("bottom").range[1] - 50:
-                    self.bias_plot.setRange(
-                        xRange=[
-                            (
-                                trial_num - self.x_range
-                                if self.x_range < trial_num
-                                else 2
-                            ),
-                            trial_num + 50,
-                        ]
-                    )
+    def _show_bias(
+        self,
+        bias: float,
+        lower: float,
+        upper: float,
+        trial_num: int,
+        trial_count: int,
+    ):
+        """Emit the bias and add it to the plot"""
+        self.biasValue.emit(bias, [lower, upper], trial_num)
 
-            # emit signal and flash current bias point if over
-            if abs(bias) > self.bias_threshold:
-                self.log.info(
-                    f"Bias value calculated over a threshold of {self.bias_threshold}. Bias: {bias} "
-                    f"Trial Count: {trial_count}"
-                )
-                self.biasOver.emit(bias, trial_count)
-                self._current_bias_point.setData(
-                    pos=[[trial_num, bias]],
-                    pen=QColor("purple"),
-                    brush=QColor("purple"),
-                    size=9,
-                )
+        # update
+        self._upper_scatter_item.setData(
+            x=np.append(self._upper_scatter_item.xData, trial_num),
+            y=np.append(self._upper_scatter_item.yData, upper),
+        )
+        self._lower_scatter_item.setData(
+            x=np.append(self._lower_scatter_item.xData, trial_num),
+            y=np.append(self._lower_scatter_item.yData, lower),
+        )
 
-            else:
-                self._current_bias_point.setData(
-                    pos=[[trial_num, bias]],
-                    pen=QColor("green"),
-                    brush=QColor("green"),
-                    size=9,
+        # add to plot
+        if len(self._biases) >= 2:
+            # append data with latest
+            x = np.append(self._biases_scatter_item.xData, trial_num)
+            y = np.append(self._biases_scatter_item.yData, bias)
+
+            self._biases_scatter_item.setData(x=x, y=y)
+
+            # auto scroll graph
+            if trial_num >= self.bias_plot.getAxis("bottom").range[1] - 50:
+                self.bias_plot.setRange(
+                    xRange=[
+                        (
+                            trial_num - self.x_range
+                            if self.x_range < trial_num
+                            else 2
+                        ),
+                        trial_num + 50,
+                    ]
                 )
 
+        # emit signal and flash current bias point if over
+        if abs(bias) > self.bias_threshold:
+            self.log.info(
+                f"Bias value calculated over a threshold of {self.bias_threshold}. Bias: {bias} "
+                f"Trial Count: {trial_count}"
+            )
+            self.biasOver.emit(bias, trial_count)
+            self._current_bias_point.setData(
+                pos=[[trial_num, bias]],
+                pen=QColor("purple"),
+                brush=QColor("purple"),
+                size=9,
+            )
+
+        else:
+            self._current_bias_point.setData(
+                pos=[[trial_num, bias]],
+                pen=QColor("green"),
+                brush=QColor("green"),
+                size=9,
+            )
+
     def clear(self):
         """Clear table of all items and clear biases list"""
 
@@ -316,6 +385,11 @@ class BiasIndicator(QMainWindow):
 
         # reset bias list
         self._biases = []
+        # reset fast fit and drop fits of the previous session
+        self.estimator.reset()
+        self._fast_fits = 0
+        if self.fit_pool is not None:
+            self.fit_pool.cancel()
         # reset upper and lower ci
         self._upper_scatter_item = PlotDataItem([0], [0], pen="lightgray")
         self._lower_scatter_item = PlotDataItem([0], [0], pen="lightgray")
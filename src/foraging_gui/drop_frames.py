@@ -0,0 +1,300 @@
+"""
+Dropped-frame verification: compare the number of camera triggers logged by the Harp
+behavior board with the number of frames each camera wrote to its metadata csv.
+
+Counting does not parse the files. Harp messages of one register all have the same
+length, so the trigger count is the file size divided by the message length, and csv rows
+are counted as newlines in large binary reads.
+
+DropFrameMonitor runs the same comparison while recording, reading only what was
+appended to the files since its last poll.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+# camera trigger register of the behavior board
+CAMERA_TRIGGER_FILE = os.path.join("BehaviorEvents", "Event_94.bin")
+_READ_SIZE = 1 << 20
+
+
+class CameraFiles(NamedTuple):
+    camera_name: str
+    video_label: str  # name of the video in the drop-frame report
+    csv_path: Optional[str]  # None if the camera has no metadata csv
+    has_header: bool
+    nested: bool  # camera subfolder with video.mp4 + metadata.csv
+
+
+class CameraFrames(NamedTuple):
+    camera: CameraFiles
+    num_frames: Optional[int]  # None if the metadata csv is missing
+
+
+def harp_message_count(path: str) -> int:
+    """Number of messages in a Harp binary file of a single register"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    # the second byte of every message is its length after the first two bytes
+    header = np.memmap(path, dtype=np.uint8, mode="r", shape=(2,))
+    stride = int(header[1]) + 2
+    del header
+    # a message still being written is not counted
+    return size // stride
+
+
+def count_csv_rows(path: str, has_header: bool = False) -> int:
+    """Number of data rows of a csv file, an unterminated last line counts as a row"""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_READ_SIZE)
+            if not chunk:
+                break
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        lines += 1
+    if has_header and lines:
+        lines -= 1
+    return lines
+
+
+def find_camera_files(video_folder: str) -> List[CameraFiles]:
+    """
+    Cameras of a video folder, with either of the two folder structures:
+    1) Flat structure, the camera name is the name of the video:
+            video_folder/
+                CameraA.avi
+                CameraA.csv
+    2) Nested structure, the subfolder name is the camera name:
+            video_folder/
+                CameraA/
+                    video.mp4
+                    metadata.csv
+    Cameras of the flat structure come first.
+    """
+    entries = os.listdir(video_folder)
+    csv_files = [f for f in entries if f.endswith(".csv")]
+    avi_files = [f for f in entries if f.endswith(".avi")]
+    subfolders = [
+        d for d in entries if os.path.isdir(os.path.join(video_folder, d))
+    ]
+
+    cameras = []
+    for avi_file in avi_files:
+        csv_file = avi_file.replace(".avi", ".csv")
+        cameras.append(
+            CameraFiles(
+                camera_name=avi_file.replace(".avi", ""),
+                video_label=avi_file,
+                csv_path=(
+                    os.path.join(video_folder, csv_file)
+                    if csv_file in csv_files
+                    else None
+                ),
+                has_header=False,
+                nested=False,
+            )
+        )
+    for camera_name in subfolders:
+        cam_dir = os.path.join(video_folder, camera_name)
+        metadata_path = os.path.join(cam_dir, "metadata.csv")
+        mp4_files = [
+            f for f in os.listdir(cam_dir) if f.lower().endswith(".mp4")
+        ]
+        # fall back to a generic name if no mp4 is found
+        video_file = mp4_files[0] if mp4_files else "video.mp4"
+        cameras.append(
+            CameraFiles(
+                camera_name=camera_name,
+                video_label=f"{camera_name}/{video_file}",
+                csv_path=(
+                    metadata_path if os.path.exists(metadata_path) else None
+                ),
+                has_header=True,
+                nested=True,
+            )
+        )
+    return cameras
+
+
+def wait_for_stable_size(
+    paths: Sequence[str],
+    stable_for: float = 1.0,
+    timeout: float = 10.0,
+    poll: float = 0.2,
+) -> bool:
+    """
+    Wait until none of the files has changed size for stable_for seconds, i.e. the
+    writers have flushed them. Return False if they were still growing after timeout.
+    """
+
+    def sizes():
+        return [os.path.getsize(p) if os.path.exists(p) else -1 for p in paths]
+
+    start = time.monotonic()
+    last_sizes = sizes()
+    last_change = start
+    while True:
+        now = time.monotonic()
+        if now - last_change >= stable_for:
+            return True
+        if now - start >= timeout:
+            return False
+        time.sleep(poll)
+        current = sizes()
+        if current != last_sizes:
+            last_sizes = current
+            last_change = time.monotonic()
+
+
+def count_frames(
+    cameras: Sequence[CameraFiles], max_workers: Optional[int] = None
+) -> List[CameraFrames]:
+    """Count the frames of every camera in a thread pool, in the order of cameras"""
+    with_csv = [c for c in cameras if c.csv_path is not None]
+    with ThreadPoolExecutor(
+        max_workers=max_workers or max(len(with_csv), 1)
+    ) as executor:
+        counts = iter(
+            list(
+                executor.map(
+                    lambda c: count_csv_rows(c.csv_path, c.has_header),
+                    with_csv,
+                )
+            )
+        )
+    return [
+        CameraFrames(c, next(counts) if c.csv_path is not None else None)
+        for c in cameras
+    ]
+
+
+class CsvTail:
+    """Running row count of a csv file that is being appended to"""
+
+    def __init__(self, path: str, has_header: bool = False):
+        self.path = path
+        self.has_header = has_header
+        self.offset = 0
+        self.lines = 0
+
+    def update(self) -> int:
+        """Count the lines completed since the last update and return the row count"""
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            # the file was rewritten
+            self.offset = 0
+            self.lines = 0
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            while self.offset < size:
+                chunk = f.read(min(_READ_SIZE, size - self.offset))
+                if not chunk:
+                    break
+                self.offset += len(chunk)
+                self.lines += chunk.count(b"\n")
+        return self.rows
+
+    @property
+    def rows(self) -> int:
+        """Complete data rows read so far"""
+        if self.has_header:
+            return max(self.lines - 1, 0)
+        return self.lines
+
+
+class DropFrameMonitor:
+    """
+    Background thread comparing the camera triggers with the frames written by each
+    camera while recording. Cameras are looked up with find_camera_files at every poll,
+    so cameras whose csv appears late are picked up.
+
+    Frames reach the csv a little after their trigger, so a camera is only reported
+    when it lags the triggers by more than tolerance frames, and again each time the
+    lag grows by another tolerance frames.
+    """
+
+    def __init__(
+        self,
+        harp_folder: str,
+        video_folder: str,
+        tolerance: int = 500,
+        interval: float = 2.0,
+        warning_log_tag: Optional[str] = None,
+    ):
+        """
+        :param harp_folder: folder of the Harp files of the session
+        :param video_folder: folder the cameras write to
+        :param tolerance: lag in frames reported as dropped frames, e.g. one second of
+            frames
+        :param interval: seconds between polls
+        :param warning_log_tag: tag of the warnings shown in the WarningWidget
+        """
+        self.trigger_file = os.path.join(harp_folder, CAMERA_TRIGGER_FILE)
+        self.video_folder = video_folder
+        self.tolerance = tolerance
+        self.interval = interval
+        self.warning_log_tag = warning_log_tag
+        self.trigger_length = 0
+        self.deltas: Dict[str, int] = {}  # triggers - frames of each camera
+        self._tails: Dict[str, CsvTail] = {}
+        self._reported: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="DropFrameMonitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling, without waiting for the last poll to finish"""
+        self._stop.set()
+
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # files can disappear or be locked while recording, try again next poll
+                logging.debug(f"Drop frame monitor poll failed: {e}")
+
+    def poll(self):
+        """Update the trigger and frame counts and report cameras lagging behind"""
+        if not os.path.exists(self.trigger_file) or not os.path.isdir(
+            self.video_folder
+        ):
+            return
+        self.trigger_length = harp_message_count(self.trigger_file)
+        for camera in find_camera_files(self.video_folder):
+            if camera.csv_path is None:
+                continue
+            tail = self._tails.get(camera.camera_name)
+            if tail is None or tail.path != camera.csv_path:
+                tail = CsvTail(camera.csv_path, camera.has_header)
+                self._tails[camera.camera_name] = tail
+            delta = self.trigger_length - tail.update()
+            self.deltas[camera.camera_name] = delta
+            reported = self._reported.get(camera.camera_name, 0)
+            if delta > self.tolerance and delta - reported >= self.tolerance:
+                self._reported[camera.camera_name] = delta
+                logging.warning(
+                    f"{camera.video_label} is {delta} frames behind "
+                    f"{self.trigger_length} camera triggers, frames may be dropped",
+                    extra={"tags": [self.warning_log_tag]},
+                )
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+def optimal_reward_probability(
+    reward_prob: np.ndarray, baited: bool
+) -> np.ndarray:
+    """
+    Expected reward per trial of the optimal forager knowing the reward probabilities,
+    as in aind_dynamic_foraging_basic_analysis.compute_foraging_efficiency
+    :param reward_prob: 2 x trials left/right reward probabilities
+    :param baited: greedy choices without baiting, "fix-and-sample" with baiting
+    """
+    p_max = np.max(reward_prob, axis=0)
+    if not baited:
+        return p_max
+    p_min = np.min(reward_prob, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m_star = np.floor(np.log(1 - p_max) / np.log(1 - p_min))
+        p_star = p_max + (1 - (1 - p_min) ** (m_star + 1) - p_max**2) / (
+            m_star + 1
+        )
+    # greedy is optimal when a side never or always gives reward
+    return np.where((p_min == 0) | (p_max >= 1), p_max, p_star)
+
+
+class ForagingEfficiency:
+    """
+    Running foraging efficiency (reward of the animal / reward of the optimal forager)
+    updated with the trials completed since the last update, so the per-trial cost does not
+    grow with the session length. Gives the same values as compute_foraging_efficiency of
+    aind_dynamic_foraging_basic_analysis on the whole history, which remains the reference
+    (see GenerateTrials.foraging_eff).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, baited: bool = False):
+        """Forget all trials"""
+        self.baited = baited
+        self.trial_n = 0  # number of trials folded into the totals
+        self.valid_n = 0  # responded trials without auto water
+        self.reward_actual = 0
+        # expected optimal reward of the trials with reward probabilities
+        self.optimal_sum = 0.0
+        self.optimal_n = 0
+        # optimal reward with the actual random numbers
+        self.optimal_random_seed = 0
+        # effective block of the optimal forager simulated with the random numbers
+        self._block_prob = None
+        self._block_trial = 0
+        self._block_sample_every = None  # None for greedy choices
+        self._block_max_side = 0
+        self._available = np.zeros(2, dtype=bool)  # min side, max side
+
+    def update(
+        self,
+        baited: bool,
+        animal_response: np.ndarray,
+        rewarded: np.ndarray,
+        reward_prob: np.ndarray,
+        random_number: np.ndarray,
+        auto_water_trial: np.ndarray,
+    ):
+        """
+        Fold the trials not seen yet into the running totals and return the foraging
+        efficiency and the foraging efficiency with the actual random numbers
+        :param baited: whether the task bait rewards
+        :param animal_response: choice history, 0 left, 1 right, 2 no response
+        :param rewarded: 2 x trials earned reward history
+        :param reward_prob: 2 x trials reward probabilities (may include the upcoming trial)
+        :param random_number: 2 x trials random numbers drawn to bait the trials
+        :param auto_water_trial: 2 x trials auto water history (may include the upcoming trial)
+        """
+        n = min(
+            len(animal_response),
+            np.shape(rewarded)[1],
+            np.shape(reward_prob)[1],
+            np.shape(random_number)[1],
+            np.shape(auto_water_trial)[1],
+        )
+        if n < self.trial_n or baited != self.baited:
+            # histories were replaced, e.g. a session was loaded, or the task changed
+            self.reset(baited)
+        new = slice(self.trial_n, n)
+        valid = (np.asarray(animal_response[new]) != 2) & ~np.any(
+            np.asarray(auto_water_trial)[:, new] == 1, axis=0
+        )
+        self.trial_n = n
+        if np.any(valid):
+            self._add_trials(
+                np.any(np.asarray(rewarded)[:, new], axis=0)[valid],
+                np.asarray(reward_prob, dtype=float)[:, new][:, valid],
+                np.asarray(random_number, dtype=float)[:, new][:, valid],
+            )
+        return self.efficiency()
+
+    def _add_trials(self, rewarded, reward_prob, random_number):
+        self.valid_n += len(rewarded)
+        self.reward_actual += int(np.sum(rewarded))
+        p_optimal = optimal_reward_probability(reward_prob, self.baited)
+        finite = ~np.isnan(p_optimal)
+        self.optimal_sum += float(np.sum(p_optimal[finite]))
+        self.optimal_n += int(np.sum(finite))
+        refills = reward_prob >= random_number
+        if not self.baited:
+            # greedy choices, left on ties
+            choice = np.argmax(reward_prob, axis=0)
+            self.optimal_random_seed += int(
+                np.sum(refills[choice, np.arange(len(choice))])
+            )
+            return
+        for p, refill in zip(reward_prob.T, refills.T):
+            self._add_baited_trial(p, refill)
+
+    def _add_baited_trial(self, p, refill):
+        """One trial of the optimal forager with baiting, given the actual refills"""
+        if self._block_prob is None or np.any(p != self._block_prob):
+            # a change of either side (or nan probabilities) starts an effective block
+            self._block_prob = p
+            self._block_trial = 0
+            self._available[:] = False
+            p_max, p_min = np.max(p), np.min(p)
+            self._block_max_side = int(np.argmax(p))
+            if p_min == 0 or p_max >= 1:
+                self._block_sample_every = None
+            else:
+                # stay on the max side m_star trials, then sample the min side once
+                m_star = np.floor(np.log(1 - p_max) / np.log(1 - p_min))
+                self._block_sample_every = int(m_star) + 1
+        sample_min = (
+            self._block_sample_every is not None
+            and self._block_trial % self._block_sample_every
+            == self._block_sample_every - 1
+        )
+        choice = 0 if sample_min else 1  # min side, max side
+        self._available |= np.array(
+            [refill[1 - self._block_max_side], refill[self._block_max_side]]
+        )
+        self.optimal_random_seed += int(self._available[choice])
+        self._available[choice] = False
+        self._block_trial += 1
+
+    def efficiency(self):
+        """foraging efficiency, foraging efficiency with the actual random numbers"""
+        reward_optimal = (
+            self.optimal_sum / self.optimal_n * self.valid_n
+            if self.optimal_n
+            else np.nan
+        )
+        reward_optimal_random_seed = self.optimal_random_seed
+        if self.baited and not reward_optimal_random_seed:
+            reward_optimal_random_seed = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (
+                np.float64(self.reward_actual) / reward_optimal,
+                np.float64(self.reward_actual) / reward_optimal_random_seed,
+            )
@@ -0,0 +1,137 @@
+"""
+Read a few top-level fields of a large json object without parsing the whole file.
+
+Session jsons are several megabytes, mostly trial histories, while pickers and indexes
+only need a couple of fields such as ``Experimenter``. ``read_fields`` reads the file in
+chunks, skips the values of the other fields with regular expressions (nothing is
+decoded), and stops reading as soon as all requested fields are found.
+"""
+
+import json
+import re
+from typing import Dict, Iterable
+
+CHUNK_SIZE = 1 << 18
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# unrolled loops: every character can be matched in only one way, so a string cut by
+# the end of the buffer fails in linear time instead of backtracking exponentially
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+# runs of characters and complete strings that do not open or close a container, at
+# the top level of a value (where a comma ends it) and inside containers
+_TOP_LEVEL_RUN = re.compile(
+    r'[^"\[\]{},]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{},]*)*'
+)
+_NESTED_RUN = re.compile(
+    r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*'
+)
+
+
+class _JsonStream:
+    """Buffered reader of a json text, keeping the text from mark (or pos) on"""
+
+    def __init__(self, file, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.mark = None
+
+    def more(self):
+        """Read the next chunk, raise ValueError at the end of the file"""
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            raise ValueError("Unexpected end of json")
+        drop = self.pos if self.mark is None else self.mark
+        self.buffer = self.buffer[drop:] + chunk
+        self.pos -= drop
+        if self.mark is not None:
+            self.mark -= drop
+
+    def next_char(self) -> str:
+        """Skip whitespace and return the next character, without consuming it"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.more()
+
+    def expect(self, char: str):
+        if self.next_char() != char:
+            raise ValueError(
+                f"Expected {char!r} in json, got {self.buffer[self.pos]!r}"
+            )
+        self.pos += 1
+
+    def string(self) -> str:
+        if self.next_char() != '"':
+            raise ValueError("Expected a string key in json")
+        while True:
+            match = _STRING.match(self.buffer, self.pos)
+            if match is not None:
+                self.pos = match.end()
+                return json.loads(match.group())
+            self.more()
+
+    def skip_value(self):
+        """Move pos to the end of the value starting at pos"""
+        self.next_char()
+        depth = 0
+        while True:
+            run = _TOP_LEVEL_RUN if depth == 0 else _NESTED_RUN
+            self.pos = run.match(self.buffer, self.pos).end()
+            if self.pos == len(self.buffer):
+                self.more()
+                continue
+            char = self.buffer[self.pos]
+            if char == '"':
+                # string cut at the end of the buffer
+                self.more()
+                continue
+            if char in "[{":
+                depth += 1
+            elif char in "]}":
+                if depth == 0:
+                    return
+                depth -= 1
+            elif char == ",":
+                return
+            self.pos += 1
+
+    def value(self):
+        """Decode the value starting at pos"""
+        self.next_char()
+        self.mark = self.pos
+        try:
+            self.skip_value()
+            return json.loads(self.buffer[self.mark : self.pos])
+        finally:
+            self.mark = None
+
+
+def read_fields(
+    path: str, keys: Iterable[str], chunk_size: int = CHUNK_SIZE
+) -> Dict[str, object]:
+    """
+    Values of some top-level fields of a json object file
+    :param path: json file holding an object
+    :param keys: fields to read
+    :return: field -> value, without the fields the object does not have
+    """
+    keys = set(keys)
+    fields = {}
+    with open(path, "r") as f:
+        stream = _JsonStream(f, chunk_size)
+        stream.expect("{")
+        if stream.next_char() == "}":
+            return fields
+        while len(fields) < len(keys):
+            key = stream.string()
+            stream.expect(":")
+            if key in keys:
+                fields[key] = stream.value()
+            else:
+                stream.skip_value()
+            if stream.next_char() == "}":
+                break
+            stream.expect(",")
+    return fields
@@ -0,0 +1,171 @@
+"""
+Laser waveforms of the optogenetics protocols (Sine, Pulse, Constant), shared by the trial
+generator, the laser calibration and the optical tagging.
+
+A waveform only depends on a few parameters that rarely change within a session, so
+waveforms are cached: an opto trial with the same parameters as an earlier one reuses its
+waveform instead of building it again. Cached waveforms are read-only arrays.
+"""
+
+import functools
+import math
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+WAVEFORM_CACHE_SIZE = 64
+
+
+class LaserWaveform(NamedTuple):
+    # samples sent to Bonsai, empty if the parameters give no waveform (e.g. less than
+    # one pulse), None for an unknown protocol
+    wave: Optional[np.ndarray]
+    # problems with the parameters, to be logged by the caller
+    warnings: Tuple[str, ...]
+
+
+def laser_waveform(
+    protocol: str,
+    duration: float,
+    amplitude: float,
+    sample_frequency: float,
+    frequency: float = None,
+    pulse_duration: float = None,
+    ramping_down: float = 0,
+    offset: float = 0,
+    pulse_unit: float = 1,
+) -> LaserWaveform:
+    """
+    Waveform of a laser protocol, built once per set of parameters. The waveform ends with
+    two zero samples
+    :param protocol: "Sine", "Pulse" or "Constant"
+    :param duration: seconds of stimulation
+    :param amplitude: voltage of the laser at full power
+    :param sample_frequency: samples per second
+    :param frequency: sine or pulse frequency (Hz), unused by Constant
+    :param pulse_duration: duration of each pulse, only used by Pulse
+    :param ramping_down: seconds of linear ramping down at the end, unused by Pulse
+    :param offset: seconds of zeros before the stimulation, ignored if not positive
+    :param pulse_unit: pulse_duration units per second, e.g. 1000 for milliseconds
+    :raises ValueError: if the pulses are longer than the pulse period
+    """
+    # parameters the protocol does not use are dropped so that they do not split the
+    # cache
+    if protocol == "Constant":
+        frequency = None
+    if protocol == "Pulse":
+        ramping_down = 0
+    else:
+        pulse_duration = None
+        pulse_unit = 1
+    return _build_waveform(
+        protocol,
+        duration,
+        frequency,
+        pulse_duration,
+        ramping_down,
+        offset if offset > 0 else 0,
+        amplitude,
+        sample_frequency,
+        pulse_unit,
+    )
+
+
+@functools.lru_cache(maxsize=WAVEFORM_CACHE_SIZE)
+def _build_waveform(
+    protocol,
+    duration,
+    frequency,
+    pulse_duration,
+    ramping_down,
+    offset,
+    amplitude,
+    sample_frequency,
+    pulse_unit,
+) -> LaserWaveform:
+    warnings = []
+    if protocol == "Sine":
+        wave = amplitude * _unit_sine(duration, frequency, sample_frequency)
+        wave = _ramp_down(
+            wave, duration, ramping_down, sample_frequency, warnings
+        )
+    elif protocol == "Pulse":
+        wave = _pulses(
+            duration,
+            frequency,
+            pulse_duration,
+            amplitude,
+            sample_frequency,
+            pulse_unit,
+            warnings,
+        )
+        if wave is None:
+            return _read_only(np.empty(0), warnings)
+    elif protocol == "Constant":
+        wave = amplitude * np.ones(int(sample_frequency * duration))
+        wave = _ramp_down(
+            wave, duration, ramping_down, sample_frequency, warnings
+        )
+    else:
+        return LaserWaveform(None, ("Unidentified optogenetics protocol!",))
+    if offset > 0:
+        wave = np.concatenate((np.zeros(int(sample_frequency * offset)), wave))
+    return _read_only(np.append(wave, [0, 0]), warnings)
+
+
+def _read_only(wave: np.ndarray, warnings: list) -> LaserWaveform:
+    wave.flags.writeable = False
+    return LaserWaveform(wave, tuple(warnings))
+
+
+@functools.lru_cache(maxsize=WAVEFORM_CACHE_SIZE)
+def _unit_sine(duration, frequency, sample_frequency) -> np.ndarray:
+    """Sine between 0 and 1 starting at 0, shared by all amplitudes"""
+    resolution = sample_frequency * duration  # how many datapoints to generate
+    length = np.pi * 2 * duration * frequency  # phase covered by the cycles
+    phase = np.arange(
+        0 + 1.5 * math.pi, length + 1.5 * math.pi, length / resolution
+    )
+    wave = (1 + np.sin(phase)) / 2
+    wave.flags.writeable = False
+    return wave
+
+
+def _ramp_down(wave, duration, ramping_down, sample_frequency, warnings):
+    """Wave with its last ramping_down seconds ramping down linearly to 0"""
+    if ramping_down <= 0:
+        return wave
+    if ramping_down > duration:
+        warnings.append("Ramping down is longer than the laser duration!")
+        return wave
+    n_constant = int((duration - ramping_down) * sample_frequency)
+    ramp = np.arange(1, 0, -1 / (wave.shape[0] - n_constant))
+    return wave * np.concatenate((np.ones(n_constant), ramp))
+
+
+def _pulses(
+    duration,
+    frequency,
+    pulse_duration,
+    amplitude,
+    sample_frequency,
+    pulse_unit,
+    warnings,
+) -> Optional[np.ndarray]:
+    """Pulse train, None if there is less than one pulse"""
+    points_each_pulse = int(sample_frequency * pulse_duration / pulse_unit)
+    interval_points = int(1 / frequency * sample_frequency - points_each_pulse)
+    if interval_points < 0:
+        raise ValueError(
+            "Pulse frequency and pulse duration are not compatible!"
+        )
+    total_points = int(sample_frequency * duration)
+    pulse_number = np.floor(duration * frequency)
+    # pulse number should be greater than 0
+    if pulse_number <= 1:
+        warnings.append("Pulse number is less than 1!")
+        return None
+    pulse = amplitude * np.ones(points_each_pulse)
+    cycle = np.concatenate((pulse, np.zeros(interval_points)))
+    wave = np.concatenate((np.tile(cycle, int(pulse_number - 1)), pulse))
+    return np.concatenate((wave, np.zeros(total_points - wave.shape[0])))
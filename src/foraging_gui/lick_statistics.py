@@ -0,0 +1,192 @@
+import numpy as np
+
+from foraging_gui.trial_store import GrowableArray
+
+
+class SortedLicks:
+    """
+    Left and right licks merged into one time-sorted sequence, with prefix sums so the
+    number of left/right licks and of side switches (double dipping) inside any window
+    is found with two binary searches.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget all licks"""
+        # incremented whenever the merged sequence is rebuilt instead of extended
+        self.generation = getattr(self, "generation", -1) + 1
+        self.times = GrowableArray(dtype=float)
+        self.sides = GrowableArray(dtype=np.int8)  # 0 left, 1 right
+        # left_cum[k]: left licks among the first k licks
+        self.left_cum = GrowableArray(dtype=np.int64)
+        self.left_cum.append(0)
+        # switch_cum[k]: side switches between consecutive licks among the first k + 1 licks
+        self.switch_cum = GrowableArray(dtype=np.int64)
+        self.n_left = 0
+        self.n_right = 0
+
+    def update(self, left_lick_time: np.ndarray, right_lick_time: np.ndarray):
+        """
+        Merge the licks received since the last update
+        :param left_lick_time: full left lick history
+        :param right_lick_time: full right lick history
+        """
+        if (
+            len(left_lick_time) < self.n_left
+            or len(right_lick_time) < self.n_right
+        ):
+            # histories were replaced, e.g. a session was loaded
+            self.reset()
+        new_times, new_sides = merge_licks(
+            left_lick_time[self.n_left :], right_lick_time[self.n_right :]
+        )
+        if new_times.size == 0:
+            return
+        if len(self.times) and new_times[0] < self.times.view()[-1]:
+            # licks arrived out of order, merge everything again
+            self.reset()
+            new_times, new_sides = merge_licks(left_lick_time, right_lick_time)
+        self.n_left = len(left_lick_time)
+        self.n_right = len(right_lick_time)
+
+        previous_side = self.sides.view()[-1] if len(self.sides) else None
+        self.times.extend(new_times)
+        self.sides.extend(new_sides)
+        self.left_cum.extend(
+            self.left_cum.view()[-1] + np.cumsum(new_sides == 0)
+        )
+        switches = np.diff(new_sides) != 0
+        if previous_side is None:
+            switches = np.concatenate(([False], switches))
+        else:
+            switches = np.concatenate(
+                ([new_sides[0] != previous_side], switches)
+            )
+        last = self.switch_cum.view()[-1] if len(self.switch_cum) else 0
+        self.switch_cum.extend(last + np.cumsum(switches))
+
+    def window_stats(self, start: np.ndarray, stop: np.ndarray):
+        """
+        Count licks inside the windows [start, stop)
+        :param start: window starts, one per window
+        :param stop: window stops, one per window
+        :return: left lick counts, right lick counts and double dipping counts per window
+        """
+        times = self.times.view()
+        lo = np.searchsorted(times, np.asarray(start, dtype=float), "left")
+        hi = np.searchsorted(times, np.asarray(stop, dtype=float), "left")
+        hi = np.maximum(hi, lo)
+        left_cum = self.left_cum.view()
+        left = left_cum[hi] - left_cum[lo]
+        right = (hi - lo) - left
+        if len(times) == 0:
+            double_dipping = np.zeros_like(lo)
+        else:
+            # switches between licks lo..hi-1
+            switch_cum = self.switch_cum.view()
+            last = np.maximum(hi - 1, lo)
+            first = np.minimum(lo, len(times) - 1)
+            last = np.minimum(last, len(times) - 1)
+            double_dipping = switch_cum[last] - switch_cum[first]
+        return left, right, double_dipping
+
+
+class InterLickIntervals:
+    """
+    Running counts of same-side and cross-side inter-lick intervals under a threshold,
+    updated with the licks received since the last update.
+    """
+
+    def __init__(self, threshold: float = 0.1):
+        """
+        :param threshold: interval in seconds under which an interval is counted
+        """
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        """Forget all licks"""
+        self.last_time = [None, None]  # last left/right lick time
+        self.n_seen = [0, 0]  # left/right licks processed
+        self.same_side_total = [0, 0]
+        self.same_side_under = [0, 0]
+        self.cross_side_total = 0
+        self.cross_side_under = 0
+        self.merged_processed = (
+            0  # merged licks processed for cross-side intervals
+        )
+        self.generation = None
+
+    def update(self, sorted_licks: SortedLicks):
+        """
+        Count the intervals involving licks merged into sorted_licks since the last update
+        :param sorted_licks: merged licks, already updated with the current lick histories
+        """
+        if sorted_licks.generation != self.generation:
+            # the merged licks were rebuilt, count everything again
+            self.reset()
+            self.generation = sorted_licks.generation
+        times = sorted_licks.times.view()
+        sides = sorted_licks.sides.view()
+        start = self.merged_processed
+        if start >= len(times):
+            return
+        # same-side intervals between consecutive licks of each side
+        for side in range(2):
+            new = times[start:][sides[start:] == side]
+            if new.size == 0:
+                continue
+            if self.last_time[side] is not None:
+                new_with_last = np.concatenate(([self.last_time[side]], new))
+            else:
+                new_with_last = new
+            intervals = np.diff(new_with_last)
+            self.same_side_total[side] += intervals.size
+            self.same_side_under[side] += int(
+                np.sum(intervals <= self.threshold)
+            )
+            self.last_time[side] = new[-1]
+            self.n_seen[side] += new.size
+        # cross-side intervals between consecutive merged licks on different sides
+        first = max(start - 1, 0)
+        switches = np.diff(sides[first:]) != 0
+        intervals = np.diff(times[first:])[switches]
+        self.cross_side_total += intervals.size
+        self.cross_side_under += int(np.sum(intervals <= self.threshold))
+        self.merged_processed = len(times)
+
+    @staticmethod
+    def _fraction(under, total) -> float:
+        return under / total if total > 0 else np.nan
+
+    def same_side_fraction(self, side: int = None) -> float:
+        """Fraction of same-side intervals under threshold, for one side or both if None"""
+        if side is None:
+            return self._fraction(
+                sum(self.same_side_under), sum(self.same_side_total)
+            )
+        return self._fraction(
+            self.same_side_under[side], self.same_side_total[side]
+        )
+
+    def cross_side_fraction(self) -> float:
+        """Fraction of cross-side intervals under threshold"""
+        return self._fraction(self.cross_side_under, self.cross_side_total)
+
+
+def merge_licks(left_lick_time: np.ndarray, right_lick_time: np.ndarray):
+    """
+    Merge left and right licks in time order
+    :return: sorted lick times and the side of each lick (0 left, 1 right)
+    """
+    times = np.concatenate((left_lick_time, right_lick_time)).astype(float)
+    sides = np.concatenate(
+        (
+            np.zeros(len(left_lick_time), dtype=np.int8),
+            np.ones(len(right_lick_time), dtype=np.int8),
+        )
+    )
+    order = np.argsort(times, kind="stable")
+    return times[order], sides[order]
@@ -0,0 +1,301 @@
+"""
+Batch conversion of the sessions under a data root to NWB with bonsai_to_nwb.
+
+Sessions are converted in worker processes, each conversion with a timeout. Every
+result is appended to a manifest (``nwb_manifest.jsonl`` in the output folder by
+default), so an interrupted run can be started again and goes on where it stopped:
+
+``python -m foraging_gui.nwb_batch <data root> <nwb folder> --workers 8``
+
+Sessions whose NWB is newer than the session file are skipped, as well as sessions the
+manifest already records as converted, incomplete or without trials.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from multiprocessing.connection import wait
+from typing import Dict, Iterator, List
+
+from foraging_gui.session_index import is_session_file
+
+MANIFEST_FILE = "nwb_manifest.jsonl"
+# results of bonsai_to_nwb that converting again would not change
+FINAL_STATUSES = ("success", "incomplete_json", "empty_trials")
+# session folders that never hold the session file
+SKIPPED_FOLDERS = {"raw.harp", "behavior-videos", "fib", "metadata-dir"}
+
+
+def find_sessions(root: str) -> Iterator[str]:
+    """Session files under root: session jsons, and mat files without a json"""
+    for folder, folders, files in os.walk(root):
+        folders[:] = sorted(f for f in folders if f not in SKIPPED_FOLDERS)
+        names = set(files)
+        for file_name in sorted(files):
+            if is_session_file(file_name):
+                yield os.path.join(folder, file_name)
+            elif (
+                file_name.endswith(".mat")
+                and file_name[: -len(".mat")] + ".json" not in names
+            ):
+                yield os.path.join(folder, file_name)
+
+
+def nwb_path(session_file: str, out_folder: str) -> str:
+    """NWB file bonsai_to_nwb writes for a session file"""
+    return os.path.join(
+        out_folder,
+        os.path.splitext(os.path.basename(session_file))[0] + ".nwb",
+    )
+
+
+def read_manifest(path: str) -> Dict[str, dict]:
+    """Last manifest record of each session file"""
+    records = {}
+    if not os.path.isfile(path):
+        return records
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # cut short by an interrupted run
+            records[record["source"]] = record
+    return records
+
+
+def is_up_to_date(session_file: str, out_folder: str, manifest: dict) -> bool:
+    """Whether a session does not need to be converted again"""
+    modified = os.path.getmtime(session_file)
+    nwb_file = nwb_path(session_file, out_folder)
+    if os.path.isfile(nwb_file) and os.path.getmtime(nwb_file) >= modified:
+        return True
+    record = manifest.get(session_file)
+    return (
+        record is not None
+        and record["status"] in FINAL_STATUSES
+        and record["source_mtime"] == modified
+    )
+
+
+def _convert_in_worker(connection, out_folder: str):
+    """Worker process: convert the session files received until None is received"""
+    from foraging_gui.TransferToNWB import bonsai_to_nwb
+
+    while True:
+        session_file = connection.recv()
+        if session_file is None:
+            return
+        # the timeout runs from here, not from the submission, which includes the
+        # start of the process and the imports for the first session
+        connection.send(("started", None))
+        try:
+            result = (bonsai_to_nwb(session_file, out_folder), None)
+        except Exception:
+            result = ("error", traceback.format_exc())
+        connection.send(result)
+
+
+class _Worker:
+    """Worker process converting one session at a time"""
+
+    def __init__(self, context, out_folder: str):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_convert_in_worker,
+            args=(child_connection, out_folder),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.session_file = None
+        self.started = None
+
+    def submit(self, session_file: str):
+        self.session_file = session_file
+        self.started = (
+            time.time()
+        )  # reset when the worker starts the conversion
+        self.connection.send(session_file)
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+def convert_sessions(
+    session_files: List[str],
+    out_folder: str,
+    manifest_file: str,
+    workers: int = None,
+    timeout: float = 600,
+    report_every: int = 50,
+) -> Dict[str, int]:
+    """
+    Convert sessions in worker processes and append each result to the manifest
+    :param workers: number of worker processes, defaults to the number of CPUs
+    :param timeout: seconds after which a conversion is stopped and recorded as timeout
+    :param report_every: log the progress every report_every sessions
+    :return: number of sessions per status
+    """
+    os.makedirs(out_folder, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    workers = min(workers or os.cpu_count() or 1, len(session_files))
+    pending = list(reversed(session_files))
+    pool = [_Worker(context, out_folder) for _ in range(workers)]
+    counts = {}
+    start_time = time.time()
+    n_done = 0
+
+    def record(worker: _Worker, status: str, error: str = None):
+        nonlocal n_done
+        elapsed = time.time() - worker.started
+        entry = {
+            "source": worker.session_file,
+            "nwb": nwb_path(worker.session_file, out_folder),
+            "status": status,
+            "seconds": round(elapsed, 2),
+            "source_mtime": os.path.getmtime(worker.session_file),
+            "time": time.time(),
+        }
+        if error is not None:
+            entry["traceback"] = error
+            logging.error(f"{worker.session_file}: {status}\n{error}")
+        manifest.write(json.dumps(entry) + "\n")
+        manifest.flush()
+        counts[status] = counts.get(status, 0) + 1
+        worker.session_file = None
+        n_done += 1
+        if n_done % report_every == 0 or n_done == len(session_files):
+            minutes = (time.time() - start_time) / 60
+            logging.info(
+                f"{n_done}/{len(session_files)} sessions, "
+                f"{n_done / minutes:.1f} sessions/min, {counts}"
+            )
+
+    with open(manifest_file, "a") as manifest:
+        try:
+            for worker in pool:
+                if pending:
+                    worker.submit(pending.pop())
+            while any(worker.session_file is not None for worker in pool):
+                busy = [w for w in pool if w.session_file is not None]
+                deadline = min(w.started for w in busy) + timeout
+                ready = wait(
+                    [w.connection for w in busy],
+                    timeout=max(deadline - time.time(), 0),
+                )
+                for i, worker in enumerate(pool):
+                    if worker.session_file is None:
+                        continue
+                    if worker.connection in ready:
+                        try:
+                            status, error = worker.connection.recv()
+                            replace = False
+                            if status == "started":
+                                worker.started = time.time()
+                                continue
+                        except EOFError:
+                            worker.process.join()
+                            status, error = "error", (
+                                "worker exited with code "
+                                f"{worker.process.exitcode}"
+                            )
+                            replace = True
+                    elif time.time() - worker.started >= timeout:
+                        status, error = "timeout", f"over {timeout} s"
+                        replace = True
+                    else:
+                        continue
+                    record(worker, status, error)
+                    if replace:
+                        # the worker is stuck or gone
+                        worker.kill()
+                        worker = pool[i] = _Worker(context, out_folder)
+                    if pending:
+                        worker.submit(pending.pop())
+        finally:
+            for worker in pool:
+                if worker.session_file is None:
+                    worker.stop()
+                else:
+                    worker.kill()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert the behavior sessions under a data root to NWB"
+    )
+    parser.add_argument("root", help="data root to search for session files")
+    parser.add_argument("out_folder", help="folder to write the NWB files to")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to the CPU count"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="seconds allowed to convert one session",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help=f"results manifest, defaults to {MANIFEST_FILE} in out_folder",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="convert all sessions, even the up-to-date ones",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s"
+    )
+    manifest_file = args.manifest or os.path.join(
+        args.out_folder, MANIFEST_FILE
+    )
+    manifest = read_manifest(manifest_file)
+    session_files = list(find_sessions(os.path.abspath(args.root)))
+    to_convert = [
+        session_file
+        for session_file in session_files
+        if args.force
+        or not is_up_to_date(session_file, args.out_folder, manifest)
+    ]
+    logging.info(
+        f"{len(session_files)} sessions found, {len(to_convert)} to convert"
+    )
+    if not to_convert:
+        return
+    start_time = time.time()
+    counts = convert_sessions(
+        to_convert,
+        args.out_folder,
+        manifest_file,
+        workers=args.workers,
+        timeout=args.timeout,
+    )
+    minutes = (time.time() - start_time) / 60
+    logging.info(
+        f"Converted {len(to_convert)} sessions in {minutes:.1f} min "
+        f"({len(to_convert) / minutes:.1f} sessions/min): {counts}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+History of the TP_ training parameters of a session, stored as a change log.
+
+Sessions used to save one list per TP_ parameter with its value at every trial. They now
+save ``Obj["parameter_log"]``: the parameters of the first trial plus one
+``[trial, name, value]`` entry each time a parameter changes. Use ``parameter_history`` to
+read the per-trial values of a saved session in either format.
+"""
+
+from bisect import bisect_right
+from collections.abc import Sequence
+from typing import Optional
+
+PARAMETER_LOG_KEY = "parameter_log"
+
+
+class ParameterHistory(Sequence):
+    """Per-trial values of one parameter, looked up in the change log on access"""
+
+    def __init__(self, log: "ParameterLog", name: str):
+        self.log = log
+        self.name = name
+
+    def __len__(self) -> int:
+        return self.log.n_trials
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.log.value(self.name, index)
+
+
+class ParameterLog:
+    """
+    Change log of the TP_ parameters: the parameters of the first trial, then an entry
+    only when a parameter changes. ``data`` is the json-ready representation saved with
+    the session, updated in place as trials are recorded.
+    """
+
+    def __init__(self, data: dict = None):
+        """
+        :param data: representation saved with a session, None to start a new log
+        """
+        if data is None:
+            data = {"initial": {}, "changes": [], "n_trials": 0}
+        self.data = data
+        # trials and values of the changes of each parameter, for lookups by trial
+        self.index = {}
+        for trial, name, value in data["changes"]:
+            trials, values = self.index.setdefault(name, ([], []))
+            trials.append(trial)
+            values.append(value)
+        self.current = dict(data["initial"])
+        for _, name, value in data["changes"]:
+            self.current[name] = value
+
+    @classmethod
+    def from_session(cls, Obj) -> Optional["ParameterLog"]:
+        """Log of a saved session, None for sessions saved with per-trial lists"""
+        if PARAMETER_LOG_KEY not in Obj:
+            return None
+        return cls(Obj[PARAMETER_LOG_KEY])
+
+    @property
+    def n_trials(self) -> int:
+        return self.data["n_trials"]
+
+    def __contains__(self, name) -> bool:
+        return name in self.current
+
+    def names(self):
+        return list(self.current)
+
+    def record(self, values: dict):
+        """
+        Log the parameters of the next trial
+        :param values: parameter name to value
+        """
+        trial = self.data["n_trials"]
+        if trial == 0:
+            self.data["initial"].update(values)
+        else:
+            for name, value in values.items():
+                if name in self.current:
+                    previous = self.current[name]
+                    if type(previous) is type(value) and previous == value:
+                        continue
+                self.data["changes"].append([trial, name, value])
+                trials, changed_values = self.index.setdefault(name, ([], []))
+                trials.append(trial)
+                changed_values.append(value)
+        self.current.update(values)
+        self.data["n_trials"] = trial + 1
+
+    def value(self, name: str, trial: int):
+        """
+        Value of a parameter at a trial
+        :param trial: trial index, negative to count from the last trial
+        :return: the value, None if the parameter did not exist yet
+        """
+        n_trials = self.data["n_trials"]
+        if trial < 0:
+            trial += n_trials
+        if not 0 <= trial < n_trials:
+            raise IndexError(f"trial {trial} out of range")
+        if name in self.index:
+            trials, values = self.index[name]
+            i = bisect_right(trials, trial)
+            if i > 0:
+                return values[i - 1]
+        return self.data["initial"].get(name)
+
+    def history(self, name: str) -> ParameterHistory:
+        """Per-trial values of a parameter, computed on access"""
+        return ParameterHistory(self, name)
+
+    def histories(self) -> dict:
+        """Per-trial value lists of all parameters, as sessions used to save them"""
+        histories = {}
+        for name in self.current:
+            history = []
+            value = self.data["initial"].get(name)
+            trials, values = self.index.get(name, ([], []))
+            for start, stop, next_value in zip(
+                [0] + trials, trials + [self.n_trials], [None] + values
+            ):
+                if start > 0:
+                    value = next_value
+                history.extend([value] * (stop - start))
+            histories[name] = history
+        return histories
+
+
+def parameter_history(Obj, name: str, log: ParameterLog = None):
+    """
+    Per-trial values of a TP_ parameter of a saved session, in either format
+    :param Obj: session dict
+    :param log: ParameterLog of Obj if already built, to avoid building it again
+    :return: list or ParameterHistory, None if the session does not have the parameter
+    """
+    if name in Obj:
+        return Obj[name]
+    if PARAMETER_LOG_KEY not in Obj:
+        return None
+    if log is None:
+        log = ParameterLog(Obj[PARAMETER_LOG_KEY])
+    if name not in log:
+        return None
+    return log.history(name)
@@ -0,0 +1,268 @@
+"""
+Batch versions of the reward schedules: N independent sessions simulated at once as
+NumPy arrays (sessions x trials), with the choices of a policy and their rewards.
+
+Each trial is one step over all sessions, so 10^5 sessions take about as many Python
+steps as one. The sessions follow the same rules as UncoupledBlocks and
+RandomWalkReward but draw their random numbers in a different order, so they match the
+scalar schedules in distribution, not trial by trial (checked by test_batch). Holding a
+block (hold_this_block) is not supported.
+
+A policy is called once per trial as ``policy(trial, sessions, rng)`` and returns the
+choice of every session, 0 left, 1 right, 2 ignored. It can read the columns before
+``trial`` of ``sessions`` and, e.g. for an ideal observer, the reward probabilities of
+``trial``.
+"""
+
+from typing import Callable, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+LEFT, RIGHT, IGNORED = 0, 1, 2
+
+
+class BatchSessions(NamedTuple):
+    reward_prob: np.ndarray  # sessions x trials x 2 (left, right)
+    choice: np.ndarray  # sessions x trials, 0 left, 1 right, 2 ignored
+    rewarded: np.ndarray  # sessions x trials
+    # sessions x trials, trials on which the anti-perseveration rule lengthened the
+    # blocks, None for schedules without it
+    persev_added: Optional[np.ndarray] = None
+
+
+def _empty_sessions(n_sessions, n_trials, persev=False):
+    return BatchSessions(
+        reward_prob=np.zeros((n_sessions, n_trials, 2)),
+        choice=np.full((n_sessions, n_trials), IGNORED, dtype=np.int8),
+        rewarded=np.zeros((n_sessions, n_trials), dtype=bool),
+        persev_added=(
+            np.zeros((n_sessions, n_trials), dtype=bool) if persev else None
+        ),
+    )
+
+
+def random_choice(trial, sessions, rng, p_ignore=0.1):
+    """Random left/right choices, ignoring p_ignore of the trials"""
+    n = len(sessions.choice)
+    choice = rng.integers(2, size=n)
+    choice[rng.random(n) < p_ignore] = IGNORED
+    return choice
+
+
+def win_stay_lose_switch(trial, sessions, rng, p_ignore=0.1):
+    """
+    The simulated forager of the GUI: repeat a rewarded choice, switch after an
+    unrewarded one, random after an ignored trial or during the first two trials
+    """
+    n = len(sessions.choice)
+    choice = rng.integers(2, size=n)
+    if trial < 2:
+        return choice
+    last_choice = sessions.choice[:, trial - 1]
+    last_rewarded = sessions.rewarded[:, trial - 1]
+    responded = last_choice != IGNORED
+    choice = np.where(
+        responded,
+        np.where(last_rewarded, last_choice, 1 - last_choice),
+        choice,
+    )
+    choice[rng.random(n) < p_ignore] = IGNORED
+    return choice
+
+
+def greedy(trial, sessions, rng):
+    """Ideal observer choosing the side with the higher reward probability"""
+    reward_prob = sessions.reward_prob[:, trial]
+    choice = (reward_prob[:, 1] > reward_prob[:, 0]).astype(np.int8)
+    ties = reward_prob[:, 1] == reward_prob[:, 0]
+    choice[ties] = rng.integers(2, size=np.count_nonzero(ties))
+    return choice
+
+
+def _respond(trial, sessions, policy, rng, bait, baiting):
+    """Bait the ports for this trial, get the choices and consume the chosen baits"""
+    n = len(sessions.choice)
+    new_bait = rng.random((n, 2)) < sessions.reward_prob[:, trial]
+    bait[:] = (bait & baiting) | new_bait
+    choice = np.asarray(policy(trial, sessions, rng))
+    responded = choice != IGNORED
+    sessions.choice[:, trial] = choice
+    rows = np.flatnonzero(responded)
+    sides = choice[responded].astype(int)
+    sessions.rewarded[rows, trial] = bait[rows, sides]
+    bait[rows, sides] = False
+
+
+def simulate_uncoupled_blocks(
+    n_sessions: int,
+    n_trials: int,
+    policy: Callable = win_stay_lose_switch,
+    rwd_prob_array: Sequence[float] = (0.1, 0.5, 0.9),
+    block_min: int = 20,
+    block_max: int = 35,
+    persev_add: bool = True,
+    perseverative_limit: int = 4,
+    max_block_tally: int = 4,
+    baiting: bool = True,
+    rng: Optional[np.random.Generator] = None,
+) -> BatchSessions:
+    """
+    UncoupledBlocks sessions, with the arguments of UncoupledBlocks
+    :param policy: policy(trial, sessions, rng) -> choices
+    :param baiting: whether an unchosen bait stays for the next trials
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    rwd_prob_array = np.asarray(rwd_prob_array, dtype=float)
+    if np.unique(rwd_prob_array).size < 2:
+        raise ValueError(
+            "Uncoupled blocks need at least two reward probabilities"
+        )
+    min_prob = rwd_prob_array.min()
+    block_stagger = int(
+        (round(block_max - block_min - 0.5) / 2 + block_min) / 2
+    )
+    sessions = _empty_sessions(n_sessions, n_trials, persev=persev_add)
+
+    def draw(n):
+        return rwd_prob_array[rng.integers(len(rwd_prob_array), size=n)]
+
+    def draw_excluding(previous):
+        # uniform over the probabilities other than the previous one, as re-drawing
+        # until it changes
+        valid = rwd_prob_array[None, :] != previous[:, None]
+        pick = np.floor(rng.random(len(previous)) * valid.sum(axis=1))
+        index = np.argmax(np.cumsum(valid, axis=1) > pick[:, None], axis=1)
+        return rwd_prob_array[index]
+
+    # current block of each side: end trial and reward probability
+    block_end = np.zeros((2, n_sessions), dtype=np.int64)
+    block_prob = np.zeros((2, n_sessions))
+    rwd_tally = np.zeros((2, n_sessions), dtype=np.int64)
+    persev_count = np.zeros((2, n_sessions), dtype=np.int64)
+    bait = np.zeros((n_sessions, 2), dtype=bool)
+
+    def next_block(side, rows, trial, check_higher, check_both_lowest):
+        other = 1 - side
+        block_end[side, rows] = trial + rng.integers(
+            block_min, block_max + 1, size=len(rows)
+        )
+        previous = block_prob[side, rows]
+        if check_higher:
+            # number of effective blocks in a row each side is higher or equal
+            other_now = block_prob[other, rows]
+            higher = previous > other_now
+            rwd_tally[side, rows] = np.where(
+                previous >= other_now, rwd_tally[side, rows] + 1, 0
+            )
+            rwd_tally[other, rows] = np.where(
+                higher, 0, rwd_tally[other, rows] + 1
+            )
+            # a side higher for too long is forced to the lowest probability
+            forced = rwd_tally[side, rows] >= max_block_tally
+            new = np.where(forced, min_prob, draw(len(rows)))
+            rwd_tally[:, rows[forced]] = 0
+        else:
+            new = draw(len(rows))
+        repeated = new == previous
+        new[repeated] = draw_excluding(previous[repeated])
+        block_prob[side, rows] = new
+        if check_both_lowest:
+            # both sides at the lowest: stagger this side, switch the other one
+            both_lowest = (new == block_prob[other, rows]) & (new == min_prob)
+            pushed = rows[both_lowest]
+            if len(pushed):
+                block_end[side, pushed] -= block_stagger
+                next_block(other, pushed, trial, False, False)
+
+    # first blocks
+    for side in (LEFT, RIGHT):
+        block_end[side] = rng.integers(
+            block_min, block_max + 1, size=n_sessions
+        )
+        block_prob[side] = draw(n_sessions)
+    both_lowest = np.flatnonzero(np.all(block_prob == min_prob, axis=0))
+    while len(both_lowest):
+        sides = rng.integers(2, size=len(both_lowest))
+        block_prob[sides, both_lowest] = draw(len(both_lowest))
+        both_lowest = both_lowest[
+            np.all(block_prob[:, both_lowest] == min_prob, axis=0)
+        ]
+    # the lower side switches first, left on ties
+    smaller_side = (block_prob[RIGHT] < block_prob[LEFT]).astype(int)
+    block_end[smaller_side, np.arange(n_sessions)] -= block_stagger
+
+    for trial in range(n_trials):
+        for side in (LEFT, RIGHT):
+            switching = np.flatnonzero(trial >= block_end[side])
+            if len(switching):
+                next_block(side, switching, trial, True, True)
+        sessions.reward_prob[:, trial] = block_prob.T
+
+        if persev_add and trial > 0:
+            last_choice = sessions.choice[:, trial - 1]
+            for side in (LEFT, RIGHT):
+                chose = last_choice == side
+                persev_count[1 - side, chose] = 0
+                on_lowest = chose & (
+                    sessions.reward_prob[:, trial - 1, side] == min_prob
+                )
+                persev_count[side, on_lowest] += 1
+            # perseverating on the lowest side lengthens both blocks
+            added = np.any(persev_count >= perseverative_limit, axis=0)
+            block_end[:, added] += perseverative_limit
+            persev_count[:, added] = 0
+            sessions.persev_added[:, trial] = added
+
+        _respond(trial, sessions, policy, rng, bait, baiting)
+    return sessions
+
+
+def simulate_random_walk(
+    n_sessions: int,
+    n_trials: int,
+    policy: Callable = win_stay_lose_switch,
+    p_min=[0, 0],
+    p_max=[1, 1],
+    sigma=[0.15, 0.15],
+    mean=[0, 0],
+    baiting: bool = False,
+    rng: Optional[np.random.Generator] = None,
+) -> BatchSessions:
+    """
+    RandomWalkReward sessions, with the arguments of RandomWalkReward
+    :param policy: policy(trial, sessions, rng) -> choices
+    :param baiting: whether an unchosen bait stays for the next trials
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    # scalars apply to both sides, as in RandomWalkReward
+    p_min, p_max, sigma, mean = (
+        np.broadcast_to(np.asarray(x, dtype=float), (2,))
+        for x in (p_min, p_max, sigma, mean)
+    )
+    sessions = _empty_sessions(n_sessions, n_trials)
+    bait = np.zeros((n_sessions, 2), dtype=bool)
+    reward_prob = rng.uniform(p_min, p_max, size=(n_sessions, 2))
+    for trial in range(n_trials):
+        if trial > 0:
+            reward_prob = np.clip(
+                rng.normal(reward_prob + mean, sigma), p_min, p_max
+            )
+        sessions.reward_prob[:, trial] = reward_prob
+        _respond(trial, sessions, policy, rng, bait, baiting)
+    return sessions
+
+
+def block_lengths(reward_prob: np.ndarray) -> np.ndarray:
+    """
+    Lengths of the blocks of a sessions x trials array of one side's reward
+    probabilities, a block being a run of trials with the same probability. The first
+    block (staggered) and the last one (cut by the session end) of each session are left
+    out
+    """
+    reward_prob = np.atleast_2d(reward_prob)
+    changed = np.zeros(reward_prob.shape, dtype=bool)
+    changed[:, 1:] = reward_prob[:, 1:] != reward_prob[:, :-1]
+    session, trial = np.nonzero(changed)
+    # consecutive block starts within the same session
+    same_session = session[1:] == session[:-1]
+    return (trial[1:] - trial[:-1])[same_session]
@@ -0,0 +1,159 @@
+"""
+The batch reward schedules must match the scalar UncoupledBlocks and RandomWalkReward
+driven trial by trial like the GUI: same distributions of block lengths, reward
+probabilities, reward rates and anti-perseveration (two-sample KS tests).
+"""
+
+import logging
+
+import numpy as np
+from scipy import stats
+
+from foraging_gui.reward_schedules.batch import (
+    IGNORED,
+    BatchSessions,
+    block_lengths,
+    simulate_random_walk,
+    simulate_uncoupled_blocks,
+    win_stay_lose_switch,
+)
+from foraging_gui.reward_schedules.random_walk import RandomWalkReward
+from foraging_gui.reward_schedules.uncoupled_block import UncoupledBlocks
+
+
+def scalar_sessions(
+    schedule_factory, n_sessions, n_trials, policy, baiting, seed
+):
+    """
+    Sessions of a scalar reward schedule driven trial by trial like the GUI, with a
+    batch policy choosing for one session at a time
+    """
+    np.random.seed(seed)
+    rng = np.random.default_rng(seed)
+    sides = ("L", "R", "ignored")
+    results = []
+    for _ in range(n_sessions):
+        schedule = schedule_factory()
+        session = BatchSessions(
+            reward_prob=np.zeros((1, n_trials, 2)),
+            choice=np.full((1, n_trials), IGNORED, dtype=np.int8),
+            rewarded=np.zeros((1, n_trials), dtype=bool),
+        )
+        bait = np.zeros(2, dtype=bool)
+        for trial in range(n_trials):
+            if trial > 0:
+                schedule.next_trial()
+            session.reward_prob[0, trial] = [
+                schedule.trial_rwd_prob[s][-1] for s in ("L", "R")
+            ]
+            bait = (bait & baiting) | (
+                rng.random(2) < session.reward_prob[0, trial]
+            )
+            choice = int(policy(trial, session, rng)[0])
+            session.choice[0, trial] = choice
+            if choice != IGNORED:
+                session.rewarded[0, trial] = bait[choice]
+                bait[choice] = False
+            schedule.add_choice(sides[choice])
+        persev_added = np.zeros(n_trials, dtype=bool)
+        persev_added[getattr(schedule, "persev_add_at_trials", [])] = True
+        results.append(session._replace(persev_added=persev_added[None]))
+    return BatchSessions(*(np.concatenate(x) for x in zip(*results)))
+
+
+def assert_same_distribution(name, scalar, batch, alpha=1e-3):
+    # scalar, batch: samples of one statistic
+    p_value = stats.ks_2samp(scalar, batch).pvalue
+    assert p_value > alpha, (
+        f"{name} differs between scalar and batch: scalar "
+        f"{np.mean(scalar):.3f}, batch {np.mean(batch):.3f} (KS p = {p_value:.2g})"
+    )
+
+
+def test_uncoupled_blocks(n_scalar=300, n_trials=500, seed=0):
+    def uncoupled_blocks():
+        schedule = UncoupledBlocks()
+        schedule.next_trial()
+        return schedule
+
+    logging.disable(logging.INFO)
+    try:
+        scalar = scalar_sessions(
+            uncoupled_blocks,
+            n_scalar,
+            n_trials,
+            win_stay_lose_switch,
+            baiting=True,
+            seed=seed,
+        )
+    finally:
+        logging.disable(logging.NOTSET)
+    batch = simulate_uncoupled_blocks(
+        n_scalar * 10,
+        n_trials,
+        win_stay_lose_switch,
+        rng=np.random.default_rng(seed + 1),
+    )
+    for side, side_name in enumerate(("left", "right")):
+        assert_same_distribution(
+            f"{side_name} block length",
+            block_lengths(scalar.reward_prob[..., side]),
+            block_lengths(batch.reward_prob[..., side]),
+        )
+        assert_same_distribution(
+            f"{side_name} reward probability",
+            scalar.reward_prob[:, ::25, side].ravel(),
+            batch.reward_prob[:, ::25, side].ravel(),
+        )
+    assert_same_distribution(
+        "reward rate",
+        scalar.rewarded.mean(axis=1),
+        batch.rewarded.mean(axis=1),
+    )
+    assert_same_distribution(
+        "anti-perseveration additions",
+        scalar.persev_added.sum(axis=1),
+        batch.persev_added.sum(axis=1),
+    )
+
+
+def test_random_walk(n_scalar=300, n_trials=500, seed=0):
+    def random_walk():
+        return RandomWalkReward(p_min=0.1, p_max=0.9, sigma=0.1)
+
+    scalar = scalar_sessions(
+        random_walk,
+        n_scalar,
+        n_trials,
+        win_stay_lose_switch,
+        baiting=False,
+        seed=seed,
+    )
+    batch = simulate_random_walk(
+        n_scalar * 10,
+        n_trials,
+        win_stay_lose_switch,
+        p_min=0.1,
+        p_max=0.9,
+        sigma=0.1,
+        rng=np.random.default_rng(seed + 1),
+    )
+    for trial in (0, 1, n_trials // 10, n_trials - 1):
+        assert_same_distribution(
+            f"left reward probability at trial {trial}",
+            scalar.reward_prob[:, trial, 0],
+            batch.reward_prob[:, trial, 0],
+        )
+    assert_same_distribution(
+        "reward rate",
+        scalar.rewarded.mean(axis=1),
+        batch.rewarded.mean(axis=1),
+    )
+
+
+def test_block_lengths():
+    reward_prob = np.array(
+        [[0.1, 0.1, 0.5, 0.5, 0.5, 0.9, 0.1, 0.1], [0.5] * 4 + [0.9] * 4]
+    )
+    # first and last blocks of each session left out
+    assert list(block_lengths(reward_prob)) == [3, 1]
@@ -1,9 +1,5 @@
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 
-matplotlib.use("Qt5Agg")
-
 #  np.random.seed(56)
 
 import logging
@@ -266,6 +262,9 @@ class UncoupledBlocks:
         ), msg
 
     def plot_reward_schedule(self):
+        # imported here so the schedule can be used without a display
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots(2, 1, figsize=[15, 7], sharex="col")
 
         def annotate_block(ax):
@@ -333,6 +332,10 @@ class UncoupledBlocks:
 
 
 if __name__ == "__main__":
+    import matplotlib
+
+    matplotlib.use("Qt5Agg")
+
     total_trial = 1000
 
     reward_schedule = UncoupledBlocks(perseverative_limit=4)
@@ -1,78 +1,95 @@
 import logging
 import queue
+import threading
 import time
+from typing import NamedTuple
 
 from pyOSC3.OSC3 import OSCMessage
 
 
+class RigMessage(NamedTuple):
+    """Compact record of a message received from Bonsai"""
+
+    address: str
+    value: object  # first OSC argument, e.g. event time or trial outcome
+    data: list  # all OSC arguments, e.g. including the harp timestamp
+
+
+class MessageLogger(threading.Thread):
+    """
+    Background thread logging received messages so the OSC receive thread never waits
+    on stdout or the log file. Each address can be throttled to one log line per interval.
+    """
+
+    def __init__(
+        self, log_intervals: dict = None, default_interval: float = 0
+    ):
+        """
+        :param log_intervals: minimum seconds between two logged messages of an address
+        :param default_interval: interval for addresses not in log_intervals, 0 logs all
+        """
+        super().__init__(daemon=True)
+        self.log_intervals = {} if log_intervals is None else log_intervals
+        self.default_interval = default_interval
+        self.last_logged = {}
+        self.pending = queue.SimpleQueue()
+
+    def put(self, message: RigMessage, received: float):
+        """Queue a message for logging, called from the receive thread"""
+        self.pending.put((message, received))
+
+    def should_log(self, address: str, received: float) -> bool:
+        """Return True if more than the address interval passed since it was last logged"""
+        interval = self.log_intervals.get(address, self.default_interval)
+        last = self.last_logged.get(address)
+        if last is not None and received - last < interval:
+            return False
+        self.last_logged[address] = received
+        return True
+
+    def run(self):
+        while True:
+            message, received = self.pending.get()
+            if not self.should_log(message.address, received):
+                continue
+            interval = self.log_intervals.get(
+                message.address, self.default_interval
+            )
+            line = str([message.address, *message.data[:3]])
+            if interval > 0:
+                line += ", displaying at {} Hz".format(1 / interval)
+            logging.info(line)
+
+
 class RigClient:
+    # addresses that are never logged as they clutter the log file
+    unlogged_addresses = frozenset(
+        [
+            "/EnvironmentSensorTemperature",
+            "/EnvironmentSensorHumidity",
+            "/EnvironmentSensorPressure",
+            "/EnvironmentSensorTimestamp",
+        ]
+    )
+    # minimum seconds between two logged messages of high rate addresses
+    log_intervals = {"/PhotometryRising": 2, "/PhotometryFalling": 2}
+
     def __init__(self, client):
         self.client = client
         self.client.addMsgHandler("default", self.msg_handler)
         self.msgs = queue.Queue(maxsize=0)
         self.last_message_time = time.time()
 
-        # Keep track photometry message history
-        self.photometry_messages = {}
-        self.photometry_message_tolerance = 2
+        self.message_logger = MessageLogger(log_intervals=self.log_intervals)
+        self.message_logger.start()
 
-    def track_photometry_messages(self, message):
-        """
-        Keep track of when we last displayed each type of photometry signal
-        """
-        if message in self.photometry_messages:
-            # We have seen this message before, check for tolerance
-            now = time.time()
-            if (
-                now - self.photometry_messages[message]
-            ) < self.photometry_message_tolerance:
-                # It has been less than tolerance, return False and do not display message
-                return False
-            else:
-                # It has been greater than tolerance, record new time, and display message
-                self.photometry_messages[message] = time.time()
-                return True
-        else:
-            # We have not seen this message before, enter time, and display message
-            self.photometry_messages[message] = time.time()
-            return True
-
-    def msg_handler(self, address, *args):
-        msg = OSCMessage(address, args)
-        CurrentMessage = [
-            msg.address,
-            args[1][0],
-            msg.values()[2],
-            msg.values()[3],
-        ]
-        self.msgs.put([msg, args])
-        msg_str = str(CurrentMessage)
+    def msg_handler(self, address, tags, data, client_address=None):
+        """Runs on the OSC receive thread, only enqueue the message here"""
+        message = RigMessage(address, data[0], data)
+        self.msgs.put(message)
         self.last_message_time = time.time()
-
-        # Selectively log photometry messages
-        if ("PhotometryRising" in msg_str) or ("PhotometryFalling" in msg_str):
-            # Only selectively log these two messages
-
-            if self.track_photometry_messages(msg.address):
-                # It was has been more than self.photometry_message_tolerance for this message
-                print(
-                    msg_str
-                    + ", displaying at {} Hz".format(
-                        1 / self.photometry_message_tolerance
-                    )
-                )
-                logging.info(
-                    msg_str
-                    + ", displaying at {} Hz".format(
-                        1 / self.photometry_message_tolerance
-                    )
-                )
-        elif "EnvironmentSensor" in msg_str:
-            return  # do not log EnvironmentSensor logs as they clutter file
-        else:
-            # Print and add to log
-            print(CurrentMessage)
-            logging.info(CurrentMessage)
+        if address not in self.unlogged_addresses:
+            self.message_logger.put(message, self.last_message_time)
 
     def send(self, address="", *args):
         message = OSCMessage(address, *args)
@@ -84,6 +101,14 @@ class RigClient:
     def receive2(self):
         return self.msgs.get(block=False)
 
+    def receive_all(self):
+        """Return all pending messages at once, taking the queue lock a single time"""
+        with self.msgs.mutex:
+            msgs = list(self.msgs.queue)
+            self.msgs.queue.clear()
+            self.msgs.not_full.notify_all()
+        return msgs
+
     def TriggerGoCue(self, value):
         self.send("/TriggerGoCue", value)
 
@@ -0,0 +1,199 @@
+"""
+Columnar session file written next to the session json (``behavior/<session>.columns``).
+
+The file starts with a small json header holding the GUI parameters and every value that
+is not a typed array, followed by the B_, BS_ and TP_ histories as raw, aligned numpy
+arrays. Reading it does not parse the histories: they are memory-mapped, and only the
+pages of the fields that are used are read from disk.
+"""
+
+import json
+import logging
+import os
+import struct
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from foraging_gui.session_journal import NumpyEncoder
+
+COLUMNS_SUFFIX = ".columns"
+MAGIC = b"FORAGING-COLUMNS-1\n"
+ALIGNMENT = 64
+# fields stored as arrays when they fit one without loss
+COLUMN_PREFIXES = ("B_", "BS_", "TP_")
+
+
+def columns_path(session_file: str) -> str:
+    """Columnar file of a session file, behavior/<session>.json -> behavior/<session>.columns"""
+    return os.path.splitext(session_file)[0] + COLUMNS_SUFFIX
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _to_column(value):
+    """
+    Typed array holding value, or None if value is not a history of booleans, numbers or
+    strings that an array holds exactly as the json would (e.g. mixed ints and floats)
+    """
+    if isinstance(value, np.ndarray):
+        array = value
+    elif isinstance(value, list) and len(value) > 0:
+        try:
+            array = np.array(value)
+        except ValueError:
+            return None  # ragged
+        if array.dtype.kind in "biufU" and json.dumps(
+            array.tolist(), cls=NumpyEncoder
+        ) != json.dumps(value, cls=NumpyEncoder):
+            return None
+    else:
+        return None
+    if array.ndim == 0 or array.dtype.kind not in "biufU":
+        return None
+    return np.ascontiguousarray(array)
+
+
+def write_columns(path: str, Obj: dict):
+    """
+    Write a session as a columnar file
+    :param path: file to write, see columns_path
+    :param Obj: session dict as saved in the session json
+    """
+    header = {"columns": {}, "values": {}}
+    columns = []
+    size = 0
+    for name, value in Obj.items():
+        column = None
+        if name.startswith(COLUMN_PREFIXES):
+            column = _to_column(value)
+        if column is None:
+            header["values"][name] = value
+            continue
+        offset = _align(size)
+        header["columns"][name] = {
+            "dtype": column.dtype.str,
+            "shape": list(column.shape),
+            "offset": offset,
+        }
+        columns.append((offset, column))
+        size = offset + column.nbytes
+    header_bytes = json.dumps(header, cls=NumpyEncoder).encode()
+    data_start = _align(len(MAGIC) + 8 + len(header_bytes))
+    # write to a tmp file first so that a crash cannot leave a truncated file behind
+    tmp_file_name = path + ".tmp"
+    with open(tmp_file_name, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for offset, column in columns:
+            f.seek(data_start + offset)
+            f.write(column.data)
+    os.replace(tmp_file_name, path)
+
+
+class ColumnarSession(MutableMapping):
+    """
+    Session read from a columnar file, used like the dict loaded from the session json.
+
+    Histories are returned as read-only arrays backed by the memory-mapped file, so only
+    what a view reads is loaded. Assigned values are kept in memory and never written
+    back.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: columnar file, see columns_path
+        """
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a columnar session file")
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size))
+        self.path = path
+        self.values = header["values"]
+        self.columns = header["columns"]
+        self.data_start = _align(len(MAGIC) + 8 + header_size)
+        self.mmap = None
+        if self.columns:
+            self.mmap = np.memmap(path, dtype=np.uint8, mode="r")
+        self.assigned = {}
+        self.deleted = set()
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only array of a history, backed by the file"""
+        spec = self.columns[name]
+        return np.ndarray(
+            spec["shape"],
+            dtype=np.dtype(spec["dtype"]),
+            buffer=self.mmap,
+            offset=self.data_start + spec["offset"],
+        )
+
+    def materialize(self, name: str):
+        """Value of a field loaded in memory, e.g. before the file is closed"""
+        value = self[name]
+        return np.array(value) if isinstance(value, np.ndarray) else value
+
+    def __getitem__(self, name: str):
+        if name in self.assigned:
+            return self.assigned[name]
+        if name in self.deleted:
+            raise KeyError(name)
+        if name in self.columns:
+            return self.column(name)
+        return self.values[name]
+
+    def __setitem__(self, name: str, value):
+        self.assigned[name] = value
+        self.deleted.discard(name)
+
+    def __delitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        self.assigned.pop(name, None)
+        self.deleted.add(name)
+
+    def __iter__(self):
+        for name in self.assigned:
+            yield name
+        for names in (self.values, self.columns):
+            for name in names:
+                if name not in self.assigned and name not in self.deleted:
+                    yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __contains__(self, name) -> bool:
+        return name in self.assigned or (
+            name not in self.deleted
+            and (name in self.columns or name in self.values)
+        )
+
+    def copy(self) -> "ColumnarSession":
+        """Shallow copy sharing the file, like dict.copy"""
+        session = ColumnarSession.__new__(ColumnarSession)
+        session.__dict__.update(self.__dict__)
+        session.assigned = dict(self.assigned)
+        session.deleted = set(self.deleted)
+        return session
+
+
+def load_session(session_file: str):
+    """
+    Load a session json, from its columnar file if there is an up-to-date one
+    :return: ColumnarSession, or the dict parsed from the json
+    """
+    path = columns_path(session_file)
+    if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(
+        session_file
+    ):
+        try:
+            return ColumnarSession(path)
+        except Exception as e:
+            logging.error(f"Cannot read {path}, loading the json: {e}")
+    with open(session_file, "r") as f:
+        return json.loads(f.read())
@@ -0,0 +1,319 @@
+"""
+On-disk index of the sessions saved under a data folder (``<default_saveFolder>``), used
+to fill the mouse and session pickers without listing folders and parsing session jsons.
+
+Sessions are laid out as ``<box>/<mouse>/behavior_<session>/behavior/<session>.json``
+(``TrainingFolder`` instead of ``behavior`` for old sessions). The index is updated when
+a session is saved; build it, or bring it up to date with sessions copied from other
+computers, with the scanner:
+
+``python -m foraging_gui.session_index <default_saveFolder>``
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence
+
+from foraging_gui.json_fields import read_fields
+
+INDEX_FILE = "session_index.sqlite"
+# folders holding the session json in a session folder, new format first
+SESSION_DATA_FOLDERS = ("behavior", "TrainingFolder")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    path TEXT PRIMARY KEY,
+    box TEXT NOT NULL,
+    mouse TEXT NOT NULL,
+    session TEXT NOT NULL,
+    experimenter TEXT,
+    start_time TEXT,
+    trials INTEGER,
+    modified REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_by_mouse ON sessions (box, mouse, session);
+CREATE TABLE IF NOT EXISTS scanned_boxes (
+    box TEXT PRIMARY KEY,
+    scanned REAL NOT NULL
+);
+"""
+
+
+class MouseEntry(NamedTuple):
+    mouse: str
+    experimenter: str  # experimenter of the most recent session that has one
+    modified: datetime  # last time one of its sessions was saved
+
+
+class SessionEntry(NamedTuple):
+    session: str  # session folder, e.g. behavior_123456_2024-01-31_10-00-00
+    path: str  # session json
+    experimenter: Optional[str]
+    start_time: Optional[str]
+    trials: Optional[int]
+
+
+def index_path(save_folder: str) -> str:
+    return os.path.join(save_folder, INDEX_FILE)
+
+
+def session_location(save_folder: str, session_file: str) -> Optional[tuple]:
+    """
+    (box, mouse, session folder) of a session json saved under save_folder, None if the
+    file is not laid out as a session of save_folder
+    """
+    relative = os.path.relpath(
+        os.path.abspath(session_file), os.path.abspath(save_folder)
+    )
+    parts = relative.split(os.sep)
+    if (
+        len(parts) != 5
+        or parts[0] == os.pardir
+        or parts[3] not in SESSION_DATA_FOLDERS
+        or not parts[4].endswith(".json")
+    ):
+        return None
+    return parts[0], parts[1], parts[2]
+
+
+# fields of a session read by session_summary
+SUMMARY_FIELDS = (
+    "Experimenter",
+    "Other_SessionStartTime",
+    "B_AnimalResponseHistory",
+)
+
+
+def session_summary(Obj) -> dict:
+    """Values of a session dict stored in the index, Obj only needs SUMMARY_FIELDS"""
+    experimenter = Obj.get("Experimenter")
+    trials = Obj.get("B_AnimalResponseHistory")
+    return {
+        "experimenter": (
+            experimenter if isinstance(experimenter, str) else None
+        ),
+        "start_time": Obj.get("Other_SessionStartTime"),
+        "trials": len(trials) if trials is not None else None,
+    }
+
+
+def is_session_file(file_name: str) -> bool:
+    """Whether a file of a session data folder is the session json"""
+    # skip the par.json, the tmp files written while saving and the session model
+    return (
+        file_name.endswith(".json")
+        and not file_name.endswith("_par.json")
+        and not file_name.endswith("_tmp.json")
+        and not file_name.startswith("behavior_session_model_")
+    )
+
+
+class SessionIndex:
+    """
+    SQLite index of the sessions of a data folder: box -> mouse -> session, with the
+    experimenter, start time, trial count and path of each session.
+    """
+
+    def __init__(self, save_folder: str, path: str = None):
+        """
+        :param save_folder: folder holding the box folders
+        :param path: index file, defaults to session_index.sqlite in save_folder
+        """
+        self.save_folder = save_folder
+        self.path = path or index_path(save_folder)
+        self.lock = threading.Lock()
+        # saving runs in worker threads, so the connection is shared under the lock
+        self.connection = sqlite3.connect(
+            self.path, timeout=10, check_same_thread=False
+        )
+        with self.lock, self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def add(
+        self,
+        session_file: str,
+        experimenter: str = None,
+        start_time: str = None,
+        trials: int = None,
+        modified: float = None,
+    ) -> bool:
+        """
+        Add or update a session
+        :param session_file: session json under save_folder
+        :param modified: modification time of the json, read from the file if None
+        :return: False if the file is not a session of save_folder
+        """
+        location = session_location(self.save_folder, session_file)
+        if location is None:
+            return False
+        if modified is None:
+            modified = os.path.getmtime(session_file)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    os.path.abspath(session_file),
+                    *location,
+                    experimenter,
+                    start_time,
+                    trials,
+                    modified,
+                ),
+            )
+        return True
+
+    def is_scanned(self, box: str) -> bool:
+        """
+        Whether the sessions of a box were scanned. Until then the index only holds the
+        sessions saved since it was created, and should not be used to list them
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM scanned_boxes WHERE box = ?", (box,)
+            ).fetchone()
+        return row is not None
+
+    def mice(self, box: str) -> List[MouseEntry]:
+        """Mice of a box with at least one session naming an experimenter, most recent first"""
+        with self.lock:
+            rows = self.connection.execute(
+                """
+                SELECT mouse, experimenter, modified FROM sessions
+                WHERE box = ? ORDER BY mouse, session DESC
+                """,
+                (box,),
+            ).fetchall()
+        mice = {}
+        for mouse, experimenter, modified in rows:
+            entry = mice.get(mouse)
+            if entry is None:
+                mice[mouse] = [experimenter, modified]
+                continue
+            if entry[0] is None:
+                entry[0] = experimenter
+            entry[1] = max(entry[1], modified)
+        entries = [
+            MouseEntry(mouse, experimenter, datetime.fromtimestamp(modified))
+            for mouse, (experimenter, modified) in mice.items()
+            if experimenter is not None
+        ]
+        entries.sort(key=lambda entry: entry.modified, reverse=True)
+        return entries
+
+    def sessions(self, box: str, mouse: str) -> List[SessionEntry]:
+        """Sessions of a mouse, most recent first"""
+        with self.lock:
+            rows = self.connection.execute(
+                """
+                SELECT session, path, experimenter, start_time, trials FROM sessions
+                WHERE box = ? AND mouse = ? ORDER BY session DESC
+                """,
+                (box, mouse),
+            ).fetchall()
+        return [SessionEntry(*row) for row in rows]
+
+    def scan(self, boxes: Sequence[str] = None, rescan: bool = False) -> int:
+        """
+        Index the sessions found on disk and drop the ones that no longer exist. Only
+        files modified since they were indexed are read, unless rescan
+        :param boxes: boxes to scan, all box folders if None
+        :return: number of session files read
+        """
+        if boxes is None:
+            boxes = [
+                box
+                for box in os.listdir(self.save_folder)
+                if os.path.isdir(os.path.join(self.save_folder, box))
+            ]
+        with self.lock:
+            indexed = dict(
+                self.connection.execute(
+                    "SELECT path, modified FROM sessions"
+                ).fetchall()
+            )
+        found = set()
+        n_read = 0
+        for box in boxes:
+            for session_file in _session_files(
+                os.path.join(self.save_folder, box)
+            ):
+                path = os.path.abspath(session_file)
+                found.add(path)
+                modified = os.path.getmtime(session_file)
+                if not rescan and indexed.get(path) == modified:
+                    continue
+                try:
+                    summary = session_summary(
+                        read_fields(session_file, SUMMARY_FIELDS)
+                    )
+                except Exception as e:
+                    logging.info(f"Cannot read {session_file}: {e}")
+                    summary = {}
+                self.add(session_file, modified=modified, **summary)
+                n_read += 1
+        boxes = set(boxes)
+        removed = [
+            (path,)
+            for path in indexed
+            if path not in found
+            and session_location(self.save_folder, path) is not None
+            and session_location(self.save_folder, path)[0] in boxes
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM sessions WHERE path = ?", removed
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO scanned_boxes VALUES (?, ?)",
+                [(box, time.time()) for box in boxes],
+            )
+        return n_read
+
+
+def _session_files(box_folder: str):
+    """Session jsons of a box folder"""
+    for mouse in sorted(os.listdir(box_folder)):
+        mouse_folder = os.path.join(box_folder, mouse)
+        if not os.path.isdir(mouse_folder):
+            continue
+        for session in sorted(os.listdir(mouse_folder)):
+            for data_folder in SESSION_DATA_FOLDERS:
+                folder = os.path.join(mouse_folder, session, data_folder)
+                if not os.path.isdir(folder):
+                    continue
+                for file_name in sorted(os.listdir(folder)):
+                    if is_session_file(file_name):
+                        yield os.path.join(folder, file_name)
+                break
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or update the session index of a data folder"
+    )
+    parser.add_argument("save_folder", help="folder holding the box folders")
+    parser.add_argument("--box", nargs="*", help="only scan these boxes")
+    parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="read all session files, not only the ones modified since indexed",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    index = SessionIndex(args.save_folder)
+    n_read = index.scan(boxes=args.box, rescan=args.rescan)
+    print(f"{n_read} session files indexed in {index.path}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Append-only journal of a running session.
+
+The journal sits next to the session json (``behavior/<session>_journal.jsonl``). Its first
+line is a header record with the GUI parameters of the session, then there is one compact
+record per trial holding only the values added or changed since the previous record. At
+the end of the session the json is saved as usual and the journal is removed; after a
+crash, ``compact`` rebuilds the session json from the journal:
+
+``python -m foraging_gui.session_journal <session>_journal.jsonl``
+"""
+
+import argparse
+import copy
+import json
+import logging
+import math
+import os
+import threading
+import time
+from typing import Tuple
+
+import numpy as np
+
+from foraging_gui.parameter_log import PARAMETER_LOG_KEY
+
+JOURNAL_SUFFIX = "_journal.jsonl"
+# dict fields journaled key by key, so the changes of the parameter log are journaled
+# like a history
+SPLIT_FIELDS = (PARAMETER_LOG_KEY,)
+
+
+class NumpyEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()  # Convert NumPy array to a list
+        if isinstance(obj, np.integer):
+            return int(obj)  # Convert np.int32 to a regular int
+        if isinstance(obj, np.float64) and np.isnan(obj):
+            return "NaN"  # Represent NaN as a string
+        return super(NumpyEncoder, self).default(obj)
+
+
+def journal_path(session_file: str) -> str:
+    """Journal of a session file, behavior/<session>.json -> behavior/<session>_journal.jsonl"""
+    return os.path.splitext(session_file)[0] + JOURNAL_SUFFIX
+
+
+def _snapshot(value):
+    """
+    Copy of a value as it is now: lists and dicts are copied shallowly (their items are not
+    changed in place), arrays are replaced rather than changed in place and are not copied
+    """
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class TrialFields:
+    """
+    Snapshots of the values of a GenerateTrials object saved with the session: the TP_
+    parameter histories in Obj and all B_ and BS_ attributes, as _Save collects them.
+
+    A snapshot is cheap enough to take under the data lock, the journal record is then
+    written from it after the lock is released. The B_/BS_ names are looked up once and
+    again only when attributes were added to the object.
+    """
+
+    def __init__(self, generated_trials):
+        self.generated_trials = generated_trials
+        self._names = []
+        self._n_attributes = -1
+
+    def names(self) -> list:
+        """B_ and BS_ attributes of the object"""
+        n_attributes = len(vars(self.generated_trials))
+        if n_attributes != self._n_attributes:
+            self._names = [
+                attr_name
+                for attr_name in dir(self.generated_trials)
+                if attr_name.startswith("B_") or attr_name.startswith("BS_")
+            ]
+            self._n_attributes = n_attributes
+        return self._names
+
+    def snapshot(self) -> dict:
+        fields = {}
+        for name, value in self.generated_trials.Obj.items():
+            if name in SPLIT_FIELDS and isinstance(value, dict):
+                for key, item in value.items():
+                    fields[f"{name}.{key}"] = _snapshot(item)
+            else:
+                fields[name] = _snapshot(value)
+        for attr_name in self.names():
+            fields[attr_name] = _snapshot(
+                getattr(self.generated_trials, attr_name)
+            )
+        return fields
+
+
+def trial_fields(generated_trials) -> dict:
+    """Snapshot of the values of a GenerateTrials object saved with the session"""
+    return TrialFields(generated_trials).snapshot()
+
+
+def _equal(a, b) -> bool:
+    if a is b:
+        return True
+    try:
+        equal = a == b
+        if isinstance(equal, bool):
+            # nan equals nan
+            return equal or (a != a and b != b)
+    except Exception:
+        pass
+    try:
+        return bool(np.array_equal(a, b, equal_nan=True))
+    except Exception:
+        pass
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+
+def _first_change(old: list, new: list) -> int:
+    """Index of the first element of new that differs from old, len(new) if none"""
+    for i, (a, b) in enumerate(zip(old, new)):
+        if not _equal(a, b):
+            return i
+    return len(new)
+
+
+def _first_array_change(old: np.ndarray, new: np.ndarray) -> int:
+    """Index along the last axis of the first column of new that differs from old"""
+    if old.shape != new.shape:
+        return 0
+    try:
+        same = np.asarray(old == new)
+        if new.dtype.kind in "fc":
+            same = same | (np.isnan(old) & np.isnan(new))
+    except Exception:
+        return _first_change(
+            list(np.moveaxis(old, -1, 0)), list(np.moveaxis(new, -1, 0))
+        )
+    same = same.reshape(-1, new.shape[-1]).all(axis=0)
+    return int(np.argmin(same)) if not same.all() else new.shape[-1]
+
+
+class _Tracked:
+    """What was journaled of one field: the length and last values of a history, or the value"""
+
+    __slots__ = ("kind", "ndim", "length", "tail")
+
+    def __init__(self, kind, ndim=0, length=0, tail=None):
+        self.kind = kind  # "list", "array" or "value"
+        self.ndim = ndim
+        self.length = length
+        self.tail = tail
+
+
+class SessionJournal:
+    """
+    Writes the journal of a session. A trial record only holds what changed since the
+    previous record, so journaling a trial costs the same at trial 10 and at trial 1000.
+
+    Histories are expected to grow at the end. The last rewrite_window journaled values of
+    each history are compared with the current ones, so values rewritten shortly after
+    being journaled (e.g. the bias, back-filled when a fit finishes) are journaled again;
+    older values are considered final. Records are flushed as they are written and
+    fsynced every sync_every trials.
+    """
+
+    def __init__(
+        self, path: str, sync_every: int = 10, rewrite_window: int = 32
+    ):
+        """
+        :param path: journal file, see journal_path
+        :param sync_every: fsync the journal every sync_every trial records
+        :param rewrite_window: number of last journaled values of each history compared
+            with the current values
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.rewrite_window = rewrite_window
+        self.lock = threading.Lock()
+        self.file = None
+        self.tracked = {}
+        self.trials = 0  # trial records written
+        self.unsynced = 0  # trial records written since the last fsync
+
+    @property
+    def is_open(self) -> bool:
+        return self.file is not None
+
+    def open(self, header: dict):
+        """
+        Start the journal, replacing any previous journal at path
+        :param header: session parameters (GUI widgets, settings, folders...)
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = open(self.path, "w")
+            self.tracked = {}
+            self.trials = 0
+            self._write({"record": "header", "time": time.time(), **header})
+            self._sync()
+
+    def record_trial(self, trial_number: int, fields: dict):
+        """
+        Append a trial record
+        :param trial_number: number of trials finished
+        :param fields: values to journal, e.g. from trial_fields
+        """
+        extend = {}
+        changed = {}
+        for name, value in fields.items():
+            if isinstance(value, list) or (
+                isinstance(value, np.ndarray) and value.ndim > 0
+            ):
+                entry = self._history_entry(name, value)
+                if entry is not None:
+                    extend[name] = entry
+            elif name not in self.tracked or not _equal(
+                self.tracked[name].tail, value
+            ):
+                changed[name] = value
+                self.tracked[name] = _Tracked(
+                    "value", tail=copy.deepcopy(value)
+                )
+        with self.lock:
+            if self.file is None:
+                return
+            self._write(
+                {
+                    "record": "trial",
+                    "trial": trial_number,
+                    "time": time.time(),
+                    "extend": extend,
+                    "set": changed,
+                }
+            )
+            self.trials += 1
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every:
+                self._sync()
+
+    def _history_entry(self, name: str, value):
+        """[start, ndim, values from start on] for a history, or None if unchanged"""
+        is_array = isinstance(value, np.ndarray)
+        kind = "array" if is_array else "list"
+        ndim = value.ndim if is_array else 1
+        length = value.shape[-1] if is_array else len(value)
+        tracked = self.tracked.get(name)
+        if (
+            tracked is None
+            or tracked.kind != kind
+            or tracked.ndim != ndim
+            or length < tracked.length
+            or (is_array and value.shape[:-1] != tracked.tail.shape[:-1])
+        ):
+            start = 0
+        else:
+            if is_array:
+                first = tracked.length - tracked.tail.shape[-1]
+                start = first + _first_array_change(
+                    tracked.tail, value[..., first : tracked.length]
+                )
+            else:
+                first = tracked.length - len(tracked.tail)
+                start = first + _first_change(
+                    tracked.tail, value[first : tracked.length]
+                )
+            if start == length and tracked.length == length:
+                return None
+        first = max(length - self.rewrite_window, 0)
+        if is_array:
+            new_values = value[..., start:]
+            tail = value[..., first:length].copy()
+        else:
+            new_values = value[start:]
+            tail = copy.deepcopy(value[first:length])
+        self.tracked[name] = _Tracked(kind, ndim, length, tail)
+        return [start, ndim, new_values]
+
+    def _write(self, record: dict):
+        self.file.write(
+            json.dumps(record, cls=NumpyEncoder, separators=(",", ":")) + "\n"
+        )
+        self.file.flush()
+
+    def _sync(self):
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def close(self, remove: bool = False):
+        """
+        Stop journaling
+        :param remove: delete the journal, e.g. once the session json is saved
+        """
+        with self.lock:
+            if self.file is not None:
+                self._sync()
+                self.file.close()
+                self.file = None
+            if remove and os.path.isfile(self.path):
+                os.remove(self.path)
+
+
+def _extend(old, new, start: int, ndim: int):
+    if old is None or start == 0:
+        return new
+    if ndim == 1:
+        return old[:start] + new
+    return [_extend(o, n, start, ndim - 1) for o, n in zip(old, new)]
+
+
+def read_journal(path: str) -> Tuple[dict, dict]:
+    """
+    Replay a journal
+    :return: header, and the journaled fields as of the last complete record
+    """
+    header = {}
+    fields = {}
+    trial = 0
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a crash can cut the last record short
+                logging.warning(
+                    f"Journal {path} ends with an incomplete record after trial {trial}"
+                )
+                break
+            if record["record"] == "header":
+                header = record
+                continue
+            for name, (start, ndim, values) in record["extend"].items():
+                fields[name] = _extend(fields.get(name), values, start, ndim)
+            fields.update(record["set"])
+            trial = record["trial"]
+    header.pop("record", None)
+    header.pop("time", None)
+    for name in SPLIT_FIELDS:
+        prefix = name + "."
+        parts = {
+            key[len(prefix) :]: fields.pop(key)
+            for key in list(fields)
+            if key.startswith(prefix)
+        }
+        if parts:
+            fields[name] = parts
+    return header, fields
+
+
+def compact(journal_file: str, session_file: str = None) -> str:
+    """
+    Write the session json rebuilt from a journal, e.g. after a crash
+    :param journal_file: journal to compact
+    :param session_file: json to write, defaults to the session file of the journal
+    :return: the session file written
+    """
+    header, fields = read_journal(journal_file)
+    if session_file is None:
+        session_file = journal_file[: -len(JOURNAL_SUFFIX)] + ".json"
+    Obj = header
+    for name, value in fields.items():
+        if isinstance(value, float) and math.isnan(value):
+            Obj[name] = "nan"
+        else:
+            Obj[name] = value
+    Obj["saving_type_label"] = "journal recovery"
+    # write to a tmp file first so that a crash cannot corrupt the session file
+    tmp_file_name = session_file.split(".json")[0] + "_tmp.json"
+    with open(tmp_file_name, "w") as outfile:
+        json.dump(Obj, outfile, indent=4, cls=NumpyEncoder)
+    if os.path.isfile(session_file):
+        os.remove(session_file)
+    os.rename(tmp_file_name, session_file)
+    logging.info(f"Recovered {session_file} from {journal_file}")
+    return session_file
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild session jsons from session journals"
+    )
+    parser.add_argument("journals", nargs="+", help="*_journal.jsonl files")
+    args = parser.parse_args()
+    for journal_file in args.journals:
+        print(compact(journal_file))
+
+
+if __name__ == "__main__":
+    main()
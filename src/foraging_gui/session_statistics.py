@@ -0,0 +1,102 @@
+import logging
+from typing import Sequence
+
+import numpy as np
+
+
+class SessionStatistics:
+    """
+    Running session statistics (trial counts, rewards, water volumes and choice-reward rates)
+    updated with the trials completed since the last update, so the per-trial cost does not
+    grow with the session length.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget all trials"""
+        self.trial_n = 0  # number of trials folded into the totals
+        self.finished_trial_n = 0  # trials with a response
+        self.choice_n = [0, 0]  # left/right choices
+        self.reward_trial_n = [0, 0]  # earned rewards (auto water excluded)
+        self.reward_n = 0  # rewards including auto water
+        self.auto_water = [0.0, 0.0]  # auto water volume per side
+        self.earned_reward = [0.0, 0.0]  # earned water volume per side
+        self.auto_water_n = [0, 0]
+        self.earned_reward_n = [0, 0]
+
+    def update(
+        self,
+        animal_response: np.ndarray,
+        rewarded: np.ndarray,
+        auto_water_trial: np.ndarray,
+        volumes: Sequence[Sequence],
+        multipliers: Sequence,
+    ):
+        """
+        Fold the trials not seen yet into the running totals
+        :param animal_response: choice history, 0 left, 1 right, 2 no response
+        :param rewarded: 2 x trials earned reward history
+        :param auto_water_trial: 2 x trials auto water history (may include the upcoming trial)
+        :param volumes: left and right reward volume of each trial
+        :param multipliers: auto water multiplier of each trial
+        """
+        if len(animal_response) < self.trial_n:
+            # histories were replaced, e.g. a session was loaded
+            self.reset()
+        for i in range(self.trial_n, len(animal_response)):
+            self._add_trial(
+                i,
+                animal_response[i],
+                rewarded,
+                auto_water_trial,
+                volumes,
+                multipliers,
+            )
+
+    def _add_trial(
+        self, i, response, rewarded, auto_water_trial, volumes, multipliers
+    ):
+        self.trial_n += 1
+        if response != 2:
+            self.finished_trial_n += 1
+        if response in (0, 1):
+            self.choice_n[int(response)] += 1
+        for side in range(2):
+            earned = bool(rewarded[side][i])
+            auto = auto_water_trial[side][i] == 1
+            if earned:
+                self.reward_trial_n[side] += 1
+            if earned or auto:
+                # auto reward is considered as reward
+                self.reward_n += 1
+            if i >= len(volumes[side]):
+                continue
+            try:
+                if auto:
+                    self.auto_water[side] += float(volumes[side][i]) * float(
+                        multipliers[i]
+                    )
+                    self.auto_water_n[side] += 1
+                elif earned:
+                    self.earned_reward[side] += float(volumes[side][i])
+                    self.earned_reward_n[side] += 1
+            except ValueError as e:
+                logging.error(str(e))
+
+    @property
+    def responded_rate(self) -> float:
+        if self.trial_n == 0:
+            return np.nan
+        return self.finished_trial_n / self.trial_n
+
+    @property
+    def total_reward(self) -> float:
+        return sum(self.earned_reward) + sum(self.auto_water)
+
+    def choice_reward_rate(self, side: int) -> float:
+        """Fraction of choices of a side that were rewarded"""
+        if self.choice_n[side] == 0:
+            return np.nan
+        return self.reward_trial_n[side] / self.choice_n[side]
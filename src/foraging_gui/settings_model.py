@@ -180,6 +180,7 @@ class DFTSettingsModel(BaseModel):
     name_mapper_file: str
     create_rig_metadata: bool
     save_each_trial: bool
+    save_columnar_session: bool
     AutomaticUpload: bool
     manifest_flag_dir: str
     lifecycle_log_dir: Path
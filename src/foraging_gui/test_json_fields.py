@@ -0,0 +1,40 @@
+"""
+read_fields must find the fields after long strings cut by the end of a chunk, without
+the string patterns backtracking over them.
+"""
+
+import json
+import os
+import tempfile
+
+from foraging_gui.json_fields import read_fields
+
+
+def _read(obj, keys, chunk_size):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "session.json")
+        with open(path, "w") as f:
+            json.dump(obj, f)
+        return read_fields(path, keys, chunk_size)
+
+
+def test_long_string_across_chunks(n_chars=5000, chunk_size=64):
+    # paths and timestamps with escapes, at the top level and in a container
+    text = ('C:\\Users\\box "A"/2024-01-31T10:00:00 ' * n_chars)[:n_chars]
+    for offset in range(0, chunk_size, 7):
+        # the padding moves the chunk boundaries over the strings
+        obj = {
+            "Padding": "x" * offset,
+            "SaveFile": text,
+            "B_Notes": [text, {"note": text}],
+            "Experimenter": "someone",
+        }
+        fields = _read(obj, ["Experimenter", "SaveFile"], chunk_size)
+        assert fields == {"Experimenter": "someone", "SaveFile": text}
+
+
+def test_missing_field(chunk_size=16):
+    obj = {"SaveFile": "a\\b" * 100, "TP_Task": ["Coupled Baiting"] * 10}
+    assert _read(obj, ["Experimenter", "TP_Task"], chunk_size) == {
+        "TP_Task": ["Coupled Baiting"] * 10
+    }
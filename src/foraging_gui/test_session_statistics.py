@@ -0,0 +1,128 @@
+"""
+SessionStatistics folds the new trials into running totals; they must equal the
+whole-history recomputation GenerateTrials._GetBasic used to do.
+"""
+
+import numpy as np
+
+from foraging_gui.session_statistics import SessionStatistics
+
+
+def synthetic_session(n_trials=1000, seed=0):
+    """Session dict shaped like a saved behavior json"""
+    rng = np.random.default_rng(seed)
+    response = rng.choice([0, 1, 2], size=n_trials, p=[0.45, 0.45, 0.1])
+    auto_water = (rng.random((2, n_trials)) < 0.05).astype(int)
+    rewarded = np.zeros((2, n_trials), dtype=bool)
+    for side in range(2):
+        rewarded[side] = (
+            (response == side)
+            & (rng.random(n_trials) < 0.4)
+            & ~auto_water[side].astype(bool)
+        )
+    p_reward = rng.choice([0.1, 0.4, 0.7], size=(2, n_trials + 1))
+    return {
+        "B_AnimalResponseHistory": response.astype(float).tolist(),
+        "B_RewardedHistory": rewarded.tolist(),
+        "B_AutoWaterTrial": auto_water.tolist(),
+        "B_RewardProHistory": p_reward.tolist(),
+        "B_CurrentRewardProbRandomNumber": rng.random((n_trials, 2)).tolist(),
+        "TP_Task": ["Coupled Baiting"] * n_trials,
+        "TP_LeftValue_volume": ["2.00"] * n_trials,
+        "TP_RightValue_volume": ["2.50"] * n_trials,
+        "TP_Multiplier": ["0.8"] * n_trials,
+    }
+
+
+def session_histories(obj):
+    """Histories needed by the session statistics as numpy arrays"""
+    from foraging_gui.parameter_log import parameter_history
+
+    response = np.array(obj["B_AnimalResponseHistory"], dtype=float)
+    n = len(response)
+    return (
+        response,
+        np.array(obj["B_RewardedHistory"], dtype=bool)[:, :n],
+        np.array(obj["B_AutoWaterTrial"])[:, :n],
+        (
+            list(parameter_history(obj, "TP_LeftValue_volume")),
+            list(parameter_history(obj, "TP_RightValue_volume")),
+        ),
+        list(parameter_history(obj, "TP_Multiplier")),
+    )
+
+
+def full_session_statistics(
+    response, rewarded, auto_water, volumes, multipliers
+):
+    """
+    Reference: the whole-history recomputation GenerateTrials._GetBasic used to do, also
+    timed by the session_statistics benchmark
+    """
+    rewarded_or_auto = rewarded | (auto_water == 1)
+    auto_volume, earned_volume = [0.0, 0.0], [0.0, 0.0]
+    for side in range(2):
+        for i, v in enumerate(volumes[side][: len(response)]):
+            if auto_water[side][i] == 1 and rewarded_or_auto[side][i]:
+                auto_volume[side] += float(v) * float(multipliers[i])
+            elif auto_water[side][i] == 0 and rewarded_or_auto[side][i]:
+                earned_volume[side] += float(v)
+    return {
+        "trial_n": len(response),
+        "finished_trial_n": int(np.sum(response != 2)),
+        "choice_n": [int(np.sum(response == 0)), int(np.sum(response == 1))],
+        "reward_trial_n": np.sum(rewarded, axis=1).tolist(),
+        "reward_n": int(np.sum(rewarded_or_auto)),
+        "auto_water": auto_volume,
+        "earned_reward": earned_volume,
+    }
+
+
+def _assert_matches(stats, full):
+    for key, value in full.items():
+        assert np.allclose(getattr(stats, key), value), key
+
+
+def test_session_statistics(n_trials=600, seed=0):
+    response, rewarded, auto_water, volumes, multipliers = session_histories(
+        synthetic_session(n_trials, seed)
+    )
+    stats = SessionStatistics()
+    # one trial at a time as in a session, then a few at once
+    for trial in list(range(1, 200)) + list(range(200, n_trials + 1, 37)):
+        stats.update(
+            response[:trial],
+            rewarded[:, :trial],
+            auto_water,
+            volumes,
+            multipliers,
+        )
+        _assert_matches(
+            stats,
+            full_session_statistics(
+                response[:trial],
+                rewarded[:, :trial],
+                auto_water[:, :trial],
+                volumes,
+                multipliers,
+            ),
+        )
+
+
+def test_session_statistics_replaced_history(n_trials=300, seed=1):
+    response, rewarded, auto_water, volumes, multipliers = session_histories(
+        synthetic_session(n_trials, seed)
+    )
+    stats = SessionStatistics()
+    stats.update(response, rewarded, auto_water, volumes, multipliers)
+    # a shorter (loaded) session starts the totals over
+    response, rewarded, auto_water, volumes, multipliers = session_histories(
+        synthetic_session(n_trials // 2, seed + 1)
+    )
+    stats.update(response, rewarded, auto_water, volumes, multipliers)
+    _assert_matches(
+        stats,
+        full_session_statistics(
+            response, rewarded, auto_water, volumes, multipliers
+        ),
+    )
@@ -0,0 +1,393 @@
+"""
+The trial table bonsai_to_nwb builds column by column must hold the same trials as the
+per-trial extraction it replaced, kept here as the reference (_reference_trials).
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+from pynwb import NWBHDF5IO
+
+from foraging_gui.parameter_log import ParameterLog
+from foraging_gui.test_session_statistics import synthetic_session
+from foraging_gui.TransferToNWB import _get_field, bonsai_to_nwb
+
+
+def synthetic_nwb_session(n_trials=1500, seed=0):
+    """Session dict with the fields bonsai_to_nwb converts, two laser conditions"""
+    rng = np.random.default_rng(seed)
+    obj = synthetic_session(n_trials, seed)
+    start = np.cumsum(rng.uniform(3, 8, size=n_trials))
+    go_cue = start + rng.uniform(0.5, 1.5, size=n_trials)
+    condition = rng.choice([0, 1, 2], size=n_trials, p=[0.8, 0.1, 0.1])
+    obj.update(
+        {
+            "ID": "123456",
+            "Experimenter": "someone",
+            "Task": "Coupled Baiting",
+            "ShowNotes": "",
+            "Other_SessionStartTime": "2024-01-31 10:00:00.000000",
+            "Other_CurrentTime": "2024-01-31 11:30:00.000000",
+            "Other_RunningTime": 90,
+            "box": "1A",
+            "BaseWeight": "25",
+            "TargetWeight": "21.25",
+            "TargetRatio": "0.85",
+            "WeightAfter": "22",
+            "BS_TotalReward": 800.0,
+            "SuggestedWater": "0.2",
+            "TotalWater": "1.0",
+            "B_for_eff_optimal": 0.8,
+            "B_for_eff_optimal_random_seed": 0.82,
+            "Opto_dialog": {
+                "laser_1_calibration_power": "5",
+                "laser_1_target": "NAc",
+            },
+            "B_TrialStartTimeHarp": start.tolist(),
+            "B_TrialEndTimeHarp": (go_cue + 2).tolist(),
+            "B_TrialEndTime": (go_cue + 2).tolist(),
+            "B_GoCueTimeSoundCard": go_cue.tolist(),
+            "B_DelayStartTimeHarp": (go_cue - 0.5).tolist(),
+            "B_RewardOutcomeTime": (go_cue + 0.3).tolist(),
+            "B_BaitHistory": (rng.random((2, n_trials)) < 0.5).tolist(),
+            "B_DelayHistory": rng.uniform(0.5, 1, size=n_trials).tolist(),
+            "B_ITIHistory": rng.uniform(1, 15, size=n_trials).tolist(),
+            "B_LaserOnTrial": (condition != 0).astype(int).tolist(),
+            "B_SelectedCondition": condition.tolist(),
+            "B_StagePositions": [
+                {"x": 1.0 * i, "y1": 2.0, "y2": 3.0, "z": 4.0}
+                for i in range(n_trials)
+            ],
+            "B_LeftLickTime": np.sort(
+                rng.uniform(0, start[-1], 3000)
+            ).tolist(),
+            "B_RightLickTime": np.sort(
+                rng.uniform(0, start[-1], 3000)
+            ).tolist(),
+            "B_OptogeneticsTimeHarp": go_cue[condition == 2].tolist(),
+        }
+    )
+    for name, value in (
+        ("BaseRewardSum", "0.8"),
+        ("LeftValue", "0.05"),
+        ("RightValue", "0.05"),
+        ("BlockBeta", "20"),
+        ("BlockMin", "10"),
+        ("BlockMax", "30"),
+        ("BlockMinReward", "0"),
+        ("DelayBeta", "0.1"),
+        ("DelayMin", "0.5"),
+        ("DelayMax", "1"),
+        ("ITIBeta", "2"),
+        ("ITIMin", "1"),
+        ("ITIMax", "15"),
+        ("ResponseTime", "1"),
+        ("RewardConsumeTime", "3"),
+        ("auto_train_engaged", True),
+        ("auto_train_stage", "STAGE_3"),
+        ("auto_train_stage_overridden", False),
+    ):
+        obj["TP_" + name] = [value] * n_trials
+    # old sessions have no reward delay, or NaN when it was not set
+    obj["TP_RewardDelay"] = [None] * (n_trials // 2) + ["0.1"] * (
+        n_trials - n_trials // 2
+    )
+    for Sc, color in ((1, "Blue"), (2, "Red")):
+        for name, value in (
+            ("Laser", color),
+            ("Location", "Both"),
+            ("Laser1_power", "[5, 2.5]"),
+            ("Probability", "0.25"),
+            ("Duration", "5"),
+            ("Condition", "1"),
+            ("ConditionP", "1"),
+            ("LaserStart", ["Trial start", "Go cue"][Sc - 1]),
+            ("OffsetStart", "0"),
+            ("LaserEnd", "NA"),
+            ("OffsetEnd", "0"),
+            ("Protocol", "Sine"),
+            ("Frequency", "40"),
+            ("RD", "1"),
+            ("PulseDur", "0.002"),
+        ):
+            obj[f"TP_{name}_{Sc}"] = [value] * n_trials
+    # the right power of condition 2 is only known from its old name
+    obj["TP_LaserPowerRight_2"] = ["[5, 3.5]"] * n_trials
+    return obj
+
+
+def _session_obj(Obj):
+    """The session as bonsai_to_nwb reads it: one attribute per field"""
+
+    class obj:
+        pass
+
+    for attr_name in Obj.keys():
+        setattr(obj, attr_name, Obj[attr_name])
+    parameter_log = ParameterLog.from_session(Obj)
+    if parameter_log is not None:
+        for attr_name, values in parameter_log.histories().items():
+            setattr(obj, attr_name, values)
+    return obj
+
+
+def _laser_trial(obj, Sc, i):
+    """Optogenetics values of trial i with laser condition Sc"""
+    if Sc == 0:
+        return {
+            "laser_wavelength": np.nan,
+            "laser_location": "None",
+            "laser_1_power": np.nan,
+            "laser_2_power": np.nan,
+            "laser_on_probability": np.nan,
+            "laser_duration": np.nan,
+            "laser_condition": "None",
+            "laser_condition_probability": np.nan,
+            "laser_start": "None",
+            "laser_start_offset": np.nan,
+            "laser_end": "None",
+            "laser_end_offset": np.nan,
+            "laser_protocol": "None",
+            "laser_frequency": np.nan,
+            "laser_rampingdown": np.nan,
+            "laser_pulse_duration": np.nan,
+        }
+    laser_color = _get_field(
+        obj,
+        field_list=[f"TP_Laser_{Sc}", f"TP_LaserColor_{Sc}"],
+        index=i,
+    )
+    wavelength = {"Blue": 473.0, "Red": 647.0, "Green": 547.0}[laser_color]
+    powers = []
+    for laser, old_name in ((1, "Left"), (2, "Right")):
+        powers.append(
+            float(
+                eval(
+                    _get_field(
+                        obj,
+                        field_list=[
+                            f"TP_Laser{laser}_power_{Sc}",
+                            f"TP_LaserPower{old_name}_{Sc}",
+                        ],
+                        index=i,
+                        default="[np.nan,np.nan]",
+                    )
+                )[1]
+            )
+        )
+    return {
+        "laser_wavelength": wavelength,
+        "laser_location": str(getattr(obj, f"TP_Location_{Sc}")[i]),
+        "laser_1_power": powers[0],
+        "laser_2_power": powers[1],
+        "laser_on_probability": float(getattr(obj, f"TP_Probability_{Sc}")[i]),
+        "laser_duration": float(getattr(obj, f"TP_Duration_{Sc}")[i]),
+        "laser_condition": str(getattr(obj, f"TP_Condition_{Sc}")[i]),
+        "laser_condition_probability": float(
+            getattr(obj, f"TP_ConditionP_{Sc}")[i]
+        ),
+        "laser_start": str(getattr(obj, f"TP_LaserStart_{Sc}")[i]),
+        "laser_start_offset": float(getattr(obj, f"TP_OffsetStart_{Sc}")[i]),
+        "laser_end": str(getattr(obj, f"TP_LaserEnd_{Sc}")[i]),
+        "laser_end_offset": float(getattr(obj, f"TP_OffsetEnd_{Sc}")[i]),
+        "laser_protocol": str(getattr(obj, f"TP_Protocol_{Sc}")[i]),
+        "laser_frequency": float(getattr(obj, f"TP_Frequency_{Sc}")[i]),
+        "laser_rampingdown": float(getattr(obj, f"TP_RD_{Sc}")[i]),
+        "laser_pulse_duration": float(getattr(obj, f"TP_PulseDur_{Sc}")[i]),
+    }
+
+
+def _reference_trials(obj):
+    """
+    Trials as the former bonsai_to_nwb extracted them, one trial at a time with
+    _get_field, before the trial table was built column by column
+    """
+    if not hasattr(obj, "B_TrialEndTimeHarp") or obj.B_TrialEndTimeHarp == []:
+        Harp = ""
+    else:
+        Harp = "Harp"
+    new_autowater = type(obj.B_AutoWaterTrial[0]) is list
+    trials = []
+    for i in range(len(obj.B_TrialEndTime)):
+        if Harp == "":
+            goCue_start_time_t = obj.B_GoCueTime[i]
+        elif hasattr(obj, "B_GoCueTimeHarp"):
+            goCue_start_time_t = obj.B_GoCueTimeHarp[i]
+        else:
+            goCue_start_time_t = obj.B_GoCueTimeSoundCard[i]
+        random_number = _get_field(
+            obj,
+            "B_CurrentRewardProbRandomNumber",
+            index=i,
+            default=[np.nan] * 2,
+        )
+        trial = {
+            "start_time": getattr(obj, f"B_TrialStartTime{Harp}")[i],
+            "stop_time": getattr(obj, f"B_TrialEndTime{Harp}")[i],
+            "animal_response": obj.B_AnimalResponseHistory[i],
+            "rewarded_historyL": obj.B_RewardedHistory[0][i],
+            "rewarded_historyR": obj.B_RewardedHistory[1][i],
+            "reward_outcome_time": obj.B_RewardOutcomeTime[i],
+            "delay_start_time": _get_field(
+                obj, f"B_DelayStartTime{Harp}", index=i, default=np.nan
+            ),
+            "goCue_start_time": goCue_start_time_t,
+            "bait_left": obj.B_BaitHistory[0][i],
+            "bait_right": obj.B_BaitHistory[1][i],
+            "base_reward_probability_sum": float(obj.TP_BaseRewardSum[i]),
+            "reward_probabilityL": float(obj.B_RewardProHistory[0][i]),
+            "reward_probabilityR": float(obj.B_RewardProHistory[1][i]),
+            "reward_random_number_left": random_number[0],
+            "reward_random_number_right": random_number[1],
+            "left_valve_open_time": float(obj.TP_LeftValue[i]),
+            "right_valve_open_time": float(obj.TP_RightValue[i]),
+            "block_beta": float(obj.TP_BlockBeta[i]),
+            "block_min": float(obj.TP_BlockMin[i]),
+            "block_max": float(obj.TP_BlockMax[i]),
+            "min_reward_each_block": float(obj.TP_BlockMinReward[i]),
+            "delay_beta": float(obj.TP_DelayBeta[i]),
+            "delay_min": float(obj.TP_DelayMin[i]),
+            "delay_max": float(obj.TP_DelayMax[i]),
+            "delay_duration": obj.B_DelayHistory[i],
+            "ITI_beta": float(obj.TP_ITIBeta[i]),
+            "ITI_min": float(obj.TP_ITIMin[i]),
+            "ITI_max": float(obj.TP_ITIMax[i]),
+            "ITI_duration": obj.B_ITIHistory[i],
+            "response_duration": float(obj.TP_ResponseTime[i]),
+            "reward_consumption_duration": float(obj.TP_RewardConsumeTime[i]),
+            "reward_delay": float(
+                _get_field(obj, "TP_RewardDelay", index=i, default=0)
+            ),
+            "auto_waterL": (
+                obj.B_AutoWaterTrial[0][i]
+                if new_autowater
+                else obj.B_AutoWaterTrial[i]
+            ),
+            "auto_waterR": (
+                obj.B_AutoWaterTrial[1][i]
+                if new_autowater
+                else obj.B_AutoWaterTrial[i]
+            ),
+            "laser_on_trial": obj.B_LaserOnTrial[i],
+            **_laser_trial(obj, obj.B_SelectedCondition[i], i),
+            "session_wide_control": _get_field(
+                obj, "TP_SessionWideControl", index=i, default="None"
+            ),
+            "fraction_of_session": float(
+                _get_field(
+                    obj, "TP_FractionOfSession", index=i, default=np.nan
+                )
+            ),
+            "session_start_with": _get_field(
+                obj, "TP_SessionStartWith", index=i, default="None"
+            ),
+            "session_alternation": _get_field(
+                obj, "TP_SessionAlternating", index=i, default="None"
+            ),
+            "minimum_opto_interval": float(
+                _get_field(obj, "TP_MinOptoInterval", index=i, default=0)
+            ),
+            "reward_size_left": float(
+                _get_field(obj, "TP_LeftValue_volume", index=i)
+            ),
+            "reward_size_right": float(
+                _get_field(obj, "TP_RightValue_volume", index=i)
+            ),
+        }
+        for name, default in (
+            ("auto_train_engaged", "None"),
+            ("auto_train_curriculum_name", "None"),
+            ("auto_train_curriculum_version", "None"),
+            ("auto_train_curriculum_schema_version", "None"),
+            ("auto_train_stage", "None"),
+            ("auto_train_stage_overridden", np.nan),
+        ):
+            trial[name] = _get_field(
+                obj, f"TP_{name}", index=i, default=default
+            )
+        stage_positions = getattr(obj, "B_StagePositions", [])
+        if i < len(stage_positions):
+            position = stage_positions[i]
+            trial["lickspout_position_x"] = position.get("x", np.nan)
+            trial["lickspout_position_z"] = position.get("z", np.nan)
+            if list(position.keys()) == ["x", "y1", "y2", "z"]:
+                trial["lickspout_position_y1"] = position["y1"]
+                trial["lickspout_position_y2"] = position["y2"]
+            else:
+                trial["lickspout_position_y"] = position.get("y", np.nan)
+        else:
+            trial["lickspout_position_x"] = np.nan
+            trial["lickspout_position_y"] = np.nan
+            trial["lickspout_position_z"] = np.nan
+        trials.append(trial)
+    return trials
+
+
+def _nwb_trials(Obj):
+    """Trial table of the session converted by bonsai_to_nwb, read back from the file"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "session.json")
+        with open(path, "w") as f:
+            json.dump(Obj, f)
+        assert bonsai_to_nwb(path, folder, from_columns=False) == "success"
+        with NWBHDF5IO(os.path.join(folder, "session.nwb"), mode="r") as io:
+            return io.read().trials.to_dataframe()
+
+
+def _assert_same_trials(Obj):
+    table = _nwb_trials(Obj)
+    # the session as saved, not as this process built it
+    reference = _reference_trials(_session_obj(json.loads(json.dumps(Obj))))
+    assert len(table) == len(reference)
+    assert set(table.columns) == set(reference[0])
+    for name in table.columns:
+        values = [trial[name] for trial in reference]
+        try:
+            expected = np.array(values, dtype=float)
+        except (TypeError, ValueError):
+            assert [str(v) for v in table[name]] == [
+                str(v) for v in values
+            ], name
+            continue
+        np.testing.assert_array_equal(
+            table[name].to_numpy(dtype=float), expected, err_msg=name
+        )
+
+
+def test_trial_table(n_trials=120):
+    _assert_same_trials(synthetic_nwb_session(n_trials))
+
+
+def test_trial_table_cpu_time(n_trials=120):
+    Obj = synthetic_nwb_session(n_trials, seed=1)
+    for name in ("B_TrialEndTimeHarp", "B_DelayStartTimeHarp"):
+        del Obj[name]
+    Obj["B_TrialStartTime"] = Obj["B_TrialStartTimeHarp"]
+    Obj["B_GoCueTime"] = Obj["B_GoCueTimeSoundCard"]
+    _assert_same_trials(Obj)
+
+
+def test_trial_table_old_formats(n_trials=120):
+    Obj = synthetic_nwb_session(n_trials, seed=2)
+    # one auto water flag for both sides, newscale stage, fields not saved yet
+    Obj["B_AutoWaterTrial"] = Obj["B_AutoWaterTrial"][0]
+    Obj["B_StagePositions"] = [
+        {"x": 1.0 * i, "y": 2.0, "z": 3.0} for i in range(n_trials // 2)
+    ]
+    for name in (
+        "B_CurrentRewardProbRandomNumber",
+        "TP_RewardDelay",
+        "TP_auto_train_stage",
+    ):
+        del Obj[name]
+    _assert_same_trials(Obj)
+
+
+def test_trial_table_rejected_values(n_trials=120):
+    Obj = synthetic_nwb_session(n_trials, seed=3)
+    Obj["TP_LeftValue_volume"] = [""] * 10 + Obj["TP_LeftValue_volume"][10:]
+    Obj["TP_auto_train_stage"] = [None] * n_trials
+    Obj["B_DelayStartTimeHarp"] = [None] * 5 + Obj["B_DelayStartTimeHarp"][5:]
+    _assert_same_trials(Obj)
@@ -0,0 +1,226 @@
+"""
+A session simulated by TrialEngine must be the same trial by trial as the seeded
+simulation through GenerateTrials it replaces. GenerateTrials runs with a stand-in for
+the main window (SimulationWindow), also used by the trial_engine benchmark.
+"""
+
+import logging
+import os
+import random
+import threading
+import types
+
+import numpy as np
+import pytest
+
+from foraging_gui.MyFunctions import GenerateTrials
+from foraging_gui.trial_engine import (
+    REWARD_FAMILIES,
+    TaskParameters,
+    simulate_session,
+)
+
+
+class _Toggle:
+    """Stand-in for a checkable button or menu action"""
+
+    def __init__(self, checked=False):
+        self.checked = checked
+
+    def isChecked(self):
+        return self.checked
+
+    def setChecked(self, checked):
+        self.checked = checked
+
+    def setStyleSheet(self, style):
+        pass
+
+
+class _WarmupBox:
+    """Stand-in for the warm-up combo box, turning it off restores the parameters"""
+
+    def __init__(self, window, text):
+        self.window = window
+        self.text = text
+
+    def currentText(self):
+        return self.text
+
+    def findText(self, text):
+        return text
+
+    def setCurrentIndex(self, text):
+        self.text = text
+
+
+class SimulationWindow:
+    """
+    Just enough of the main window for GenerateTrials to run a simulation session:
+    the training parameters of a TaskParameters, the simulation menu and the buttons
+    the trial logic toggles
+    """
+
+    def __init__(self, parameters, policy):
+        base = parameters._replace(warmup="off")
+        if parameters.warmup == "on":
+            parameters = parameters.with_warmup()
+        self.values = dict(
+            parameters.to_trial_parameters(),
+            OptogeneticsB="off",
+            LeftValue_volume="3.0",
+            RightValue_volume="3.0",
+            Multiplier="0.8",
+        )
+        self.base_values = dict(self.values, **base.to_trial_parameters())
+        self.RewardFamilies = REWARD_FAMILIES
+        self.UpdateParameters = 1
+        self.NewTrialRewardOrder = 1
+        self.warning_log_tag = "warning_widget"
+        self.box_letter = "A"
+        self.stage_widget = None
+        self.unsaved_data = False
+        self.give_left_volume_reserved = 0
+        self.give_right_volume_reserved = 0
+        self.widget_registry = types.SimpleNamespace(read=self._read)
+        self.UncoupledReward = types.SimpleNamespace(
+            text=lambda: self.values["UncoupledReward"]
+        )
+        self.Save = _Toggle()
+        self.Start = _Toggle(True)
+        self.StartExcitation = _Toggle()
+        self.NextBlock = _Toggle()
+        self.actionWin_stay_lose_switch = _Toggle(
+            policy == "win_stay_lose_switch"
+        )
+        self.actionRandom_choice = _Toggle(policy == "random")
+        self.warmup = _WarmupBox(self, parameters.warmup)
+
+    def _read(self, names):
+        return dict(self.values, NextBlock=self.NextBlock.isChecked())
+
+    def _warmup(self):
+        if self.warmup.currentText() == "off":
+            self.values = dict(self.base_values)
+
+    def keyPressEvent(self):
+        pass
+
+    def _NextBlock(self):
+        pass
+
+    def _UpdateSuggestedWater(self):
+        pass
+
+    def session_end_tasks(self):
+        pass
+
+
+def gui_simulation(parameters, seed, policy):
+    """Simulation session run through GenerateTrials as the trial loop of the GUI does"""
+    random.seed(seed)
+    np.random.seed(seed)
+    window = SimulationWindow(parameters, policy)
+    trials = GenerateTrials(window)
+    # the foraging efficiency is display only
+    trials._update_foraging_efficiency = lambda force=False: None
+    data_lock = threading.Lock()
+    trials._GenerateATrial(None)
+    while window.Start.isChecked():
+        trials.B_CurrentTrialN += 1
+        trials._InitiateATrial(None, None)
+        trials._GetAnimalResponse(None, None, data_lock)
+        trials._GenerateATrial(None)
+    return trials
+
+
+# histories the GUI loop and TrialEngine must give the same
+PARITY_KEYS = (
+    "B_RewardProHistory",
+    "B_BaitHistory",
+    "B_AutoWaterTrial",
+    "B_AnimalResponseHistory",
+    "B_RewardedHistory",
+    "B_ITIHistory",
+    "B_DelayHistory",
+    "B_TrialStartTime",
+    "B_GoCueTime",
+    "B_TrialEndTime",
+)
+
+
+# task parameters and policy of the sessions compared with the GUI loop
+PARITY_CONFIGURATIONS = {
+    "coupled baiting": (
+        TaskParameters(MaxTrial=400),
+        "win_stay_lose_switch",
+    ),
+    "coupled without baiting, even": (
+        TaskParameters(
+            Task="Coupled Without Baiting",
+            Randomness="Even",
+            RewardPairsN=3,
+            MaxTrial=400,
+        ),
+        "random",
+    ),
+    "uncoupled baiting": (
+        TaskParameters(Task="Uncoupled Baiting", MaxTrial=400),
+        "win_stay_lose_switch",
+    ),
+    "RewardN, min reward": (
+        TaskParameters(Task="RewardN", BlockMinReward=5, MaxTrial=400),
+        "win_stay_lose_switch",
+    ),
+    "auto water, advanced switch": (
+        TaskParameters(
+            AutoReward=True,
+            Unrewarded=5,
+            Ignored=2,
+            AutoWaterType="High pro",
+            IncludeAutoReward="yes",
+            AdvancedBlockAuto="now",
+            MaxTrial=400,
+        ),
+        "random",
+    ),
+    "warm-up, then uncoupled": (
+        TaskParameters(
+            Task="Uncoupled Without Baiting", warmup="on", MaxTrial=400
+        ),
+        "win_stay_lose_switch",
+    ),
+    "ignore stop": (
+        TaskParameters(
+            min_time=0,
+            auto_stop_ignore_win=5,
+            auto_stop_ignore_ratio_threshold=0.4,
+        ),
+        "random",
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def app():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtWidgets
+
+    # GenerateTrials shows a message box when the session stops
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.mark.parametrize("name", PARITY_CONFIGURATIONS)
+def test_same_trials_as_generate_trials(app, name, seeds=(0, 1)):
+    parameters, policy = PARITY_CONFIGURATIONS[name]
+    logging.disable(logging.WARNING)
+    try:
+        for seed in seeds:
+            trials = gui_simulation(parameters, seed, policy)
+            result = simulate_session(parameters, seed, policy)
+            for key in PARITY_KEYS:
+                assert np.array_equal(
+                    np.asarray(getattr(trials, key)), result.histories[key]
+                ), f"seed {seed}: {key} differs"
+    finally:
+        logging.disable(logging.NOTSET)
@@ -0,0 +1,745 @@
+"""
+GUI-free trial engine running the task logic of GenerateTrials with a simulated forager,
+to simulate many sessions quickly, e.g. when tuning curricula and task parameters.
+
+It covers what a simulation session (Simulation > Win-stay-lose-switch or Random choice)
+runs through GenerateTrials: coupled and uncoupled blocks, RewardN, baiting, auto water,
+advanced block switch, warm-up and the session stop rules. Random numbers are drawn from
+the global ``random`` and ``np.random`` generators in the same order as GenerateTrials,
+so a session with a given seed is the same trial by trial as a seeded simulation through
+GenerateTrials (checked by test_trial_engine).
+Optogenetics, licks, water volumes and hardware timing are not simulated.
+
+Simulate sessions with e.g.
+
+``results = simulate_sessions(TaskParameters(Task="Uncoupled Baiting"), range(1000))``
+"""
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from foraging_gui.reward_schedules.uncoupled_block import UncoupledBlocks
+from foraging_gui.trial_store import GrowableArray
+
+# reward pairs of the coupled task, selected by RewardFamily (1-based)
+REWARD_FAMILIES = [
+    [[8, 1], [6, 1], [3, 1], [1, 1]],
+    [[8, 1], [1, 1]],
+    [
+        [1, 0],
+        [0.9, 0.1],
+        [0.8, 0.2],
+        [0.7, 0.3],
+        [0.6, 0.4],
+        [0.5, 0.5],
+    ],
+    [[6, 1], [3, 1], [1, 1]],
+]
+COUPLED_TASKS = ("Coupled Baiting", "Coupled Without Baiting", "RewardN")
+UNCOUPLED_TASKS = ("Uncoupled Baiting", "Uncoupled Without Baiting")
+BAITING_TASKS = ("Coupled Baiting", "Uncoupled Baiting")
+# parameters Window._warmup sets while the warm-up is on
+WARMUP_PARAMETERS = dict(
+    Task="Coupled Baiting",
+    BaseRewardSum=1.0,
+    RewardFamily=3,
+    RewardPairsN=1,
+    BlockBeta=1.0,
+    BlockMin=1,
+    BlockMax=1,
+    BlockMinReward=1,
+    AutoReward=True,
+    AutoWaterType="Natural",
+    Unrewarded=0,
+    Ignored=0,
+    AdvancedBlockAuto="off",
+)
+
+
+class TaskParameters(NamedTuple):
+    """
+    Training parameters used by the task logic, named after their widgets (the TP_
+    parameters of a session without the prefix). Defaults are those of the GUI.
+    """
+
+    Task: str = "Coupled Baiting"
+    RewardFamily: int = 1
+    RewardPairsN: int = 1
+    BaseRewardSum: float = 0.8
+    UncoupledReward: Tuple[float, ...] = (0.1, 0.3, 0.7)
+    Randomness: str = "Exponential"  # or "Even"
+    BlockMin: int = 20
+    BlockMax: int = 60
+    BlockBeta: float = 20.0
+    BlockMinReward: int = 0
+    ITIMin: float = 1.0
+    ITIMax: float = 8.0
+    ITIBeta: float = 2.0
+    DelayMin: float = 0.0
+    DelayMax: float = 1.0
+    DelayBeta: float = 1.0
+    ResponseTime: float = 1.0
+    RewardConsumeTime: float = 3.0
+    InitiallyInactiveN: int = 2
+    AdvancedBlockAuto: str = "off"  # or "now", "once"
+    SwitchThr: float = 0.5
+    PointsInARow: Optional[int] = 5  # None when the field is empty
+    IncludeAutoReward: str = "no"
+    AutoReward: bool = False
+    AutoWaterType: str = "Natural"  # or "High pro", "Both"
+    Unrewarded: int = 200
+    Ignored: int = 100
+    AddOneTrialForNoresponse: str = "Yes"
+    MaxTrial: int = 1000
+    MaxTime: float = 120.0  # minutes
+    min_time: int = 30  # minutes
+    auto_stop_ignore_win: int = 30
+    auto_stop_ignore_ratio_threshold: float = 0.8
+    warmup: str = "off"
+    warm_min_trial: float = 60.0
+    warm_min_finish_ratio: float = 0.8
+    warm_max_choice_ratio_bias: float = 0.1
+    warm_windowsize: int = 20
+
+    @classmethod
+    def from_trial_parameters(cls, values: Dict[str, object]):
+        """
+        Parameters from widget values, e.g. the TP_ parameters of a trial of a saved
+        session. Names may have the TP_ prefix, parameters missing from values keep
+        their default
+        """
+        parameters = {}
+        for name, kind in cls.__annotations__.items():
+            value = values.get("TP_" + name, values.get(name))
+            if value is None:
+                continue
+            if name == "UncoupledReward":
+                if isinstance(value, str):
+                    value = (
+                        value.replace("[", "")
+                        .replace("]", "")
+                        .replace(",", " ")
+                        .split()
+                    )
+                value = tuple(float(v) for v in value)
+            elif name == "PointsInARow":
+                value = None if value == "" else int(float(value))
+            elif kind is int:
+                value = int(float(value))
+            elif kind is float:
+                value = float(value)
+            elif kind is bool:
+                value = value in (True, "True", "true", 1)
+            parameters[name] = value
+        return cls(**parameters)
+
+    def to_trial_parameters(self) -> Dict[str, object]:
+        """Widget values of the parameters, as the GUI reads them (without the TP_ prefix)"""
+        values = {}
+        for name, value in self._asdict().items():
+            if name == "UncoupledReward":
+                value = ",".join(str(v) for v in value)
+            elif name == "PointsInARow":
+                value = "" if value is None else str(value)
+            elif not isinstance(value, bool):
+                value = str(value)
+            values[name] = value
+        return values
+
+    def with_warmup(self):
+        """Parameters used while the warm-up is on"""
+        return self._replace(warmup="on", **WARMUP_PARAMETERS)
+
+
+def consecutive_runs(
+    values: np.ndarray, target
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Runs of consecutive values equal to target, as GenerateTrials._consecutive_length
+    :return: run lengths, and (first index, last index) of each run
+    """
+    hit = np.asarray(values) == target
+    if not hit.any():
+        return np.array([]), np.array([])
+    edges = np.diff(np.concatenate(([0], hit.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return ends - starts + 1, np.column_stack([starts, ends])
+
+
+def win_stay_lose_switch(engine: "TrialEngine"):
+    """Simulated forager of GenerateTrials: repeat rewarded choices, switch after errors"""
+    if engine.trial_n >= 2:
+        if np.random.random(1) < 0.1:  # no response
+            return 2
+        if np.random.random(1) < 0:  # left bias, off as in GenerateTrials
+            return 0
+        last_rewarded = engine.rewarded.view()[:, -1]
+        last_response = engine.response.view()[-1]
+        if any(last_rewarded == 1):  # win
+            return last_response
+        if any(last_rewarded == 0) and last_response != 2:  # lose
+            return 1 - last_response
+    return random.choice(range(2))
+
+
+def random_choice(engine: "TrialEngine"):
+    """Simulated forager of GenerateTrials choosing at random, ignoring 10% of trials"""
+    if np.random.random(1) < 0.1:  # no response
+        return 2
+    return random.choice(range(2))
+
+
+POLICIES = {
+    "win_stay_lose_switch": win_stay_lose_switch,
+    "random": random_choice,
+}
+
+
+class TrialEngine:
+    """
+    One simulated session. A policy is called with the engine once per trial and
+    returns the choice, 0 left, 1 right, 2 no response; it can read the histories of
+    the previous trials. Parameters can be changed between trials with set_parameters,
+    they take effect when the next trial is generated, as in the GUI.
+    """
+
+    def __init__(
+        self,
+        parameters: TaskParameters = TaskParameters(),
+        policy: Union[str, Callable] = "win_stay_lose_switch",
+        seed: Optional[int] = None,
+        reward_families=REWARD_FAMILIES,
+    ):
+        """
+        :param parameters: training parameters; with warmup "on" the session starts with
+            the warm-up parameters and switches to parameters once the warm-up is over
+        :param policy: name in POLICIES or callable(engine) -> choice
+        :param seed: seed of the global random and np.random generators, None to keep
+            their state
+        """
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+        self.policy = POLICIES[policy] if isinstance(policy, str) else policy
+        self.reward_families = reward_families
+        if parameters.warmup == "on":
+            self.parameters = parameters.with_warmup()
+            self._warmup_done_parameters = parameters._replace(warmup="off")
+        else:
+            self.parameters = parameters
+            self._warmup_done_parameters = None
+        self._next_parameters = None
+
+        # current trial, starts from 0 when a trial is initiated
+        self.trial_n = -1
+        self.stopped = False
+        self.stop_reason = None  # "ignored", "max_trial" or "max_time"
+        self.running_time = 0.0
+        self.next_block = False  # the NextBlock button
+        self.a_new_block = np.array([1, 1]).astype(int)
+        self.block_len_history = [[], []]
+        self.uncoupled_blocks = None
+        self.current_reward_prob = np.empty((2,))
+        self.baited = np.array([False, False])
+        self.current_bait = None
+        self.current_auto_reward = 0
+        self.bait_permitted = True
+        self.advanced_block_switch_permitted = 1
+        # reward probability runs of each side, for the block lengths
+        self._run_start = [0, 0]
+        self._finished_runs = [[], []]
+
+        self.reward_prob = GrowableArray(rows=2, dtype=float)
+        self.random_number = GrowableArray(rows=2, dtype=float)
+        self.bait = GrowableArray(rows=2, dtype=bool)
+        self.auto_water = GrowableArray(rows=2, dtype=int)
+        self.response = GrowableArray(dtype=float)
+        self.rewarded = GrowableArray(rows=2, dtype=bool)
+        # responses of the trials without auto water, for the ignore stop rule
+        self.non_auto_response = GrowableArray(dtype=float)
+        self.iti = []
+        self.delay = []
+        self.response_time = []
+        self.reward_consume_time = []
+        self.trial_start_time = GrowableArray(dtype=float)
+        self.go_cue_time = GrowableArray(dtype=float)
+        self.trial_end_time = GrowableArray(dtype=float)
+
+    def set_parameters(self, parameters: TaskParameters):
+        """Use parameters from the next generated trial on"""
+        self._next_parameters = parameters
+
+    def run(self):
+        """Run trials until a stop rule is met, as the trial loop of a simulation session"""
+        if self.trial_n == -1 and not len(self.reward_prob):
+            self.generate_trial()
+        while not self.stopped:
+            self.trial_n += 1
+            self.initiate_trial()
+            self.respond()
+            self.generate_trial()
+        return self
+
+    # --- generating a trial (GenerateTrials._GenerateATrial) ---
+
+    def generate_trial(self):
+        """Draw the reward probabilities, ITI and delay of the next trial"""
+        if self._next_parameters is not None:
+            self.parameters, self._next_parameters = (
+                self._next_parameters,
+                None,
+            )
+        p = self.parameters
+        self.reward_consume_time.append(p.RewardConsumeTime)
+        self.current_auto_reward = self._check_auto_water()
+
+        if p.Task in COUPLED_TASKS:
+            self._check_coupled_block_transition()
+            if any(self.a_new_block == 1):
+                self._generate_next_coupled_block()
+        elif p.Task in UNCOUPLED_TASKS:
+            if self.trial_n == -1 or self.uncoupled_blocks is None:
+                self.uncoupled_blocks = UncoupledBlocks(
+                    rwd_prob_array=np.array(p.UncoupledReward),
+                    block_min=int(p.BlockMin),
+                    block_max=int(p.BlockMax),
+                    persev_add=True,
+                    perseverative_limit=4,
+                    max_block_tally=3,
+                )
+            else:
+                self.uncoupled_blocks.add_choice(
+                    ["L", "R", "ignored"][int(self.response.view()[-1])]
+                )
+            self.uncoupled_blocks.next_trial()
+            for i, side in enumerate(["L", "R"]):
+                self.current_reward_prob[i] = (
+                    self.uncoupled_blocks.trial_rwd_prob[side][-1]
+                )
+        self._append_reward_prob(self.current_reward_prob)
+
+        self._generate_iti_and_delay()
+        self.bait_permitted = (
+            self._max_consecutive_selection() >= p.InitiallyInactiveN
+            if p.Task == "RewardN"
+            else True
+        )
+        if self.trial_n >= 0 and len(self.trial_end_time):
+            self.running_time = float(
+                self.trial_end_time.view()[-1]
+                - self.trial_start_time.view()[0]
+            )
+        self._check_stop()
+        self._check_warmup()
+
+    def _append_reward_prob(self, reward_prob):
+        n = len(self.reward_prob)
+        if n:
+            last = self.reward_prob.view()[:, -1]
+            for i in range(2):
+                if reward_prob[i] != last[i]:
+                    self._finished_runs[i].append(n - self._run_start[i])
+                    self._run_start[i] = n
+        self.reward_prob.append(reward_prob)
+
+    def _override_block_len(self, sides):
+        """Set the block lengths of sides to the lengths of their reward probability runs"""
+        n = len(self.reward_prob)
+        for i in sides:
+            self.block_len_history[i] = self._finished_runs[i] + [
+                n - self._run_start[i]
+            ]
+
+    def _check_auto_water(self) -> int:
+        p = self.parameters
+        if not p.AutoReward:
+            return 0
+        if p.Unrewarded <= 0 or p.Ignored <= 0:
+            return 1
+        n = len(self.response)
+        if n < p.Ignored and n < p.Unrewarded:
+            return 0
+        if n >= p.Ignored and np.all(self.response.view()[-p.Ignored :] == 2):
+            return 1
+        if n >= p.Unrewarded:
+            # auto water counts as reward
+            rewarded = self.rewarded.view()[:, -p.Unrewarded :] | (
+                self.auto_water.view()[:, -p.Unrewarded :] != 0
+            )
+            if not rewarded.any():
+                return 1
+        return 0
+
+    def _check_coupled_block_transition(self):
+        p = self.parameters
+        self.advanced_block_switch_permitted = (
+            self._advanced_block_switch_permitted()
+        )
+        if self.next_block:
+            self.a_new_block[:] = 1
+            self.next_block = False
+            if self.trial_n >= 0:
+                self._override_block_len([0, 1])
+            return
+        for i in range(2):
+            if self.trial_n + 1 >= sum(self.block_len_history[i]):
+                self.a_new_block[i] = 1
+        if self.trial_n >= 0:
+            all_reward = self._current_block_reward()
+        else:
+            all_reward = -1
+        # for the coupled task, hold the block switch on both sides
+        if np.all(self.a_new_block == 1) and all_reward != -1:
+            if (
+                all_reward < p.BlockMinReward
+                or self.advanced_block_switch_permitted == 0
+            ):
+                self.a_new_block = np.zeros_like(self.a_new_block)
+                self._override_block_len([0, 1])
+
+    def _current_block_reward(self) -> int:
+        """
+        Rewards in the current block of both sides, extending the block lengths that are
+        exceeded (GenerateTrials._get_current_block_reward with UpdateBlockLen=1)
+        """
+        p = self.parameters
+        rewarded = self.rewarded.view()
+        if p.IncludeAutoReward == "yes":
+            rewarded = rewarded | (self.auto_water.view() != 0)
+        elif p.IncludeAutoReward == "no":
+            response = self.response.view()
+            bait = self.bait.view()[:, : len(response)]
+            rewarded = (response == np.arange(2)[:, None]) & bait
+        n = len(self.reward_prob)
+        block_len = [
+            self.block_len_history[0][-1],
+            self.block_len_history[1][-1],
+        ]
+        all_reward = 0
+        for i in range(2):
+            all_reward += int(np.sum(rewarded[i, self._run_start[i] :]))
+        for i in range(2):
+            if n - self._run_start[i] > block_len[i]:
+                self._override_block_len([i])
+        return all_reward
+
+    def _choice_fraction(self) -> np.ndarray:
+        """Running average of right choices over 2 trials, ignoring no responses"""
+        response = np.where(
+            self.response.view() == 2, np.nan, self.response.view()
+        )
+        pairs = np.stack([response[:-1], response[1:]])
+        count = np.sum(~np.isnan(pairs), axis=0)
+        total = np.nansum(pairs, axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(count > 0, total / count, np.nan)
+
+    def _advanced_block_switch_permitted(self) -> int:
+        p = self.parameters
+        if p.AdvancedBlockAuto == "off":
+            return 1
+        if self.trial_n <= 2:
+            return 1
+        n = len(self.reward_prob)
+        choice_fraction = self._choice_fraction()
+        block_len = min(n - start for start in self._run_start)
+        if block_len > len(choice_fraction):
+            return 1
+        choice_fraction = choice_fraction[-block_len:]
+        prob = self.current_reward_prob
+        delta = abs((prob[0] - prob[1]) * p.SwitchThr)
+        if prob[0] > prob[1]:
+            threshold = [0, prob[0] - delta]
+        elif prob[0] < prob[1]:
+            threshold = [prob[0] + delta, 1]
+        else:
+            return 1
+        ok_points = (
+            (choice_fraction >= threshold[0])
+            & (choice_fraction <= threshold[1])
+        ).astype(float)
+        lengths, indices = consecutive_runs(ok_points, 1)
+        if lengths.size == 0:
+            return 0
+        if p.PointsInARow is None:
+            return 1
+        if p.AdvancedBlockAuto == "now":
+            # the current run qualifies
+            return int(
+                len(ok_points) in indices[lengths > p.PointsInARow][:, 1] + 1
+            )
+        if p.AdvancedBlockAuto == "once":
+            return int(np.any(lengths > p.PointsInARow))
+        return 1
+
+    def _generate_next_coupled_block(self):
+        p = self.parameters
+        reward_pairs = self.reward_families[p.RewardFamily - 1][
+            : p.RewardPairsN
+        ]
+        reward_prob = (
+            np.array(reward_pairs)
+            / np.expand_dims(np.sum(reward_pairs, axis=1), axis=1)
+            * p.BaseRewardSum
+        )
+        pool = np.append(reward_prob, np.fliplr(reward_prob), axis=0)
+        if len(self.reward_prob):
+            last = self.reward_prob.view()[:, -1]
+            # exclude the previous reward probabilities
+            pool = pool[np.any(pool != last, axis=1)]
+            # force a change of the block identity (L->R; R->L)
+            if last[0] != last[1]:
+                pool = pool[(pool[:, 0] > pool[:, 1]) != (last[0] > last[1])]
+        pool = np.unique(pool, axis=0)
+        self.current_reward_prob = pool[random.choice(range(pool.shape[0]))]
+        if p.Randomness == "Exponential":
+            block_len = int(
+                np.random.exponential(float(p.BlockBeta)) + float(p.BlockMin)
+            )
+        elif p.Randomness == "Even":
+            block_len = np.random.randint(int(p.BlockMin), int(p.BlockMax) + 1)
+        if block_len > p.BlockMax:
+            block_len = int(p.BlockMax)
+        for i in range(2):
+            self.block_len_history[i].append(block_len)
+        self.a_new_block = np.array([0, 0])
+
+    def _generate_iti_and_delay(self):
+        p = self.parameters
+        if p.Randomness == "Exponential":
+            iti = float(np.random.exponential(p.ITIBeta) + p.ITIMin)
+        elif p.Randomness == "Even":
+            iti = random.uniform(p.ITIMin, p.ITIMax)
+        iti = min(iti, p.ITIMax)
+        if p.Randomness == "Exponential":
+            delay = float(np.random.exponential(p.DelayBeta) + p.DelayMin)
+        elif p.Randomness == "Even":
+            delay = random.uniform(p.DelayMin, p.DelayMax)
+        delay = min(delay, p.DelayMax)
+        # the shaders timer does not allow delays close to zero
+        self.iti.append(max(iti, 0.05))
+        self.delay.append(max(delay, 0.05))
+        self.response_time.append(p.ResponseTime)
+
+    def _max_consecutive_selection(self) -> int:
+        """Longest run of choices of the active side in the current block (RewardN)"""
+        n = len(self.response)
+        if n == 0:
+            return 0
+        reward_prob = self.reward_prob.view()
+        # reset to 0 on the first trial of a block
+        if np.any(reward_prob[:, -1] != reward_prob[:, -2]):
+            return 0
+        active_side = np.argmax(reward_prob[:, n - 1])
+        lengths, _ = consecutive_runs(
+            self.response.view()[self._run_start[0] : n], active_side
+        )
+        return np.max(lengths) if len(lengths) else 0
+
+    def _check_stop(self):
+        p = self.parameters
+        stop_ignore = round(
+            p.auto_stop_ignore_ratio_threshold * p.auto_stop_ignore_win
+        )
+        ignored = np.count_nonzero(
+            self.non_auto_response.view()[-p.auto_stop_ignore_win :] == 2
+        )
+        if self.running_time / 60 >= p.min_time and ignored >= stop_ignore:
+            self.stop_reason = "ignored"
+        elif self.trial_n > p.MaxTrial - 2:
+            self.stop_reason = "max_trial"
+        elif self.running_time > p.MaxTime * 60:
+            self.stop_reason = "max_time"
+        self.stopped = self.stop_reason is not None
+
+    def _check_warmup(self):
+        p = self.parameters
+        if p.warmup != "on":
+            return
+        window = self.response.view()[-int(p.warm_windowsize) :]
+        left = np.count_nonzero(window == 0)
+        right = np.count_nonzero(window == 1)
+        no_response = np.count_nonzero(window == 2)
+        finish_ratio = (
+            (left + right) / (left + right + no_response)
+            if left + right + no_response
+            else 0
+        )
+        choice_ratio = right / (left + right) if left + right else 0
+        if (
+            len(self.response) >= p.warm_min_trial
+            and finish_ratio >= p.warm_min_finish_ratio
+            and abs(choice_ratio - 0.5) <= p.warm_max_choice_ratio_bias
+        ):
+            # back to the parameters before the warm-up, starting a new block
+            self.set_parameters(
+                self._warmup_done_parameters or p._replace(warmup="off")
+            )
+            self.next_block = True
+
+    # --- running a trial (GenerateTrials._InitiateATrial and _SimulateResponse) ---
+
+    def initiate_trial(self):
+        """Bait the ports and decide auto water"""
+        p = self.parameters
+        random_number = np.random.random(2)
+        self.random_number.append(random_number)
+        bait = self.current_reward_prob > random_number
+        if p.Task in BAITING_TASKS:
+            bait = bait | self.baited
+        if not self.bait_permitted:
+            # no reward on the active side during the initial N trials (RewardN)
+            bait[np.argmax(self.current_reward_prob)] = False
+        self.baited = bait.copy()
+        self.bait.append(bait)
+        auto_water = [0, 0]
+        if self.current_auto_reward == 1:
+            if p.AutoWaterType == "Natural":
+                auto_water = [int(b) for b in bait]
+            elif p.AutoWaterType == "Both":
+                auto_water = [1, 1]
+            elif p.AutoWaterType == "High pro":
+                prob = self.current_reward_prob
+                if prob[0] > prob[1]:
+                    auto_water = [1, 0]
+                elif prob[0] < prob[1]:
+                    auto_water = [0, 1]
+                else:
+                    auto_water = [1, 1]
+            # no baited reward on the auto water side
+            for i in range(2):
+                if auto_water[i] == 1:
+                    bait[i] = False
+                    self.baited[i] = False
+        self.auto_water.append(auto_water)
+        self.current_bait = bait
+
+    def respond(self):
+        """Get the choice of the policy and the outcome and times of the trial"""
+        choice = self.policy(self)
+        rewarded = np.array([False, False])
+        if choice == 2:
+            self._add_one_trial()
+        elif choice in (0, 1):
+            side = int(choice)
+            self.baited[side] = False
+            rewarded[side] = bool(self.current_bait[side])
+        self.response.append(choice)
+        self.rewarded.append(rewarded)
+        if not any(self.auto_water.view()[:, -1]):
+            self.non_auto_response.append(choice)
+
+        trial = len(self.trial_start_time)
+        if trial == 0:
+            trial_start = 0
+        else:
+            trial_start = (
+                self.trial_start_time.view()[-1]
+                + self.iti[trial - 1]
+                + self.delay[trial - 1]
+                + self.response_time[trial - 1]
+                + float(self.reward_consume_time[trial - 1])
+            )
+        go_cue = trial_start + self.iti[trial] + self.delay[trial]
+        trial_end = (
+            go_cue
+            + self.response_time[trial]
+            + float(self.reward_consume_time[trial])
+        )
+        self.trial_start_time.append(trial_start)
+        self.go_cue_time.append(go_cue)
+        self.trial_end_time.append(trial_end)
+
+    def _add_one_trial(self):
+        """Extend the current block by one trial after a no response"""
+        p = self.parameters
+        if p.AddOneTrialForNoresponse != "Yes":
+            return
+        if p.Task in UNCOUPLED_TASKS:
+            for side in ["L", "R"]:
+                self.uncoupled_blocks.block_ends[side][-1] += 1
+        elif p.Task in ("Coupled Baiting", "Coupled Without Baiting"):
+            for i in range(2):
+                self.block_len_history[i][-1] = (
+                    self.block_len_history[i][-1] + 1
+                )
+
+    def histories(self) -> Dict[str, np.ndarray]:
+        """Histories of the session under the names GenerateTrials saves them with"""
+        return {
+            "B_RewardProHistory": self.reward_prob.view(),
+            "B_CurrentRewardProbRandomNumber": self.random_number.view().T,
+            "B_BaitHistory": self.bait.view(),
+            "B_AutoWaterTrial": self.auto_water.view(),
+            "B_AnimalResponseHistory": self.response.view(),
+            "B_RewardedHistory": self.rewarded.view(),
+            "B_ITIHistory": np.array(self.iti),
+            "B_DelayHistory": np.array(self.delay),
+            "B_TrialStartTime": self.trial_start_time.view(),
+            "B_GoCueTime": self.go_cue_time.view(),
+            "B_TrialEndTime": self.trial_end_time.view(),
+        }
+
+
+class SessionResult(NamedTuple):
+    seed: Optional[int]
+    stop_reason: str
+    histories: Dict[str, np.ndarray]
+
+
+def simulate_session(
+    parameters: TaskParameters = TaskParameters(),
+    seed: Optional[int] = None,
+    policy: Union[str, Callable] = "win_stay_lose_switch",
+) -> SessionResult:
+    """Simulate one session until it stops"""
+    engine = TrialEngine(parameters, policy=policy, seed=seed).run()
+    histories = {
+        name: np.array(values) for name, values in engine.histories().items()
+    }
+    return SessionResult(seed, engine.stop_reason, histories)
+
+
+def _simulate_seeds(args) -> List[SessionResult]:
+    parameters, seeds, policy = args
+    return [simulate_session(parameters, seed, policy) for seed in seeds]
+
+
+def simulate_sessions(
+    parameters: TaskParameters,
+    seeds: Iterable[int],
+    policy: Union[str, Callable] = "win_stay_lose_switch",
+    workers: Optional[int] = 1,
+    chunk_size: int = 50,
+) -> List[SessionResult]:
+    """
+    Simulate one session per seed, in the order of seeds
+    :param policy: name in POLICIES, or a module-level function when workers > 1
+    :param workers: number of worker processes, 1 to simulate in this process and
+        None for one per CPU
+    """
+    seeds = list(seeds)
+    if workers == 1:
+        return _simulate_seeds((parameters, seeds, policy))
+    chunks = [
+        (parameters, seeds[i : i + chunk_size], policy)
+        for i in range(0, len(seeds), chunk_size)
+    ]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in executor.map(_simulate_seeds, chunks):
+            results.extend(chunk)
+    return results
@@ -0,0 +1,181 @@
+import numpy as np
+
+
+class GrowableArray:
+    """Append-only array with capacity doubling along its last axis"""
+
+    def __init__(self, rows: int = None, dtype=float, capacity: int = 64):
+        """
+        :param rows: number of rows for 2d histories (e.g. one per lick port), None for 1d
+        :param dtype: dtype of the stored values
+        :param capacity: initial number of columns to allocate
+        """
+        self.rows = rows
+        capacity = max(int(capacity), 1)
+        shape = (capacity,) if rows is None else (rows, capacity)
+        self._data = np.empty(shape, dtype=dtype)
+        self._size = 0
+
+    @classmethod
+    def from_array(cls, values, dtype=None):
+        """
+        Build a buffer holding a copy of values
+        :param values: 1d array, or 2d array whose last axis is the trial/event axis
+        :param dtype: dtype of the buffer. Defaults to the dtype of values
+        """
+        values = np.asarray(values, dtype=dtype)
+        if values.ndim > 2:
+            raise ValueError(
+                f"GrowableArray only supports 1d or 2d values, got shape {values.shape}"
+            )
+        rows = None if values.ndim <= 1 else values.shape[0]
+        values = values.reshape(-1) if rows is None else values
+        buffer = cls(
+            rows=rows, dtype=values.dtype, capacity=2 * values.shape[-1]
+        )
+        buffer.extend(values)
+        return buffer
+
+    @classmethod
+    def wrap(cls, values: np.ndarray):
+        """
+        Build a full buffer using values as its storage, e.g. a memory-mapped history of
+        a loaded session. values are not copied until the buffer grows
+        :param values: 1d array, or 2d array whose last axis is the trial/event axis
+        """
+        if values.ndim not in (1, 2):
+            raise ValueError(
+                f"GrowableArray only supports 1d or 2d values, got shape {values.shape}"
+            )
+        buffer = cls.__new__(cls)
+        buffer.rows = None if values.ndim == 1 else values.shape[0]
+        buffer._data = values
+        buffer._size = values.shape[-1]
+        return buffer
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[-1]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def view(self) -> np.ndarray:
+        """Read-only view of the filled part of the buffer, no copy is made"""
+        view = self._data[..., : self._size]
+        view.flags.writeable = False
+        return view
+
+    def _reserve(self, size: int):
+        """Make sure at least size columns fit without reallocation"""
+        if size <= self.capacity and self._data.flags.writeable:
+            return
+        # wrapped storage may be read-only or empty
+        capacity = max(self.capacity, 1)
+        while capacity < size:
+            capacity *= 2
+        shape = (capacity,) if self.rows is None else (self.rows, capacity)
+        data = np.empty(shape, dtype=self._data.dtype)
+        data[..., : self._size] = self._data[..., : self._size]
+        # views handed out before the reallocation keep the old array alive
+        self._data = data
+
+    def append(self, value):
+        """
+        Append one value (1d) or one column of length rows (2d)
+        :param value: scalar for 1d buffers, array-like with rows elements for 2d buffers
+        """
+        self._reserve(self._size + 1)
+        if self.rows is None:
+            self._data[self._size] = value
+        else:
+            self._data[:, self._size] = np.asarray(value).reshape(self.rows)
+        self._size += 1
+
+    def extend(self, values):
+        """
+        Append several values (1d) or columns (2d, shape rows x n) at once
+        """
+        if self.rows is None:
+            values = np.asarray(values).reshape(-1)
+        else:
+            values = np.asarray(values).reshape(self.rows, -1)
+        n = values.shape[-1]
+        self._reserve(self._size + n)
+        self._data[..., self._size : self._size + n] = values
+        self._size += n
+
+    def clear(self):
+        """Drop all values but keep the allocated capacity"""
+        self._size = 0
+
+
+class BufferedHistory:
+    """
+    Descriptor exposing a GrowableArray as a plain numpy attribute.
+
+    Reading the attribute returns a read-only view of the buffer so that existing readers
+    (plotting, lick statistics, saving) keep working. Assigning an array replaces the buffer
+    content, which is how histories are restored when loading a session.
+    Use ``append_history``/``extend_history`` on the owner to add new values.
+    """
+
+    def __init__(self, per_trial_rows: int = None):
+        """
+        :param per_trial_rows: for 2d histories read and assigned as one row of
+            per_trial_rows values per trial (trials x per_trial_rows), the layout they are
+            saved in. They are still stored per_trial_rows x trials so that appending a
+            trial writes one column
+        """
+        self.per_trial_rows = per_trial_rows
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def buffer(self, obj) -> GrowableArray:
+        try:
+            return obj.__dict__["_histories"][self.name]
+        except KeyError:
+            raise AttributeError(
+                f"{type(obj).__name__} has no history {self.name}"
+            ) from None
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        view = self.buffer(obj).view()
+        return view if self.per_trial_rows is None else view.T
+
+    def __set__(self, obj, value):
+        if isinstance(value, GrowableArray):
+            pass
+        elif self.per_trial_rows is not None:
+            value = np.asarray(value, dtype=float)
+            value = GrowableArray.from_array(
+                value.reshape(-1, self.per_trial_rows).T
+            )
+        else:
+            value = GrowableArray.from_array(value)
+        obj.__dict__.setdefault("_histories", {})[self.name] = value
+
+
+class HistoryMixin:
+    """Helpers for classes declaring BufferedHistory attributes"""
+
+    def _history_buffer(self, name: str) -> GrowableArray:
+        descriptor = getattr(type(self), name)
+        if not isinstance(descriptor, BufferedHistory):
+            raise AttributeError(f"{name} is not a buffered history")
+        return descriptor.buffer(self)
+
+    def append_history(self, name: str, value):
+        """Append one value (or one column for 2d histories) to the named history"""
+        self._history_buffer(name).append(value)
+
+    def extend_history(self, name: str, values):
+        """Append several values to the named history"""
+        self._history_buffer(name).extend(values)
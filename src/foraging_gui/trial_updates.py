@@ -0,0 +1,230 @@
+import logging
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Callable
+
+import numpy as np
+
+
+class TrialSnapshot:
+    """
+    State of a GenerateTrials object at the end of a trial, handed to the plot, information
+    and bias consumers. Buffered histories are read-only views, so they are referenced
+    without copying; lists and writable arrays are copied.
+    """
+
+    fields = (
+        "B_CurrentTrialN",
+        "B_LickPortN",
+        "B_AnimalResponseHistory",
+        "B_AnimalCurrentResponse",
+        "B_RewardedHistory",
+        "B_RewardProHistory",
+        "B_CurrentRewardProb",
+        "B_BaitHistory",
+        "B_AutoWaterTrial",
+        "B_LaserOnTrial",
+        "B_SelectedCondition",
+        "B_ITIHistory",
+        "B_DelayHistory",
+        "B_TrialStartTime",
+        "B_TrialEndTime",
+        "B_RewardOutcomeTime",
+        "B_LeftLickTime",
+        "B_RightLickTime",
+        "B_ManualLeftWaterStartTime",
+        "B_ManualRightWaterStartTime",
+        "B_EarnedLeftWaterStartTime",
+        "B_EarnedRightWaterStartTime",
+        "B_AutoLeftWaterStartTime",
+        "B_AutoRightWaterStartTime",
+    )
+
+    def __init__(self, generated_trials):
+        """
+        :param generated_trials: GenerateTrials object of the running session
+        """
+        # consumers use source to tell sessions apart
+        self.source = generated_trials
+        self.published = time.perf_counter()
+        for name in self.fields:
+            value = getattr(generated_trials, name)
+            if isinstance(value, list):
+                value = list(value)
+            elif isinstance(value, np.ndarray) and value.flags.writeable:
+                value = value.copy()
+            setattr(self, name, value)
+
+
+class SnapshotMailbox:
+    """Holds the latest snapshot only, older snapshots not taken yet are dropped"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.snapshot = None
+        self.dropped = 0  # snapshots replaced before being taken
+
+    def put(self, snapshot: TrialSnapshot):
+        with self.condition:
+            if self.snapshot is not None:
+                self.dropped += 1
+            self.snapshot = snapshot
+            self.condition.notify()
+
+    def take(self, timeout: float = None):
+        """
+        Return the latest snapshot, waiting up to timeout seconds for one
+        :param timeout: seconds to wait, 0 to return immediately, None to wait forever
+        :return: the snapshot, or None if there was none
+        """
+        with self.condition:
+            if timeout != 0:
+                self.condition.wait_for(
+                    lambda: self.snapshot is not None, timeout
+                )
+            snapshot, self.snapshot = self.snapshot, None
+        return snapshot
+
+    def clear(self):
+        with self.condition:
+            self.snapshot = None
+
+
+class SnapshotConsumer(threading.Thread):
+    """Background thread passing the latest snapshot to a callback, at its own rate"""
+
+    def __init__(self, name: str, callback: Callable[[TrialSnapshot], None]):
+        super().__init__(name=name, daemon=True)
+        self.callback = callback
+        self.mailbox = SnapshotMailbox()
+        self.busy_time = 0.0  # seconds spent in callback
+
+    def run(self):
+        while True:
+            snapshot = self.mailbox.take()
+            start = time.perf_counter()
+            try:
+                self.callback(snapshot)
+            except Exception:
+                logging.error(traceback.format_exc())
+            self.busy_time += time.perf_counter() - start
+
+
+class TrialUpdates:
+    """
+    Fan out per-trial snapshots from the trial loop to consumers. Publishing never waits on
+    a consumer: consumers running on their own thread take the latest snapshot when they
+    are done with the previous one, consumers polled on the GUI thread take it with poll().
+    """
+
+    def __init__(self):
+        self.consumers = {}
+
+    def add_consumer(
+        self, name: str, callback: Callable[[TrialSnapshot], None] = None
+    ):
+        """
+        Register a consumer
+        :param name: consumer name, used by poll() and in logs
+        :param callback: run on a background thread with each snapshot taken. If None,
+            snapshots are only taken with poll()
+        """
+        if callback is None:
+            self.consumers[name] = SnapshotMailbox()
+        else:
+            consumer = SnapshotConsumer(name, callback)
+            consumer.start()
+            self.consumers[name] = consumer
+
+    def _mailbox(self, name: str) -> SnapshotMailbox:
+        consumer = self.consumers[name]
+        return getattr(consumer, "mailbox", consumer)
+
+    def publish(self, snapshot: TrialSnapshot):
+        for name in self.consumers:
+            self._mailbox(name).put(snapshot)
+
+    def poll(self, name: str):
+        """Return the latest snapshot of a polled consumer, or None if there is no new one"""
+        return self._mailbox(name).take(timeout=0)
+
+    def clear(self):
+        """Drop the snapshots not taken yet, e.g. when the session is cleared"""
+        for name in self.consumers:
+            self._mailbox(name).clear()
+
+    def dropped(self) -> dict:
+        """Number of stale snapshots dropped per consumer"""
+        return {name: self._mailbox(name).dropped for name in self.consumers}
+
+
+class TrialGapMonitor:
+    """
+    Measures the gap between a trial being ready to start (the previous trial ended) and
+    the trial loop starting it, and how much of the loop time is spent on GUI work.
+    """
+
+    def __init__(self, log_every: int = 100):
+        """
+        :param log_every: log a summary every log_every trials
+        """
+        self.log_every = log_every
+        self.reset()
+
+    def reset(self):
+        self.ready_time = None
+        self.gui_time = 0.0  # GUI work since the last trial started
+        self.gaps = []
+        self.gui_times = []
+
+    def trial_ready(self):
+        """Call when the next trial is allowed to start"""
+        self.ready_time = time.perf_counter()
+
+    @contextmanager
+    def gui_work(self):
+        """Time GUI work done on the trial loop thread"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.gui_time += time.perf_counter() - start
+
+    def trial_started(self):
+        """Call right before the trial loop initiates the next trial"""
+        if self.ready_time is not None:
+            self.gaps.append(time.perf_counter() - self.ready_time)
+            self.gui_times.append(self.gui_time)
+            if len(self.gaps) % self.log_every == 0:
+                self.log_summary()
+        self.ready_time = None
+        self.gui_time = 0.0
+
+    def summary(self) -> dict:
+        """Mean, 95th percentile and max of the inter-trial gaps and GUI work, in ms"""
+        if not self.gaps:
+            return {}
+        gaps = np.array(self.gaps) * 1e3
+        gui_times = np.array(self.gui_times) * 1e3
+        return {
+            "trials": len(gaps),
+            "gap_mean": np.mean(gaps),
+            "gap_p95": np.percentile(gaps, 95),
+            "gap_max": np.max(gaps),
+            "gui_mean": np.mean(gui_times),
+            "gui_p95": np.percentile(gui_times, 95),
+            "gui_max": np.max(gui_times),
+        }
+
+    def log_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        logging.info(
+            "Inter-trial gap over {trials} trials: mean {gap_mean:.1f} ms, "
+            "p95 {gap_p95:.1f} ms, max {gap_max:.1f} ms; GUI work in the trial "
+            "loop: mean {gui_mean:.1f} ms, p95 {gui_p95:.1f} ms, "
+            "max {gui_max:.1f} ms".format(**summary)
+        )
@@ -0,0 +1,143 @@
+"""
+Registry of the parameter widgets of the main window and its dialogs.
+
+The widgets are found once, when their container is registered, instead of walking the
+widget tree with findChildren on every trial and keypress. The value of each widget is
+cached and only read again after the widget signals a change.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from PyQt5 import QtWidgets
+
+# widgets whose text is the parameter value
+TEXT_WIDGETS = (
+    QtWidgets.QLineEdit,
+    QtWidgets.QDoubleSpinBox,
+    QtWidgets.QSpinBox,
+)
+PARAMETER_WIDGETS = TEXT_WIDGETS + (QtWidgets.QComboBox, QtWidgets.QPushButton)
+# widgets created by Qt, e.g. the line edit inside a spin box
+IGNORED_NAMES = ("qt_spinbox_lineedit", "")
+# containers of the parameters checked and applied by the main window
+WINDOW_PARAMETER_CONTAINERS = (
+    "TrainingParameters",
+    "centralwidget",
+    "Opto_dialog",
+    "Metadata_dialog",
+)
+# containers of the TP_ parameters of each trial
+TRIAL_PARAMETER_CONTAINERS = (
+    "TrainingParameters",
+    "centralwidget",
+    "Opto_dialog",
+    "Camera_dialog",
+    "Metadata_dialog",
+)
+
+
+def widget_value(widget):
+    """Parameter value of a widget: its text, current text or checked state"""
+    if isinstance(widget, TEXT_WIDGETS):
+        return widget.text()
+    if isinstance(widget, QtWidgets.QComboBox):
+        return widget.currentText()
+    return widget.isChecked()
+
+
+def _changed_signal(widget):
+    if isinstance(widget, TEXT_WIDGETS):
+        return widget.textChanged
+    if isinstance(widget, QtWidgets.QComboBox):
+        return widget.currentTextChanged
+    return widget.toggled
+
+
+class WidgetRegistry:
+    """
+    Parameter widgets of named containers (e.g. "TrainingParameters", "Opto_dialog"),
+    in the order findChildren returns them: text widgets, then combo boxes, then push
+    buttons. A widget is marked dirty when it emits textChanged, currentTextChanged or
+    toggled, and read is the only place where widgets are read.
+
+    read runs on the trial thread while widgets are marked from the GUI thread, so the
+    dirty set is only changed or swapped under a lock.
+    """
+
+    def __init__(self):
+        self.containers = {}  # container name -> [(parameter name, widget)]
+        self.cache = {}  # widget -> value when it was last read
+        self.dirty = set()  # widgets changed since they were last read
+        self.lock = threading.Lock()
+
+    def register(self, name: str, container: QtWidgets.QWidget):
+        """
+        Find the parameter widgets of a container, e.g. once a dialog is created.
+        Registering a name again replaces its widgets
+        :param name: name used to refer to the container, e.g. its attribute name
+        """
+        entries = []
+        for widget_types in (
+            TEXT_WIDGETS,
+            QtWidgets.QComboBox,
+            QtWidgets.QPushButton,
+        ):
+            for child in container.findChildren(widget_types):
+                if child.objectName() in IGNORED_NAMES:
+                    continue
+                entries.append((child.objectName(), child))
+                if child not in self.cache:
+                    self.cache[child] = None
+                    self._mark(child)
+                    _changed_signal(child).connect(
+                        lambda *args, widget=child: self._mark(widget)
+                    )
+        self.containers[name] = entries
+
+    def _mark(self, widget):
+        """Read the widget again on the next read"""
+        with self.lock:
+            self.dirty.add(widget)
+
+    def __contains__(self, name) -> bool:
+        return name in self.containers
+
+    def widgets(
+        self, names: Iterable[str], widget_types: Tuple = PARAMETER_WIDGETS
+    ) -> List[QtWidgets.QWidget]:
+        """
+        Widgets of the named containers, each once
+        :param names: registered containers, unregistered ones are skipped
+        :param widget_types: only return widgets of these types
+        """
+        widgets = {}
+        for name in names:
+            for _, widget in self.containers.get(name, ()):
+                if isinstance(widget, widget_types):
+                    widgets[widget] = None
+        return list(widgets)
+
+    def read(self, names: Iterable[str]) -> Dict[str, object]:
+        """
+        Parameter values of the widgets of the named containers. Only widgets changed
+        since the previous read are read again
+        :param names: registered containers, unregistered ones are skipped. When
+            several widgets have the same name, the last one wins
+        :return: widget name -> value
+        """
+        # swap first: a widget changed while reading is read again next time
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+        for widget in dirty:
+            self.cache[widget] = widget_value(widget)
+        values = {}
+        for name in names:
+            for parameter, widget in self.containers.get(name, ()):
+                values[parameter] = self.cache[widget]
+        return values
+
+    def invalidate(self):
+        """Read all widgets again on the next read, e.g. after changes made with signals blocked"""
+        with self.lock:
+            self.dirty.update(self.cache)